@@ -1,8 +1,14 @@
 import json
 import pathlib
 
+from src.schemas.multi_agent import AnswerReview, DistributorOutput, ModuleGeneratorOutput
+from src.schemas.output_schemas import gemini_response_schema, openai_response_format
+from src.schemas.precheck import PrecheckResponse
 from src.schemas.sdf import SystemDefinitionFile
 
+# Agent outputs sent to the providers as native structured-output schemas.
+STRUCTURED_OUTPUT_MODELS = (DistributorOutput, ModuleGeneratorOutput, AnswerReview, PrecheckResponse)
+
 
 def main():
     """Generates the sdf_schema.json file from the Pydantic model."""
@@ -23,6 +29,20 @@ def main():
 
     print(f"✅ Successfully generated SDF schema at: {output_path}")
 
+    # Provider-native schemas for the structured agent outputs
+    structured_path = output_dir / "structured_output_schemas.json"
+    structured = {
+        model.__name__: {
+            "azure_openai": openai_response_format(model),
+            "gemini": gemini_response_schema(model),
+        }
+        for model in STRUCTURED_OUTPUT_MODELS
+    }
+    with open(structured_path, "w") as f:
+        json.dump(structured, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Successfully generated structured output schemas at: {structured_path}")
+
 
 if __name__ == "__main__":
     main()
@@ -3,7 +3,7 @@ Configuration module for AI Gateway
 
 Supports multi-provider, multi-agent architecture.
 Each agent (distributor, hr, invoice, inventory, integrator, chatbot) can have its own:
-- Provider (azure_openai or gemini)
+- Provider (azure_openai, gemini, or mock for offline runs)
 - API key / endpoint
 - Model / deployment name
 - Temperature, timeout, retries
@@ -33,6 +33,21 @@ class AgentConfig:
     azure_endpoint: Optional[str] = None
     azure_deployment: Optional[str] = None
     azure_api_version: Optional[str] = None
+    # Client-side rate limits for this agent's deployment (per minute)
+    rpm_limit: Optional[int] = None
+    tpm_limit: Optional[int] = None
+    # Provider to fail over to per call while this agent's primary is
+    # circuit-broken ("none" disables failover for the agent)
+    failover_provider: Optional[str] = None
+    # Request hedging: send a backup request once the first has run past
+    # the agent's observed pXX latency (optionally to another deployment)
+    hedge_enabled: bool = False
+    hedge_percentile: Optional[float] = None
+    hedge_deployment: Optional[str] = None
+    # Serve repeated identical calls from the response cache
+    cache_enabled: Optional[bool] = None
+    # Output token budget per call; clipped to the model's limits
+    max_output_tokens: Optional[int] = None
     
     def get_api_key(self, default: str) -> str:
         return self.api_key if self.api_key else default
@@ -55,6 +70,24 @@ class AgentConfig:
     def get_azure_api_version(self, default: str) -> str:
         return self.azure_api_version if self.azure_api_version else default
 
+    def get_rpm_limit(self, default: int) -> int:
+        return self.rpm_limit if self.rpm_limit is not None else default
+
+    def get_tpm_limit(self, default: int) -> int:
+        return self.tpm_limit if self.tpm_limit is not None else default
+
+    def get_failover_provider(self, default: str) -> str:
+        return self.failover_provider if self.failover_provider is not None else default
+
+    def get_hedge_percentile(self, default: float) -> float:
+        return self.hedge_percentile if self.hedge_percentile is not None else default
+
+    def get_cache_enabled(self, default: bool) -> bool:
+        return self.cache_enabled if self.cache_enabled is not None else default
+
+    def get_max_output_tokens(self, default: int) -> int:
+        return self.max_output_tokens if self.max_output_tokens is not None else default
+
 
 class Settings:
     """Application settings loaded from environment variables"""
@@ -63,7 +96,7 @@ class Settings:
     HOST: str = os.getenv("HOST", "0.0.0.0")
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     
-    # Provider selection (azure_openai | gemini)
+    # Provider selection (azure_openai | gemini | mock)
     AI_DEFAULT_PROVIDER: str = os.getenv("AI_DEFAULT_PROVIDER", "azure_openai")
     
     # Google AI Configuration (fallback provider)
@@ -79,6 +112,183 @@ class Settings:
     # Request Configuration (Global defaults)
     AI_TIMEOUT_SECONDS: int = int(os.getenv("AI_TIMEOUT_SECONDS", "120"))
     AI_MAX_RETRIES: int = int(os.getenv("AI_MAX_RETRIES", "3"))
+
+    # Output sizing: every call requests the agent's budget
+    # (AI_AGENT_<NAME>_MAX_OUTPUT_TOKENS, default AI_MAX_OUTPUT_TOKENS),
+    # clipped to the model's output limit and to the context window left
+    # after the estimated prompt. A completion cut off at the limit is
+    # continued up to AI_MAX_CONTINUATIONS times.
+    AI_MAX_OUTPUT_TOKENS: int = int(os.getenv("AI_MAX_OUTPUT_TOKENS", "8192"))
+    AI_MIN_OUTPUT_TOKENS: int = int(os.getenv("AI_MIN_OUTPUT_TOKENS", "512"))
+    AI_CONTEXT_WARN_RATIO: float = float(os.getenv("AI_CONTEXT_WARN_RATIO", "0.8"))
+    AI_MAX_CONTINUATIONS: int = int(os.getenv("AI_MAX_CONTINUATIONS", "2"))
+
+    # Retry backoff: provider Retry-After hints first, decorrelated jitter
+    # otherwise. The process-wide budget allows at most AI_RETRY_BUDGET_RATIO
+    # retries per first attempt over the window (never fewer than
+    # AI_RETRY_BUDGET_MIN_RETRIES).
+    AI_RETRY_BASE_SECONDS: float = float(os.getenv("AI_RETRY_BASE_SECONDS", "1"))
+    AI_RETRY_MAX_BACKOFF_SECONDS: float = float(os.getenv("AI_RETRY_MAX_BACKOFF_SECONDS", "30"))
+    AI_RETRY_MAX_RETRY_AFTER_SECONDS: float = float(os.getenv("AI_RETRY_MAX_RETRY_AFTER_SECONDS", "60"))
+    AI_RETRY_BUDGET_RATIO: float = float(os.getenv("AI_RETRY_BUDGET_RATIO", "0.1"))
+    AI_RETRY_BUDGET_WINDOW_SECONDS: float = float(os.getenv("AI_RETRY_BUDGET_WINDOW_SECONDS", "60"))
+    AI_RETRY_BUDGET_MIN_RETRIES: int = int(os.getenv("AI_RETRY_BUDGET_MIN_RETRIES", "3"))
+
+    # Shared HTTP connection pools (one per provider/endpoint/credential)
+    AI_HTTP_MAX_CONNECTIONS: int = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "50"))
+    AI_HTTP_MAX_KEEPALIVE: int = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "20"))
+    AI_HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("AI_HTTP_KEEPALIVE_SECONDS", "60"))
+    AI_HTTP2_ENABLED: bool = os.getenv("AI_HTTP2_ENABLED", "true").lower() == "true"
+
+    # Client-side rate limiting per deployment (0 = unlimited). Mirror the
+    # quota assigned to the deployment in Azure so calls queue locally
+    # instead of failing with 429s.
+    AI_RATE_LIMIT_RPM: int = int(os.getenv("AI_RATE_LIMIT_RPM", "0"))
+    AI_RATE_LIMIT_TPM: int = int(os.getenv("AI_RATE_LIMIT_TPM", "0"))
+
+    # Runtime failover: a per-provider circuit breaker wraps every agent's
+    # primary client; while it is open, calls go straight to the failover
+    # provider. Off by default; set AI_FAILOVER_PROVIDER (e.g. gemini) to
+    # opt in.
+    AI_FAILOVER_PROVIDER: str = os.getenv("AI_FAILOVER_PROVIDER", "none")
+    AI_BREAKER_WINDOW: int = int(os.getenv("AI_BREAKER_WINDOW", "20"))
+    AI_BREAKER_MIN_CALLS: int = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))
+    AI_BREAKER_FAILURE_RATE: float = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5"))
+    AI_BREAKER_SLOW_CALL_SECONDS: float = float(os.getenv("AI_BREAKER_SLOW_CALL_SECONDS", "90"))
+    AI_BREAKER_SLOW_CALL_RATE: float = float(os.getenv("AI_BREAKER_SLOW_CALL_RATE", "0.8"))
+    AI_BREAKER_OPEN_SECONDS: float = float(os.getenv("AI_BREAKER_OPEN_SECONDS", "30"))
+
+    # Request hedging for agents that opt in with AI_AGENT_<NAME>_HEDGE=true.
+    # The hedge fires at the agent's observed AI_HEDGE_PERCENTILE latency,
+    # never earlier than AI_HEDGE_MIN_DELAY_SECONDS, and only once
+    # AI_HEDGE_MIN_SAMPLES calls have been observed.
+    AI_HEDGE_PERCENTILE: float = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+    AI_HEDGE_MIN_SAMPLES: int = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "10"))
+    AI_HEDGE_WINDOW: int = int(os.getenv("AI_HEDGE_WINDOW", "100"))
+    AI_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("AI_HEDGE_MIN_DELAY_SECONDS", "2"))
+
+    # Content-addressed response cache. AI_CACHE_ENABLED is the default for
+    # every agent; AI_AGENT_<NAME>_CACHE overrides it.
+    # AI_CACHE_DISK_MAX_MB=0 keeps the cache memory-only.
+    AI_CACHE_ENABLED: bool = os.getenv("AI_CACHE_ENABLED", "false").lower() == "true"
+    AI_CACHE_TTL_SECONDS: float = float(os.getenv("AI_CACHE_TTL_SECONDS", "86400"))
+    AI_CACHE_MEMORY_ENTRIES: int = int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "256"))
+    AI_CACHE_DISK_MAX_MB: float = float(os.getenv("AI_CACHE_DISK_MAX_MB", "100"))
+    AI_CACHE_DB_PATH: str = os.getenv("AI_CACHE_DB_PATH") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "llm_responses.sqlite"
+    )
+    
+    # Explicit Gemini context caching of static prompt prefixes (schema
+    # reference, template instructions). Azure caches repeated prefixes of
+    # 1024+ tokens automatically; Gemini needs a CachedContent per prefix.
+    AI_GEMINI_CONTEXT_CACHE: bool = os.getenv("AI_GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+    AI_GEMINI_CONTEXT_CACHE_TTL_SECONDS: float = float(os.getenv("AI_GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+    AI_GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = int(os.getenv("AI_GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+
+    # Provider-native structured outputs: calls with a response_schema send
+    # it as an Azure json_schema response_format / Gemini response_schema.
+    # Off falls back to plain JSON mode (useful to compare repair rates).
+    AI_STRUCTURED_OUTPUTS: bool = os.getenv("AI_STRUCTURED_OUTPUTS", "true").lower() == "true"
+
+    # Module generators stream their JSON through an incremental parser:
+    # entities are reported as they close and malformed output is restarted
+    # early. Streaming calls skip the response cache and request hedging.
+    AI_STREAM_GENERATORS: bool = os.getenv("AI_STREAM_GENERATORS", "true").lower() == "true"
+    AI_STREAM_MALFORMED_RETRIES: int = int(os.getenv("AI_STREAM_MALFORMED_RETRIES", "1"))
+
+    # Start the distributor alongside the answer reviewer on fresh builds;
+    # its result is discarded (and its tokens reported as waste) on a halt.
+    AI_SPECULATIVE_DISTRIBUTOR: bool = os.getenv("AI_SPECULATIVE_DISTRIBUTOR", "true").lower() == "true"
+
+    # Start the selected modules' generators while the distributor runs, with a
+    # context predicted from the wizard answers. A prefetched output is kept
+    # when its predicted context is at least this similar (0-1) to the
+    # distributor's; otherwise only that module is re-run.
+    AI_SPECULATIVE_GENERATORS: bool = os.getenv("AI_SPECULATIVE_GENERATORS", "false").lower() == "true"
+    AI_SPECULATIVE_GENERATOR_MIN_SIMILARITY: float = float(os.getenv("AI_SPECULATIVE_GENERATOR_MIN_SIMILARITY", "0.6"))
+
+    # Change requests that touch only some of a module's entities regenerate
+    # just those (distributor affected_entities, or slugs named in the change
+    # instructions); the module's other entities are carried forward.
+    AI_INCREMENTAL_ENTITIES: bool = os.getenv("AI_INCREMENTAL_ENTITIES", "true").lower() == "true"
+
+    # Pipeline stage scheduling. Each stage of generate_sdf (reviewer,
+    # distributor, hr_generator, merge, ...) takes an optional per-attempt
+    # timeout and retry count from AI_STAGE_<NAME>_TIMEOUT / _RETRIES.
+    # AI_PIPELINE_MAX_LLM_STAGES caps concurrent LLM stages (0 = no cap).
+    AI_PIPELINE_MAX_LLM_STAGES: int = int(os.getenv("AI_PIPELINE_MAX_LLM_STAGES", "0"))
+
+    # Per-project stage checkpoints. Runs that carry a project_id save the
+    # distributor, generator and merge outputs keyed by a hash of each
+    # stage's inputs; /ai/clarify reuses the stages whose inputs are unchanged.
+    AI_CHECKPOINTS_ENABLED: bool = os.getenv("AI_CHECKPOINTS_ENABLED", "true").lower() == "true"
+    AI_CHECKPOINT_TTL_SECONDS: float = float(os.getenv("AI_CHECKPOINT_TTL_SECONDS", "604800"))
+    # Stages kept in the in-process LRU in front of the sqlite file.
+    AI_CHECKPOINT_MEMORY_ENTRIES: int = int(os.getenv("AI_CHECKPOINT_MEMORY_ENTRIES", "1024"))
+    AI_CHECKPOINT_DB_PATH: str = os.getenv("AI_CHECKPOINT_DB_PATH") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "pipeline_checkpoints.sqlite"
+    )
+
+    # Asynchronous job API (/ai/jobs/*). Jobs live in a sqlite table and run
+    # on AI_JOBS_WORKERS worker tasks; /ai/analyze runs through the same pool.
+    # Jobs interrupted by a restart are re-queued up to AI_JOBS_MAX_ATTEMPTS.
+    AI_JOBS_WORKERS: int = int(os.getenv("AI_JOBS_WORKERS", "2"))
+    AI_JOBS_MAX_PENDING: int = int(os.getenv("AI_JOBS_MAX_PENDING", "100"))
+    AI_JOBS_MAX_ATTEMPTS: int = int(os.getenv("AI_JOBS_MAX_ATTEMPTS", "2"))
+    AI_JOBS_RETENTION_SECONDS: float = float(os.getenv("AI_JOBS_RETENTION_SECONDS", "86400"))
+    AI_JOBS_LEASE_SECONDS: float = float(os.getenv("AI_JOBS_LEASE_SECONDS", "30"))
+    AI_JOBS_DB_PATH: str = os.getenv("AI_JOBS_DB_PATH") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "jobs.sqlite"
+    )
+
+    # Shared state for multi-worker deployments (uvicorn --workers N):
+    # memory (single worker), sqlite (workers on one host) or redis
+    # (AI_STATE_REDIS_URL; without it an in-process stand-in is used).
+    # Generation progress expires after AI_PROGRESS_TTL_SECONDS, and
+    # AI_PROGRESS_DONE_TTL_SECONDS after the run completes.
+    AI_STATE_BACKEND: str = os.getenv("AI_STATE_BACKEND", "memory").lower()
+    AI_STATE_DB_PATH: str = os.getenv("AI_STATE_DB_PATH") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "state.sqlite"
+    )
+    AI_STATE_REDIS_URL: str = os.getenv("AI_STATE_REDIS_URL", "")
+    AI_STATE_REDIS_PREFIX: str = os.getenv("AI_STATE_REDIS_PREFIX", "ai-gateway")
+    AI_PROGRESS_TTL_SECONDS: float = float(os.getenv("AI_PROGRESS_TTL_SECONDS", "3600"))
+    AI_PROGRESS_DONE_TTL_SECONDS: float = float(os.getenv("AI_PROGRESS_DONE_TTL_SECONDS", "10"))
+    # Worker processes serving this port (uvicorn --workers N). Defaults to
+    # WEB_CONCURRENCY, which uvicorn and gunicorn read too. With more than
+    # one, startup refuses a state backend the other workers can't see.
+    AI_GATEWAY_WORKERS: int = int(os.getenv("AI_GATEWAY_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1")
+
+    # Training-session log (training_data/sessions.jsonl). Records are queued
+    # and appended in batches by a background task; when more than
+    # AI_TRAINING_LOG_QUEUE_SIZE are waiting, new ones are dropped.
+    # fsync policy: always | interval | never
+    AI_TRAINING_LOG_QUEUE_SIZE: int = int(os.getenv("AI_TRAINING_LOG_QUEUE_SIZE", "1000"))
+    AI_TRAINING_LOG_BATCH_SIZE: int = int(os.getenv("AI_TRAINING_LOG_BATCH_SIZE", "50"))
+    AI_TRAINING_LOG_FSYNC: str = os.getenv("AI_TRAINING_LOG_FSYNC", "interval").lower()
+    AI_TRAINING_LOG_FSYNC_INTERVAL_SECONDS: float = float(os.getenv("AI_TRAINING_LOG_FSYNC_INTERVAL_SECONDS", "1"))
+    # Indexed copy of the log read by /ai/training/*; an existing
+    # sessions.jsonl is imported into it once at startup.
+    AI_TRAINING_DB_PATH: str = os.getenv("AI_TRAINING_DB_PATH") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "training_sessions.sqlite"
+    )
+
+    # Offline mock provider (AI_AGENT_<NAME>_PROVIDER=mock). Replays recorded
+    # step logs / fixtures and simulates latency, 429s and timeouts.
+    AI_MOCK_SESSIONS_FILE: str = os.getenv("AI_MOCK_SESSIONS_FILE") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "training_data", "sessions.jsonl"
+    )
+    AI_MOCK_FIXTURES: str = os.getenv("AI_MOCK_FIXTURES", "")
+    AI_MOCK_STRICT: bool = os.getenv("AI_MOCK_STRICT", "false").lower() == "true"
+    AI_MOCK_SEED: int = int(os.getenv("AI_MOCK_SEED", "0"))
+    # fixed | uniform | lognormal | recorded
+    AI_MOCK_LATENCY_DISTRIBUTION: str = os.getenv("AI_MOCK_LATENCY_DISTRIBUTION", "lognormal").lower()
+    AI_MOCK_LATENCY_MS: float = float(os.getenv("AI_MOCK_LATENCY_MS", "1500"))
+    AI_MOCK_LATENCY_JITTER: float = float(os.getenv("AI_MOCK_LATENCY_JITTER", "0.5"))
+    AI_MOCK_LATENCY_SCALE: float = float(os.getenv("AI_MOCK_LATENCY_SCALE", "1.0"))
+    AI_MOCK_RATE_LIMIT_RATE: float = float(os.getenv("AI_MOCK_RATE_LIMIT_RATE", "0"))
+    AI_MOCK_TIMEOUT_RATE: float = float(os.getenv("AI_MOCK_TIMEOUT_RATE", "0"))
+    AI_MOCK_STREAM_CHUNK_CHARS: int = int(os.getenv("AI_MOCK_STREAM_CHUNK_CHARS", "24"))
     
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
@@ -102,6 +312,26 @@ class Settings:
         azure_endpoint = os.getenv(f"{prefix}AZURE_ENDPOINT") or None
         azure_deployment = os.getenv(f"{prefix}AZURE_DEPLOYMENT") or None
         azure_api_version = os.getenv(f"{prefix}AZURE_API_VERSION") or None
+
+        rpm_str = os.getenv(f"{prefix}RPM")
+        rpm_limit = int(rpm_str) if rpm_str else None
+
+        tpm_str = os.getenv(f"{prefix}TPM")
+        tpm_limit = int(tpm_str) if tpm_str else None
+
+        # "none" disables failover for this agent only.
+        failover_provider = os.getenv(f"{prefix}FAILOVER_PROVIDER") or None
+
+        hedge_enabled = (os.getenv(f"{prefix}HEDGE") or "false").lower() == "true"
+        hedge_pct_str = os.getenv(f"{prefix}HEDGE_PERCENTILE")
+        hedge_percentile = float(hedge_pct_str) if hedge_pct_str else None
+        hedge_deployment = os.getenv(f"{prefix}HEDGE_DEPLOYMENT") or None
+
+        cache_str = os.getenv(f"{prefix}CACHE")
+        cache_enabled = cache_str.lower() == "true" if cache_str else None
+
+        max_output_str = os.getenv(f"{prefix}MAX_OUTPUT_TOKENS")
+        max_output_tokens = int(max_output_str) if max_output_str else None
         
         return AgentConfig(
             name=agent_name,
@@ -114,8 +344,24 @@ class Settings:
             azure_endpoint=azure_endpoint,
             azure_deployment=azure_deployment,
             azure_api_version=azure_api_version,
+            rpm_limit=rpm_limit,
+            tpm_limit=tpm_limit,
+            failover_provider=failover_provider,
+            hedge_enabled=hedge_enabled,
+            hedge_percentile=hedge_percentile,
+            hedge_deployment=hedge_deployment,
+            cache_enabled=cache_enabled,
+            max_output_tokens=max_output_tokens,
         )
     
+    @classmethod
+    def stage_policy(cls, stage_name: str) -> tuple[Optional[float], int]:
+        """(timeout seconds, retries) for a pipeline stage."""
+        prefix = f"AI_STAGE_{stage_name.upper()}_"
+        timeout_str = os.getenv(f"{prefix}TIMEOUT")
+        retries_str = os.getenv(f"{prefix}RETRIES")
+        return (float(timeout_str) if timeout_str else None, int(retries_str) if retries_str else 0)
+
     _agent_configs: dict[str, AgentConfig] = {}
     
     @classmethod
@@ -163,6 +409,10 @@ class Settings:
             cfg.azure_deployment = dist.azure_deployment
         if not cfg.azure_api_version and dist.azure_api_version:
             cfg.azure_api_version = dist.azure_api_version
+        if cfg.rpm_limit is None and dist.rpm_limit is not None:
+            cfg.rpm_limit = dist.rpm_limit
+        if cfg.tpm_limit is None and dist.tpm_limit is not None:
+            cfg.tpm_limit = dist.tpm_limit
         # Provider gets resolved via AI_DEFAULT_PROVIDER if AI_AGENT_REVIEWER_PROVIDER
         # is unset; if for some reason it's still unset, mirror distributor.
         if not cfg.provider:
@@ -195,6 +445,10 @@ class Settings:
         errors = []
         has_azure = bool(cls.AZURE_OPENAI_API_KEY and cls.AZURE_OPENAI_ENDPOINT)
         has_gemini = bool(cls.GOOGLE_AI_API_KEY)
+
+        if cls.AI_DEFAULT_PROVIDER == "mock":
+            print("[Config] WARNING: AI_DEFAULT_PROVIDER is mock — responses are simulated.")
+            return errors
         
         if not has_azure and not has_gemini:
             errors.append(
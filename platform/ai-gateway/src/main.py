@@ -3,7 +3,7 @@ CustomERP AI Gateway
 FastAPI service for AI-powered SDF generation using Google Gemini
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel, Field, AliasChoices
@@ -11,19 +11,36 @@ from typing import Optional, Union, Any, Dict, List
 import json
 import os
 import asyncio
-from fastapi.responses import PlainTextResponse
+import sqlite3
+import zlib
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from .config import settings
 from .services.gemini_client import GeminiClient
-from .services.azure_client import AzureOpenAIClient
+from .services.failover_client import create_agent_client
+from .services.circuit_breaker import circuit_breaker_snapshot
+from .services.hedged_client import hedging_snapshot
+from .services.retry_policy import retry_budget_snapshot
+from .services.response_cache import response_cache_snapshot
+from .services.checkpoint_store import checkpoint_store_snapshot
+from .services.job_queue import JobQueueFull, get_job_queue, job_handler, job_queue_snapshot
+from .services.progress_events import get_progress_broker, progress_stream_snapshot
+from .services.state_backend import StateWriter, check_multi_worker, get_state_backend, state_backend_snapshot
+from .services.session_log import get_session_log, session_log_snapshot
+from .services.session_store import SessionStore, get_session_store, session_store_snapshot
+from .services.gemini_context_cache import gemini_context_cache_snapshot
+from .services.single_flight import get_single_flight, request_key, single_flight_snapshot
+from .services.multi_agent_service import generator_prefetch_snapshot, json_repair_snapshot, speculation_snapshot
 from .services.sdf_service import SDFService
-from .services.base_client import BaseAIClient
+from .services.base_client import BaseAIClient, rate_limiter_snapshot
+from .services import client_registry
 from .schemas.sdf import SystemDefinitionFile
 from .schemas.clarify import ClarifyRequest
 from .schemas.multi_agent import AgentStepLog
 from .schemas.precheck import PrecheckRequest, PrecheckResponse
 from .services.precheck_service import PrecheckService
 from .services.chat_scope_guard import strip_offtopic_features
+from .services.chat_reply_stream import ReplyFieldExtractor
 from .prompts.sdf_generation import get_chat_prompt
 
 # Initialize FastAPI app
@@ -51,8 +68,21 @@ import uuid as _uuid
 _TRAINING_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent / "training_data"
 _SESSIONS_FILE = _TRAINING_DATA_DIR / "sessions.jsonl"
 
-# In-memory generation progress tracker: { project_id: { step, detail, pct, steps_done, steps_total } }
-_generation_progress: Dict[str, Dict[str, Any]] = {}
+# Generation progress tracker: { project_id: { step, detail, pct } }, kept in
+# the shared state backend so any gateway worker can answer /ai/progress.
+_PROGRESS_NAMESPACE = "progress"
+_progress_writer: Optional[StateWriter] = None
+
+
+def _progress_state() -> StateWriter:
+    global _progress_writer
+    if _progress_writer is None:
+        _progress_writer = StateWriter(get_state_backend(), _PROGRESS_NAMESPACE)
+    return _progress_writer
+
+
+async def _read_progress(project_id: str) -> Optional[Dict[str, Any]]:
+    return await get_state_backend().get(_PROGRESS_NAMESPACE, project_id)
 
 
 def _log_training_session(
@@ -62,11 +92,11 @@ def _log_training_session(
     step_logs: Optional[list] = None,
     token_usage: Optional[dict] = None,
 ) -> str:
-    """Write a rich JSONL record per request, including per-agent step details.
+    """Queue a rich JSONL record per request, including per-agent step details.
+    The record is written to sessions.jsonl in the background.
     Returns the generated session_id."""
     session_id = str(_uuid.uuid4())
     try:
-        _TRAINING_DATA_DIR.mkdir(parents=True, exist_ok=True)
         if isinstance(output_data, dict):
             out = output_data
         elif hasattr(output_data, "model_dump"):
@@ -89,10 +119,9 @@ def _log_training_session(
             "step_logs": serialised_steps,
             "token_usage": token_usage or {},
         }
-        with open(_SESSIONS_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        get_session_log(_SESSIONS_FILE).write(record)
     except Exception as e:
-        print(f"[TRAINING-LOG] Failed to write training session: {e}")
+        print(f"[TRAINING-LOG] Failed to queue training session: {e}")
     return session_id
 
 # Lazy-loaded Gemini client (initialized on first use)
@@ -104,6 +133,12 @@ def get_gemini_client():
     """Get or create the Gemini client singleton"""
     global _gemini_client
     if _gemini_client is None:
+        if settings.AI_DEFAULT_PROVIDER == "mock":
+            # The legacy single-call endpoints (/ai/edit, /ai/clarify, ...)
+            # replay "sdf_editor" recordings in offline mode.
+            from .services.mock_client import MockClient
+            _gemini_client = MockClient(settings.get_agent_config("sdf_editor"))
+            return _gemini_client
         if not settings.GOOGLE_AI_API_KEY:
             return None
         from .services.gemini_client import GeminiClient
@@ -132,6 +167,30 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ai/diagnostics", tags=["Monitoring"])
+async def diagnostics():
+    """Runtime state of the client layer (rate limits, retries, breakers, hedging, caches, pools)."""
+    return {
+        "rate_limiters": rate_limiter_snapshot(),
+        "retry_budget": retry_budget_snapshot(),
+        "circuit_breakers": circuit_breaker_snapshot(),
+        "hedging": hedging_snapshot(),
+        "response_cache": await response_cache_snapshot(),
+        "gemini_context_cache": gemini_context_cache_snapshot(),
+        "single_flight": single_flight_snapshot(),
+        "json_repair": json_repair_snapshot(),
+        "speculative_distributor": speculation_snapshot(),
+        "speculative_generators": generator_prefetch_snapshot(),
+        "checkpoints": checkpoint_store_snapshot(),
+        "jobs": job_queue_snapshot(),
+        "progress_streams": progress_stream_snapshot(),
+        "state_backend": state_backend_snapshot(),
+        "training_log": session_log_snapshot(),
+        "training_store": session_store_snapshot(),
+        "http_pools": client_registry.pool_count(),
+    }
+
+
 # ─────────────────────────────────────────────────────────────
 # Core AI Endpoints
 # ─────────────────────────────────────────────────────────────
@@ -216,6 +275,11 @@ class EditRequest(BaseModel):
         validation_alias=AliasChoices("review_only", "reviewOnly"),
         description="When true, run the change reviewer but do not edit the SDF.",
     )
+    project_id: Optional[str] = Field(
+        default=None,
+        description="Project ID; identical concurrent edits for a project are coalesced.",
+        validation_alias=AliasChoices("project_id", "projectId"),
+    )
 
 
 class ChatMessage(BaseModel):
@@ -255,39 +319,18 @@ def get_chatbot_client() -> Optional[BaseAIClient]:
     global _chatbot_client
     if _chatbot_client is None:
         config = settings.get_agent_config("chatbot")
-        if config.provider == "azure_openai":
-            try:
-                _chatbot_client = AzureOpenAIClient(agent_config=config)
-            except Exception as e:
-                print(f"[ChatBot] Azure client init failed: {e}")
-                if settings.GOOGLE_AI_API_KEY:
-                    print("[ChatBot] Falling back to Gemini")
-                    config.provider = "gemini"
-                    _chatbot_client = GeminiClient(agent_config=config)
-                else:
-                    return None
-        else:
-            if not settings.GOOGLE_AI_API_KEY:
-                return None
-            _chatbot_client = GeminiClient(agent_config=config)
+        if config.provider == "gemini" and not settings.GOOGLE_AI_API_KEY:
+            return None
+        try:
+            _chatbot_client = create_agent_client(config, log_prefix="ChatBot")
+        except Exception as e:
+            print(f"[ChatBot] Client init failed: {e}")
+            return None
     return _chatbot_client
 
 
-@app.post("/ai/chat", response_model=ChatResponse, tags=["Chat Mode"])
-async def chat_endpoint(request: ChatRequest):
-    """
-    Chat mode endpoint for conversational feature discussion.
-
-    Uses the chatbot agent to help users explore and refine their ERP requirements
-    before switching to build mode. Does NOT generate SDF output.
-    """
-    client = get_chatbot_client()
-    if not client:
-        raise HTTPException(
-            status_code=503,
-            detail="Chat AI service is not configured or failed to initialize."
-        )
-
+def _build_chat_prompt(request: ChatRequest) -> str:
+    """Render the chatbot prompt from a ChatRequest."""
     history_str = ""
     if request.conversation_history:
         lines = []
@@ -307,7 +350,7 @@ async def chat_endpoint(request: ChatRequest):
 
     modules_str = ", ".join(request.selected_modules) if request.selected_modules else ""
 
-    prompt = get_chat_prompt(
+    return get_chat_prompt(
         business_description=request.business_description,
         user_message=request.message,
         selected_modules=modules_str,
@@ -318,60 +361,113 @@ async def chat_endpoint(request: ChatRequest):
         language=request.language,
     )
 
+
+def _build_chat_response(request: ChatRequest, text: str) -> ChatResponse:
+    """Parse the chatbot's raw JSON text into a ChatResponse."""
+    data = _parse_chat_json(text)
+    # Plan K — strip off-topic suggestions and surface them as audit. The
+    # guard normalizes string-shaped legacy entries into the bilingual
+    # `{name_en, name_native}` shape so downstream consumers only see
+    # one structure.
+    kept_features, dropped_features = strip_offtopic_features(
+        request.message, data.get("unsupported_features", []) or []
+    )
+    return ChatResponse(
+        reply=data.get("reply", "I'm sorry, I couldn't generate a response. Please try again."),
+        suggested_modules=data.get("suggested_modules", []),
+        discussion_points=data.get("discussion_points", []),
+        confidence=data.get("confidence", "medium"),
+        unsupported_features=kept_features,
+        dropped_unsupported_features=dropped_features,
+    )
+
+
+def _log_chat_session(
+    endpoint: str,
+    request: ChatRequest,
+    prompt: str,
+    chat_response: ChatResponse,
+    raw_text: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    model: str = "",
+) -> dict:
+    """Write the training record for a chat turn. Returns its token_usage.
+
+    ``model`` is the model that answered (the failover provider's, when the
+    call failed over); the configured one is recorded when it is unknown.
+    """
+    config = settings.get_agent_config("chatbot")
+    chat_step = {
+        "agent": "chatbot", "model": model or config.model,
+        "temperature": config.temperature,
+        "prompt_text": prompt,
+        "input_summary": {
+            "message": request.message,
+            "business_description": request.business_description,
+            "selected_modules": request.selected_modules,
+            "business_answers": request.business_answers,
+            "current_step": request.current_step,
+            "sdf_status": request.sdf_status,
+            "conversation_history_length": len(request.conversation_history) if request.conversation_history else 0,
+        },
+        "output_parsed": chat_response.model_dump(exclude_none=True),
+        "raw_response": raw_text[:10000],
+        "tokens_in": prompt_tokens,
+        "tokens_out": completion_tokens,
+    }
+    token_usage = {"total": {"prompt": prompt_tokens, "completion": completion_tokens}}
+    _log_training_session(
+        endpoint,
+        {
+            "message": request.message,
+            "business_description": request.business_description,
+            "conversation_history": [m.model_dump() for m in request.conversation_history[-10:]] if request.conversation_history else [],
+            "selected_modules": request.selected_modules,
+            "business_answers": request.business_answers,
+            "current_step": request.current_step,
+            "sdf_status": request.sdf_status,
+        },
+        chat_response,
+        step_logs=[chat_step],
+        token_usage=token_usage,
+    )
+    return token_usage
+
+
+@app.post("/ai/chat", response_model=ChatResponse, tags=["Chat Mode"])
+async def chat_endpoint(request: ChatRequest):
+    """
+    Chat mode endpoint for conversational feature discussion.
+
+    Uses the chatbot agent to help users explore and refine their ERP requirements
+    before switching to build mode. Does NOT generate SDF output.
+    """
+    client = get_chatbot_client()
+    if not client:
+        raise HTTPException(
+            status_code=503,
+            detail="Chat AI service is not configured or failed to initialize."
+        )
+
+    prompt = _build_chat_prompt(request)
+
     try:
         config = settings.get_agent_config("chatbot")
         result = await client.generate_with_retry(
             prompt, temperature=config.temperature, json_mode=True,
         )
 
-        data = _parse_chat_json(result.text)
-        # Plan K — strip off-topic suggestions and surface them as audit. The
-        # guard normalizes string-shaped legacy entries into the bilingual
-        # `{name_en, name_native}` shape so downstream consumers only see
-        # one structure.
-        kept_features, dropped_features = strip_offtopic_features(
-            request.message, data.get("unsupported_features", []) or []
-        )
-        chat_response = ChatResponse(
-            reply=data.get("reply", "I'm sorry, I couldn't generate a response. Please try again."),
-            suggested_modules=data.get("suggested_modules", []),
-            discussion_points=data.get("discussion_points", []),
-            confidence=data.get("confidence", "medium"),
-            unsupported_features=kept_features,
-            dropped_unsupported_features=dropped_features,
-        )
-        chat_step = {
-            "agent": "chatbot", "model": config.model,
-            "temperature": config.temperature,
-            "prompt_text": prompt,
-            "input_summary": {
-                "message": request.message,
-                "business_description": request.business_description,
-                "selected_modules": request.selected_modules,
-                "business_answers": request.business_answers,
-                "current_step": request.current_step,
-                "sdf_status": request.sdf_status,
-                "conversation_history_length": len(request.conversation_history) if request.conversation_history else 0,
-            },
-            "output_parsed": chat_response.model_dump(exclude_none=True),
-            "raw_response": result.text[:10000],
-            "tokens_in": getattr(result, "prompt_tokens", 0),
-            "tokens_out": getattr(result, "completion_tokens", 0),
-        }
-        _log_training_session(
+        chat_response = _build_chat_response(request, result.text)
+        _log_chat_session(
             "/ai/chat",
-            {
-                "message": request.message,
-                "business_description": request.business_description,
-                "conversation_history": [m.model_dump() for m in request.conversation_history[-10:]] if request.conversation_history else [],
-                "selected_modules": request.selected_modules,
-                "business_answers": request.business_answers,
-                "current_step": request.current_step,
-                "sdf_status": request.sdf_status,
-            },
+            request,
+            prompt,
             chat_response,
-            step_logs=[chat_step],
-            token_usage={"total": {"prompt": chat_step["tokens_in"], "completion": chat_step["tokens_out"]}},
+            result.text,
+            getattr(result, "prompt_tokens", 0),
+            getattr(result, "completion_tokens", 0),
+            getattr(result, "model", ""),
         )
         return chat_response
     except Exception as e:
@@ -379,6 +475,77 @@ async def chat_endpoint(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+def _sse_event(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id is not None else frame
+
+
+@app.post("/ai/chat/stream", tags=["Chat Mode"])
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    SSE variant of /ai/chat.
+
+    Streams the `reply` text as the model produces it (`event: delta`, data
+    `{"text": ...}`), then emits one `event: final` carrying the parsed
+    ChatResponse and token usage — the same payload /ai/chat returns. On a
+    mid-stream failure an `event: error` frame is sent instead of `final`.
+    """
+    client = get_chatbot_client()
+    if not client:
+        raise HTTPException(
+            status_code=503,
+            detail="Chat AI service is not configured or failed to initialize."
+        )
+
+    prompt = _build_chat_prompt(request)
+    config = settings.get_agent_config("chatbot")
+
+    async def event_stream():
+        extractor = ReplyFieldExtractor()
+        raw_parts: List[str] = []
+        final_chunk = None
+        try:
+            async for chunk in client.generate_stream(
+                prompt, temperature=config.temperature, json_mode=True,
+            ):
+                if chunk.done:
+                    final_chunk = chunk
+                    continue
+                raw_parts.append(chunk.text)
+                reply_delta = extractor.feed(chunk.text)
+                if reply_delta:
+                    yield _sse_event("delta", {"text": reply_delta})
+
+            raw_text = "".join(raw_parts)
+            chat_response = _build_chat_response(request, raw_text)
+            token_usage = _log_chat_session(
+                "/ai/chat/stream",
+                request,
+                prompt,
+                chat_response,
+                raw_text,
+                final_chunk.prompt_tokens if final_chunk else 0,
+                final_chunk.completion_tokens if final_chunk else 0,
+                final_chunk.model if final_chunk else "",
+            )
+            yield _sse_event("final", {
+                "response": chat_response.model_dump(),
+                "token_usage": token_usage,
+            })
+        except Exception as e:
+            print(f"[ERROR] Unexpected error in /ai/chat/stream: {e}")
+            yield _sse_event("error", {"detail": f"Chat error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so deltas reach the browser as
+        # they are produced.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def _parse_chat_json(text: str) -> dict:
     """Extract a JSON object from the chatbot's response text."""
     start = text.find('{')
@@ -394,13 +561,72 @@ def _parse_chat_json(text: str) -> dict:
 @app.get("/ai/progress/{project_id}", tags=["SDF Generation"])
 async def get_progress(project_id: str):
     """Returns current generation progress for a project."""
-    return _generation_progress.get(project_id, {"step": "idle", "pct": 0, "detail": ""})
+    return await _read_progress(project_id) or {"step": "idle", "pct": 0, "detail": ""}
+
+
+@app.get("/ai/progress/{project_id}/stream", tags=["SDF Generation"])
+async def stream_progress(project_id: str, request: Request):
+    """
+    SSE variant of /ai/progress: pushes every event of the project's run.
+
+    Events: `progress` (step, pct, detail), `stage` (a pipeline stage
+    started or finished, with its timing), `module` (a module's partial SDF
+    as soon as its generator completes), then `done` or `error`, after which
+    the stream ends. The current run's earlier events are replayed first;
+    a reconnecting client's `Last-Event-ID` resumes after that event.
+    """
+    last_id = request.headers.get("last-event-id", "")
+    after = int(last_id) if last_id.isdigit() else None
+
+    async def event_stream():
+        async for seq, event, data in get_progress_broker().subscribe(project_id, after=after):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield _sse_event(event, data, seq)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
+@app.websocket("/ai/progress/{project_id}/ws")
+async def progress_websocket(websocket: WebSocket, project_id: str, after: Optional[int] = None):
+    """WebSocket variant of the progress stream: one JSON message per event.
 
-@app.post("/ai/analyze", response_model=SystemDefinitionFile, response_model_exclude_none=True, tags=["SDF Generation"])
+    A reconnecting client passes the last ``id`` it received as ``?after=``
+    to resume, like ``Last-Event-ID`` on the SSE stream.
+    """
+    await websocket.accept()
+    try:
+        async for seq, event, data in get_progress_broker().subscribe(project_id, after=after):
+            if event is not None:
+                await websocket.send_json({"id": seq, "event": event, "data": data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@app.post(
+    "/ai/analyze",
+    response_model=SystemDefinitionFile,
+    response_model_exclude_none=True,
+    tags=["SDF Generation"],
+    responses={
+        429: {"description": "AI_JOBS_MAX_PENDING jobs are already waiting; retry shortly"},
+        503: {"description": "AI service is not configured or failed to initialize"},
+    },
+)
 async def analyze(request: AnalyzeRequest):
     """
     Analyzes a business description and generates a System Definition File (SDF).
+
+    Identical concurrent requests for the same project share one pipeline run.
+    The run is an "analyze" job on the job worker pool (see /ai/jobs/analyze);
+    this endpoint waits for it. When AI_JOBS_MAX_PENDING jobs are already
+    waiting for a worker, it answers 429 instead of queueing another run.
     """
     sdf_service = get_sdf_service()
     if not sdf_service:
@@ -409,10 +635,90 @@ async def analyze(request: AnalyzeRequest):
             detail="AI service is not configured or failed to initialize."
         )
 
+    payload = request.model_dump(mode="json")
+
+    async def run_job():
+        # Inside the single flight: callers sharing the run share its history.
+        get_progress_broker().begin(request.project_id or "unknown")
+        return await get_job_queue().run("analyze", payload, request.project_id)
+
+    try:
+        return await get_single_flight("/ai/analyze").run(
+            request_key("/ai/analyze", payload, request.project_id),
+            run_job,
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+@app.post(
+    "/ai/jobs/analyze",
+    status_code=202,
+    tags=["Jobs"],
+    responses={429: {"description": "AI_JOBS_MAX_PENDING jobs are already waiting; retry shortly"}},
+)
+async def submit_analyze_job(request: AnalyzeRequest):
+    """
+    Queues an /ai/analyze run and returns its job_id immediately.
+
+    The job keeps running if the client disconnects; poll
+    GET /ai/jobs/{job_id} (and /ai/progress/{project_id}) for the result.
+    """
+    if not get_sdf_service():
+        raise HTTPException(
+            status_code=503,
+            detail="AI service is not configured or failed to initialize."
+        )
+    try:
+        job_id = await get_job_queue().submit("analyze", request.model_dump(mode="json"), request.project_id)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if request.project_id:
+        broker = get_progress_broker()
+        broker.begin(request.project_id)
+        broker.publish(request.project_id, "progress", {"step": "queued", "pct": 0, "detail": "", "job_id": job_id})
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/ai/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    """Status of a job; ``result`` holds the SDF once it has succeeded."""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    if job["status"] == "running" and job["project_id"]:
+        job["progress"] = await _read_progress(job["project_id"])
+    return job
+
+
+@job_handler("analyze")
+async def _analyze_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    sdf_service = get_sdf_service()
+    if not sdf_service:
+        raise HTTPException(
+            status_code=503,
+            detail="AI service is not configured or failed to initialize."
+        )
+    sdf = await _run_analyze(sdf_service, AnalyzeRequest.model_validate(payload))
+    return sdf.model_dump(mode="json", exclude_none=True)
+
+
+async def _run_analyze(sdf_service: SDFService, request: AnalyzeRequest):
     pid = request.project_id or "unknown"
+    # The run was begun when its job was submitted; a job taken over from
+    # another worker starts a run here.
+    broker = get_progress_broker()
+    broker.ensure_run(pid)
 
     def on_progress(step: str, pct: int, detail: str = ""):
-        _generation_progress[pid] = {"step": step, "pct": pct, "detail": detail}
+        state = {"step": step, "pct": pct, "detail": detail}
+        # The final 100% stays readable briefly, then expires.
+        ttl = settings.AI_PROGRESS_DONE_TTL_SECONDS if step == "done" else settings.AI_PROGRESS_TTL_SECONDS
+        _progress_state().put(pid, state, ttl=ttl)
+        broker.publish(pid, "progress", state)
+
+    def on_event(event: str, data: Dict[str, Any]):
+        broker.publish(pid, event, data)
 
     try:
         on_progress("starting", 5, "Saving your answers")
@@ -426,8 +732,14 @@ async def analyze(request: AnalyzeRequest):
             selected_modules=request.selected_modules,
             business_answers=request.business_answers,
             acknowledged_unsupported_features=request.acknowledged_unsupported_features,
+            project_id=request.project_id,
+            on_event=on_event,
         )
         on_progress("done", 100, "Complete")
+        broker.publish(pid, "done", {
+            "sdf_complete": bool(sdf.sdf_complete),
+            "halted_reason": sdf.halted_reason,
+        })
         _log_training_session(
             "/ai/analyze",
             {
@@ -441,18 +753,14 @@ async def analyze(request: AnalyzeRequest):
         )
         return sdf
     except ValueError as e:
-        _generation_progress.pop(pid, None)
+        _progress_state().put(pid, None)
+        broker.publish(pid, "error", {"detail": f"Failed to generate a valid SDF: {str(e)}"})
         raise HTTPException(status_code=400, detail=f"Failed to generate a valid SDF: {str(e)}")
     except Exception as e:
-        _generation_progress.pop(pid, None)
+        _progress_state().put(pid, None)
         print(f"[ERROR] Unexpected error in /ai/analyze: {e}")
+        broker.publish(pid, "error", {"detail": f"An unexpected error occurred: {str(e)}"})
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
-    finally:
-        # Clean up after a short delay so the frontend can read the final 100%
-        async def _cleanup():
-            await asyncio.sleep(10)
-            _generation_progress.pop(pid, None)
-        asyncio.create_task(_cleanup())
 
 
 # ── Module Precheck (Plan D follow-up #8) ─────────────────────────────
@@ -522,6 +830,8 @@ async def clarify_sdf_endpoint(request: ClarifyRequest):
             prefilled_sdf=request.prefilled_sdf,
             language=request.language,
             selected_modules=request.selected_modules,
+            project_id=request.project_id,
+            reuse_checkpoints=True,
         )
         _log_training_session(
             "/ai/clarify",
@@ -596,6 +906,7 @@ def _agent_step(
         raw_response=(getattr(result, "text", "") or "")[:12000],
         tokens_in=int(getattr(result, "prompt_tokens", 0) or 0),
         tokens_out=int(getattr(result, "completion_tokens", 0) or 0),
+        tokens_cached=int(getattr(result, "cached_tokens", 0) or 0),
         duration_ms=max(0, int((datetime.datetime.utcnow() - started_at).total_seconds() * 1000)),
     )
 
@@ -604,6 +915,8 @@ def _agent_step(
 async def edit_sdf_endpoint(request: EditRequest):
     """
     Applies a change request (instructions) to an existing generator SDF.
+
+    Identical concurrent requests for the same project share one review/edit run.
     """
     sdf_service = get_sdf_service()
     if not sdf_service:
@@ -612,6 +925,13 @@ async def edit_sdf_endpoint(request: EditRequest):
             detail="AI service is not configured or failed to initialize."
         )
 
+    return await get_single_flight("/ai/edit").run(
+        request_key("/ai/edit", request.model_dump(mode="json"), request.project_id),
+        lambda: _run_edit(sdf_service, request),
+    )
+
+
+async def _run_edit(sdf_service: SDFService, request: EditRequest):
     step_logs: list[AgentStepLog] = []
     token_usage: dict[str, Any] = {}
     input_data = {
@@ -643,11 +963,13 @@ async def edit_sdf_endpoint(request: EditRequest):
             "prompt": review_step.tokens_in,
             "completion": review_step.tokens_out,
             "total": review_step.tokens_in + review_step.tokens_out,
+            "cached": review_step.tokens_cached,
         }
         token_usage["total"] = {
             "prompt": review_step.tokens_in,
             "completion": review_step.tokens_out,
             "total": review_step.tokens_in + review_step.tokens_out,
+            "cached": review_step.tokens_cached,
         }
 
         should_halt = (
@@ -689,10 +1011,12 @@ async def edit_sdf_endpoint(request: EditRequest):
             "prompt": edit_step.tokens_in,
             "completion": edit_step.tokens_out,
             "total": edit_step.tokens_in + edit_step.tokens_out,
+            "cached": edit_step.tokens_cached,
         }
         token_usage["total"] = {
             "prompt": sum(v.get("prompt", 0) for k, v in token_usage.items() if k != "total" and isinstance(v, dict)),
             "completion": sum(v.get("completion", 0) for k, v in token_usage.items() if k != "total" and isinstance(v, dict)),
+            "cached": sum(v.get("cached", 0) for k, v in token_usage.items() if k != "total" and isinstance(v, dict)),
         }
         token_usage["total"]["total"] = token_usage["total"]["prompt"] + token_usage["total"]["completion"]
         _log_training_session(
@@ -728,21 +1052,11 @@ async def edit_sdf_endpoint(request: EditRequest):
 # Training Data Endpoints (read-only, consumed by platform backend)
 # ─────────────────────────────────────────────────────────────
 
-def _read_sessions_file() -> list[dict]:
-    """Read all JSONL records from sessions.jsonl (newest first)."""
-    if not _SESSIONS_FILE.exists():
-        return []
-    records = []
-    with open(_SESSIONS_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                try:
-                    records.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-    records.reverse()
-    return records
+async def _training_store() -> SessionStore:
+    """The indexed session store, with sessions.jsonl imported on first use."""
+    store = get_session_store()
+    await store.import_jsonl(_SESSIONS_FILE)
+    return store
 
 
 @app.get("/ai/training/sessions", tags=["Training Data"])
@@ -751,69 +1065,104 @@ async def list_training_sessions(
     offset: int = 0,
     endpoint: Optional[str] = None,
     agent: Optional[str] = None,
+    cursor: Optional[int] = None,
 ):
-    """List training sessions with pagination and optional endpoint/agent filter."""
-    all_records = _read_sessions_file()
-    if endpoint:
-        all_records = [r for r in all_records if r.get("endpoint") == endpoint]
-    if agent:
-        all_records = [
-            r for r in all_records
-            if any(s.get("agent", "") == agent for s in r.get("step_logs", []))
-        ]
-    total = len(all_records)
-    page = all_records[offset : offset + limit]
-    summaries = []
-    for r in page:
-        inp = r.get("input", {})
-        desc = inp.get("business_description", inp.get("message", ""))
-        agents_in_session = [s.get("agent", "") for s in r.get("step_logs", [])]
-        summaries.append({
-            "session_id": r.get("session_id", ""),
-            "timestamp": r.get("timestamp", ""),
-            "endpoint": r.get("endpoint", ""),
-            "description_snippet": desc[:200] if isinstance(desc, str) else "",
-            "step_count": len(r.get("step_logs", [])),
-            "agents": agents_in_session,
-            "token_usage": r.get("token_usage", {}),
-        })
-    return {"total": total, "offset": offset, "limit": limit, "sessions": summaries}
+    """List training sessions (newest first) with optional endpoint/agent filter.
+
+    Page with ``offset``, or pass the previous page's ``next_cursor`` as
+    ``cursor`` (offset is then ignored).
+    """
+    store = await _training_store()
+    total, summaries, next_cursor = await store.list_sessions(limit, offset, endpoint, agent, cursor)
+    return {
+        "total": total, "offset": offset, "limit": limit, "sessions": summaries, "next_cursor": next_cursor,
+    }
 
 
 @app.get("/ai/training/sessions/{session_id}", tags=["Training Data"])
 async def get_training_session(session_id: str):
     """Get full detail for a single training session."""
-    all_records = _read_sessions_file()
-    for r in all_records:
-        if r.get("session_id") == session_id:
-            return r
-    raise HTTPException(status_code=404, detail="Session not found")
+    record = await (await _training_store()).get(session_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return record
 
 
 @app.get("/ai/training/stats", tags=["Training Data"])
 async def get_training_stats():
     """Aggregate stats across all training sessions."""
-    all_records = _read_sessions_file()
-    if not all_records:
-        return {"total_sessions": 0, "by_endpoint": {}, "date_range": None}
-    by_endpoint: Dict[str, int] = {}
-    timestamps = []
-    total_tokens = 0
-    for r in all_records:
-        ep = r.get("endpoint", "unknown")
-        by_endpoint[ep] = by_endpoint.get(ep, 0) + 1
-        ts = r.get("timestamp", "")
-        if ts:
-            timestamps.append(ts)
-        usage = r.get("token_usage", {}).get("total", {})
-        total_tokens += usage.get("total", usage.get("prompt", 0) + usage.get("completion", 0))
-    timestamps.sort()
-    return {
-        "total_sessions": len(all_records),
-        "by_endpoint": by_endpoint,
-        "total_tokens": total_tokens,
-        "date_range": {"earliest": timestamps[0], "latest": timestamps[-1]} if timestamps else None,
-    }
+    return await (await _training_store()).stats()
+
+
+def _fine_tuning_rows(line: str, agent: Optional[str]) -> List[Dict[str, Any]]:
+    """One (prompt, completion) row per LLM step of a session record."""
+    record = json.loads(line)
+    rows = []
+    for step in record.get("step_logs") or []:
+        if not isinstance(step, dict) or step.get("model") == "deterministic" or not step.get("prompt_text"):
+            continue
+        if agent and step.get("agent") != agent:
+            continue
+        parsed = step.get("output_parsed")
+        rows.append({
+            "session_id": record.get("session_id", ""),
+            "timestamp": record.get("timestamp", ""),
+            "endpoint": record.get("endpoint", ""),
+            "agent": step.get("agent", ""),
+            "model": step.get("model", ""),
+            "prompt": step["prompt_text"],
+            "completion": json.dumps(parsed, ensure_ascii=False) if parsed else step.get("raw_response", ""),
+        })
+    return rows
+
+
+@app.get("/ai/training/export", tags=["Training Data"])
+async def export_training_sessions(
+    endpoint: Optional[str] = None,
+    agent: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    session_id: Optional[List[str]] = Query(default=None),
+    rows: str = "sessions",
+    gzip: bool = False,
+):
+    """Stream matching training sessions as NDJSON, oldest first.
+
+    ``since``/``until`` bound the ISO timestamp (inclusive/exclusive, a date
+    like ``2026-01-31`` works). ``session_id`` may repeat or be
+    comma-separated. ``rows=steps`` emits one ``{prompt, completion}`` row
+    per LLM step instead of whole sessions (``agent`` then also selects the
+    steps). ``gzip=true`` compresses the stream.
+    """
+    if rows not in ("sessions", "steps"):
+        raise HTTPException(status_code=400, detail="rows must be 'sessions' or 'steps'")
+    session_ids = [sid for value in session_id for sid in value.split(",") if sid] if session_id else None
+    store = await _training_store()
+
+    async def lines():
+        async for line in store.export(endpoint, agent, since, until, session_ids):
+            if rows == "sessions":
+                yield line + "\n"
+                continue
+            for row in _fine_tuning_rows(line, agent):
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    async def body():
+        if not gzip:
+            async for line in lines():
+                yield line.encode("utf-8")
+            return
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        async for line in lines():
+            chunk = compressor.compress(line.encode("utf-8"))
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    headers = {"Content-Disposition": f'attachment; filename="training_{rows}.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
 
 
 @app.get("/test", tags=["Testing"], response_class=PlainTextResponse)
@@ -883,8 +1232,18 @@ async def startup_event():
         print("  Configuration OK")
     print("=" * 60)
 
+    check_multi_worker(settings.AI_GATEWAY_WORKERS)
+    await get_job_queue().start()
+    try:
+        await _training_store()
+    except (OSError, sqlite3.Error) as e:
+        print(f"  WARNING: training session import failed: {e}")
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown tasks"""
     print("AI Gateway shutting down...")
+    await get_job_queue().stop()
+    await get_session_log(_SESSIONS_FILE).stop()
+    await client_registry.aclose_all()
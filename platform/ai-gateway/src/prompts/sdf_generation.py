@@ -3,6 +3,7 @@ Main prompt for generating the System Definition File (SDF)
 """
 
 import pathlib
+from collections import OrderedDict
 from typing import Optional
 
 PROMPT_DIR = pathlib.Path(__file__).parent
@@ -77,25 +78,77 @@ def _with_language_directive(prompt_text: str, language: str | None) -> str:
     """Prepend the language directive block to a rendered prompt.
 
     Templates may optionally include a `{language_directive}` placeholder — if
-    present, we replace it. Otherwise we prepend the directive to the top of
-    the prompt so the LLM sees it before any other instruction.
+    present, we replace it (with an empty string when there is no
+    directive). Otherwise we prepend the directive to the top of the prompt
+    so the LLM sees it before any other instruction.
     """
     directive = load_language_directive(language).strip()
-    if not directive:
-        return prompt_text
     placeholder = "{language_directive}"
     if placeholder in prompt_text:
         return prompt_text.replace(placeholder, directive)
+    if not directive:
+        return prompt_text
     return f"{directive}\n\n{prompt_text}"
 
 
+# Static prefixes of rendered prompts (template text, schema reference and
+# language directive, up to the first per-request placeholder), most recent
+# last. Providers cache repeated prompt prefixes; clients use this registry to
+# find the cacheable part of a prompt they are about to send.
+_STATIC_PREFIXES: "OrderedDict[str, None]" = OrderedDict()
+_MAX_STATIC_PREFIXES = 64
+
+
+def _render(template: str, values: dict[str, str], language: str | None = None) -> str:
+    """Render a template with static content first and request data last.
+
+    The schema reference and (when ``language`` is given) the language
+    directive are filled in before anything request-specific, and the text
+    up to the first request placeholder is registered as the prompt's static
+    prefix. Templates keep every request placeholder after their static
+    instructions so that prefix is as long as possible.
+    """
+    text = template
+    if "{sdf_schema_reference}" in text:
+        text = text.replace("{sdf_schema_reference}", _get_sdf_schema_reference())
+    if language is not None:
+        text = _with_language_directive(text, language)
+    else:
+        text = text.replace("{language_directive}", "")
+    positions = [text.find("{" + key + "}") for key in values]
+    cut = min((pos for pos in positions if pos != -1), default=len(text))
+    _register_static_prefix(text[:cut])
+    return _inject_placeholders(text, values)
+
+
+def _register_static_prefix(prefix: str) -> None:
+    if not prefix:
+        return
+    _STATIC_PREFIXES[prefix] = None
+    _STATIC_PREFIXES.move_to_end(prefix)
+    while len(_STATIC_PREFIXES) > _MAX_STATIC_PREFIXES:
+        _STATIC_PREFIXES.popitem(last=False)
+
+
+def static_prefix(prompt: str) -> str:
+    """Longest registered static prefix of ``prompt`` ("" if none)."""
+    best = ""
+    for prefix in _STATIC_PREFIXES:
+        if len(prefix) > len(best) and prompt.startswith(prefix):
+            best = prefix
+    return best
+
+
 def get_sdf_prompt(business_description: str, language: str = DEFAULT_LANGUAGE) -> str:
     """Loads the SDF prompt from a text file and injects the business description."""
     try:
         prompt_template_path = PROMPT_DIR / "analyze_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(prompt_template, {"business_description": business_description})
-        return _with_language_directive(rendered, language)
+        return _render(
+            prompt_template,
+            {"business_description": business_description},
+            language,
+        )
     except FileNotFoundError:
         # Handle case where the prompt file is missing
         print(f"Error: Prompt file not found at {prompt_template_path}")
@@ -108,15 +161,15 @@ def get_clarify_prompt(business_description: str, partial_sdf: str, answers: str
     try:
         prompt_template_path = PROMPT_DIR / "clarify_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description,
                 "partial_sdf": partial_sdf,
                 "answers": answers,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -141,17 +194,18 @@ def get_module_precheck_prompt(
         # all instructions live there verbatim. Inputs are appended below so
         # the model gets a clean, unambiguous shape.
         import json as _json
-        rendered = (
+        return _render(
             prompt_template
+            + "\n\n{language_directive}"
             + "\n\n## INPUT\n\n"
-            + "business_description:\n"
-            + business_description
-            + "\n\n"
-            + "selected_modules: "
-            + _json.dumps(list(selected_modules or []))
-            + "\n"
+            + "business_description:\n{business_description}\n\n"
+            + "selected_modules: {selected_modules}\n",
+            {
+                "business_description": business_description,
+                "selected_modules": _json.dumps(list(selected_modules or [])),
+            },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found for module precheck.")
         return "Error: Could not load prompt."
@@ -166,7 +220,25 @@ def get_fix_json_prompt(invalid_json: str) -> str:
     try:
         prompt_template_path = PROMPT_DIR / "fix_json_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        return _inject_placeholders(prompt_template, {"invalid_json": invalid_json})
+        return _render(prompt_template, {"invalid_json": invalid_json})
+    except FileNotFoundError:
+        print(f"Error: Prompt file not found at {prompt_template_path}")
+        return "Error: Could not load prompt."
+
+
+def get_continuation_prompt(original_prompt: str, partial_response: str) -> str:
+    """Loads the continuation prompt for a response cut off at the output limit.
+
+    Like the JSON fix prompt this is structural, so no language directive is
+    injected (the original prompt already carries one).
+    """
+    try:
+        prompt_template_path = PROMPT_DIR / "continuation_prompt.txt"
+        prompt_template = prompt_template_path.read_text()
+        # The partial response goes in last so text inside it is never
+        # mistaken for a placeholder.
+        prompt = _inject_placeholders(prompt_template, {"original_prompt": original_prompt})
+        return _inject_placeholders(prompt, {"partial_response": partial_response})
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -177,15 +249,15 @@ def get_edit_prompt(business_description: str, current_sdf: str, instructions: s
     try:
         prompt_template_path = PROMPT_DIR / "edit_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description or "",
                 "current_sdf": current_sdf,
                 "instructions": instructions,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -210,7 +282,7 @@ def get_change_request_reviewer_prompt(
                     ack_clean.append(f.strip())
         ack_str = "\n".join(f"- {f}" for f in ack_clean) if ack_clean else "(none)"
 
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description or "(empty)",
@@ -218,8 +290,8 @@ def get_change_request_reviewer_prompt(
                 "instructions": instructions or "(empty)",
                 "acknowledged_unsupported_features": ack_str,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -230,15 +302,15 @@ def get_finalize_prompt(business_description: str, partial_sdf: str, answers: st
     try:
         prompt_template_path = PROMPT_DIR / "finalize_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description or "",
                 "partial_sdf": partial_sdf,
                 "answers": answers,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -291,7 +363,7 @@ def get_answer_reviewer_prompt(
                     ack_clean.append(f.strip())
         ack_str = "\n".join(f"- {f}" for f in ack_clean) if ack_clean else "(none)"
 
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description or "(empty)",
@@ -300,8 +372,8 @@ def get_answer_reviewer_prompt(
                 "selected_modules": selected_str,
                 "acknowledged_unsupported_features": ack_str,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -353,16 +425,16 @@ def get_distributor_prompt(
                 "- DO NOT add any module not in this list, even if the business description strongly implies it "
                 "(e.g., mentions of employees must NOT force HR if HR is not in the selected set).\n"
                 "- DO NOT remove any module in this list, even if the description is silent about it.\n"
-                "- The FALLBACK DETECTION rules below are IGNORED whenever this list is non-empty.\n"
+                "- The FALLBACK DETECTION rules above are IGNORED whenever this list is non-empty.\n"
             )
         else:
             selected_modules_block = (
                 "# USER-SELECTED MODULES (AUTHORITATIVE)\n"
                 "\n"
-                "No explicit selection was provided by the UI — fall back to inference using the detection rules below.\n"
+                "No explicit selection was provided by the UI — fall back to inference using the detection rules above.\n"
             )
 
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description,
@@ -370,8 +442,8 @@ def get_distributor_prompt(
                 "existing_modules": existing_modules or "No existing ERP — this is a fresh generation.",
                 "selected_modules_block": selected_modules_block,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -386,12 +458,13 @@ def get_hr_generator_prompt(
     prefilled_module_sdf: str = "",
     change_instructions: str = "",
     language: str = DEFAULT_LANGUAGE,
+    entity_scope: str = "",
 ) -> str:
     """Loads the HR module generator prompt."""
     try:
         prompt_template_path = PROMPT_DIR / "hr_generator_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description,
@@ -401,10 +474,10 @@ def get_hr_generator_prompt(
                 "default_answers": default_answers or "None provided",
                 "prefilled_module_sdf": prefilled_module_sdf or "None — generate from scratch",
                 "change_instructions": change_instructions or "None — this is a fresh generation, not a change request.",
-                "sdf_schema_reference": _get_sdf_schema_reference(),
+                "entity_scope": entity_scope or "None — output every entity of this module.",
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -419,12 +492,13 @@ def get_invoice_generator_prompt(
     prefilled_module_sdf: str = "",
     change_instructions: str = "",
     language: str = DEFAULT_LANGUAGE,
+    entity_scope: str = "",
 ) -> str:
     """Loads the Invoice module generator prompt."""
     try:
         prompt_template_path = PROMPT_DIR / "invoice_generator_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description,
@@ -434,10 +508,10 @@ def get_invoice_generator_prompt(
                 "default_answers": default_answers or "None provided",
                 "prefilled_module_sdf": prefilled_module_sdf or "None — generate from scratch",
                 "change_instructions": change_instructions or "None — this is a fresh generation, not a change request.",
-                "sdf_schema_reference": _get_sdf_schema_reference(),
+                "entity_scope": entity_scope or "None — output every entity of this module.",
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -452,12 +526,13 @@ def get_inventory_generator_prompt(
     prefilled_module_sdf: str = "",
     change_instructions: str = "",
     language: str = DEFAULT_LANGUAGE,
+    entity_scope: str = "",
 ) -> str:
     """Loads the Inventory module generator prompt."""
     try:
         prompt_template_path = PROMPT_DIR / "inventory_generator_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description,
@@ -467,10 +542,10 @@ def get_inventory_generator_prompt(
                 "default_answers": default_answers or "None provided",
                 "prefilled_module_sdf": prefilled_module_sdf or "None — generate from scratch",
                 "change_instructions": change_instructions or "None — this is a fresh generation, not a change request.",
-                "sdf_schema_reference": _get_sdf_schema_reference(),
+                "entity_scope": entity_scope or "None — output every entity of this module.",
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
@@ -491,7 +566,7 @@ def get_chat_prompt(
         prompt_template_path = PROMPT_DIR / "chat_prompt.txt"
         prompt_template = prompt_template_path.read_text()
         normalized_language = _normalize_language(language)
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "business_description": business_description or "",
@@ -503,8 +578,8 @@ def get_chat_prompt(
                 "sdf_status": sdf_status or "none",
                 "project_language": normalized_language,
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {PROMPT_DIR / 'chat_prompt.txt'}")
         return "Error: Could not load prompt."
@@ -525,7 +600,7 @@ def get_integrator_prompt(
     try:
         prompt_template_path = PROMPT_DIR / "integrator_prompt.txt"
         prompt_template = prompt_template_path.read_text()
-        rendered = _inject_placeholders(
+        return _render(
             prompt_template,
             {
                 "project_name": project_name,
@@ -536,10 +611,9 @@ def get_integrator_prompt(
                 "inventory_output": inventory_output or "null",
                 "default_question_answers": default_question_answers or "{}",
                 "prefilled_sdf": prefilled_sdf or "{}",
-                "sdf_schema_reference": _get_sdf_schema_reference(),
             },
+            language,
         )
-        return _with_language_directive(rendered, language)
     except FileNotFoundError:
         print(f"Error: Prompt file not found at {prompt_template_path}")
         return "Error: Could not load prompt."
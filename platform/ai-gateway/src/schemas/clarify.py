@@ -63,6 +63,11 @@ class ClarifyRequest(BaseModel):
         ),
         validation_alias=AliasChoices("selected_modules", "selectedModules"),
     )
+    project_id: Optional[str] = Field(
+        default=None,
+        description="Project ID; pipeline stages whose inputs are unchanged since the last cycle are reused.",
+        validation_alias=AliasChoices("project_id", "projectId"),
+    )
     
     def get_merged_context(self) -> Dict[str, Any]:
         """Merge original wizard answers + clarification answers into one dict.
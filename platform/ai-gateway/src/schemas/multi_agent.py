@@ -17,6 +17,10 @@ class ModuleContext(BaseModel):
     )
     entities_hint: List[str] = Field(default_factory=list)
     features: List[str] = Field(default_factory=list)
+    affected_entities: List[str] = Field(
+        default_factory=list,
+        description="Slugs of the existing entities a change touches (change mode only; empty regenerates the whole module)",
+    )
 
 
 class DistributorOutput(BaseModel):
@@ -129,7 +133,18 @@ class AgentStepLog(BaseModel):
     raw_response: str = Field(default="", description="Truncated raw AI response text")
     tokens_in: int = 0
     tokens_out: int = 0
+    tokens_cached: int = Field(default=0, description="Prompt tokens served from the provider's prompt cache")
     duration_ms: int = 0
+    rate_limit_wait_ms: int = Field(default=0, description="Time queued in the client-side rate limiter")
+    hedged: bool = Field(default=False, description="A backup request was sent after the hedge delay")
+    hedge_won: bool = Field(default=False, description="The backup request answered first")
+    hedge_extra_tokens: int = Field(default=0, description="Tokens spent on the losing hedged attempt")
+    cache_hit: bool = Field(default=False, description="Served from the response cache (zero tokens)")
+    finish_reason: Optional[str] = Field(default=None, description="Provider finish reason of the final call")
+    continuations: int = Field(default=0, description="Continuation calls made after the output hit its token limit")
+    stream_restarts: int = Field(default=0, description="Streamed attempts dropped before the one that answered (tokens included)")
+    started_at: Optional[float] = Field(default=None, description="Unix time this agent's call started")
+    ended_at: Optional[float] = Field(default=None, description="Unix time this agent's call finished")
 
 
 class PipelineResult(BaseModel):
@@ -162,6 +177,10 @@ class PipelineResult(BaseModel):
     )
     errors: List[str] = Field(default_factory=list)
     warnings: List[str] = Field(default_factory=list)
+    stage_trace: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="Per-stage status and start/end times from the pipeline scheduler",
+    )
     inferred_dropped_modules: List[str] = Field(
         default_factory=list,
         description=(
@@ -0,0 +1,164 @@
+"""
+Provider-native JSON Schemas for structured LLM outputs.
+
+The agents that answer with a single Pydantic-described object
+(``DistributorOutput``, ``ModuleGeneratorOutput``, ``AnswerReview``,
+``PrecheckResponse``) pass that model as ``response_schema``. This module
+turns the model's ``model_json_schema()`` into what each provider's
+constrained decoding accepts, once per model:
+
+- Azure OpenAI ``response_format={"type": "json_schema", ...}``. Strict mode
+  needs every property listed in ``required``, ``additionalProperties:
+  false`` on every object and no ``default``/length keywords; fields with
+  defaults simply become required. Models with free-form objects (generator
+  ``entities`` are open ``Dict[str, Any]`` rows) cannot be strict and are
+  sent with ``strict: false`` so the schema still guides the output.
+- Gemini ``response_schema``: the OpenAPI subset ``protos.Schema`` accepts
+  (``$ref`` inlined, ``anyOf [X, null]`` as ``nullable``, enums tagged with
+  ``format: "enum"``). Gemini cannot express free-form objects at all, so
+  those models get ``None`` and keep plain JSON mode.
+
+Run ``python -m scripts.generate_schema`` to write the generated schemas to
+``src/schemas/`` for inspection.
+"""
+
+import copy
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+# Keywords neither strict mode nor protos.Schema accept; dropped everywhere.
+_DROPPED_KEYWORDS = ("title", "default", "minLength", "maxLength", "minItems", "maxItems", "pattern", "examples")
+
+
+def _inline_refs(node: Any, defs: Dict[str, Any]) -> Any:
+    """Replace every ``$ref`` with a copy of its definition."""
+    if isinstance(node, list):
+        return [_inline_refs(item, defs) for item in node]
+    if not isinstance(node, dict):
+        return node
+    ref = node.get("$ref")
+    if ref is not None:
+        target = copy.deepcopy(defs[ref.rsplit("/", 1)[-1]])
+        extra = {k: v for k, v in node.items() if k != "$ref"}
+        target.update(extra)
+        return _inline_refs(target, defs)
+    return {key: _inline_refs(value, defs) for key, value in node.items() if key != "$defs"}
+
+
+def _clean(node: Any) -> Any:
+    if isinstance(node, list):
+        return [_clean(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    cleaned = {}
+    for key, value in node.items():
+        if key in _DROPPED_KEYWORDS:
+            continue
+        if key == "properties":
+            cleaned[key] = {name: _clean(prop) for name, prop in value.items()}
+        else:
+            cleaned[key] = _clean(value)
+    if "const" in cleaned:
+        cleaned["enum"] = [cleaned.pop("const")]
+    return cleaned
+
+
+def _is_open_object(node: Dict[str, Any]) -> bool:
+    return node.get("type") == "object" and not node.get("properties")
+
+
+def _has_open_object(node: Any) -> bool:
+    if isinstance(node, list):
+        return any(_has_open_object(item) for item in node)
+    if not isinstance(node, dict):
+        return False
+    if _is_open_object(node):
+        return True
+    return any(_has_open_object(value) for value in node.values())
+
+
+def _base_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    schema = model.model_json_schema()
+    return _clean(_inline_refs(schema, schema.get("$defs", {})))
+
+
+def _close_objects(node: Any) -> None:
+    """Strict-mode object rules: all properties required, nothing extra."""
+    if isinstance(node, list):
+        for item in node:
+            _close_objects(item)
+        return
+    if not isinstance(node, dict):
+        return
+    properties = node.get("properties")
+    if properties:
+        node["required"] = list(properties)
+        node["additionalProperties"] = False
+    for value in node.values():
+        _close_objects(value)
+
+
+@lru_cache(maxsize=None)
+def _openai_schema(model: Type[BaseModel]) -> Tuple[Dict[str, Any], bool]:
+    schema = _base_schema(model)
+    strict = not _has_open_object(schema)
+    if strict:
+        _close_objects(schema)
+    return schema, strict
+
+
+def openai_response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    """``response_format`` for the Chat Completions API."""
+    schema, strict = _openai_schema(model)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": copy.deepcopy(schema), "strict": strict},
+    }
+
+
+def is_strict(model: Type[BaseModel]) -> bool:
+    """True when ``model`` can be enforced with strict structured outputs."""
+    return _openai_schema(model)[1]
+
+
+def _to_gemini(node: Dict[str, Any]) -> Dict[str, Any]:
+    any_of = node.get("anyOf")
+    if any_of is not None:
+        options = [option for option in any_of if option.get("type") != "null"]
+        if len(options) != 1:
+            raise ValueError("Gemini response_schema supports only Optional[...] unions")
+        merged = {**{k: v for k, v in node.items() if k != "anyOf"}, **options[0]}
+        result = _to_gemini(merged)
+        result["nullable"] = True
+        return result
+
+    result: Dict[str, Any] = {}
+    if "type" in node:
+        result["type"] = node["type"]
+    if "description" in node:
+        result["description"] = node["description"]
+    if "enum" in node:
+        result["enum"] = [str(value) for value in node["enum"]]
+        result["format"] = "enum"
+    if "items" in node:
+        result["items"] = _to_gemini(node["items"])
+    if node.get("properties"):
+        result["properties"] = {name: _to_gemini(prop) for name, prop in node["properties"].items()}
+        result["required"] = list(node["properties"])
+    return result
+
+
+@lru_cache(maxsize=None)
+def _gemini_schema(model: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    schema = _base_schema(model)
+    if _has_open_object(schema):
+        return None
+    return _to_gemini(schema)
+
+
+def gemini_response_schema(model: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    """``response_schema`` dict for Gemini, or None if the model can't be expressed."""
+    schema = _gemini_schema(model)
+    return copy.deepcopy(schema) if schema is not None else None
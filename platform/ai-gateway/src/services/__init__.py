@@ -1,5 +1,5 @@
 # Services module
-from .base_client import BaseAIClient, GenerationResult
+from .base_client import BaseAIClient, GenerationResult, StreamChunk
 from .gemini_client import GeminiClient
 from .azure_client import AzureOpenAIClient
 from .multi_agent_service import MultiAgentService
@@ -8,6 +8,7 @@ from .sdf_service import SDFService
 __all__ = [
     "BaseAIClient",
     "GenerationResult",
+    "StreamChunk",
     "GeminiClient",
     "AzureOpenAIClient",
     "MultiAgentService",
@@ -9,13 +9,26 @@ deployment (and therefore a different fine-tuned model in the future).
 import asyncio
 import os
 import re
-from typing import Optional, Type
+from typing import AsyncIterator, Optional, Type
 
-from openai import AsyncAzureOpenAI, APIConnectionError, APITimeoutError, RateLimitError
+from openai import (
+    AsyncAzureOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
 from pydantic import BaseModel
 
 from src.config import settings, AgentConfig
-from src.services.base_client import BaseAIClient, GenerationResult
+from src.schemas.output_schemas import openai_response_format
+from src.services.base_client import (
+    BaseAIClient,
+    GenerationResult,
+    StreamChunk,
+)
+from src.services.client_registry import get_http_client
+from src.services.retry_policy import get_retry_budget, next_retry_delay
 
 
 # Azure deployments backed by reasoning-class models (o1/o3/o4 series and the
@@ -39,9 +52,23 @@ def _is_reasoning_deployment(deployment: str) -> bool:
     return bool(_REASONING_OSERIES_RE.search(name))
 
 
+def _cached_tokens(usage) -> int:
+    """Prompt tokens Azure served from its automatic prefix cache."""
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    return (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+
 class AzureOpenAIClient(BaseAIClient):
     """Client for Azure OpenAI Service."""
 
+    PROVIDER_FAILURE_ERRORS = (
+        APIConnectionError,
+        APITimeoutError,
+        RateLimitError,
+        InternalServerError,
+        asyncio.TimeoutError,
+    )
+
     def __init__(self, agent_config: Optional[AgentConfig] = None):
         super().__init__(agent_config)
 
@@ -65,13 +92,23 @@ class AzureOpenAIClient(BaseAIClient):
                 "AZURE_OPENAI_ENDPOINT in your .env file."
             )
 
+        # The SDK wrapper is cheap and per-agent (it carries the agent's
+        # timeout); the connection pool underneath is shared by every agent
+        # hitting the same endpoint with the same key.
         self.client = AsyncAzureOpenAI(
             api_key=api_key,
             azure_endpoint=endpoint,
             api_version=api_version,
             timeout=float(self.get_timeout()),
+            # Retries are owned by generate_with_retry and the shared retry
+            # policy; the SDK's own retry loop would bypass the retry budget.
+            max_retries=0,
+            http_client=get_http_client("azure_openai", endpoint, api_key, api_version),
         )
 
+        self.breaker_key = f"azure_openai:{endpoint.rstrip('/')}"
+        self._init_rate_limiter(f"{self.breaker_key}:{self.deployment}")
+
         agent_name = self.agent_config.name if self.agent_config else "default"
         print(
             f"[AzureOpenAI:{agent_name}] Initialized — "
@@ -86,15 +123,15 @@ class AzureOpenAIClient(BaseAIClient):
     def max_retries(self) -> int:
         return self.get_max_retries()
 
-    async def generate(
+    def _build_request_kwargs(
         self,
         prompt: str,
-        temperature: Optional[float] = None,
-        json_mode: bool = False,
-        response_schema: Optional[Type[BaseModel]] = None,
-        request_options: Optional[dict] = None,
-    ) -> GenerationResult:
+        temperature: Optional[float],
+        json_mode: bool,
+        response_schema: Optional[Type[BaseModel]],
+    ) -> dict:
         temp = temperature if temperature is not None else self.get_temperature()
+        max_output_tokens = self.plan_output_tokens(prompt)
         is_reasoning = _is_reasoning_deployment(self.deployment)
 
         kwargs: dict = {
@@ -107,7 +144,7 @@ class AzureOpenAIClient(BaseAIClient):
             # `temperature`. They also accept an optional `reasoning_effort`
             # ("low" | "medium" | "high"); pull it from a per-agent env var
             # (e.g. AI_AGENT_DISTRIBUTOR_REASONING_EFFORT=medium) when set.
-            kwargs["max_completion_tokens"] = 8192
+            kwargs["max_completion_tokens"] = max_output_tokens
             agent_name = (self.agent_config.name if self.agent_config else "").upper()
             if agent_name:
                 effort = os.getenv(f"AI_AGENT_{agent_name}_REASONING_EFFORT")
@@ -115,26 +152,95 @@ class AzureOpenAIClient(BaseAIClient):
                     kwargs["reasoning_effort"] = effort.strip().lower()
         else:
             kwargs["temperature"] = temp
-            kwargs["max_tokens"] = 8192
+            kwargs["max_tokens"] = max_output_tokens
 
-        if response_schema is not None or json_mode:
+        if response_schema is not None and settings.AI_STRUCTURED_OUTPUTS:
+            kwargs["response_format"] = openai_response_format(response_schema)
+        elif response_schema is not None or json_mode:
             kwargs["response_format"] = {"type": "json_object"}
 
+        return kwargs
+
+    @staticmethod
+    def _output_budget(kwargs: dict) -> int:
+        return kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or 0
+
+    async def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+        request_options: Optional[dict] = None,
+    ) -> GenerationResult:
+        kwargs = self._build_request_kwargs(prompt, temperature, json_mode, response_schema)
+        wait_ms = await self._throttle(prompt, self._output_budget(kwargs))
+
         try:
             response = await self.client.chat.completions.create(**kwargs)
-            text = response.choices[0].message.content or ""
+            choice = response.choices[0]
+            text = choice.message.content or ""
             usage = response.usage
             return GenerationResult(
                 text=text,
                 prompt_tokens=usage.prompt_tokens if usage else 0,
                 completion_tokens=usage.completion_tokens if usage else 0,
                 total_tokens=usage.total_tokens if usage else 0,
+                cached_tokens=_cached_tokens(usage),
                 model=response.model or self.deployment,
+                rate_limit_wait_ms=wait_ms,
+                finish_reason=choice.finish_reason,
             )
         except Exception as e:
             print(f"[AzureOpenAI] Generation error: {e}")
             raise
 
+    async def generate_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        kwargs = self._build_request_kwargs(prompt, temperature, json_mode, response_schema)
+        kwargs["stream"] = True
+        # Without include_usage Azure never reports token counts on a stream.
+        kwargs["stream_options"] = {"include_usage": True}
+        await self._throttle(prompt, self._output_budget(kwargs))
+
+        model = self.deployment
+        finish_reason: Optional[str] = None
+        usage = None
+        try:
+            stream = await self.client.chat.completions.create(**kwargs)
+            async for chunk in stream:
+                if getattr(chunk, "model", None):
+                    model = chunk.model
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    # The trailing usage-only chunk has no choices.
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    yield StreamChunk(text=delta)
+        except Exception as e:
+            print(f"[AzureOpenAI] Streaming error: {e}")
+            raise
+
+        yield StreamChunk(
+            done=True,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            total_tokens=usage.total_tokens if usage else 0,
+            cached_tokens=_cached_tokens(usage),
+            model=model,
+            finish_reason=finish_reason,
+        )
+
     async def generate_with_retry(
         self,
         prompt: str,
@@ -143,20 +249,25 @@ class AzureOpenAIClient(BaseAIClient):
         response_schema: Optional[Type[BaseModel]] = None,
     ) -> GenerationResult:
         last_exception = None
+        backoff = 0.0
+        get_retry_budget().record_request()
         for attempt in range(self.max_retries):
             try:
                 agent_name = self.agent_config.name if self.agent_config else "default"
                 print(f"[AzureOpenAI:{agent_name}] Attempt {attempt + 1}/{self.max_retries}...")
-                return await self.generate(
+                result = await self.generate(
                     prompt, temperature, json_mode, response_schema=response_schema
                 )
+                return await self._continue_if_truncated(prompt, result, temperature)
             except (APIConnectionError, APITimeoutError, RateLimitError, asyncio.TimeoutError) as e:
                 print(f"[AzureOpenAI] Attempt {attempt + 1} transient error: {e}")
                 last_exception = e
                 if attempt == self.max_retries - 1:
                     break
-                backoff = 2 ** (attempt + 1)
-                print(f"[AzureOpenAI] Retrying in {backoff}s...")
+                backoff = next_retry_delay(e, backoff, "AzureOpenAI")
+                if backoff is None:
+                    break
+                print(f"[AzureOpenAI] Retrying in {backoff:.1f}s...")
                 await asyncio.sleep(backoff)
             except Exception as e:
                 print(f"[AzureOpenAI] Non-retriable error: {e}")
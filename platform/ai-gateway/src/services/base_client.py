@@ -5,11 +5,20 @@ Abstract base class for AI clients. Allows swapping between different AI provide
 (Azure OpenAI, Gemini, fine-tuned models, etc.) without changing the service layer.
 """
 
+import asyncio
+import dataclasses
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Optional, Type
+from typing import AsyncIterator, Dict, Optional, Type
 from pydantic import BaseModel
 from src.config import AgentConfig, settings
+from src.prompts.sdf_generation import get_continuation_prompt
+from src.services.token_estimator import estimate_tokens, plan_max_output_tokens
+
+
+# Output budget assumed when a call's planned budget is not known.
+DEFAULT_MAX_OUTPUT_TOKENS = 8192
 
 
 @dataclass
@@ -24,10 +33,233 @@ class GenerationResult:
     completion_tokens: int = 0
     total_tokens: int = 0
     model: str = ""
+    # Prompt tokens the provider served from its prompt cache (included in
+    # prompt_tokens, billed at the cached rate).
+    cached_tokens: int = 0
+    # Time spent queued in the client-side rate limiter before the call
+    # was allowed out.
+    rate_limit_wait_ms: int = 0
+    # Request hedging: whether a backup request was sent, whether it was
+    # the one that answered, and the tokens spent on the losing attempt.
+    hedged: bool = False
+    hedge_won: bool = False
+    hedge_extra_tokens: int = 0
+    # Served from the response cache: no provider call, zero tokens.
+    cache_hit: bool = False
+    # Provider finish reason ("stop", "length", ...) and how many
+    # continuation calls were stitched on after a "length" cut-off.
+    finish_reason: Optional[str] = None
+    continuations: int = 0
+    # Streamed calls: attempts dropped and started again (or abandoned for
+    # a buffered call). Their tokens are included in the totals above.
+    stream_restarts: int = 0
+
+
+@dataclass
+class StreamChunk:
+    """One increment yielded by ``generate_stream``.
+
+    Intermediate chunks only carry a ``text`` delta. The last chunk of a
+    stream has ``done=True`` and carries the token-usage telemetry plus the
+    provider's finish reason, so streaming callers can log the same numbers
+    a ``GenerationResult`` would have.
+    """
+    text: str = ""
+    done: bool = False
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    model: str = ""
+    finish_reason: Optional[str] = None
+    cached_tokens: int = 0
+
+
+def estimate_prompt_tokens(prompt: str, model: str = "") -> int:
+    """Cheap local prompt-size estimate (see ``token_estimator``)."""
+    return estimate_tokens(prompt or "", model) + 1
+
+
+def _strip_continuation(partial: str, continuation: str) -> str:
+    """Drop fences and any overlap the model repeated from ``partial``."""
+    text = continuation
+    stripped = text.lstrip()
+    if stripped.startswith("```"):
+        # Models sometimes re-open a code fence for the continuation.
+        newline = stripped.find("\n")
+        text = stripped[newline + 1:] if newline != -1 else ""
+    if text.rstrip().endswith("```") and "```" not in partial:
+        text = text.rstrip()[:-3].rstrip()
+    tail = partial[-200:]
+    for size in range(min(len(tail), len(text)), 8, -1):
+        if text.startswith(tail[-size:]):
+            return text[size:]
+    return text
+
+
+class _TokenBucket:
+    """Continuous-refill bucket holding at most ``per_minute`` units."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single call larger than the whole bucket can never fit; let it
+        # through once the bucket is full instead of deadlocking the queue.
+        need = min(amount, self.capacity)
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+def _stricter(current: int, requested: int) -> int:
+    """The lower of two limits, where 0 means unlimited."""
+    if current <= 0:
+        return max(requested, 0)
+    if requested <= 0:
+        return current
+    return min(current, requested)
+
+
+def _resized(bucket: Optional[_TokenBucket], per_minute: int) -> _TokenBucket:
+    resized = _TokenBucket(per_minute)
+    if bucket is not None:
+        bucket._refill(time.monotonic())
+        resized.tokens = min(resized.capacity, bucket.tokens)
+    return resized
+
+
+class RateLimiter:
+    """Async RPM + TPM token-bucket limiter for one deployment.
+
+    Callers queue on a FIFO lock, so a large request at the head of the
+    queue is not starved by a stream of small ones behind it. A limit of 0
+    disables that dimension.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = _TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = _TokenBucket(tpm) if tpm > 0 else None
+        self._lock = asyncio.Lock()
+        self._queue_depth = 0
+        self._acquired = 0
+        self._delayed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def tighten(self, rpm: int, tpm: int) -> bool:
+        """Lower the limits to the stricter of the current and given ones.
+
+        Returns True when a limit changed. Budget already in a bucket is
+        kept, up to the new capacity.
+        """
+        rpm, tpm = _stricter(self.rpm, rpm), _stricter(self.tpm, tpm)
+        if (rpm, tpm) == (self.rpm, self.tpm):
+            return False
+        if rpm != self.rpm:
+            self.rpm, self._requests = rpm, _resized(self._requests, rpm)
+        if tpm != self.tpm:
+            self.tpm, self._tokens = tpm, _resized(self._tokens, tpm)
+        return True
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """Wait until one request of ``estimated_tokens`` fits. Returns seconds waited."""
+        start = time.monotonic()
+        self._queue_depth += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    wait = 0.0
+                    if self._requests is not None:
+                        wait = max(wait, self._requests.seconds_until(1, now))
+                    if self._tokens is not None:
+                        wait = max(wait, self._tokens.seconds_until(estimated_tokens, now))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                if self._requests is not None:
+                    self._requests.consume(1)
+                if self._tokens is not None:
+                    self._tokens.consume(estimated_tokens)
+        finally:
+            self._queue_depth -= 1
+
+        waited = time.monotonic() - start
+        self._acquired += 1
+        self._total_wait += waited
+        if waited > 0.001:
+            self._delayed += 1
+        self._max_wait = max(self._max_wait, waited)
+        return waited
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        for bucket in (self._requests, self._tokens):
+            if bucket is not None:
+                bucket._refill(now)
+        return {
+            "rpm_limit": self.rpm,
+            "tpm_limit": self.tpm,
+            "queue_depth": self._queue_depth,
+            "acquired": self._acquired,
+            "delayed": self._delayed,
+            "avg_wait_ms": int(self._total_wait / self._acquired * 1000) if self._acquired else 0,
+            "max_wait_ms": int(self._max_wait * 1000),
+            "requests_available": round(self._requests.tokens, 1) if self._requests is not None else None,
+            "tokens_available": int(self._tokens.tokens) if self._tokens is not None else None,
+        }
+
+
+# One limiter per deployment, shared by every agent that targets it —
+# Azure enforces quota per deployment, not per caller. When agents on one
+# deployment configure different limits, the strictest RPM and TPM win,
+# whichever agent was created first.
+_rate_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(key: str, rpm: int, tpm: int) -> Optional[RateLimiter]:
+    limiter = _rate_limiters.get(key)
+    if limiter is None:
+        if rpm <= 0 and tpm <= 0:
+            return None
+        limiter = RateLimiter(key, rpm=rpm, tpm=tpm)
+        _rate_limiters[key] = limiter
+    elif limiter.tighten(rpm, tpm):
+        print(
+            f"[RateLimiter:{key}] Conflicting limits for one deployment (rpm={rpm}, tpm={tpm}); "
+            f"using the strictest: rpm={limiter.rpm}, tpm={limiter.tpm}"
+        )
+    return limiter
+
+
+def rate_limiter_snapshot() -> dict:
+    return {key: limiter.snapshot() for key, limiter in _rate_limiters.items()}
 
 
 class BaseAIClient(ABC):
     """Abstract base class for AI clients."""
+
+    # Exceptions that mean the provider itself is unhealthy (overloaded,
+    # unreachable, timing out) rather than that the request was bad.
+    # Subclasses extend this; it feeds the circuit breaker.
+    PROVIDER_FAILURE_ERRORS: tuple = (asyncio.TimeoutError,)
+
+    # Name of the circuit breaker guarding this client's provider endpoint.
+    breaker_key: str = "default"
     
     def __init__(self, agent_config: Optional[AgentConfig] = None):
         self.agent_config = agent_config
@@ -59,6 +291,23 @@ class BaseAIClient(ABC):
     ) -> GenerationResult:
         """Generate with automatic retry on transient errors."""
         pass
+
+    @abstractmethod
+    def generate_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        """Stream a response as it is produced.
+
+        Yields text-delta ``StreamChunk``s followed by exactly one final
+        chunk with ``done=True`` and token counts. No retries: once the
+        first delta has been forwarded to a caller a retry would duplicate
+        output, so streaming callers handle failures themselves.
+        """
+        pass
     
     @abstractmethod
     async def test_connection(self) -> bool:
@@ -84,3 +333,167 @@ class BaseAIClient(ABC):
         if self.agent_config:
             return self.agent_config.get_max_retries(settings.AI_MAX_RETRIES)
         return settings.AI_MAX_RETRIES
+
+    def is_provider_failure(self, error: BaseException) -> bool:
+        return isinstance(error, self.PROVIDER_FAILURE_ERRORS)
+
+    def _init_rate_limiter(self, deployment_key: str) -> None:
+        """Attach the shared limiter for this deployment (if limits are configured)."""
+        if self.agent_config:
+            rpm = self.agent_config.get_rpm_limit(settings.AI_RATE_LIMIT_RPM)
+            tpm = self.agent_config.get_tpm_limit(settings.AI_RATE_LIMIT_TPM)
+        else:
+            rpm = settings.AI_RATE_LIMIT_RPM
+            tpm = settings.AI_RATE_LIMIT_TPM
+        self.rate_limit_key = deployment_key
+        self.rate_limiter = get_rate_limiter(deployment_key, rpm, tpm)
+
+    def plan_output_tokens(self, prompt: str) -> int:
+        """``max_tokens`` for this prompt: the agent's budget, clipped to the model."""
+        if self.agent_config:
+            budget = self.agent_config.get_max_output_tokens(settings.AI_MAX_OUTPUT_TOKENS)
+        else:
+            budget = settings.AI_MAX_OUTPUT_TOKENS
+        model = getattr(self, "model_name", "") or getattr(self, "deployment", "")
+        return plan_max_output_tokens(estimate_prompt_tokens(prompt, model), model, budget)
+
+    async def _throttle(self, prompt: str, max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS) -> int:
+        """Queue for rate-limit budget before a provider call. Returns ms waited.
+
+        Budgets prompt estimate + max output tokens, which is how Azure
+        itself charges a request against the deployment's TPM quota.
+        """
+        # An agent without limits of its own still queues on the
+        # deployment's limiter once another agent has created one.
+        limiter = getattr(self, "rate_limiter", None) or _rate_limiters.get(getattr(self, "rate_limit_key", ""))
+        if limiter is None:
+            return 0
+        model = getattr(self, "model_name", "")
+        waited = await limiter.acquire(estimate_prompt_tokens(prompt, model) + max_output_tokens)
+        if waited >= 1.0:
+            agent_name = self.agent_config.name if self.agent_config else "default"
+            print(f"[RateLimiter:{limiter.name}] {agent_name} waited {waited:.1f}s for budget")
+        return int(waited * 1000)
+
+    async def _continue_if_truncated(
+        self,
+        prompt: str,
+        result: GenerationResult,
+        temperature: Optional[float] = None,
+    ) -> GenerationResult:
+        """Ask for the rest of a response that stopped at the output limit.
+
+        Each continuation call sees the original prompt plus everything
+        generated so far and returns only the remainder, which is appended.
+        Up to ``AI_MAX_CONTINUATIONS`` rounds; if one fails, the text so far
+        is returned and the caller's JSON salvage takes over as before.
+        """
+        agent_name = self.agent_config.name if self.agent_config else "default"
+        while result.finish_reason == "length" and result.continuations < settings.AI_MAX_CONTINUATIONS:
+            print(
+                f"[{type(self).__name__}:{agent_name}] Output hit the token limit "
+                f"— requesting continuation {result.continuations + 1}/{settings.AI_MAX_CONTINUATIONS}"
+            )
+            try:
+                # No JSON mode: the continuation is a fragment, not a document.
+                follow = await self.generate(
+                    get_continuation_prompt(prompt, result.text), temperature,
+                )
+            except Exception as e:
+                print(f"[{type(self).__name__}:{agent_name}] Continuation failed: {e}")
+                break
+            result = dataclasses.replace(
+                result,
+                text=result.text + _strip_continuation(result.text, follow.text),
+                prompt_tokens=result.prompt_tokens + follow.prompt_tokens,
+                completion_tokens=result.completion_tokens + follow.completion_tokens,
+                total_tokens=result.total_tokens + follow.total_tokens,
+                cached_tokens=result.cached_tokens + follow.cached_tokens,
+                rate_limit_wait_ms=result.rate_limit_wait_ms + follow.rate_limit_wait_ms,
+                finish_reason=follow.finish_reason,
+                continuations=result.continuations + 1,
+            )
+        return result
+
+
+class DelegatingClient(BaseAIClient):
+    """Base for clients that wrap another client (failover, hedging, caching).
+
+    Everything not overridden is passed through to ``primary`` so the
+    pipeline and step logs see the wrapped provider's model and settings.
+    """
+
+    def __init__(self, primary: BaseAIClient):
+        # Deliberately skip BaseAIClient.__init__: the wrapped client is
+        # already set up.
+        self.primary = primary
+        self.agent_config = primary.agent_config
+
+    def _setup_client(self) -> None:
+        pass
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.primary, "model_name", "")
+
+    @property
+    def deployment(self) -> str:
+        return getattr(self.primary, "deployment", "")
+
+    @property
+    def breaker_key(self) -> str:
+        return self.primary.breaker_key
+
+    def get_temperature(self, override: Optional[float] = None) -> float:
+        return self.primary.get_temperature(override)
+
+    def get_timeout(self) -> int:
+        return self.primary.get_timeout()
+
+    def get_max_retries(self) -> int:
+        return self.primary.get_max_retries()
+
+    def is_provider_failure(self, error: BaseException) -> bool:
+        return self.primary.is_provider_failure(error)
+
+    async def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+        request_options: Optional[dict] = None,
+    ) -> GenerationResult:
+        return await self.primary.generate(
+            prompt, temperature=temperature, json_mode=json_mode,
+            response_schema=response_schema, request_options=request_options,
+        )
+
+    async def generate_with_retry(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> GenerationResult:
+        return await self.primary.generate_with_retry(
+            prompt, temperature=temperature, json_mode=json_mode, response_schema=response_schema,
+        )
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        async for chunk in self.primary.generate_stream(
+            prompt, temperature=temperature, json_mode=json_mode, response_schema=response_schema,
+        ):
+            yield chunk
+
+    async def test_connection(self) -> bool:
+        return await self.primary.test_connection()
+
+    def get_model_info(self) -> dict:
+        return dict(self.primary.get_model_info())
@@ -0,0 +1,107 @@
+"""Incremental extractor for the chatbot's ``reply`` field.
+
+The chat agent answers in JSON mode (``{"reply": "...", "suggested_modules":
+[...], ...}``), so the raw token stream is JSON, not prose. The SSE variant
+of ``/ai/chat`` wants to forward only the human-readable ``reply`` text while
+it is still being generated; this module decodes that one string value out
+of a partial JSON document, one delta at a time.
+
+Only the top-level ``reply`` value is decoded — everything else is ignored
+here and parsed once the stream completes via the regular
+``_parse_chat_json`` path.
+"""
+
+from __future__ import annotations
+
+import re
+
+_REPLY_KEY_RE = re.compile(r'"reply"\s*:\s*"')
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class ReplyFieldExtractor:
+    """Feed raw JSON deltas in, get decoded ``reply`` text deltas out."""
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, delta: str) -> str:
+        """Consume a raw delta and return newly decoded reply text (may be '')."""
+        if self._finished or not delta:
+            return ""
+        self._buffer += delta
+
+        if not self._started:
+            match = _REPLY_KEY_RE.search(self._buffer)
+            if not match:
+                return ""
+            self._started = True
+            self._pos = match.end()
+
+        out: list[str] = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._finished = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Escape sequence — wait for the rest of it if it was split
+            # across deltas.
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc == "u":
+                if i + 6 > len(buf):
+                    break
+                try:
+                    code = int(buf[i + 2:i + 6], 16)
+                except ValueError:
+                    out.append(buf[i:i + 6])
+                    i += 6
+                    continue
+                if 0xD800 <= code < 0xDC00:
+                    # High surrogate: emoji etc. arrive as a \uXXXX\uXXXX pair.
+                    if i + 8 > len(buf):
+                        break
+                    if buf[i + 6:i + 8] == "\\u":
+                        if i + 12 > len(buf):
+                            break
+                        try:
+                            low = int(buf[i + 8:i + 12], 16)
+                        except ValueError:
+                            low = 0
+                        if 0xDC00 <= low < 0xE000:
+                            out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                            i += 12
+                            continue
+                out.append(chr(code))
+                i += 6
+                continue
+            out.append(_SIMPLE_ESCAPES.get(esc, esc))
+            i += 2
+
+        self._pos = i
+        return "".join(out)
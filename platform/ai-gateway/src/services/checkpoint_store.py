@@ -0,0 +1,190 @@
+"""
+Per-project checkpoints of pipeline stage outputs.
+
+``generate_sdf`` runs that carry a ``project_id`` save the output of the
+distributor, each module generator and the merge, together with a hash of
+the inputs the stage consumed (``stage_key``). A later /ai/clarify cycle for
+the same project looks the stage up with the hash of its new inputs and, on
+a match, reuses the saved output instead of running the stage again.
+
+One checkpoint is kept per (project, stage): the latest. Rows live in a
+sqlite file (``AI_CHECKPOINT_DB_PATH``) so they survive restarts and are
+shared by every gateway worker (lookups read the file), and expire
+after ``AI_CHECKPOINT_TTL_SECONDS``. The in-process copy is an LRU of at
+most ``AI_CHECKPOINT_MEMORY_ENTRIES`` stages. Like the response cache, every row is
+stamped with the prompt template fingerprint and ignored once templates
+change.
+"""
+
+import asyncio
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.config import settings
+from src.services.response_cache import PROMPT_DIR, template_fingerprint
+
+
+def stage_key(stage: str, *inputs: Any) -> str:
+    """Canonical hash of a stage's inputs: key order and whitespace do not matter."""
+    payload = json.dumps([stage, *inputs], sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CheckpointStore:
+    """Latest output per (project, stage), in memory and optionally in sqlite."""
+
+    def __init__(
+        self,
+        db_path: Optional[pathlib.Path],
+        ttl_seconds: float = 7 * 86400.0,
+        prompt_dir: pathlib.Path = PROMPT_DIR,
+        memory_entries: int = 1024,
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = max(1, memory_entries)
+        self._fingerprint = template_fingerprint(prompt_dir)
+        # (project_id, stage) -> (input_key, payload, expires_at), least recently used first
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[str, Dict[str, Any], float]]" = OrderedDict()
+        self._db_lock = threading.Lock()
+
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.stores = 0
+        self.evicted = 0
+
+        if self.db_path is not None:
+            self._init_db()
+
+    # ── sqlite ────────────────────────────────────────────────────
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        with self._db_lock:
+            conn = sqlite3.connect(str(self.db_path), timeout=5)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def _init_db(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                " project_id TEXT NOT NULL,"
+                " stage TEXT NOT NULL,"
+                " input_key TEXT NOT NULL,"
+                " fingerprint TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (project_id, stage))"
+            )
+            conn.execute("DELETE FROM checkpoints WHERE fingerprint != ? OR expires_at <= ?", (self._fingerprint, time.time()))
+
+    def _disk_get(self, project_id: str, stage: str) -> Optional[Tuple[str, Dict[str, Any], float]]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT input_key, payload, expires_at FROM checkpoints"
+                " WHERE project_id = ? AND stage = ? AND fingerprint = ?",
+                (project_id, stage, self._fingerprint),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def _disk_put(self, project_id: str, stage: str, input_key: str, payload: str, expires_at: float) -> None:
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)",
+                (project_id, stage, input_key, self._fingerprint, payload, expires_at),
+            )
+            conn.execute("DELETE FROM checkpoints WHERE expires_at <= ?", (time.time(),))
+
+    def _remember(self, project_id: str, stage: str, entry: Tuple[str, Dict[str, Any], float]) -> None:
+        key = (project_id, stage)
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evicted += 1
+
+    # ── public API ────────────────────────────────────────────────
+
+    async def latest(self, project_id: str, stage: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """The live (input_key, payload) saved for a stage, whatever its inputs were."""
+        entry = self._memory.get((project_id, stage))
+        if self.db_path is not None:
+            # The file is the source of truth: another gateway worker may
+            # have checkpointed this project since we last saw it.
+            try:
+                entry = await asyncio.to_thread(self._disk_get, project_id, stage)
+            except sqlite3.Error as e:
+                print(f"[CheckpointStore] Disk lookup failed: {e}")
+            if entry is not None:
+                self._remember(project_id, stage, entry)
+        elif entry is not None:
+            self._memory.move_to_end((project_id, stage))
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[0], entry[1]
+
+    async def get(self, project_id: str, stage: str, input_key: str) -> Optional[Dict[str, Any]]:
+        """The saved payload if the stage last ran on the same inputs, else None."""
+        latest = await self.latest(project_id, stage)
+        if latest is None or latest[0] != input_key:
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+            return None
+        self.hits[stage] = self.hits.get(stage, 0) + 1
+        return latest[1]
+
+    async def put(self, project_id: str, stage: str, input_key: str, payload: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(project_id, stage, (input_key, payload, expires_at))
+        self.stores += 1
+        if self.db_path is not None:
+            try:
+                await asyncio.to_thread(
+                    self._disk_put, project_id, stage, input_key, json.dumps(payload, default=str), expires_at,
+                )
+            except sqlite3.Error as e:
+                print(f"[CheckpointStore] Disk write failed: {e}")
+
+    def snapshot(self) -> dict:
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "projects": len({project for project, _ in self._memory}),
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "stores": self.stores,
+            "memory_entries": len(self._memory),
+            "evicted": self.evicted,
+        }
+
+
+_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Return the process-wide checkpoint store, creating it from settings."""
+    global _store
+    if _store is None:
+        _store = CheckpointStore(
+            pathlib.Path(settings.AI_CHECKPOINT_DB_PATH),
+            ttl_seconds=settings.AI_CHECKPOINT_TTL_SECONDS,
+            memory_entries=settings.AI_CHECKPOINT_MEMORY_ENTRIES,
+        )
+    return _store
+
+
+def checkpoint_store_snapshot() -> Optional[dict]:
+    return _store.snapshot() if _store is not None else None
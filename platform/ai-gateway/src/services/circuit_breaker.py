@@ -0,0 +1,168 @@
+"""
+Per-provider circuit breaker.
+
+Tracks the outcome of recent provider calls in a sliding window and trips
+when either the failure rate or the slow-call rate crosses its threshold:
+
+    closed ──(too many failures / slow calls)──▶ open
+    open ──(AI_BREAKER_OPEN_SECONDS elapsed)──▶ half_open
+    half_open ──(probe succeeds)──▶ closed
+    half_open ──(probe fails)──▶ open
+
+While open, ``allow_request`` returns False so callers can route straight
+to a secondary provider instead of burning retries against a degraded one.
+Half-open admits a single probe at a time.
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from src.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the breaker is open and no secondary client is configured."""
+
+
+class CircuitBreaker:
+    """Sliding-window breaker with error-rate and latency thresholds."""
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 60.0,
+        slow_call_rate_threshold: float = 0.8,
+        open_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+
+        # (failed, slow) per call, newest last
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+        self._rejected = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+            print(f"[CircuitBreaker:{self.name}] half-open — next call probes the primary")
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self._rejected += 1
+        return False
+
+    def record_success(self, duration_seconds: float) -> None:
+        slow = duration_seconds >= self.slow_call_seconds
+        if self._state == HALF_OPEN:
+            if slow:
+                self._trip("half-open probe was slow")
+                return
+            self._close()
+            return
+        self._outcomes.append((False, slow))
+        self._evaluate()
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        self._last_error = str(error)[:300] if error is not None else None
+        if self._state == HALF_OPEN:
+            self._trip("half-open probe failed")
+            return
+        self._outcomes.append((True, False))
+        self._evaluate()
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot whose outcome says nothing about health."""
+        self._probe_in_flight = False
+
+    def _evaluate(self) -> None:
+        calls = len(self._outcomes)
+        if self._state != CLOSED or calls < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, is_slow in self._outcomes if is_slow)
+        if failures / calls >= self.failure_rate_threshold:
+            self._trip(f"failure rate {failures}/{calls}")
+        elif slow / calls >= self.slow_call_rate_threshold:
+            self._trip(f"slow-call rate {slow}/{calls}")
+
+    def _trip(self, reason: str) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._times_opened += 1
+        print(f"[CircuitBreaker:{self.name}] OPEN ({reason}) for {self.open_seconds:.0f}s")
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._outcomes.clear()
+        self._probe_in_flight = False
+        print(f"[CircuitBreaker:{self.name}] closed — primary restored")
+
+    def snapshot(self) -> dict:
+        calls = len(self._outcomes)
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, is_slow in self._outcomes if is_slow)
+        state = self.state
+        return {
+            "state": state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "window_slow_calls": slow,
+            "times_opened": self._times_opened,
+            "rejected_calls": self._rejected,
+            "seconds_until_half_open": (
+                max(0, int(self.open_seconds - (time.monotonic() - self._opened_at)))
+                if state == OPEN else None
+            ),
+            "last_error": self._last_error,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Return the shared breaker for a provider endpoint, creating it from settings."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name,
+            window_size=settings.AI_BREAKER_WINDOW,
+            min_calls=settings.AI_BREAKER_MIN_CALLS,
+            failure_rate_threshold=settings.AI_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.AI_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate_threshold=settings.AI_BREAKER_SLOW_CALL_RATE,
+            open_seconds=settings.AI_BREAKER_OPEN_SECONDS,
+        )
+        _breakers[name] = breaker
+    return breaker
+
+
+def circuit_breaker_snapshot() -> dict:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -0,0 +1,89 @@
+"""
+Shared HTTP connection pools for provider SDK clients.
+
+Every agent (reviewer, distributor, hr, invoice, inventory, chatbot,
+precheck) builds its own SDK client object, but agents that talk to the same
+endpoint with the same credentials now share one pooled keep-alive transport
+from this registry. That keeps TLS sessions warm across agents and bounds the
+number of sockets a burst of concurrent pipelines can open.
+
+Pools are keyed by ``(provider, endpoint, api_key, api_version)`` and closed
+from the FastAPI shutdown hook via ``aclose_all``.
+
+Gemini is not pooled here: google-generativeai keeps a single process-wide
+gRPC channel (already HTTP/2 and multiplexed) once ``genai.configure`` has
+run, so there is nothing to share on top of it.
+"""
+
+import hashlib
+import importlib.util
+from typing import Dict, Tuple
+
+import httpx
+from openai import DefaultAsyncHttpxClient
+
+from src.config import settings
+
+# api_key is hashed so the secret never sits in a dict key that might end up
+# in a log line or a diagnostics payload.
+PoolKey = Tuple[str, str, str, str]
+
+_pools: Dict[PoolKey, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def make_pool_key(provider: str, endpoint: str, api_key: str, api_version: str) -> PoolKey:
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return (provider, (endpoint or "").rstrip("/").lower(), key_digest, api_version or "")
+
+
+def get_http_client(
+    provider: str,
+    endpoint: str,
+    api_key: str,
+    api_version: str = "",
+) -> httpx.AsyncClient:
+    """Return the shared pooled transport for this provider/endpoint/credential."""
+    key = make_pool_key(provider, endpoint, api_key, api_version)
+    client = _pools.get(key)
+    if client is not None and not client.is_closed:
+        return client
+
+    use_http2 = settings.AI_HTTP2_ENABLED and _http2_available()
+    if settings.AI_HTTP2_ENABLED and not use_http2:
+        print("[ClientRegistry] AI_HTTP2_ENABLED is set but the 'h2' package is missing; using HTTP/1.1")
+
+    # DefaultAsyncHttpxClient keeps the SDK's own defaults (redirects,
+    # timeouts) and only swaps in our pool limits.
+    client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.AI_HTTP_KEEPALIVE_SECONDS,
+        ),
+        http2=use_http2,
+    )
+    _pools[key] = client
+    print(
+        f"[ClientRegistry] New {provider} pool for {key[1]} "
+        f"(http2={use_http2}, max_connections={settings.AI_HTTP_MAX_CONNECTIONS})"
+    )
+    return client
+
+
+def pool_count() -> int:
+    return sum(1 for c in _pools.values() if not c.is_closed)
+
+
+async def aclose_all() -> None:
+    """Close every pooled transport. Called from the app shutdown hook."""
+    pools = list(_pools.values())
+    _pools.clear()
+    for client in pools:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"[ClientRegistry] Error closing pool: {e}")
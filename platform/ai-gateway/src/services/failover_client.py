@@ -0,0 +1,258 @@
+"""
+Runtime provider failover.
+
+``create_agent_client`` is the single construction path for agent clients
+(multi-agent pipeline, precheck, chatbot). It keeps the old construction-time
+Azure→Gemini fallback, wraps caching agents in a ``CachingClient`` and
+hedging agents in a ``HedgingClient`` and, when a failover provider is
+configured, wraps the primary client in a ``FailoverClient``:
+
+- every call is guarded by the primary provider's circuit breaker;
+- a provider failure (timeout, 429, 5xx, connection error) after the
+  primary's own retries fails that call over to the secondary;
+- while the breaker is open, calls skip the primary entirely;
+- half-open probes go to the primary and close the breaker on success.
+"""
+
+import dataclasses
+import time
+from typing import AsyncIterator, Optional, Type
+
+from pydantic import BaseModel
+
+from src.config import AgentConfig, settings
+from src.services.azure_client import AzureOpenAIClient
+from src.services.base_client import BaseAIClient, DelegatingClient, GenerationResult, StreamChunk
+from src.services.circuit_breaker import CircuitBreaker, CircuitOpenError, get_circuit_breaker
+from src.services.gemini_client import GeminiClient
+from src.services.hedged_client import HedgingClient, get_latency_tracker
+from src.services.mock_client import MockClient
+from src.services.response_cache import CachingClient, get_response_cache
+
+
+class FailoverClient(DelegatingClient):
+    """Primary client guarded by a circuit breaker, with a secondary to fail over to."""
+
+    def __init__(
+        self,
+        primary: BaseAIClient,
+        secondary: Optional[BaseAIClient],
+        breaker: CircuitBreaker,
+    ):
+        super().__init__(primary)
+        self.secondary = secondary
+        self.breaker = breaker
+
+    # ── routing ───────────────────────────────────────────────────
+
+    def _agent_name(self) -> str:
+        return self.agent_config.name if self.agent_config else "default"
+
+    def _secondary_or_raise(self) -> BaseAIClient:
+        if self.secondary is None:
+            raise CircuitOpenError(
+                f"Circuit '{self.breaker.name}' is open and no failover provider is configured"
+            )
+        return self.secondary
+
+    async def _call(self, method: str, prompt: str, **kwargs) -> GenerationResult:
+        if not self.breaker.allow_request():
+            secondary = self._secondary_or_raise()
+            print(f"[Failover:{self._agent_name()}] Circuit {self.breaker.name} open — using secondary")
+            return await getattr(secondary, method)(prompt, **kwargs)
+
+        started = time.monotonic()
+        try:
+            result = await getattr(self.primary, method)(prompt, **kwargs)
+        except Exception as e:
+            if not self.primary.is_provider_failure(e):
+                # Bad request, content filter, parse error... says nothing
+                # about provider health.
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_failure(e)
+            if self.secondary is None:
+                raise
+            print(f"[Failover:{self._agent_name()}] Primary failed ({type(e).__name__}) — failing over this call")
+            return await getattr(self.secondary, method)(prompt, **kwargs)
+        except BaseException:
+            # Cancelled (e.g. client disconnect): no verdict on health.
+            self.breaker.release_probe()
+            raise
+
+        elapsed = time.monotonic() - started - (getattr(result, "rate_limit_wait_ms", 0) or 0) / 1000
+        self.breaker.record_success(max(0.0, elapsed))
+        return result
+
+    async def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+        request_options: Optional[dict] = None,
+    ) -> GenerationResult:
+        return await self._call(
+            "generate", prompt,
+            temperature=temperature, json_mode=json_mode,
+            response_schema=response_schema, request_options=request_options,
+        )
+
+    async def generate_with_retry(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> GenerationResult:
+        return await self._call(
+            "generate_with_retry", prompt,
+            temperature=temperature, json_mode=json_mode, response_schema=response_schema,
+        )
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        kwargs = {"temperature": temperature, "json_mode": json_mode, "response_schema": response_schema}
+        if not self.breaker.allow_request():
+            secondary = self._secondary_or_raise()
+            async for chunk in secondary.generate_stream(prompt, **kwargs):
+                yield chunk
+            return
+
+        started = time.monotonic()
+        yielded = False
+        try:
+            async for chunk in self.primary.generate_stream(prompt, **kwargs):
+                yielded = True
+                yield chunk
+        except Exception as e:
+            if not self.primary.is_provider_failure(e):
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_failure(e)
+            # Once text has reached the caller, switching providers would
+            # splice two different answers together.
+            if self.secondary is None or yielded:
+                raise
+            print(f"[Failover:{self._agent_name()}] Primary stream failed ({type(e).__name__}) — failing over")
+            async for chunk in self.secondary.generate_stream(prompt, **kwargs):
+                yield chunk
+            return
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        self.breaker.record_success(time.monotonic() - started)
+
+    def get_model_info(self) -> dict:
+        info = super().get_model_info()
+        info["circuit_breaker"] = self.breaker.name
+        info["circuit_state"] = self.breaker.state
+        info["failover"] = self.secondary.get_model_info() if self.secondary else None
+        return info
+
+
+# ── factory ──────────────────────────────────────────────────────
+
+def _provider_configured(provider: str) -> bool:
+    if provider == "azure_openai":
+        return bool(settings.AZURE_OPENAI_API_KEY and settings.AZURE_OPENAI_ENDPOINT)
+    if provider == "gemini":
+        return bool(settings.GOOGLE_AI_API_KEY)
+    return provider == "mock"
+
+
+def _build_provider_client(provider: str, config: AgentConfig) -> BaseAIClient:
+    if provider == "azure_openai":
+        return AzureOpenAIClient(agent_config=config)
+    if provider == "mock":
+        return MockClient(agent_config=config)
+    return GeminiClient(agent_config=config)
+
+
+def create_agent_client(config: AgentConfig, log_prefix: str = "ClientFactory") -> BaseAIClient:
+    """Create the AI client for an agent based on its configured provider."""
+    client = _create_hedged_client(config, log_prefix)
+    if config.get_cache_enabled(settings.AI_CACHE_ENABLED):
+        # Outermost, so a hit skips hedging, failover and rate limiting.
+        client = CachingClient(client, get_response_cache())
+    return client
+
+
+def _create_hedged_client(config: AgentConfig, log_prefix: str) -> BaseAIClient:
+    requested_provider = config.provider
+    client = _create_failover_client(config, log_prefix)
+    if not config.hedge_enabled:
+        return client
+
+    hedge_client = None
+    # Skip the dedicated hedge target if init already fell back to another provider.
+    if config.hedge_deployment and config.provider == requested_provider:
+        # Azure hedges to another deployment, Gemini to another model.
+        hedge_config = dataclasses.replace(
+            config,
+            hedge_enabled=False,
+            **({"azure_deployment": config.hedge_deployment}
+               if config.provider == "azure_openai" else {"model": config.hedge_deployment}),
+        )
+        try:
+            hedge_client = _create_failover_client(hedge_config, log_prefix)
+        except Exception as e:
+            print(f"[{log_prefix}] Hedge client init failed for {config.name}: {e}")
+
+    percentile = config.get_hedge_percentile(settings.AI_HEDGE_PERCENTILE)
+    print(f"[{log_prefix}] Hedging enabled for {config.name} at p{percentile:g}")
+    return HedgingClient(
+        client,
+        hedge_client,
+        get_latency_tracker(config.name),
+        percentile=percentile,
+        min_delay_seconds=settings.AI_HEDGE_MIN_DELAY_SECONDS,
+    )
+
+
+def _create_failover_client(config: AgentConfig, log_prefix: str) -> BaseAIClient:
+    if config.provider == "azure_openai":
+        try:
+            primary = AzureOpenAIClient(agent_config=config)
+        except Exception as e:
+            print(f"[{log_prefix}] Azure client init failed for {config.name}: {e}")
+            if settings.GOOGLE_AI_API_KEY:
+                print(f"[{log_prefix}] Falling back to Gemini for {config.name}")
+                config.provider = "gemini"
+                return GeminiClient(agent_config=config)
+            raise
+    elif config.provider == "mock":
+        # Offline runs never fail over to a paid provider.
+        return MockClient(agent_config=config)
+    else:
+        primary = GeminiClient(agent_config=config)
+
+    failover = (config.get_failover_provider(settings.AI_FAILOVER_PROVIDER) or "").strip().lower()
+    if not failover or failover == "none" or failover == config.provider:
+        return primary
+    if not _provider_configured(failover):
+        return primary
+
+    # The secondary runs on the failover provider's global defaults; the
+    # agent's own key/model/deployment belong to the primary provider.
+    secondary_config = dataclasses.replace(
+        config,
+        provider=failover,
+        api_key=None,
+        model=None,
+        azure_endpoint=None,
+        azure_deployment=None,
+        azure_api_version=None,
+    )
+    try:
+        secondary = _build_provider_client(failover, secondary_config)
+    except Exception as e:
+        print(f"[{log_prefix}] Failover client init failed for {config.name}: {e}")
+        return primary
+
+    return FailoverClient(primary, secondary, get_circuit_breaker(primary.breaker_key))
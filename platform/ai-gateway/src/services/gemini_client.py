@@ -4,7 +4,7 @@ Handles communication with Google's Gemini API (fallback provider).
 """
 
 import asyncio
-from typing import Optional, Type
+from typing import Any, AsyncIterator, Optional, Tuple, Type
 
 import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
@@ -12,11 +12,43 @@ from google.generativeai.types import GenerationConfig
 from pydantic import BaseModel
 
 from src.config import settings, AgentConfig
-from src.services.base_client import BaseAIClient, GenerationResult
+from src.schemas.output_schemas import gemini_response_schema
+from src.prompts.sdf_generation import static_prefix
+from src.services.base_client import (
+    BaseAIClient,
+    GenerationResult,
+    StreamChunk,
+)
+from src.services.gemini_context_cache import get_gemini_context_cache
+from src.services.retry_policy import get_retry_budget, next_retry_delay
+
+
+# Gemini finish reasons mapped onto the OpenAI vocabulary the pipeline checks.
+_FINISH_REASONS = {"STOP": "stop", "MAX_TOKENS": "length"}
+
+
+def _finish_reason(response) -> Optional[str]:
+    try:
+        candidate = response.candidates[0] if response.candidates else None
+        if candidate is not None and candidate.finish_reason:
+            name = candidate.finish_reason.name
+            return _FINISH_REASONS.get(name, name.lower())
+    except Exception:
+        pass
+    return None
 
 
 class GeminiClient(BaseAIClient):
     """Client for interacting with Google Gemini AI."""
+
+    PROVIDER_FAILURE_ERRORS = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.ResourceExhausted,
+        asyncio.TimeoutError,
+    )
+    breaker_key = "gemini"
     
     _default_instance: Optional["GeminiClient"] = None
     
@@ -41,6 +73,7 @@ class GeminiClient(BaseAIClient):
         
         self.model = genai.GenerativeModel(model_name)
         self.model_name = model_name
+        self._init_rate_limiter(f"gemini:{model_name}")
         
         agent_name = self.agent_config.name if self.agent_config else "default"
         print(f"[GeminiClient:{agent_name}] Initialized with model: {model_name}")
@@ -68,11 +101,50 @@ class GeminiClient(BaseAIClient):
                     "prompt": getattr(meta, "prompt_token_count", 0) or 0,
                     "completion": getattr(meta, "candidates_token_count", 0) or 0,
                     "total": getattr(meta, "total_token_count", 0) or 0,
+                    "cached": getattr(meta, "cached_content_token_count", 0) or 0,
                 }
         except Exception:
             pass
-        return {"prompt": 0, "completion": 0, "total": 0}
+        return {"prompt": 0, "completion": 0, "total": 0, "cached": 0}
+
+    async def _model_for(self, prompt: str) -> Tuple[Any, str, str]:
+        """Model, contents and cached prefix for a call.
+
+        With context caching on, a prompt whose static prefix is cached is
+        sent as just its request-specific suffix against that cache.
+        """
+        cache = get_gemini_context_cache()
+        if cache is None:
+            return self.model, prompt, ""
+        prefix = static_prefix(prompt)
+        if not prompt[len(prefix):].strip():
+            return self.model, prompt, ""
+        cached = await cache.get(self.model_name, prefix)
+        if cached is None:
+            return self.model, prompt, ""
+        return genai.GenerativeModel.from_cached_content(cached), prompt[len(prefix):], prefix
     
+    def _build_generation_config(
+        self,
+        temperature: Optional[float],
+        json_mode: bool,
+        response_schema: Optional[Type[BaseModel]],
+        max_output_tokens: int,
+    ) -> GenerationConfig:
+        config_params = {
+            "temperature": temperature if temperature is not None else self.get_temperature(),
+            "max_output_tokens": max_output_tokens,
+        }
+
+        if response_schema is not None or json_mode:
+            config_params["response_mime_type"] = "application/json"
+            if response_schema is not None and settings.AI_STRUCTURED_OUTPUTS:
+                schema = gemini_response_schema(response_schema)
+                if schema is not None:
+                    config_params["response_schema"] = schema
+
+        return GenerationConfig(**config_params)
+
     async def generate(
         self, 
         prompt: str, 
@@ -82,38 +154,105 @@ class GeminiClient(BaseAIClient):
         request_options: dict = None
     ) -> GenerationResult:
         try:
-            config_params = {
-                "temperature": temperature,
-                "max_output_tokens": 8192,
-            }
-            
-            if response_schema is not None or json_mode:
-                config_params["response_mime_type"] = "application/json"
-                if response_schema is not None:
-                    agent_name = self.agent_config.name if self.agent_config else "default"
-                    print(f"[GeminiClient:{agent_name}] JSON mode with schema hint: {response_schema.__name__}")
-
-            generation_config = GenerationConfig(**config_params)
-
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=generation_config,
-                request_options=request_options
+            max_output_tokens = self.plan_output_tokens(prompt)
+            generation_config = self._build_generation_config(
+                temperature, json_mode, response_schema, max_output_tokens
             )
+            wait_ms = await self._throttle(prompt, max_output_tokens)
+
+            model, contents, prefix = await self._model_for(prompt)
+            try:
+                response = await model.generate_content_async(
+                    contents,
+                    generation_config=generation_config,
+                    request_options=request_options
+                )
+            except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as e:
+                if not prefix:
+                    raise
+                # The cached content expired or was deleted server-side.
+                print(f"[GeminiClient] Cached context unavailable ({e}); sending full prompt")
+                get_gemini_context_cache().invalidate(self.model_name, prefix)
+                response = await self.model.generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    request_options=request_options
+                )
             
+            finish_reason = _finish_reason(response)
+            try:
+                text = response.text
+            except ValueError:
+                # `.text` raises when the candidate has no parts, which
+                # happens when the limit is hit before any text was produced.
+                if finish_reason != "length":
+                    raise
+                text = ""
             usage = self._extract_usage(response)
             return GenerationResult(
-                text=response.text,
+                text=text,
                 prompt_tokens=usage["prompt"],
                 completion_tokens=usage["completion"],
                 total_tokens=usage["total"],
+                cached_tokens=usage["cached"],
                 model=self.model_name,
+                rate_limit_wait_ms=wait_ms,
+                finish_reason=finish_reason,
             )
             
         except Exception as e:
             print(f"[GeminiClient] Generation error: {e}")
             raise
     
+    async def generate_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        max_output_tokens = self.plan_output_tokens(prompt)
+        generation_config = self._build_generation_config(
+            temperature, json_mode, response_schema, max_output_tokens
+        )
+        last_chunk = None
+        finish_reason: Optional[str] = None
+        await self._throttle(prompt, max_output_tokens)
+        model, contents, _ = await self._model_for(prompt)
+        try:
+            response = await model.generate_content_async(
+                contents,
+                generation_config=generation_config,
+                stream=True,
+                request_options={"timeout": self.timeout},
+            )
+            async for chunk in response:
+                last_chunk = chunk
+                finish_reason = _finish_reason(chunk) or finish_reason
+                try:
+                    delta = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the closing safety
+                    # metadata chunk) raise on `.text`.
+                    delta = ""
+                if delta:
+                    yield StreamChunk(text=delta)
+        except Exception as e:
+            print(f"[GeminiClient] Streaming error: {e}")
+            raise
+
+        # Gemini reports cumulative usage on every chunk; the last one wins.
+        usage = self._extract_usage(last_chunk)
+        yield StreamChunk(
+            done=True,
+            prompt_tokens=usage["prompt"],
+            completion_tokens=usage["completion"],
+            total_tokens=usage["total"],
+            cached_tokens=usage["cached"],
+            model=self.model_name,
+            finish_reason=finish_reason,
+        )
+
     async def generate_with_retry(
         self, 
         prompt: str, 
@@ -122,6 +261,8 @@ class GeminiClient(BaseAIClient):
         response_schema: Optional[Type[BaseModel]] = None
     ) -> GenerationResult:
         last_exception = None
+        backoff = 0.0
+        get_retry_budget().record_request()
         for attempt in range(self.max_retries):
             try:
                 print(f"[GeminiClient] Generating content (Attempt {attempt + 1}/{self.max_retries})...")
@@ -133,10 +274,11 @@ class GeminiClient(BaseAIClient):
                     response_schema=response_schema,
                     request_options=request_options
                 )
-                return result
+                return await self._continue_if_truncated(prompt, result, temperature)
             except (
                 google_exceptions.ServiceUnavailable,
                 google_exceptions.DeadlineExceeded,
+                google_exceptions.ResourceExhausted,
                 asyncio.TimeoutError
             ) as e:
                 print(f"[GeminiClient] Attempt {attempt + 1} failed with transient error: {e}")
@@ -145,9 +287,11 @@ class GeminiClient(BaseAIClient):
                     print("[GeminiClient] Max retries reached. Failing.")
                     break
                 
-                backoff_time = 2 ** (attempt + 1)
-                print(f"[GeminiClient] Retrying in {backoff_time} seconds...")
-                await asyncio.sleep(backoff_time)
+                backoff = next_retry_delay(e, backoff, "GeminiClient")
+                if backoff is None:
+                    break
+                print(f"[GeminiClient] Retrying in {backoff:.1f} seconds...")
+                await asyncio.sleep(backoff)
             except Exception as e:
                 print(f"[GeminiClient] A non-retriable error occurred: {e}")
                 last_exception = e
@@ -0,0 +1,123 @@
+"""
+Explicit Gemini context caching for static prompt prefixes.
+
+Prompts are rendered static-first (see ``prompts.sdf_generation._render``):
+template instructions, the SDF schema reference and the language directive
+come before any request data, and that static prefix is registered. With
+``AI_GEMINI_CONTEXT_CACHE=true`` the Gemini client uploads each registered
+prefix once as ``CachedContent`` and sends only the request-specific suffix
+against it, so the large static blocks are billed at the cached rate.
+
+Prefixes under ``AI_GEMINI_CONTEXT_CACHE_MIN_TOKENS`` are sent normally (the
+API rejects small caches). Entries are renewed shortly before their TTL runs
+out; a prefix whose cache could not be created is retried after one TTL.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from google.generativeai import caching
+
+from src.config import settings
+from src.services.token_estimator import estimate_tokens
+
+# Renew an entry this long before it expires so no call races the expiry.
+_RENEW_MARGIN_SECONDS = 60.0
+
+
+class GeminiContextCache:
+    """Maps (model, static prefix) to a live Gemini ``CachedContent``."""
+
+    def __init__(self, ttl_seconds: float = 3600.0, min_tokens: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        # key -> (cached content, expires_at monotonic)
+        self._entries: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        # key -> monotonic time before which creation is not retried
+        self._failed: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.created = 0
+        self.reused = 0
+        self.too_small = 0
+        self.failures = 0
+
+    @staticmethod
+    def _key(model_name: str, prefix: str) -> Tuple[str, str]:
+        return model_name, hashlib.sha256(prefix.encode()).hexdigest()[:16]
+
+    async def get(self, model_name: str, prefix: str) -> Optional[Any]:
+        """Cached content holding ``prefix`` for ``model_name``, or None to send uncached."""
+        if not prefix:
+            return None
+        key = self._key(model_name, prefix)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] - time.monotonic() > _RENEW_MARGIN_SECONDS:
+            self.reused += 1
+            return entry[0]
+        if self._failed.get(key, 0.0) > time.monotonic():
+            return None
+        if estimate_tokens(prefix, model_name) < self.min_tokens:
+            self.too_small += 1
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] - time.monotonic() > _RENEW_MARGIN_SECONDS:
+                self.reused += 1
+                return entry[0]
+            try:
+                cached = await asyncio.to_thread(self._create, model_name, prefix)
+            except Exception as e:
+                print(f"[GeminiContextCache] Could not cache prefix for {model_name}: {e}")
+                self.failures += 1
+                self._failed[key] = time.monotonic() + self.ttl_seconds
+                return None
+            self._entries[key] = (cached, time.monotonic() + self.ttl_seconds)
+            self.created += 1
+            print(f"[GeminiContextCache] Cached {len(prefix)}-char static prefix for {model_name}")
+            return cached
+
+    def _create(self, model_name: str, prefix: str) -> Any:
+        return caching.CachedContent.create(
+            model=model_name,
+            display_name=f"customerp-{self._key(model_name, prefix)[1]}",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+        )
+
+    def invalidate(self, model_name: str, prefix: str) -> None:
+        """Forget an entry the API no longer recognizes (expired or deleted)."""
+        self._entries.pop(self._key(model_name, prefix), None)
+
+    def snapshot(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "created": self.created,
+            "reused": self.reused,
+            "too_small": self.too_small,
+            "failures": self.failures,
+        }
+
+
+_context_cache: Optional[GeminiContextCache] = None
+
+
+def get_gemini_context_cache() -> Optional[GeminiContextCache]:
+    """Process-wide context cache, or None when ``AI_GEMINI_CONTEXT_CACHE`` is off."""
+    global _context_cache
+    if not settings.AI_GEMINI_CONTEXT_CACHE:
+        return None
+    if _context_cache is None:
+        _context_cache = GeminiContextCache(
+            ttl_seconds=settings.AI_GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+            min_tokens=settings.AI_GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+        )
+    return _context_cache
+
+
+def gemini_context_cache_snapshot() -> Optional[dict]:
+    return _context_cache.snapshot() if _context_cache is not None else None
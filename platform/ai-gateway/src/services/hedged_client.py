@@ -0,0 +1,221 @@
+"""
+Request hedging for tail-latency-critical agents.
+
+An agent with hedging enabled (``AI_AGENT_<NAME>_HEDGE=true``) keeps a
+sliding window of its recent call latencies. Once the window holds enough
+samples, every call arms a timer at the agent's observed pXX latency; if
+the first attempt is still outstanding when it fires, an identical second
+request goes out (to the same client, or to ``AI_AGENT_<NAME>_HEDGE_DEPLOYMENT``).
+Whichever finishes first wins and the other is cancelled.
+
+The returned ``GenerationResult`` says whether the call was hedged, whether
+the hedge won, and how many extra tokens the losing attempt cost.
+"""
+
+import asyncio
+import dataclasses
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from src.config import settings
+from src.services.base_client import BaseAIClient, DelegatingClient, GenerationResult, estimate_prompt_tokens
+
+
+class LatencyTracker:
+    """Recent latencies plus hedging counters for one agent."""
+
+    def __init__(self, name: str, window_size: int = 100, min_samples: int = 10):
+        self.name = name
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window_size)
+        self.calls = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.extra_tokens = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency at ``pct`` (0-100), or None until ``min_samples`` are in."""
+        if len(self._samples) < max(1, self.min_samples):
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+    def snapshot(self, pct: float) -> dict:
+        p50 = self.percentile(50)
+        hedge_at = self.percentile(pct)
+        return {
+            "samples": len(self._samples),
+            "p50_ms": int(p50 * 1000) if p50 is not None else None,
+            "hedge_after_ms": int(hedge_at * 1000) if hedge_at is not None else None,
+            "calls": self.calls,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges_sent, 3) if self.hedges_sent else 0.0,
+            "extra_tokens": self.extra_tokens,
+        }
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_tracker_percentiles: Dict[str, float] = {}
+
+
+def get_latency_tracker(name: str) -> LatencyTracker:
+    """Return the shared latency tracker for an agent, creating it from settings."""
+    tracker = _trackers.get(name)
+    if tracker is None:
+        tracker = LatencyTracker(
+            name,
+            window_size=settings.AI_HEDGE_WINDOW,
+            min_samples=settings.AI_HEDGE_MIN_SAMPLES,
+        )
+        _trackers[name] = tracker
+    return tracker
+
+
+def hedging_snapshot() -> dict:
+    return {
+        name: tracker.snapshot(_tracker_percentiles.get(name, settings.AI_HEDGE_PERCENTILE))
+        for name, tracker in _trackers.items()
+    }
+
+
+class HedgingClient(DelegatingClient):
+    """Sends a backup request when the first one runs past the agent's pXX latency."""
+
+    def __init__(
+        self,
+        primary: BaseAIClient,
+        hedge: Optional[BaseAIClient],
+        tracker: LatencyTracker,
+        percentile: float,
+        min_delay_seconds: float = 0.0,
+    ):
+        super().__init__(primary)
+        # Without a dedicated hedge deployment the backup goes to the same client.
+        self.hedge = hedge or primary
+        self.tracker = tracker
+        self.percentile = percentile
+        self.min_delay_seconds = min_delay_seconds
+        _tracker_percentiles[tracker.name] = percentile
+
+    # ── hedging ───────────────────────────────────────────────────
+
+    def hedge_delay(self) -> Optional[float]:
+        observed = self.tracker.percentile(self.percentile)
+        if observed is None:
+            return None
+        return max(observed, self.min_delay_seconds)
+
+    def _record(self, started: float, result: GenerationResult) -> None:
+        wait = (getattr(result, "rate_limit_wait_ms", 0) or 0) / 1000
+        self.tracker.record(max(0.0, time.monotonic() - started - wait))
+
+    async def _call(self, method: str, prompt: str, **kwargs) -> GenerationResult:
+        self.tracker.calls += 1
+        delay = self.hedge_delay()
+        started = time.monotonic()
+        if delay is None:
+            # Still warming up: no latency profile to hedge against yet.
+            result = await getattr(self.primary, method)(prompt, **kwargs)
+            self._record(started, result)
+            return result
+
+        first = asyncio.create_task(getattr(self.primary, method)(prompt, **kwargs))
+        backup: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                result = first.result()
+                self._record(started, result)
+                return result
+
+            print(
+                f"[Hedging:{self.tracker.name}] No response after {delay:.1f}s "
+                f"(p{self.percentile:g}) — sending hedge request"
+            )
+            self.tracker.hedges_sent += 1
+            backup = asyncio.create_task(getattr(self.hedge, method)(prompt, **kwargs))
+
+            pending = {first, backup}
+            first_error: Optional[BaseException] = None
+            winner: Optional[asyncio.Task] = None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the original attempt when both land together.
+                for task in (first, backup):
+                    if task not in done:
+                        continue
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    first_error = first_error or task.exception()
+            if winner is None:
+                raise first_error
+
+            loser = backup if winner is first else first
+            extra_tokens = 0
+            if loser.done() and not loser.cancelled() and loser.exception() is None:
+                extra_tokens = loser.result().total_tokens
+            elif not loser.done():
+                loser.cancel()
+                # The provider bills the prompt of a request it has accepted
+                # even if we stop waiting for the completion.
+                extra_tokens = estimate_prompt_tokens(prompt)
+
+            result = winner.result()
+            self._record(started, result)
+            hedge_won = winner is backup
+            if hedge_won:
+                self.tracker.hedge_wins += 1
+            self.tracker.extra_tokens += extra_tokens
+            return dataclasses.replace(
+                result, hedged=True, hedge_won=hedge_won, hedge_extra_tokens=extra_tokens,
+            )
+        finally:
+            for task in (first, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+        request_options: Optional[dict] = None,
+    ) -> GenerationResult:
+        return await self._call(
+            "generate", prompt,
+            temperature=temperature, json_mode=json_mode,
+            response_schema=response_schema, request_options=request_options,
+        )
+
+    async def generate_with_retry(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> GenerationResult:
+        return await self._call(
+            "generate_with_retry", prompt,
+            temperature=temperature, json_mode=json_mode, response_schema=response_schema,
+        )
+
+    # generate_stream is inherited unhedged: streams already surface the
+    # first token early, and hedging them would splice two answers together.
+
+    def get_model_info(self) -> dict:
+        info = super().get_model_info()
+        info["hedging"] = {
+            "percentile": self.percentile,
+            "hedge_target": self.hedge.get_model_info() if self.hedge is not self.primary else "same",
+        }
+        return info
@@ -0,0 +1,364 @@
+"""
+Persistent job queue for long-running pipeline calls.
+
+``POST /ai/jobs/analyze`` stores the request in a sqlite job table and
+returns its id at once; a fixed pool of worker tasks (``AI_JOBS_WORKERS``)
+runs queued jobs, so a proxy timeout or a client that goes away no longer
+throws the run away. ``GET /ai/jobs/{id}`` reads status and result from the
+table. The synchronous endpoints submit a job and wait for it (``run``), so
+they share the same pool.
+
+The table outlives the process and is shared by every worker process of
+the gateway. Each queue owns the jobs it accepted and keeps a heartbeat in
+the ``workers`` table; jobs whose owner stopped (or stopped heartbeating
+for ``AI_JOBS_LEASE_SECONDS``) are taken over by a live queue, at startup
+and every third of a lease. The heartbeat is written from its own thread,
+so a long CPU-bound stage that stalls the event loop does not let another
+worker take over jobs that are still running. A taken-over job that was queued is queued again;
+one that was running (interrupted) is queued again while it has attempts
+left (``AI_JOBS_MAX_ATTEMPTS``), otherwise marked failed. A job is claimed
+with a conditional UPDATE, so it never runs twice at once.
+
+Handlers are registered per job kind with ``@job_handler(kind)``; they take
+the stored request payload and return a JSON-serializable result.
+"""
+
+import asyncio
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from src.config import settings
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register the coroutine that runs jobs of ``kind``."""
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = handler
+        return handler
+    return register
+
+
+class JobQueueFull(Exception):
+    """More jobs are waiting than AI_JOBS_MAX_PENDING allows."""
+
+
+class JobQueue:
+    """A sqlite job table drained by a bounded pool of worker tasks."""
+
+    def __init__(
+        self,
+        db_path: pathlib.Path,
+        workers: int = 2,
+        max_pending: int = 100,
+        max_attempts: int = 2,
+        retention_seconds: float = 86400.0,
+        lease_seconds: float = 30.0,
+    ):
+        self.db_path = db_path
+        self.owner = uuid.uuid4().hex
+        self.lease_seconds = lease_seconds
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self.retention_seconds = retention_seconds
+        self._db_lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._recover_task: Optional[asyncio.Task] = None
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._heartbeat_stop = threading.Event()
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self.running = 0
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.resumed = 0
+
+        self._init_db()
+
+    # ── sqlite ────────────────────────────────────────────────────
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        with self._db_lock:
+            conn = sqlite3.connect(str(self.db_path), timeout=5)
+            conn.row_factory = sqlite3.Row
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def _init_db(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " project_id TEXT,"
+                " owner TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS workers (owner TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._db() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _update(self, sql: str, params: tuple = ()) -> int:
+        """Run an UPDATE and return how many rows it changed."""
+        with self._db() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _insert(self, job_id: str, kind: str, project_id: Optional[str], payload: str) -> None:
+        now = time.time()
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, project_id, owner, status, payload, created_at)"
+                " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, project_id, self.owner, payload, now),
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at <= ?",
+                (now - self.retention_seconds,),
+            )
+
+    async def _db_call(self, fn: Callable, *args) -> Any:
+        return await asyncio.to_thread(fn, *args)
+
+    # ── lifecycle ─────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        """Start the workers and take over jobs left by stopped queues."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        await self._db_call(self._heartbeat)
+        await self._recover()
+        self._worker_tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+        self._recover_task = asyncio.ensure_future(self._recover_loop())
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_thread_main, args=(self._heartbeat_stop,), name="job-queue-heartbeat", daemon=True,
+        )
+        self._heartbeat_thread.start()
+
+    async def stop(self) -> None:
+        """Cancel the workers and release this queue's jobs to the other workers.
+
+        Jobs still running stay 'running'; whichever queue takes them over
+        (this process after a restart, or another worker) retries them.
+        """
+        tasks = self._worker_tasks + ([self._recover_task] if self._recover_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks, self._recover_task = [], None
+        if self._heartbeat_thread is not None:
+            self._heartbeat_stop.set()
+            await asyncio.to_thread(self._heartbeat_thread.join)
+            self._heartbeat_thread = None
+        self._queue = None
+        await self._db_call(self._execute, "DELETE FROM workers WHERE owner = ?", (self.owner,))
+
+    def _heartbeat(self) -> None:
+        self._execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (self.owner, time.time()))
+
+    def _heartbeat_thread_main(self, stop: threading.Event) -> None:
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                self._heartbeat()
+            except sqlite3.Error as e:
+                print(f"[JobQueue] Heartbeat failed: {e}")
+
+    async def _recover_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._recover()
+            except sqlite3.Error as e:
+                print(f"[JobQueue] Recovery scan failed: {e}")
+
+    async def _recover(self) -> None:
+        """Take over unfinished jobs whose owner is gone."""
+        rows = await self._db_call(
+            self._execute,
+            "SELECT id, owner, status, attempts FROM jobs WHERE status IN ('queued', 'running')"
+            " AND owner NOT IN (SELECT owner FROM workers WHERE heartbeat_at > ?) ORDER BY created_at",
+            (time.time() - self.lease_seconds,),
+        )
+        taken = 0
+        for row in rows:
+            # Conditional on the old owner: only one live queue takes each job.
+            if row["status"] == "running" and row["attempts"] >= self.max_attempts:
+                changed = await self._db_call(
+                    self._update,
+                    "UPDATE jobs SET owner = ?, status = 'failed', error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                    (self.owner, "Interrupted by a gateway restart", time.time(), row["id"], row["owner"]),
+                )
+                self.failed += changed
+                continue
+            changed = await self._db_call(
+                self._update,
+                "UPDATE jobs SET owner = ?, status = 'queued' WHERE id = ? AND owner = ?",
+                (self.owner, row["id"], row["owner"]),
+            )
+            if changed:
+                self._queue.put_nowait(row["id"])
+                taken += 1
+        self.resumed += taken
+        if rows:
+            print(f"[JobQueue] Took over {len(rows)} unfinished job(s) from stopped workers; {taken} re-queued")
+
+    # ── public API ────────────────────────────────────────────────
+
+    async def submit(self, kind: str, payload: Dict[str, Any], project_id: Optional[str] = None) -> str:
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        await self.start()
+        if self._queue.qsize() >= self.max_pending:
+            raise JobQueueFull(f"{self._queue.qsize()} jobs are already waiting; try again shortly")
+        job_id = uuid.uuid4().hex
+        await self._db_call(self._insert, job_id, kind, project_id, json.dumps(payload, default=str))
+        self._queue.put_nowait(job_id)
+        self.submitted += 1
+        return job_id
+
+    async def run(self, kind: str, payload: Dict[str, Any], project_id: Optional[str] = None) -> Any:
+        """Submit a job and wait for its result; the handler's exception is re-raised.
+
+        The wait is shielded: a caller that goes away does not cancel the job.
+        """
+        job_id = await self.submit(kind, payload, project_id)
+        waiter = asyncio.get_running_loop().create_future()
+        # Mark the exception retrieved even if the caller went away.
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._waiters[job_id] = waiter
+        return await asyncio.shield(waiter)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._db_call(self._execute, "SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "project_id": row["project_id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+        }
+
+    # ── workers ───────────────────────────────────────────────────
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[JobQueue] Worker {index} failed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        claimed = await self._db_call(
+            self._update,
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?"
+            " WHERE id = ? AND owner = ? AND status = 'queued'",
+            (time.time(), job_id, self.owner),
+        )
+        if not claimed:
+            return
+        rows = await self._db_call(self._execute, "SELECT kind, payload FROM jobs WHERE id = ?", (job_id,))
+        kind, payload = rows[0]["kind"], json.loads(rows[0]["payload"])
+        self.running += 1
+        waiter = self._waiters.get(job_id)
+        try:
+            result = await _handlers[kind](payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e) or type(e).__name__
+            print(f"[JobQueue] Job {job_id} ({kind}) failed: {error}")
+            await self._finish(job_id, "failed", error=str(error))
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(e)
+        else:
+            await self._finish(job_id, "succeeded", result=result)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(result)
+        finally:
+            self.running -= 1
+            self._waiters.pop(job_id, None)
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        if status == "succeeded":
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        await self._db_call(
+            self._execute,
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": len(self._worker_tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "resumed": self.resumed,
+        }
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, creating it from settings."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            pathlib.Path(settings.AI_JOBS_DB_PATH),
+            workers=settings.AI_JOBS_WORKERS,
+            max_pending=settings.AI_JOBS_MAX_PENDING,
+            max_attempts=settings.AI_JOBS_MAX_ATTEMPTS,
+            retention_seconds=settings.AI_JOBS_RETENTION_SECONDS,
+            lease_seconds=settings.AI_JOBS_LEASE_SECONDS,
+        )
+    return _job_queue
+
+
+def job_queue_snapshot() -> Optional[dict]:
+    return _job_queue.snapshot() if _job_queue is not None else None
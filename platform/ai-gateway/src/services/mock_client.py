@@ -0,0 +1,392 @@
+"""
+Mock AI Client
+Deterministic offline provider for load tests and local development.
+
+Select it per agent with ``AI_AGENT_<NAME>_PROVIDER=mock`` (or for every
+agent with ``AI_DEFAULT_PROVIDER=mock``). Responses are looked up, in order:
+
+1. a recorded response for the same agent and prompt hash, from
+   ``training_data/sessions.jsonl`` step logs or the ``AI_MOCK_FIXTURES``
+   files (``.json`` list or ``.jsonl`` records);
+2. a recorded response for the same prompt hash from any agent;
+3. any recorded response for the agent (round-robin), unless
+   ``AI_MOCK_STRICT=true``;
+4. a small canned response that parses for that agent.
+
+Latency, token counts, 429s and timeouts are simulated so throughput can be
+measured on a laptop without Azure/Gemini keys.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import pathlib
+import random
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Type
+
+import httpx
+from pydantic import BaseModel
+
+from src.config import settings, AgentConfig
+from src.services.base_client import (
+    BaseAIClient,
+    GenerationResult,
+    StreamChunk,
+    estimate_prompt_tokens,
+)
+from src.services.retry_policy import get_retry_budget, next_retry_delay
+
+
+# Step logs keep only the first 30k characters of a prompt; hashing the same
+# prefix lets truncated recordings still match.
+PROMPT_HASH_PREFIX_CHARS = 30000
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256((prompt or "")[:PROMPT_HASH_PREFIX_CHARS].encode("utf-8")).hexdigest()
+
+
+class MockRateLimitError(Exception):
+    """Simulated 429 carrying a Retry-After header like the real providers."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Mock rate limit (retry after {retry_after:.1f}s)")
+        self.response = httpx.Response(429, headers={"retry-after": f"{retry_after:.3f}"})
+
+
+_CANNED_RESPONSES: Dict[str, dict] = {
+    "reviewer": {"is_clear_to_proceed": True, "issues": [], "summary": "Mock review: answers look usable."},
+    "distributor": {
+        "project_name": "Mock Project",
+        "modules_needed": ["inventory"],
+        "shared_entities": [],
+        "inventory_context": {
+            "enabled": True,
+            "description": "Track products and stock levels.",
+            "entities_hint": ["products"],
+            "features": [],
+        },
+        "clarifications_needed": [],
+        "unsupported_features": [],
+        "warnings": [],
+    },
+    "inventory": {
+        "entities": [
+            {
+                "slug": "products",
+                "display_name": "Products",
+                "module": "inventory",
+                "fields": [
+                    {"name": "name", "type": "string", "required": True},
+                    {"name": "sku", "type": "string", "required": True, "unique": True},
+                    {"name": "quantity", "type": "integer", "required": True},
+                ],
+            }
+        ],
+        "module_config": {},
+        "clarifications_needed": [],
+        "sdf_complete": True,
+        "warnings": [],
+    },
+    "hr": {"entities": [], "module_config": {"enabled": True}, "clarifications_needed": [], "sdf_complete": True},
+    "invoice": {"entities": [], "module_config": {"enabled": True}, "clarifications_needed": [], "sdf_complete": True},
+    "chatbot": {
+        "reply": "This is a mock reply from the offline provider.",
+        "suggested_modules": [],
+        "discussion_points": [],
+        "confidence": "medium",
+        "unsupported_features": [],
+    },
+    # Legacy single-call editor: an empty patch merges onto the current SDF.
+    "sdf_editor": {},
+}
+
+
+class MockResponseStore:
+    """Recorded responses indexed by (agent, prompt hash)."""
+
+    def __init__(self):
+        self._by_agent_and_hash: Dict[Tuple[str, str], dict] = {}
+        self._by_hash: Dict[str, dict] = {}
+        self._by_agent: Dict[str, List[dict]] = {}
+        self._cursors: Dict[str, Iterator[dict]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_agent_and_hash)
+
+    def add(
+        self,
+        agent: str,
+        response: str,
+        prompt: Optional[str] = None,
+        prompt_sha256: Optional[str] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        duration_ms: int = 0,
+    ) -> None:
+        digest = prompt_sha256 or (prompt_hash(prompt) if prompt is not None else None)
+        record = {
+            "text": response,
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "duration_ms": int(duration_ms or 0),
+        }
+        if digest:
+            self._by_agent_and_hash[(agent, digest)] = record
+            self._by_hash.setdefault(digest, record)
+        self._by_agent.setdefault(agent, []).append(record)
+        self._cursors.pop(agent, None)
+
+    def lookup(self, agent: str, prompt: str, strict: bool = False) -> Optional[dict]:
+        digest = prompt_hash(prompt)
+        record = self._by_agent_and_hash.get((agent, digest)) or self._by_hash.get(digest)
+        if record is not None or strict:
+            return record
+        pool = self._by_agent.get(agent)
+        if not pool:
+            return None
+        cursor = self._cursors.get(agent)
+        if cursor is None:
+            cursor = itertools.cycle(pool)
+            self._cursors[agent] = cursor
+        return next(cursor)
+
+    def load_sessions(self, path: pathlib.Path) -> int:
+        """Index every step log of a training sessions.jsonl file."""
+        loaded = 0
+        if not path.exists():
+            return 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    session = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for step in session.get("step_logs") or []:
+                    if not isinstance(step, dict) or not step.get("raw_response"):
+                        continue
+                    self.add(
+                        agent=step.get("agent", ""),
+                        response=step["raw_response"],
+                        prompt=step.get("prompt_text") or None,
+                        prompt_tokens=step.get("tokens_in", 0),
+                        completion_tokens=step.get("tokens_out", 0),
+                        duration_ms=step.get("duration_ms", 0),
+                    )
+                    loaded += 1
+        return loaded
+
+    def load_fixtures(self, path: pathlib.Path) -> int:
+        """Load fixture records from a file or every .json/.jsonl file in a directory.
+
+        Each record has ``agent`` and ``response`` (string or JSON object),
+        plus ``prompt`` or ``prompt_sha256`` and optional token counts.
+        """
+        files = sorted(path.glob("*.json*")) if path.is_dir() else [path]
+        loaded = 0
+        for file in files:
+            if not file.exists():
+                continue
+            text = file.read_text(encoding="utf-8")
+            if file.suffix == ".jsonl":
+                records = [json.loads(line) for line in text.splitlines() if line.strip()]
+            else:
+                records = json.loads(text)
+                if isinstance(records, dict):
+                    records = [records]
+            for rec in records:
+                response = rec.get("response", "")
+                self.add(
+                    agent=rec.get("agent", ""),
+                    response=response if isinstance(response, str) else json.dumps(response),
+                    prompt=rec.get("prompt"),
+                    prompt_sha256=rec.get("prompt_sha256"),
+                    prompt_tokens=rec.get("prompt_tokens", 0),
+                    completion_tokens=rec.get("completion_tokens", 0),
+                    duration_ms=rec.get("duration_ms", 0),
+                )
+                loaded += 1
+        return loaded
+
+
+_store: Optional[MockResponseStore] = None
+
+
+def get_mock_store() -> MockResponseStore:
+    """Return the shared response store, loading recordings on first use."""
+    global _store
+    if _store is None:
+        _store = MockResponseStore()
+        if settings.AI_MOCK_SESSIONS_FILE:
+            count = _store.load_sessions(pathlib.Path(settings.AI_MOCK_SESSIONS_FILE))
+            print(f"[MockClient] Loaded {count} recorded step(s) from {settings.AI_MOCK_SESSIONS_FILE}")
+        if settings.AI_MOCK_FIXTURES:
+            count = _store.load_fixtures(pathlib.Path(settings.AI_MOCK_FIXTURES))
+            print(f"[MockClient] Loaded {count} fixture response(s) from {settings.AI_MOCK_FIXTURES}")
+    return _store
+
+
+class MockClient(BaseAIClient):
+    """Offline provider that replays recorded responses with simulated latency and faults."""
+
+    PROVIDER_FAILURE_ERRORS = (MockRateLimitError, asyncio.TimeoutError)
+
+    def __init__(
+        self,
+        agent_config: Optional[AgentConfig] = None,
+        store: Optional[MockResponseStore] = None,
+        seed: Optional[int] = None,
+    ):
+        self._store = store
+        self._seed = seed
+        super().__init__(agent_config)
+
+    def _setup_client(self) -> None:
+        agent_name = self.agent_config.name if self.agent_config else "default"
+        self.model_name = f"mock-{agent_name}"
+        self.breaker_key = f"mock:{agent_name}"
+        self.timeout = self.get_timeout()
+        self.max_retries = self.get_max_retries()
+        self.store = self._store if self._store is not None else get_mock_store()
+        seed = self._seed if self._seed is not None else settings.AI_MOCK_SEED
+        self._rng = random.Random(f"{seed}:{agent_name}")
+        self._init_rate_limiter(self.breaker_key)
+
+    # ── simulation ───────────────────────────────────────────────
+
+    def _agent_name(self) -> str:
+        return self.agent_config.name if self.agent_config else "default"
+
+    def _resolve(self, prompt: str) -> dict:
+        record = self.store.lookup(self._agent_name(), prompt, strict=settings.AI_MOCK_STRICT)
+        if record is not None:
+            return record
+        canned = _CANNED_RESPONSES.get(self._agent_name(), {})
+        return {"text": json.dumps(canned), "prompt_tokens": 0, "completion_tokens": 0, "duration_ms": 0}
+
+    def _latency_seconds(self, recorded_ms: int) -> float:
+        distribution = settings.AI_MOCK_LATENCY_DISTRIBUTION
+        median = settings.AI_MOCK_LATENCY_MS / 1000
+        spread = settings.AI_MOCK_LATENCY_JITTER
+        if distribution == "recorded" and recorded_ms:
+            seconds = recorded_ms / 1000
+        elif distribution == "fixed":
+            seconds = median
+        elif distribution == "uniform":
+            seconds = self._rng.uniform(median * (1 - spread), median * (1 + spread))
+        else:
+            # Log-normal: long right tail, like real LLM latencies.
+            seconds = median * math.exp(self._rng.gauss(0, spread))
+        return max(0.0, seconds * settings.AI_MOCK_LATENCY_SCALE)
+
+    async def _simulate_faults(self) -> None:
+        roll = self._rng.random()
+        if roll < settings.AI_MOCK_RATE_LIMIT_RATE:
+            await asyncio.sleep(0)
+            raise MockRateLimitError(self._rng.uniform(0.5, 2.0) * settings.AI_MOCK_LATENCY_SCALE)
+        if roll < settings.AI_MOCK_RATE_LIMIT_RATE + settings.AI_MOCK_TIMEOUT_RATE:
+            # A timed-out call holds its slot for the whole client timeout.
+            await asyncio.sleep(self.timeout * settings.AI_MOCK_LATENCY_SCALE)
+            raise asyncio.TimeoutError(f"Mock timeout after {self.timeout}s")
+
+    def _usage(self, prompt: str, record: dict) -> Tuple[int, int]:
+        prompt_tokens = record["prompt_tokens"] or estimate_prompt_tokens(prompt)
+        completion_tokens = record["completion_tokens"] or estimate_prompt_tokens(record["text"])
+        return prompt_tokens, completion_tokens
+
+    # ── BaseAIClient ─────────────────────────────────────────────
+
+    async def generate(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+        request_options: Optional[dict] = None,
+    ) -> GenerationResult:
+        wait_ms = await self._throttle(prompt, self.plan_output_tokens(prompt))
+        await self._simulate_faults()
+        record = self._resolve(prompt)
+        await asyncio.sleep(self._latency_seconds(record["duration_ms"]))
+        prompt_tokens, completion_tokens = self._usage(prompt, record)
+        return GenerationResult(
+            text=record["text"],
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            model=self.model_name,
+            rate_limit_wait_ms=wait_ms,
+            finish_reason="stop",
+        )
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        await self._throttle(prompt, self.plan_output_tokens(prompt))
+        await self._simulate_faults()
+        record = self._resolve(prompt)
+        total = self._latency_seconds(record["duration_ms"])
+        text = record["text"]
+        pieces = [text[i:i + settings.AI_MOCK_STREAM_CHUNK_CHARS]
+                  for i in range(0, len(text), settings.AI_MOCK_STREAM_CHUNK_CHARS)] or [""]
+        # Time to first token is a fifth of the call; the rest is spread
+        # evenly over the remaining chunks.
+        await asyncio.sleep(total * 0.2)
+        for piece in pieces:
+            if piece:
+                yield StreamChunk(text=piece)
+            await asyncio.sleep(total * 0.8 / len(pieces))
+        prompt_tokens, completion_tokens = self._usage(prompt, record)
+        yield StreamChunk(
+            done=True,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            model=self.model_name,
+            finish_reason="stop",
+        )
+
+    async def generate_with_retry(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> GenerationResult:
+        last_exception = None
+        backoff = 0.0
+        get_retry_budget().record_request()
+        for attempt in range(self.max_retries):
+            try:
+                return await self.generate(prompt, temperature, json_mode, response_schema=response_schema)
+            except self.PROVIDER_FAILURE_ERRORS as e:
+                print(f"[MockClient:{self._agent_name()}] Attempt {attempt + 1} transient error: {e}")
+                last_exception = e
+                if attempt == self.max_retries - 1:
+                    break
+                backoff = next_retry_delay(e, backoff, "MockClient")
+                if backoff is None:
+                    break
+                await asyncio.sleep(backoff * settings.AI_MOCK_LATENCY_SCALE)
+        raise last_exception
+
+    async def test_connection(self) -> bool:
+        return True
+
+    def get_model_info(self) -> dict:
+        return {
+            "provider": "mock",
+            "model": self.model_name,
+            "agent": self._agent_name(),
+            "recorded_responses": len(self.store),
+            "latency_distribution": settings.AI_MOCK_LATENCY_DISTRIBUTION,
+            "latency_ms": settings.AI_MOCK_LATENCY_MS,
+            "rate_limit_rate": settings.AI_MOCK_RATE_LIMIT_RATE,
+            "timeout_rate": settings.AI_MOCK_TIMEOUT_RATE,
+        }
@@ -12,14 +12,19 @@ enabling per-domain fine-tuning in the future.
 
 import json
 import asyncio
+import functools
 import re
 import time
+from dataclasses import dataclass, field, replace
 from typing import Optional, Dict, Any, List, Callable
 
 from src.config import settings
-from src.services.base_client import BaseAIClient, GenerationResult
-from src.services.gemini_client import GeminiClient
-from src.services.azure_client import AzureOpenAIClient
+from src.services.base_client import BaseAIClient, GenerationResult, estimate_prompt_tokens
+from src.services.checkpoint_store import CheckpointStore, get_checkpoint_store, stage_key
+from src.services.failover_client import create_agent_client
+from src.services.pipeline_dag import DAGRun, PipelineDAG, Stage, StageError
+from src.services.stream_json import IncrementalJSONParser, StreamJSONError
+from src.services.token_estimator import estimate_tokens
 from src.schemas.multi_agent import (
     AgentStepLog,
     AnswerIssue,
@@ -38,10 +43,199 @@ from src.prompts.sdf_generation import (
     get_inventory_generator_prompt,
     get_fix_json_prompt,
 )
-from src.services.sdf.integrator import merge_module_outputs
+from src.services.sdf.filtering import DEFAULT_QUESTION_KEYS
+from src.services.sdf.integrator import PreparedModule, merge_module_outputs, prepare_module_output
 
 PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
 
+# Per-agent outcome of parsing LLM JSON: parsed directly, fixed by the
+# repair call, or still broken after it. Exposed via /ai/diagnostics so the
+# repair-call rate can be compared with AI_STRUCTURED_OUTPUTS on and off.
+_json_parse_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _record_json_parse(agent_name: str, outcome: str) -> None:
+    stats = _json_parse_stats.setdefault(
+        agent_name, {"parsed": 0, "repaired": 0, "failed": 0, "streams_aborted": 0},
+    )
+    stats[outcome] += 1
+
+
+def _with_aborted_usage(result: GenerationResult, aborted: GenerationResult) -> GenerationResult:
+    """``result`` with the tokens and count of dropped stream attempts added."""
+    if not aborted.stream_restarts:
+        return result
+    return replace(
+        result,
+        prompt_tokens=result.prompt_tokens + aborted.prompt_tokens,
+        completion_tokens=result.completion_tokens + aborted.completion_tokens,
+        total_tokens=result.total_tokens + aborted.total_tokens,
+        stream_restarts=result.stream_restarts + aborted.stream_restarts,
+    )
+
+
+def json_repair_snapshot() -> dict:
+    agents = {}
+    for agent_name, stats in _json_parse_stats.items():
+        total = stats["parsed"] + stats["repaired"] + stats["failed"]
+        repair_calls = stats["repaired"] + stats["failed"]
+        agents[agent_name] = {
+            **stats,
+            "repair_rate": round(repair_calls / total, 4) if total else 0.0,
+        }
+    return {"structured_outputs": settings.AI_STRUCTURED_OUTPUTS, "agents": agents}
+
+
+# Speculative distributor runs (AI_SPECULATIVE_DISTRIBUTOR): how many were
+# used after the reviewer cleared and how many were thrown away on a halt.
+_speculation_stats: Dict[str, int] = {
+    "started": 0, "used": 0, "discarded": 0, "used_tokens": 0, "wasted_tokens": 0,
+}
+
+
+def speculation_snapshot() -> dict:
+    spent = _speculation_stats["used_tokens"] + _speculation_stats["wasted_tokens"]
+    return {
+        "enabled": settings.AI_SPECULATIVE_DISTRIBUTOR,
+        **_speculation_stats,
+        "wasted_rate": round(_speculation_stats["wasted_tokens"] / spent, 4) if spent else 0.0,
+    }
+
+
+# Speculative generator prefetch (AI_SPECULATIVE_GENERATORS): prefetched
+# module outputs kept (hits), re-run because the distributor's context
+# diverged (misses), or dropped because the module wasn't generated (unused).
+_prefetch_stats: Dict[str, int] = {"started": 0, "hits": 0, "misses": 0, "unused": 0, "wasted_tokens": 0}
+
+_FEATURE_STOPWORDS = {"a", "an", "and", "the", "of", "for", "with", "to", "enable", "enabled", "support"}
+_YES_ANSWERS = {"yes", "true", "on", "1", "y", "evet"}
+
+
+def generator_prefetch_snapshot() -> dict:
+    decided = _prefetch_stats["hits"] + _prefetch_stats["misses"] + _prefetch_stats["unused"]
+    return {
+        "enabled": settings.AI_SPECULATIVE_GENERATORS,
+        "min_similarity": settings.AI_SPECULATIVE_GENERATOR_MIN_SIMILARITY,
+        **_prefetch_stats,
+        "hit_rate": round(_prefetch_stats["hits"] / decided, 4) if decided else 0.0,
+    }
+
+
+def _word_set(items: List[Any]) -> set:
+    words: set = set()
+    for item in items or []:
+        words.update(w for w in re.findall(r"[a-z0-9]+", str(item).lower()) if w not in _FEATURE_STOPWORDS)
+    return words
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _context_similarity(
+    predicted: ModuleContext, predicted_shared: List[str],
+    actual: ModuleContext, actual_shared: List[str],
+) -> float:
+    """How close a predicted generator input is to the distributor's.
+
+    Averages the word overlap of the feature lists and of the shared
+    entities. The description is left out: it is prose, and the generator
+    also receives the full business description. Change instructions
+    always count as a mismatch since the prediction never has any.
+    """
+    if (actual.change_instructions or "").strip():
+        return 0.0
+    features = _jaccard(_word_set(predicted.features), _word_set(actual.features))
+    shared = _jaccard(_word_set(predicted_shared), _word_set(actual_shared))
+    return (features + shared) / 2
+
+
+GENERATOR_MODULES = ("hr", "invoice", "inventory")
+
+
+@dataclass
+class _PipelineRun:
+    """Inputs and accumulators shared by the stages of one generate_sdf run."""
+    business_description: str
+    default_question_answers: Dict[str, Any]
+    prefilled_sdf: Dict[str, Any]
+    language: str
+    selected_modules: List[str]
+    business_answers: Optional[Dict[str, Dict[str, str]]]
+    acknowledged_unsupported_features: List[str]
+    on_progress: Optional[Callable]
+    on_event: Optional[Callable[[str, Dict[str, Any]], None]]
+    run_review: bool
+    speculative: bool
+    token_usage: Dict[str, Any]
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    step_logs: List[AgentStepLog] = field(default_factory=list)
+    prefetch: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    generators_total: int = 0
+    generators_landed: int = 0
+    # Stage checkpoints (runs with a project_id). Only clarify cycles reuse
+    # them; answers to a generator's own questions are routed to it alone.
+    project_id: Optional[str] = None
+    checkpoints: Optional[CheckpointStore] = None
+    reuse_checkpoints: bool = False
+    routed_answers: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    restored: List[str] = field(default_factory=list)
+
+    def progress(self, step: str, pct: int, detail: str = "") -> None:
+        if self.on_progress:
+            self.on_progress(step, pct, detail)
+
+    def emit(self, event: str, data: Dict[str, Any]) -> None:
+        if not self.on_event:
+            return
+        try:
+            self.on_event(event, data)
+        except Exception as e:
+            # Progress listeners must never break the run.
+            print(f"[MultiAgentService] on_event failed: {e}")
+
+    def module_ready(self, module: str, output: ModuleGeneratorOutput) -> None:
+        """Publish a module's partial SDF as soon as its generator lands."""
+        self.emit("module", {
+            "module": module,
+            "entities": output.entities,
+            "module_config": output.module_config,
+            "sdf_complete": output.sdf_complete,
+        })
+
+    def entity_ready(self, module: str, index: int, entity: Dict[str, Any]) -> None:
+        slug = entity.get("slug") if isinstance(entity, dict) else None
+        self.progress("generators", 25, f"{module.upper()}: {slug or f'entity {index + 1}'} ready")
+
+    def distributor_answers(self) -> Dict[str, Any]:
+        routed = {qid for answers in self.routed_answers.values() for qid in answers}
+        return {k: v for k, v in self.default_question_answers.items() if k not in routed}
+
+    async def checkpoint(self, stage: str, key: str) -> Optional[Dict[str, Any]]:
+        if self.checkpoints is None or not self.reuse_checkpoints:
+            return None
+        saved = await self.checkpoints.get(self.project_id, stage, key)
+        if saved is not None:
+            self.restored.append(stage)
+            print(f"[MultiAgentService] Reusing the {stage} checkpoint (inputs unchanged)")
+        return saved
+
+    async def save_checkpoint(self, stage: str, key: str, payload: Dict[str, Any]) -> None:
+        if self.checkpoints is not None:
+            await self.checkpoints.put(self.project_id, stage, key, payload)
+
+    def distributor_args(self) -> Dict[str, Any]:
+        return dict(
+            business_description=self.business_description,
+            default_question_answers=self.distributor_answers(),
+            prefilled_sdf=self.prefilled_sdf,
+            language=self.language,
+            selected_modules=self.selected_modules,
+        )
+
 
 class MultiAgentService:
     """Orchestrates the multi-agent SDF generation pipeline."""
@@ -71,43 +265,76 @@ class MultiAgentService:
             config = settings.reviewer_config()
         else:
             config = settings.get_agent_config(agent_name)
-        if config.provider == "azure_openai":
-            try:
-                return AzureOpenAIClient(agent_config=config)
-            except Exception as e:
-                print(f"[MultiAgentService] Azure client init failed for {agent_name}: {e}")
-                if settings.GOOGLE_AI_API_KEY:
-                    print(f"[MultiAgentService] Falling back to Gemini for {agent_name}")
-                    config.provider = "gemini"
-                    return GeminiClient(agent_config=config)
-                raise
-        return GeminiClient(agent_config=config)
+        return create_agent_client(config, log_prefix="MultiAgentService")
 
     # ── token helpers ───────────────────────────────────────────
 
     @staticmethod
     def _empty_token_usage() -> Dict[str, Any]:
         return {
-            "reviewer": {"prompt": 0, "completion": 0, "total": 0},
-            "distributor": {"prompt": 0, "completion": 0, "total": 0},
-            "hr": {"prompt": 0, "completion": 0, "total": 0},
-            "invoice": {"prompt": 0, "completion": 0, "total": 0},
-            "inventory": {"prompt": 0, "completion": 0, "total": 0},
-            "integrator": {"prompt": 0, "completion": 0, "total": 0},
-            "json_repair": {"prompt": 0, "completion": 0, "total": 0},
-            "total": {"prompt": 0, "completion": 0, "total": 0},
+            "reviewer": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "distributor": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "hr": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "invoice": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "inventory": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "integrator": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "json_repair": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+            "total": {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
         }
 
     @staticmethod
     def _add_tokens(usage: Dict[str, Any], agent: str, result: GenerationResult) -> None:
-        bucket = usage.setdefault(agent, {"prompt": 0, "completion": 0, "total": 0})
+        bucket = usage.setdefault(agent, {"prompt": 0, "completion": 0, "total": 0, "cached": 0})
         bucket["prompt"] += result.prompt_tokens
         bucket["completion"] += result.completion_tokens
         bucket["total"] += result.total_tokens
+        bucket["cached"] = bucket.get("cached", 0) + result.cached_tokens
         total = usage["total"]
         total["prompt"] += result.prompt_tokens
         total["completion"] += result.completion_tokens
         total["total"] += result.total_tokens
+        total["cached"] = total.get("cached", 0) + result.cached_tokens
+
+    @classmethod
+    def _record_speculation(cls, usage: Dict[str, Any], wasted: Optional[GenerationResult]) -> None:
+        """Count discarded speculative work in ``usage`` and refresh the waste rate.
+
+        Wasted tokens are real spend, so they are added to the total too;
+        ``wasted_rate`` is their share of this run's total.
+        """
+        if wasted is not None:
+            cls._add_tokens(usage, "speculative_waste", wasted)
+        bucket = usage.setdefault(
+            "speculative_waste", {"prompt": 0, "completion": 0, "total": 0, "cached": 0},
+        )
+        spent = usage["total"]["total"]
+        bucket["wasted_rate"] = round(bucket["total"] / spent, 4) if spent else 0.0
+
+    async def _discard_speculative_distributor(
+        self,
+        finished: Optional[tuple],
+        distributor_args: Dict[str, Any],
+        usage: Dict[str, Any],
+    ) -> None:
+        """Account for a speculative distributor run thrown away after the reviewer halted.
+
+        ``finished`` is the distributor stage's ``(tokens, prompt, ms)`` when it
+        completed before the halt; otherwise the stage was cancelled or failed.
+        """
+        _speculation_stats["discarded"] += 1
+        if finished is not None:
+            wasted = finished[0]
+        else:
+            # The call was cut off; its prompt had already been sent, which
+            # is the bulk of what it cost. Completion tokens are unknown.
+            estimate = estimate_prompt_tokens(
+                self._distributor_prompt(**distributor_args),
+                getattr(self.distributor_client, "model_name", ""),
+            )
+            wasted = GenerationResult(text="", prompt_tokens=estimate, total_tokens=estimate)
+        _speculation_stats["wasted_tokens"] += wasted.total_tokens
+        self._record_speculation(usage, wasted)
+        print(f"[MultiAgentService] Discarded speculative distributor run ({wasted.total_tokens} tokens)")
 
     # ── step-log helper ────────────────────────────────────────
 
@@ -120,9 +347,15 @@ class MultiAgentService:
         result: GenerationResult,
         duration_ms: int,
         prompt_text: str = "",
+        started_at: Optional[float] = None,
+        ended_at: Optional[float] = None,
     ) -> AgentStepLog:
         config = settings.get_agent_config(agent_name)
-        model_str = config.model or getattr(client, "model_name", "") or getattr(client, "deployment", "") or ""
+        # The model that answered: after a failover it is not the configured one.
+        model_str = (
+            getattr(result, "model", "") or config.model
+            or getattr(client, "model_name", "") or getattr(client, "deployment", "") or ""
+        )
         return AgentStepLog(
             agent=agent_name,
             model=model_str,
@@ -133,7 +366,18 @@ class MultiAgentService:
             raw_response=result.text[:10000],
             tokens_in=result.prompt_tokens,
             tokens_out=result.completion_tokens,
+            tokens_cached=getattr(result, "cached_tokens", 0) or 0,
             duration_ms=duration_ms,
+            rate_limit_wait_ms=getattr(result, "rate_limit_wait_ms", 0) or 0,
+            hedged=getattr(result, "hedged", False),
+            hedge_won=getattr(result, "hedge_won", False),
+            hedge_extra_tokens=getattr(result, "hedge_extra_tokens", 0) or 0,
+            cache_hit=getattr(result, "cache_hit", False),
+            finish_reason=getattr(result, "finish_reason", None),
+            continuations=getattr(result, "continuations", 0) or 0,
+            stream_restarts=getattr(result, "stream_restarts", 0) or 0,
+            started_at=started_at,
+            ended_at=ended_at,
         )
 
     # ── main pipeline ───────────────────────────────────────────
@@ -148,130 +392,250 @@ class MultiAgentService:
         selected_modules: Optional[List[str]] = None,
         business_answers: Optional[Dict[str, Dict[str, str]]] = None,
         acknowledged_unsupported_features: Optional[List[str]] = None,
+        project_id: Optional[str] = None,
+        reuse_checkpoints: bool = False,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
     ) -> PipelineResult:
-        errors: List[str] = []
-        warnings: List[str] = []
-        token_usage = self._empty_token_usage()
-        step_logs: List[AgentStepLog] = []
-
-        def _progress(step: str, pct: int, detail: str = ""):
-            if on_progress:
-                on_progress(step, pct, detail)
-
-        # ── Step 0: Answer Reviewer (pre-distributor quality gate) ──
-        # Run only when the caller passed business_answers. The change-request
-        # paths (regenerate / edit) intentionally omit business_answers, which is
-        # how we distinguish them from fresh builds — prefilled_sdf can't be used
-        # for that, since fresh builds also seed prefilled_sdf.modules/entities
-        # from the module wizard answers.
+        # The answer reviewer runs only when the caller passed business_answers.
+        # The change-request paths (regenerate / edit) intentionally omit
+        # business_answers, which is how we distinguish them from fresh builds —
+        # prefilled_sdf can't be used for that, since fresh builds also seed
+        # prefilled_sdf.modules/entities from the module wizard answers.
         run_review = business_answers is not None
-        answer_review: Optional[AnswerReview] = None
-        if run_review:
-            _progress("reviewer", 5, "Reviewing your answers")
-            print("[MultiAgentService] Step 0: Running answer reviewer...")
-            t_rev = time.monotonic()
-            try:
-                answer_review, rev_tokens, rev_prompt = await self._run_answer_reviewer(
-                    business_description=business_description,
-                    business_answers=business_answers or {},
-                    default_question_answers=default_question_answers or {},
-                    selected_modules=selected_modules or [],
-                    acknowledged_unsupported_features=acknowledged_unsupported_features or [],
-                    language=language,
-                )
-                rev_ms = int((time.monotonic() - t_rev) * 1000)
-                self._add_tokens(token_usage, "reviewer", rev_tokens)
-                step_logs.append(self._build_step_log(
-                    "reviewer", self.reviewer_client,
-                    {
-                        "business_description_len": len(business_description or ""),
-                        "business_answer_ids": list((business_answers or {}).keys()),
-                        "selected_modules": selected_modules or [],
-                        "acknowledged_unsupported_features": acknowledged_unsupported_features or [],
-                    },
-                    answer_review.model_dump(exclude_none=True),
-                    rev_tokens, rev_ms,
-                    prompt_text=rev_prompt,
-                ))
-            except Exception as e:
-                # Reviewer must never break generation — log and proceed.
-                print(f"[MultiAgentService] Answer reviewer failed (non-fatal): {e}")
-                warnings.append(f"Answer reviewer skipped due to error: {str(e)}")
-                answer_review = None
-
-            if answer_review is not None:
-                # Drop unsupported_feature issues already acknowledged by the user
-                # so a second submit clears them and the pipeline moves on.
-                ack_set = {f.strip().lower() for f in (acknowledged_unsupported_features or []) if isinstance(f, str)}
-                if ack_set:
-                    answer_review.issues = [
-                        iss for iss in answer_review.issues
-                        if not (
-                            iss.kind == "unsupported_feature"
-                            and (iss.related_feature or "").strip().lower() in ack_set
-                        )
-                    ]
-                # Re-derive is_clear_to_proceed from remaining issues (don't trust LLM math).
-                has_blocking = any(iss.severity == "block" for iss in answer_review.issues)
-                has_unack_unsupported = any(
-                    iss.kind == "unsupported_feature" and iss.severity == "acknowledgeable"
-                    for iss in answer_review.issues
-                )
-                answer_review.is_clear_to_proceed = not has_blocking and not has_unack_unsupported
+        run = _PipelineRun(
+            business_description=business_description,
+            default_question_answers=default_question_answers or {},
+            prefilled_sdf=prefilled_sdf or {},
+            language=language,
+            selected_modules=selected_modules or [],
+            business_answers=business_answers,
+            acknowledged_unsupported_features=acknowledged_unsupported_features or [],
+            on_progress=on_progress,
+            on_event=on_event,
+            run_review=run_review,
+            speculative=run_review and settings.AI_SPECULATIVE_DISTRIBUTOR,
+            token_usage=self._empty_token_usage(),
+        )
+        if project_id and settings.AI_CHECKPOINTS_ENABLED:
+            run.project_id = project_id
+            run.checkpoints = get_checkpoint_store()
+            run.reuse_checkpoints = reuse_checkpoints
+            if reuse_checkpoints:
+                await self._route_clarification_answers(run)
+        dag = PipelineDAG(
+            self._pipeline_stages(run), limits={"llm": settings.AI_PIPELINE_MAX_LLM_STAGES},
+            on_event=run.emit if on_event else None,
+        )
+        try:
+            outcome = await dag.run()
+        except BaseException as e:
+            for entry in run.prefetch.values():
+                entry["task"].cancel()
+            if isinstance(e, StageError):
+                raise e.error from None
+            raise
+        print(f"[MultiAgentService] Stage trace: {outcome.summary()}")
+        return await self._pipeline_result(run, outcome)
+
+    # ── pipeline stages ─────────────────────────────────────────
+
+    def _pipeline_stages(self, run: "_PipelineRun") -> List[Stage]:
+        """The generate_sdf stage graph.
+
+        Order follows the declared inputs: in speculative mode the
+        distributor and generator prefetch don't wait for ``answer_review``,
+        so they run alongside the reviewer and are cancelled by its halt.
+        The module generators only share upstream inputs, so they run
+        concurrently and each is prepared for the merge as it lands.
+        """
+        after_review = () if run.speculative else ("answer_review",)
+
+        def stage(name: str, fn: Callable, inputs, outputs, **kwargs) -> Stage:
+            timeout, retries = settings.stage_policy(name)
+            return Stage(
+                name=name, run=functools.partial(fn, run), inputs=tuple(inputs), outputs=tuple(outputs),
+                timeout=timeout, retries=retries, **kwargs,
+            )
 
-                if not answer_review.is_clear_to_proceed:
-                    print(
-                        f"[MultiAgentService] Answer review halted pipeline — "
-                        f"{len(answer_review.issues)} issue(s), blocking={has_blocking}"
-                    )
-                    _progress("answer_review", 8, "Waiting for your review")
-                    return PipelineResult(
-                        success=True,
-                        sdf=None,
-                        sdf_complete=False,
-                        answer_review=answer_review,
-                        halted_reason="answer_review",
-                        token_usage=token_usage,
-                        step_logs=step_logs,
-                        warnings=warnings,
-                    )
+        generators = [
+            stage(
+                f"{module}_generator", functools.partial(self._stage_generator, module),
+                ("distributor_output", "modules_to_generate", "entity_scopes", "prefetched"),
+                (f"{module}_output",),
+                concurrency="llm",
+                when=lambda v, module=module: module in v["modules_to_generate"],
+                error_output=f"{module}_error",
+            )
+            for module in GENERATOR_MODULES
+        ]
+        generated = [key for module in GENERATOR_MODULES for key in (f"{module}_output", f"{module}_error")]
+        return [
+            stage(
+                "reviewer", self._stage_reviewer, (), ("answer_review",),
+                concurrency="llm",
+                when=lambda _: run.run_review,
+                halt=lambda v: (
+                    "answer_review"
+                    if v["answer_review"] is not None and not v["answer_review"].is_clear_to_proceed else None
+                ),
+            ),
+            stage(
+                "distributor", self._stage_distributor, after_review, ("distributor_output", "distributor_call"),
+                concurrency="llm",
+                error_output="distributor_error",
+            ),
+            stage("prefetch", self._stage_prefetch, after_review, ("prefetch",), when=lambda _: run.run_review),
+            stage(
+                "gatekeeper", self._stage_gatekeeper,
+                ("answer_review", "distributor_output", "distributor_call", "distributor_error"),
+                ("gate", "clarifications", "unsupported_features"),
+                halt=lambda v: v["gate"],
+            ),
+            stage(
+                "plan", self._stage_plan, ("distributor_output", "gate", "prefetch"),
+                ("modules_to_generate", "skipped_modules", "entity_scopes", "inferred_dropped_modules", "prefetched"),
+            ),
+            *generators,
+            stage(
+                "assemble", self._stage_assemble, ("modules_to_generate", "skipped_modules", *generated),
+                ("module_outputs", "prepared_modules"),
+                halt=lambda v: None if v["module_outputs"] else "no_module_outputs",
+            ),
+            stage(
+                "merge", self._stage_merge, ("distributor_output", "module_outputs", "prepared_modules"), ("final_sdf",),
+                concurrency="cpu",
+            ),
+            stage(
+                "finalize", self._stage_finalize, ("final_sdf", "module_outputs"),
+                ("clarifications_needed", "sdf_complete"),
+            ),
+        ]
 
-        # Step 1: Distributor
-        _progress("distributor", 10, "Analyzing your business requirements")
-        print("[MultiAgentService] Step 1: Running distributor...")
-        t0 = time.monotonic()
+    async def _stage_reviewer(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Step 0: answer reviewer (pre-distributor quality gate)."""
+        run.progress("reviewer", 5, "Reviewing your answers")
+        print("[MultiAgentService] Step 0: Running answer reviewer...")
+        t_rev = time.monotonic()
+        answer_review: Optional[AnswerReview] = None
         try:
-            distributor_output, dist_tokens, dist_prompt = await self._run_distributor(
-                business_description,
-                default_question_answers or {},
-                prefilled_sdf or {},
-                language=language,
-                selected_modules=selected_modules or [],
+            answer_review, rev_tokens, rev_prompt = await self._run_answer_reviewer(
+                business_description=run.business_description,
+                business_answers=run.business_answers or {},
+                default_question_answers=run.default_question_answers,
+                selected_modules=run.selected_modules,
+                acknowledged_unsupported_features=run.acknowledged_unsupported_features,
+                language=run.language,
+            )
+            rev_ms = int((time.monotonic() - t_rev) * 1000)
+            self._add_tokens(run.token_usage, "reviewer", rev_tokens)
+            run.step_logs.append(self._build_step_log(
+                "reviewer", self.reviewer_client,
+                {
+                    "business_description_len": len(run.business_description or ""),
+                    "business_answer_ids": list((run.business_answers or {}).keys()),
+                    "selected_modules": run.selected_modules,
+                    "acknowledged_unsupported_features": run.acknowledged_unsupported_features,
+                },
+                answer_review.model_dump(exclude_none=True),
+                rev_tokens, rev_ms,
+                prompt_text=rev_prompt,
+            ))
+        except Exception as e:
+            # Reviewer must never break generation — log and proceed.
+            print(f"[MultiAgentService] Answer reviewer failed (non-fatal): {e}")
+            run.warnings.append(f"Answer reviewer skipped due to error: {str(e)}")
+            return {"answer_review": None}
+
+        # Drop unsupported_feature issues already acknowledged by the user
+        # so a second submit clears them and the pipeline moves on.
+        ack_set = {f.strip().lower() for f in run.acknowledged_unsupported_features if isinstance(f, str)}
+        if ack_set:
+            answer_review.issues = [
+                iss for iss in answer_review.issues
+                if not (
+                    iss.kind == "unsupported_feature"
+                    and (iss.related_feature or "").strip().lower() in ack_set
+                )
+            ]
+        # Re-derive is_clear_to_proceed from remaining issues (don't trust LLM math).
+        has_blocking = any(iss.severity == "block" for iss in answer_review.issues)
+        has_unack_unsupported = any(
+            iss.kind == "unsupported_feature" and iss.severity == "acknowledgeable"
+            for iss in answer_review.issues
+        )
+        answer_review.is_clear_to_proceed = not has_blocking and not has_unack_unsupported
+
+        if not answer_review.is_clear_to_proceed:
+            print(
+                f"[MultiAgentService] Answer review halted pipeline — "
+                f"{len(answer_review.issues)} issue(s), blocking={has_blocking}"
             )
-            dist_ms = int((time.monotonic() - t0) * 1000)
-            self._add_tokens(token_usage, "distributor", dist_tokens)
-            warnings.extend(distributor_output.warnings)
-            step_logs.append(self._build_step_log(
+            run.progress("answer_review", 8, "Waiting for your review")
+        return {"answer_review": answer_review}
+
+    async def _stage_distributor(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Step 1: distributor. Accounting happens in the gatekeeper, once the
+        run is known to continue; a speculative run may still be discarded."""
+        if run.speculative:
+            print("[MultiAgentService] Starting distributor speculatively alongside the reviewer")
+            _speculation_stats["started"] += 1
+        else:
+            run.progress("distributor", 10, "Analyzing your business requirements")
+            print("[MultiAgentService] Step 1: Running distributor...")
+        # prefilled_sdf stays out of the key: on clarify it is the previous
+        # cycle's own output sent back.
+        key = stage_key(
+            "distributor", run.business_description, run.distributor_answers(), run.language, run.selected_modules,
+        )
+        saved = await run.checkpoint("distributor", key)
+        if saved is not None:
+            return {"distributor_output": DistributorOutput.model_validate(saved["output"]), "distributor_call": None}
+        t0 = time.monotonic()
+        output, tokens, prompt = await self._run_distributor(**run.distributor_args())
+        await run.save_checkpoint("distributor", key, {"output": output.model_dump(mode="json")})
+        return {
+            "distributor_output": output,
+            "distributor_call": (tokens, prompt, int((time.monotonic() - t0) * 1000)),
+        }
+
+    async def _stage_prefetch(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        run.prefetch = self._start_generator_prefetch(**run.distributor_args())
+        return {"prefetch": run.prefetch}
+
+    async def _stage_gatekeeper(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Account for the distributor and stop on its failure or clarifications."""
+        if run.speculative:
+            run.progress("distributor", 10, "Analyzing your business requirements")
+            print("[MultiAgentService] Step 1: Running distributor...")
+        error = v["distributor_error"]
+        if error is not None:
+            print(f"[MultiAgentService] Distributor failed: {error}")
+            run.errors.append(f"Distributor agent failed: {str(error)}")
+            return {"gate": "distributor_failed"}
+
+        distributor_output: DistributorOutput = v["distributor_output"]
+        run.warnings.extend(distributor_output.warnings)
+        # A restored distributor made no call: nothing to account or log.
+        if v["distributor_call"] is not None:
+            dist_tokens, dist_prompt, dist_ms = v["distributor_call"]
+            if run.speculative:
+                _speculation_stats["used"] += 1
+                _speculation_stats["used_tokens"] += dist_tokens.total_tokens
+                self._record_speculation(run.token_usage, wasted=None)
+            self._add_tokens(run.token_usage, "distributor", dist_tokens)
+            run.step_logs.append(self._build_step_log(
                 "distributor", self.distributor_client,
                 {
-                    "business_description": business_description,
-                    "default_question_answers": default_question_answers or {},
-                    "prefilled_sdf_keys": list((prefilled_sdf or {}).get("modules", {}).keys()),
+                    "business_description": run.business_description,
+                    "default_question_answers": run.distributor_answers(),
+                    "prefilled_sdf_keys": list(run.prefilled_sdf.get("modules", {}).keys()),
                 },
                 distributor_output.model_dump(exclude_none=True),
                 dist_tokens, dist_ms,
                 prompt_text=dist_prompt,
             ))
-        except Exception as e:
-            print(f"[MultiAgentService] Distributor failed: {e}")
-            return PipelineResult(
-                success=False,
-                errors=[f"Distributor agent failed: {str(e)}"],
-                token_usage=token_usage,
-                step_logs=step_logs,
-            )
 
-        # ── Gatekeeper: parse distributor clarifications & unsupported features ──
+        # Parse distributor clarifications & unsupported features
         dist_clarifications = self._parse_clarifications(
             [q.model_dump() if hasattr(q, "model_dump") else q for q in distributor_output.clarifications_needed],
             "distributor",
@@ -283,21 +647,13 @@ class MultiAgentService:
 
         if dist_clarifications:
             print(f"[MultiAgentService] Distributor returned {len(dist_clarifications)} clarification(s) — stopping pipeline early")
-            _progress("clarifications", 20, "Waiting for your answers")
-            return PipelineResult(
-                success=True,
-                sdf=None,
-                sdf_complete=False,
-                distributor_output=distributor_output,
-                clarifications_needed=dist_clarifications,
-                unsupported_features=unsupported,
-                answer_review=answer_review,
-                halted_reason="clarifications",
-                token_usage=token_usage,
-                step_logs=step_logs,
-                warnings=warnings,
-            )
+            run.progress("clarifications", 20, "Waiting for your answers")
+            return {"gate": "clarifications", "clarifications": dist_clarifications, "unsupported_features": unsupported}
+        return {"gate": None, "clarifications": [], "unsupported_features": unsupported}
 
+    async def _stage_plan(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Decide which modules to generate, skip or scope to a few entities."""
+        distributor_output: DistributorOutput = v["distributor_output"]
         modules_needed = list(distributor_output.modules_needed or [])
         print(f"[MultiAgentService] Modules needed: {modules_needed}")
 
@@ -307,8 +663,8 @@ class MultiAgentService:
         # but Plan D follow-up #8 records the drop in `inferred_dropped_modules`
         # so the generation report can surface what was clamped.
         inferred_dropped_modules: List[str] = []
-        if selected_modules:
-            allow = {m.strip().lower() for m in selected_modules if isinstance(m, str) and m.strip()}
+        if run.selected_modules:
+            allow = {m.strip().lower() for m in run.selected_modules if isinstance(m, str) and m.strip()}
             dropped = [
                 m.lower()
                 for m in modules_needed
@@ -329,89 +685,128 @@ class MultiAgentService:
             distributor_output.modules_needed = kept
 
         # Determine which modules actually need regeneration vs. carry-forward
-        context_for = {
-            "hr": distributor_output.hr_context,
-            "invoice": distributor_output.invoice_context,
-            "inventory": distributor_output.inventory_context,
-        }
+        context_for = {module: getattr(distributor_output, f"{module}_context") for module in GENERATOR_MODULES}
         skipped_modules: Dict[str, Any] = {}
         modules_to_generate = []
         for mod in modules_needed:
             ctx = context_for.get(mod)
-            if ctx and not ctx.changed and prefilled_sdf:
+            if ctx and not ctx.changed and run.prefilled_sdf:
                 skipped_modules[mod] = True
                 print(f"[MultiAgentService] Skipping {mod.upper()} generator (unchanged in change request)")
             else:
                 modules_to_generate.append(mod)
 
         module_labels = ", ".join(m.upper() for m in modules_to_generate) if modules_to_generate else "modules"
-        _progress("generators", 25, f"Generating {module_labels} configurations")
+        run.progress("generators", 25, f"Generating {module_labels} configurations")
         print(f"[MultiAgentService] Step 2: Running module generators for: {modules_to_generate}")
-        module_outputs: Dict[str, ModuleGeneratorOutput] = {}
-        generator_tasks = []
+        run.generators_total = len([m for m in GENERATOR_MODULES if m in modules_to_generate])
+
+        # Change requests that touch a few entities regenerate only those.
+        entity_scopes: Dict[str, List[str]] = {}
+        if settings.AI_INCREMENTAL_ENTITIES and not run.run_review and run.prefilled_sdf:
+            for mod in modules_to_generate:
+                scope = self._entity_scope(mod, context_for.get(mod), run.prefilled_sdf)
+                if scope:
+                    entity_scopes[mod] = scope
+                    print(f"[MultiAgentService] Regenerating only {scope} for {mod.upper()} (entity-level change)")
+        prefetched = await self._claim_generator_prefetch(
+            v["prefetch"] or {}, modules_to_generate, context_for, distributor_output.shared_entities, run.token_usage,
+        )
+        return {
+            "modules_to_generate": modules_to_generate,
+            "skipped_modules": skipped_modules,
+            "entity_scopes": entity_scopes,
+            "inferred_dropped_modules": inferred_dropped_modules,
+            "prefetched": prefetched,
+        }
 
-        answers = default_question_answers or {}
-        pre_sdf = prefilled_sdf or {}
-        if "hr" in modules_to_generate:
-            generator_tasks.append(("hr", self._run_hr_generator(
-                business_description, distributor_output.hr_context, distributor_output.shared_entities, answers, pre_sdf,
-                language=language,
-            )))
-        if "invoice" in modules_to_generate:
-            generator_tasks.append(("invoice", self._run_invoice_generator(
-                business_description, distributor_output.invoice_context, distributor_output.shared_entities, answers, pre_sdf,
-                language=language,
-            )))
-        if "inventory" in modules_to_generate:
-            generator_tasks.append(("inventory", self._run_inventory_generator(
-                business_description, distributor_output.inventory_context, distributor_output.shared_entities, answers, pre_sdf,
-                language=language,
-            )))
+    async def _stage_generator(self, module: str, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Step 2: one module generator, prepared for the merge as soon as it lands."""
+        distributor_output: DistributorOutput = v["distributor_output"]
+        ctx = getattr(distributor_output, f"{module}_context")
+        scope = v["entity_scopes"].get(module)
+        clarification_answers = run.routed_answers.get(module, {})
+        prefix = self._ANSWER_PREFIXES[module]
+        key = stage_key(
+            f"{module}_generator", run.business_description,
+            ctx.model_dump(mode="json") if ctx else None, distributor_output.shared_entities,
+            {k: a for k, a in run.default_question_answers.items() if k.startswith(prefix)},
+            clarification_answers, run.language, scope,
+        )
+        saved = await run.checkpoint(f"{module}_generator", key)
+        if saved is not None:
+            output = self._restored_generator_output(module, saved, run.prefilled_sdf)
+            run.module_ready(module, output)
+            run.generators_landed += 1
+            run.progress("generators", 25 + 30 * run.generators_landed // max(run.generators_total, 1),
+                         f"{module.upper()} configuration ready")
+            return {f"{module}_output": (output, prepare_module_output(output.module, output))}
+
+        # Popped so a retried stage generates afresh instead of re-awaiting it.
+        prefetched = v["prefetched"].pop(module, None)
+        if prefetched is not None:
+            _, result, started_at, ended_at = await prefetched
+            if isinstance(result, Exception):
+                raise result
+        else:
+            started_at = time.time()
+            result = await getattr(self, f"_run_{module}_generator")(
+                run.business_description, ctx, distributor_output.shared_entities,
+                run.default_question_answers, run.prefilled_sdf,
+                language=run.language, on_entity=run.entity_ready, entity_scope=scope,
+                clarification_answers=clarification_answers,
+            )
+            ended_at = time.time()
+        output, gen_tokens, gen_prompt = result
+        if scope:
+            output = self._apply_entity_scope(module, output, scope, run.prefilled_sdf)
+        await run.save_checkpoint(f"{module}_generator", key, {"output": output.model_dump(mode="json")})
+        prepared = prepare_module_output(output.module, output)
+        run.module_ready(module, output)
+        run.generators_landed += 1
+        run.progress("generators", 25 + 30 * run.generators_landed // max(run.generators_total, 1),
+                     f"{module.upper()} configuration ready")
+        self._add_tokens(run.token_usage, module, gen_tokens)
+        run.step_logs.append(self._build_step_log(
+            f"{module}_generator", getattr(self, f"{module}_client", self.hr_client),
+            {
+                "business_description": run.business_description,
+                "module": module,
+                "module_context": ctx.model_dump(exclude_none=True) if ctx else {},
+                "shared_entities": distributor_output.shared_entities,
+                "entity_scope": scope,
+            },
+            output.model_dump(exclude_none=True),
+            gen_tokens, int((ended_at - started_at) * 1000),
+            prompt_text=gen_prompt,
+            started_at=started_at,
+            ended_at=ended_at,
+        ))
+        return {f"{module}_output": (output, prepared)}
 
-        if generator_tasks:
-            coros = [t[1] for t in generator_tasks]
-            names = [t[0] for t in generator_tasks]
-            gen_start = time.monotonic()
-            results = await asyncio.gather(*coros, return_exceptions=True)
-            gen_elapsed_ms = int((time.monotonic() - gen_start) * 1000)
-
-            context_map = {
-                "hr": distributor_output.hr_context,
-                "invoice": distributor_output.invoice_context,
-                "inventory": distributor_output.inventory_context,
-            }
-
-            for name, result in zip(names, results):
-                if isinstance(result, Exception):
-                    errors.append(f"Module generator ({name}) failed: {str(result)}")
-                else:
-                    output, gen_tokens, gen_prompt = result
-                    module_outputs[output.module] = output
-                    warnings.extend(output.warnings)
-                    self._add_tokens(token_usage, name, gen_tokens)
-                    client_map = {"hr": self.hr_client, "invoice": self.invoice_client, "inventory": self.inventory_client}
-                    ctx = context_map.get(name)
-                    step_logs.append(self._build_step_log(
-                        f"{name}_generator", client_map.get(name, self.hr_client),
-                        {
-                            "business_description": business_description,
-                            "module": name,
-                            "module_context": ctx.model_dump(exclude_none=True) if ctx else {},
-                            "shared_entities": distributor_output.shared_entities,
-                        },
-                        output.model_dump(exclude_none=True),
-                        gen_tokens, gen_elapsed_ms,
-                        prompt_text=gen_prompt,
-                    ))
+    async def _stage_assemble(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Collect generator outputs and carry forward what wasn't regenerated."""
+        module_outputs: Dict[str, ModuleGeneratorOutput] = {}
+        prepared_modules: Dict[str, PreparedModule] = {}
+        # Keep the configured module order: the merge takes the first
+        # module's definition of a shared entity as its base.
+        for name in GENERATOR_MODULES:
+            if name not in v["modules_to_generate"]:
+                continue
+            error = v[f"{name}_error"]
+            if error is not None:
+                run.errors.append(f"Module generator ({name}) failed: {str(error)}")
+                continue
+            output, prepared = v[f"{name}_output"]
+            module_outputs[output.module] = output
+            prepared_modules[output.module] = prepared
+            run.warnings.extend(output.warnings)
 
+        pre_sdf = run.prefilled_sdf
         # Carry forward skipped modules from prefilled SDF as synthetic outputs
-        for mod_name in skipped_modules:
+        for mod_name in v["skipped_modules"]:
             mod_config = (pre_sdf.get("modules") or {}).get(mod_name, {})
-            mod_entities = [
-                e for e in (pre_sdf.get("entities") or [])
-                if mod_name in (e.get("belongs_to") if isinstance(e.get("belongs_to"), list) else [e.get("belongs_to", "")])
-                or e.get("module") == mod_name
-            ]
+            mod_entities = self._module_entities(pre_sdf, mod_name)
             module_outputs[mod_name] = ModuleGeneratorOutput(
                 module=mod_name,
                 entities=mod_entities,
@@ -442,6 +837,7 @@ class MultiAgentService:
                 host_out = module_outputs[host_key]
                 host_entities = list(host_out.entities) if hasattr(host_out, "entities") else list(host_out.get("entities", []))
                 host_entities.extend(shared_carry)
+                prepared_modules.pop(host_key, None)
                 module_outputs[host_key] = ModuleGeneratorOutput(
                     module=host_out.module if hasattr(host_out, "module") else host_out.get("module", host_key),
                     entities=host_entities,
@@ -450,20 +846,24 @@ class MultiAgentService:
                     warnings=list(host_out.warnings) if hasattr(host_out, "warnings") else list(host_out.get("warnings", [])),
                 )
                 print(f"[MultiAgentService] Carried forward {len(shared_carry)} shared entities (appended to {host_key.upper()})")
-
-        if not module_outputs:
-            return PipelineResult(
-                success=False,
-                distributor_output=distributor_output,
-                errors=errors or ["No module outputs generated"],
-                warnings=warnings,
-                token_usage=token_usage,
-                step_logs=step_logs,
-                inferred_dropped_modules=inferred_dropped_modules,
-            )
-
-        # Step 3: Deterministic merge (replaces LLM integrator)
-        _progress("integrator", 60, "Combining modules into your ERP")
+        return {"module_outputs": module_outputs, "prepared_modules": prepared_modules}
+
+    async def _stage_merge(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        """Step 3: deterministic merge (replaces LLM integrator)."""
+        distributor_output: DistributorOutput = v["distributor_output"]
+        module_outputs = v["module_outputs"]
+        run.progress("integrator", 60, "Combining modules into your ERP")
+        key = stage_key(
+            "merge", distributor_output.project_name,
+            {name: output.model_dump(mode="json") for name, output in module_outputs.items()},
+            distributor_output.shared_entities, run.prefilled_sdf,
+        )
+        saved = await run.checkpoint("merge", key)
+        if saved is not None:
+            final_sdf = saved["final_sdf"]
+            if isinstance(final_sdf.get("warnings"), list):
+                run.warnings.extend(final_sdf["warnings"])
+            return {"final_sdf": final_sdf}
         print("[MultiAgentService] Step 3: Merging module outputs (deterministic)...")
         t_integ = time.monotonic()
 
@@ -471,14 +871,15 @@ class MultiAgentService:
             project_name=distributor_output.project_name,
             module_outputs=module_outputs,
             shared_entity_hints=distributor_output.shared_entities,
-            prefilled_sdf=prefilled_sdf or {},
+            prefilled_sdf=run.prefilled_sdf,
+            prepared=v["prepared_modules"],
         )
         integ_ms = int((time.monotonic() - t_integ) * 1000)
         print(f"[MultiAgentService] Merge completed in {integ_ms}ms — "
               f"{len(final_sdf.get('entities', []))} entities, "
               f"{len(final_sdf.get('modules', {}))} modules")
 
-        step_logs.append(AgentStepLog(
+        run.step_logs.append(AgentStepLog(
             agent="integrator",
             model="deterministic",
             temperature=0.0,
@@ -496,33 +897,210 @@ class MultiAgentService:
             duration_ms=integ_ms,
         ))
 
+        await run.save_checkpoint("merge", key, {"final_sdf": final_sdf})
         if isinstance(final_sdf.get("warnings"), list):
-            warnings.extend(final_sdf["warnings"])
+            run.warnings.extend(final_sdf["warnings"])
+        return {"final_sdf": final_sdf}
 
-        _progress("finalizing", 80, "Checking for follow-up questions")
+    async def _stage_finalize(self, run: "_PipelineRun", v: Dict[str, Any]) -> Dict[str, Any]:
+        run.progress("finalizing", 80, "Checking for follow-up questions")
+        module_outputs = v["module_outputs"]
         aggregated_clarifications = self._aggregate_clarifications(module_outputs, [])
 
         all_modules_complete = all(
             output.sdf_complete for output in module_outputs.values()
         )
-        pipeline_complete = all_modules_complete and len(aggregated_clarifications) == 0
+        return {
+            "clarifications_needed": aggregated_clarifications,
+            "sdf_complete": all_modules_complete and len(aggregated_clarifications) == 0,
+        }
+
+    async def _pipeline_result(self, run: "_PipelineRun", outcome: DAGRun) -> PipelineResult:
+        """Turn a finished (or halted) stage run into the PipelineResult."""
+        v = outcome.values
+        common = dict(
+            token_usage=run.token_usage,
+            step_logs=run.step_logs,
+            stage_trace=[
+                {**timing.as_dict(), "restored": timing.stage in run.restored} for timing in outcome.trace
+            ],
+        )
+        reason = outcome.halt_reason
+        if reason == "answer_review" and run.speculative:
+            await self._discard_speculative_distributor(v.get("distributor_call"), run.distributor_args(), run.token_usage)
+        if reason is not None:
+            await self._drop_generator_prefetch(run.prefetch, run.token_usage)
 
+        if reason == "answer_review":
+            return PipelineResult(
+                success=True,
+                sdf=None,
+                sdf_complete=False,
+                answer_review=v["answer_review"],
+                halted_reason="answer_review",
+                warnings=run.warnings,
+                **common,
+            )
+        if reason == "distributor_failed":
+            return PipelineResult(success=False, errors=run.errors, **common)
+        if reason == "clarifications":
+            return PipelineResult(
+                success=True,
+                sdf=None,
+                sdf_complete=False,
+                distributor_output=v["distributor_output"],
+                clarifications_needed=v["clarifications"],
+                unsupported_features=v["unsupported_features"],
+                answer_review=v["answer_review"],
+                halted_reason="clarifications",
+                warnings=run.warnings,
+                **common,
+            )
+        if reason == "no_module_outputs":
+            return PipelineResult(
+                success=False,
+                distributor_output=v["distributor_output"],
+                errors=run.errors or ["No module outputs generated"],
+                warnings=run.warnings,
+                inferred_dropped_modules=v["inferred_dropped_modules"],
+                **common,
+            )
         return PipelineResult(
             success=True,
-            sdf=final_sdf,
-            sdf_complete=pipeline_complete,
-            distributor_output=distributor_output,
-            module_outputs=module_outputs,
-            clarifications_needed=aggregated_clarifications,
-            unsupported_features=unsupported,
-            answer_review=answer_review,
-            token_usage=token_usage,
-            step_logs=step_logs,
-            errors=errors,
-            warnings=warnings,
-            inferred_dropped_modules=inferred_dropped_modules,
+            sdf=v["final_sdf"],
+            sdf_complete=v["sdf_complete"],
+            distributor_output=v["distributor_output"],
+            module_outputs=v["module_outputs"],
+            clarifications_needed=v["clarifications_needed"],
+            unsupported_features=v["unsupported_features"],
+            answer_review=v["answer_review"],
+            errors=run.errors,
+            warnings=run.warnings,
+            inferred_dropped_modules=v["inferred_dropped_modules"],
+            **common,
         )
 
+    def _start_generator_prefetch(
+        self,
+        business_description: str,
+        default_question_answers: Dict[str, Any],
+        prefilled_sdf: Dict[str, Any],
+        language: str = "en",
+        selected_modules: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Start generators for the selected modules before the distributor answers.
+
+        Only modules the user selected and answered wizard questions for are
+        prefetched; their context is predicted from those answers (enabled
+        features) and the prefilled SDF (entity hints, shared entities).
+        """
+        if not settings.AI_SPECULATIVE_GENERATORS or not selected_modules:
+            return {}
+        prefetch: Dict[str, Dict[str, Any]] = {}
+        selected = {m.strip().lower() for m in selected_modules if isinstance(m, str)}
+        for module in ("hr", "invoice", "inventory"):
+            keys = DEFAULT_QUESTION_KEYS[module]
+            if module not in selected or not any(k in default_question_answers for k in keys):
+                continue
+            context, shared = self._predict_module_context(module, default_question_answers, prefilled_sdf)
+            runner = getattr(self, f"_run_{module}_generator")
+            task = asyncio.ensure_future(self._timed_generator(module, runner(
+                business_description, context, shared, default_question_answers, prefilled_sdf,
+                language=language,
+            )))
+            prompt = self._generator_prompt(
+                module, business_description, context, shared, default_question_answers, prefilled_sdf, language,
+            )
+            prefetch[module] = {"context": context, "shared": shared, "task": task, "prompt": prompt}
+            _prefetch_stats["started"] += 1
+        if prefetch:
+            print(f"[MultiAgentService] Prefetching generators for {sorted(prefetch)} while the distributor runs")
+        return prefetch
+
+    @staticmethod
+    def _predict_module_context(
+        module: str, default_question_answers: Dict[str, Any], prefilled_sdf: Dict[str, Any],
+    ) -> tuple[ModuleContext, List[str]]:
+        prefix = MultiAgentService._ANSWER_PREFIXES[module]
+        features = []
+        for key in DEFAULT_QUESTION_KEYS[module]:
+            value = default_question_answers.get(key)
+            if value is True or str(value).strip().lower() in _YES_ANSWERS:
+                features.append(key[len(prefix):].replace("enable_", "").replace("_", " "))
+        entities = [e for e in (prefilled_sdf.get("entities") or []) if isinstance(e, dict) and e.get("slug")]
+        hints = [e["slug"] for e in entities if (e.get("module") or "").lower() == module]
+        shared = [e["slug"] for e in entities if (e.get("module") or "").lower() == "shared"]
+        return ModuleContext(enabled=True, changed=True, entities_hint=hints, features=features), shared
+
+    async def _claim_generator_prefetch(
+        self,
+        prefetch: Dict[str, Dict[str, Any]],
+        modules_to_generate: List[str],
+        context_for: Dict[str, ModuleContext],
+        shared_entities: List[str],
+        usage: Dict[str, Any],
+    ) -> Dict[str, "asyncio.Task"]:
+        """Keep prefetched generators whose predicted input is close enough.
+
+        Returns the kept tasks by module. Prefetches for modules that diverged
+        or are not being generated are cancelled and counted as waste.
+        """
+        kept: Dict[str, asyncio.Task] = {}
+        for module, entry in list(prefetch.items()):
+            if module not in modules_to_generate:
+                _prefetch_stats["unused"] += 1
+                continue
+            similarity = _context_similarity(entry["context"], entry["shared"], context_for[module], shared_entities)
+            if similarity >= settings.AI_SPECULATIVE_GENERATOR_MIN_SIMILARITY:
+                _prefetch_stats["hits"] += 1
+                kept[module] = prefetch.pop(module)["task"]
+                print(f"[MultiAgentService] Prefetched {module.upper()} generator kept (similarity {similarity:.2f})")
+            else:
+                _prefetch_stats["misses"] += 1
+                print(f"[MultiAgentService] Prefetched {module.upper()} generator diverged (similarity {similarity:.2f}); re-running")
+        await self._drop_generator_prefetch(prefetch, usage, count_unused=False)
+        if kept:
+            self._record_speculation(usage, wasted=None)
+        return kept
+
+    async def _drop_generator_prefetch(
+        self, prefetch: Dict[str, Dict[str, Any]], usage: Dict[str, Any], count_unused: bool = True,
+    ) -> None:
+        """Cancel prefetched generators that won't be used and record their cost."""
+        for module, entry in prefetch.items():
+            task = entry["task"]
+            if count_unused:
+                _prefetch_stats["unused"] += 1
+            wasted: Optional[GenerationResult] = None
+            if task.done() and not task.cancelled():
+                result = task.result()[1]
+                if not isinstance(result, Exception):
+                    wasted = result[1]
+            if wasted is None:
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                # Cut off mid-flight: the prompt was sent, the output unknown.
+                estimate = estimate_prompt_tokens(
+                    entry["prompt"], getattr(getattr(self, f"{module}_client", None), "model_name", ""),
+                )
+                wasted = GenerationResult(text="", prompt_tokens=estimate, total_tokens=estimate)
+            _prefetch_stats["wasted_tokens"] += wasted.total_tokens
+            self._record_speculation(usage, wasted)
+        prefetch.clear()
+
+    @staticmethod
+    async def _timed_generator(name: str, coro) -> tuple[str, Any, float, float]:
+        """Run one generator, returning its result (or exception) and wall-clock span."""
+        started_at = time.time()
+        try:
+            result = await coro
+        except Exception as e:
+            result = e
+        return name, result, started_at, time.time()
+
     # ── individual agents ───────────────────────────────────────
 
     @staticmethod
@@ -612,23 +1190,33 @@ class MultiAgentService:
         )
         return review, result, prompt
 
-    async def _run_distributor(
+    def _distributor_prompt(
         self, business_description: str,
         default_question_answers: Dict[str, Any],
         prefilled_sdf: Dict[str, Any],
         language: str = "en",
         selected_modules: Optional[List[str]] = None,
-    ) -> tuple[DistributorOutput, GenerationResult, str]:
+    ) -> str:
         default_questions_str = json.dumps(default_question_answers, indent=2) if default_question_answers else ""
         existing_modules_str = self._build_existing_modules_summary(prefilled_sdf)
-
-        prompt = get_distributor_prompt(
+        return get_distributor_prompt(
             business_description,
             default_questions_str,
             existing_modules_str,
             language=language,
             selected_modules=selected_modules or [],
         )
+
+    async def _run_distributor(
+        self, business_description: str,
+        default_question_answers: Dict[str, Any],
+        prefilled_sdf: Dict[str, Any],
+        language: str = "en",
+        selected_modules: Optional[List[str]] = None,
+    ) -> tuple[DistributorOutput, GenerationResult, str]:
+        prompt = self._distributor_prompt(
+            business_description, default_question_answers, prefilled_sdf, language, selected_modules,
+        )
         result = await self.distributor_client.generate_with_retry(
             prompt, temperature=self.distributor_client.get_temperature(), response_schema=DistributorOutput,
         )
@@ -658,14 +1246,140 @@ class MultiAgentService:
         return output, result, prompt
 
     @staticmethod
-    def _extract_module_prefilled(prefilled_sdf: Dict[str, Any], module_name: str) -> str:
+    def _prefilled_role(entity: Any, module_name: str) -> Optional[str]:
+        """How ``module_name``'s generator relates to a prefilled entity.
+
+        "shared" for entities marked shared: every generator sees them and
+        the merge carries them forward, so one module can replace but never
+        drop them. "owned" for the module's own entities (by ``module`` or
+        ``belongs_to``). None for everything else.
+        """
+        if not isinstance(entity, dict):
+            return None
+        if entity.get("module") == "shared":
+            return "shared"
+        belongs_to = entity.get("belongs_to")
+        if entity.get("module") == module_name or module_name in (
+            belongs_to if isinstance(belongs_to, list) else [belongs_to]
+        ):
+            return "owned"
+        return None
+
+    @classmethod
+    def _module_entities(cls, prefilled_sdf: Dict[str, Any], module_name: str) -> List[Dict[str, Any]]:
+        """Prefilled entities owned by ``module_name`` (by ``module`` or ``belongs_to``)."""
+        return [
+            e for e in (prefilled_sdf.get("entities") or [])
+            if cls._prefilled_role(e, module_name) == "owned"
+        ]
+
+    @classmethod
+    def _restored_generator_output(
+        cls, module: str, saved: Dict[str, Any], prefilled_sdf: Dict[str, Any],
+    ) -> ModuleGeneratorOutput:
+        """A generator output rebuilt from its checkpoint.
+
+        The checkpoint supplies the clarifications and completeness; the
+        entities and config come from prefilled_sdf when it has them, since
+        on clarify that is the post-processed SDF the user last saw.
+        """
+        output = ModuleGeneratorOutput.model_validate(saved["output"])
+        entities = cls._module_entities(prefilled_sdf, module)
+        if entities:
+            output.entities = entities
+            output.module_config = (prefilled_sdf.get("modules") or {}).get(module) or output.module_config
+        return output
+
+    @staticmethod
+    async def _route_clarification_answers(run: "_PipelineRun") -> None:
+        """Route answers to a generator's own questions to that generator only.
+
+        The questions come from the generator's last checkpoint; its answers
+        are left out of the distributor's inputs, so they re-run just the
+        generator that asked.
+        """
+        for module in GENERATOR_MODULES:
+            latest = await run.checkpoints.latest(run.project_id, f"{module}_generator")
+            if latest is None:
+                continue
+            asked = [
+                q.get("id") for q in latest[1]["output"].get("clarifications_needed") or [] if isinstance(q, dict)
+            ]
+            routed = {qid: run.default_question_answers[qid] for qid in asked if qid in run.default_question_answers}
+            if routed:
+                run.routed_answers[module] = routed
+                print(f"[MultiAgentService] Routing {sorted(routed)} to the {module.upper()} generator")
+
+    @classmethod
+    def _entity_scope(
+        cls, module: str, context: Optional[ModuleContext], prefilled_sdf: Dict[str, Any],
+    ) -> Optional[List[str]]:
+        """Existing entities a change request touches, or None to regenerate the module.
+
+        Uses the distributor's ``affected_entities`` when it names known
+        slugs, otherwise the slugs (or their spaced forms) mentioned in
+        ``change_instructions``. Entities are returned in prefilled order;
+        a scope covering every module entity is no scope at all.
+        """
+        if context is None or not (context.change_instructions or "").strip():
+            return None
+        owned = [e["slug"] for e in cls._module_entities(prefilled_sdf, module) if e.get("slug")]
+        if not owned:
+            return None
+        known = [
+            e["slug"] for e in (prefilled_sdf.get("entities") or [])
+            if cls._prefilled_role(e, module) and e.get("slug")
+        ]
+        named = {str(slug).strip().lower() for slug in context.affected_entities}
+        scope = [slug for slug in known if slug.lower() in named]
+        if not scope:
+            text = context.change_instructions.lower()
+            scope = [
+                slug for slug in known
+                if re.search(rf"\b({re.escape(slug.lower())}|{re.escape(slug.lower().replace('_', ' '))})\b", text)
+            ]
+        if not scope or set(owned) <= set(scope):
+            return None
+        return scope
+
+    @classmethod
+    def _apply_entity_scope(
+        cls, module: str, output: ModuleGeneratorOutput, scope: List[str], prefilled_sdf: Dict[str, Any],
+    ) -> ModuleGeneratorOutput:
+        """Splice a scoped generator output back into the module's prefilled entities.
+
+        Unscoped module entities are carried forward in place, scoped ones
+        are replaced by their regenerated version (or dropped if the
+        generator left them out), and new entities are appended. A
+        regenerated shared entity is replaced in place too; one left out
+        stays as it was, since the merge carries shared entities forward.
+        """
+        generated = {
+            e.get("slug"): e for e in output.entities if isinstance(e, dict) and e.get("slug")
+        }
+        entities = []
+        for entity in prefilled_sdf.get("entities") or []:
+            role = cls._prefilled_role(entity, module)
+            if role is None:
+                continue
+            slug = entity.get("slug")
+            if slug in generated:
+                entities.append(generated.pop(slug))
+            elif role == "owned" and slug not in scope:
+                entities.append(entity)
+        entities.extend(generated.values())
+        module_config = {**((prefilled_sdf.get("modules") or {}).get(module) or {}), **output.module_config}
+        return output.model_copy(update={"entities": entities, "module_config": module_config})
+
+    @classmethod
+    def _extract_module_prefilled(cls, prefilled_sdf: Dict[str, Any], module_name: str) -> str:
         """Extract the module-specific config + entities from the prefilled SDF."""
         if not prefilled_sdf:
             return ""
         mod_cfg = (prefilled_sdf.get("modules") or {}).get(module_name)
         entities = [
             e for e in (prefilled_sdf.get("entities") or [])
-            if isinstance(e, dict) and e.get("module") in (module_name, "shared")
+            if cls._prefilled_role(e, module_name)
         ]
         if not mod_cfg and not entities:
             return ""
@@ -676,28 +1390,71 @@ class MultiAgentService:
             snippet["entities"] = entities
         return json.dumps(snippet, indent=2)
 
-    async def _run_hr_generator(
-        self, business_description: str, hr_context: ModuleContext, shared_entities: List[str],
+    _GENERATOR_PROMPTS = {
+        "hr": get_hr_generator_prompt,
+        "invoice": get_invoice_generator_prompt,
+        "inventory": get_inventory_generator_prompt,
+    }
+    _ANSWER_PREFIXES = {"hr": "hr_", "invoice": "invoice_", "inventory": "inv_"}
+
+    def _generator_prompt(
+        self, module: str, business_description: str, context: ModuleContext, shared_entities: List[str],
         default_question_answers: Optional[Dict[str, Any]] = None,
         prefilled_sdf: Optional[Dict[str, Any]] = None,
         language: str = "en",
-    ) -> tuple[ModuleGeneratorOutput, GenerationResult, str]:
-        print("[MultiAgentService] Generating HR module...")
-        hr_answers = {k: v for k, v in (default_question_answers or {}).items() if k.startswith("hr_")}
-        prompt = get_hr_generator_prompt(
+        entity_scope: Optional[List[str]] = None,
+        clarification_answers: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        prefix = self._ANSWER_PREFIXES[module]
+        module_answers = {k: v for k, v in (default_question_answers or {}).items() if k.startswith(prefix)}
+        module_answers.update(clarification_answers or {})
+        scope_text = ""
+        if entity_scope:
+            # Only the scoped entities are sent; the rest are carried forward.
+            prefilled_sdf = dict(prefilled_sdf or {})
+            others = [
+                e.get("slug") for e in (prefilled_sdf.get("entities") or [])
+                if self._prefilled_role(e, module) and e.get("slug") not in entity_scope
+            ]
+            prefilled_sdf["entities"] = [
+                e for e in (prefilled_sdf.get("entities") or [])
+                if isinstance(e, dict) and e.get("slug") in entity_scope
+            ]
+            scope_text = (
+                f"Output ONLY these existing entities, updated per the change instructions: {', '.join(entity_scope)}. "
+                "Also output any NEW entities the change instructions ask for. To remove one of the listed "
+                "entities, leave it out (shared entities are kept for the other modules). Every other entity is kept unchanged by the system — do NOT output it"
+                + (f"; you may still reference it by slug: {', '.join(others)}." if others else ".")
+            )
+        return self._GENERATOR_PROMPTS[module](
             business_description=business_description,
-            hr_description=hr_context.description,
-            hr_features=", ".join(hr_context.features),
             shared_entities=", ".join(shared_entities),
-            default_answers=json.dumps(hr_answers, indent=2) if hr_answers else "",
-            prefilled_module_sdf=self._extract_module_prefilled(prefilled_sdf or {}, "hr"),
-            change_instructions=hr_context.change_instructions,
+            default_answers=json.dumps(module_answers, indent=2) if module_answers else "",
+            prefilled_module_sdf=self._extract_module_prefilled(prefilled_sdf or {}, module),
+            change_instructions=context.change_instructions,
             language=language,
+            entity_scope=scope_text,
+            **{
+                f"{module}_description": context.description,
+                f"{module}_features": ", ".join(context.features),
+            },
         )
-        result = await self.hr_client.generate_with_retry(
-            prompt, temperature=self.hr_client.get_temperature(), response_schema=ModuleGeneratorOutput,
+
+    async def _run_hr_generator(
+        self, business_description: str, hr_context: ModuleContext, shared_entities: List[str],
+        default_question_answers: Optional[Dict[str, Any]] = None,
+        prefilled_sdf: Optional[Dict[str, Any]] = None,
+        language: str = "en",
+        on_entity: Optional[Callable[[str, int, Dict[str, Any]], None]] = None,
+        entity_scope: Optional[List[str]] = None,
+        clarification_answers: Optional[Dict[str, Any]] = None,
+    ) -> tuple[ModuleGeneratorOutput, GenerationResult, str]:
+        print("[MultiAgentService] Generating HR module...")
+        prompt = self._generator_prompt(
+            "hr", business_description, hr_context, shared_entities,
+            default_question_answers, prefilled_sdf, language, entity_scope, clarification_answers,
         )
-        data = await self._parse_json_with_repair(result.text, "hr")
+        data, result = await self._generate_module_json(self.hr_client, prompt, "hr", on_entity)
         clarifications = self._parse_clarifications(data.get("clarifications_needed", []), "hr")
         output = ModuleGeneratorOutput(
             module="hr",
@@ -714,23 +1471,16 @@ class MultiAgentService:
         default_question_answers: Optional[Dict[str, Any]] = None,
         prefilled_sdf: Optional[Dict[str, Any]] = None,
         language: str = "en",
+        on_entity: Optional[Callable[[str, int, Dict[str, Any]], None]] = None,
+        entity_scope: Optional[List[str]] = None,
+        clarification_answers: Optional[Dict[str, Any]] = None,
     ) -> tuple[ModuleGeneratorOutput, GenerationResult, str]:
         print("[MultiAgentService] Generating Invoice module...")
-        inv_answers = {k: v for k, v in (default_question_answers or {}).items() if k.startswith("invoice_")}
-        prompt = get_invoice_generator_prompt(
-            business_description=business_description,
-            invoice_description=invoice_context.description,
-            invoice_features=", ".join(invoice_context.features),
-            shared_entities=", ".join(shared_entities),
-            default_answers=json.dumps(inv_answers, indent=2) if inv_answers else "",
-            prefilled_module_sdf=self._extract_module_prefilled(prefilled_sdf or {}, "invoice"),
-            change_instructions=invoice_context.change_instructions,
-            language=language,
-        )
-        result = await self.invoice_client.generate_with_retry(
-            prompt, temperature=self.invoice_client.get_temperature(), response_schema=ModuleGeneratorOutput,
+        prompt = self._generator_prompt(
+            "invoice", business_description, invoice_context, shared_entities,
+            default_question_answers, prefilled_sdf, language, entity_scope, clarification_answers,
         )
-        data = await self._parse_json_with_repair(result.text, "invoice")
+        data, result = await self._generate_module_json(self.invoice_client, prompt, "invoice", on_entity)
         clarifications = self._parse_clarifications(data.get("clarifications_needed", []), "invoice")
         output = ModuleGeneratorOutput(
             module="invoice",
@@ -747,23 +1497,16 @@ class MultiAgentService:
         default_question_answers: Optional[Dict[str, Any]] = None,
         prefilled_sdf: Optional[Dict[str, Any]] = None,
         language: str = "en",
+        on_entity: Optional[Callable[[str, int, Dict[str, Any]], None]] = None,
+        entity_scope: Optional[List[str]] = None,
+        clarification_answers: Optional[Dict[str, Any]] = None,
     ) -> tuple[ModuleGeneratorOutput, GenerationResult, str]:
         print("[MultiAgentService] Generating Inventory module...")
-        stock_answers = {k: v for k, v in (default_question_answers or {}).items() if k.startswith("inv_")}
-        prompt = get_inventory_generator_prompt(
-            business_description=business_description,
-            inventory_description=inventory_context.description,
-            inventory_features=", ".join(inventory_context.features),
-            shared_entities=", ".join(shared_entities),
-            default_answers=json.dumps(stock_answers, indent=2) if stock_answers else "",
-            prefilled_module_sdf=self._extract_module_prefilled(prefilled_sdf or {}, "inventory"),
-            change_instructions=inventory_context.change_instructions,
-            language=language,
-        )
-        result = await self.inventory_client.generate_with_retry(
-            prompt, temperature=self.inventory_client.get_temperature(), response_schema=ModuleGeneratorOutput,
+        prompt = self._generator_prompt(
+            "inventory", business_description, inventory_context, shared_entities,
+            default_question_answers, prefilled_sdf, language, entity_scope, clarification_answers,
         )
-        data = await self._parse_json_with_repair(result.text, "inventory")
+        data, result = await self._generate_module_json(self.inventory_client, prompt, "inventory", on_entity)
         clarifications = self._parse_clarifications(data.get("clarifications_needed", []), "inventory")
         output = ModuleGeneratorOutput(
             module="inventory",
@@ -775,6 +1518,129 @@ class MultiAgentService:
         )
         return output, result, prompt
 
+    async def _generate_module_json(
+        self,
+        client: BaseAIClient,
+        prompt: str,
+        agent_name: str,
+        on_entity: Optional[Callable[[str, int, Dict[str, Any]], None]] = None,
+    ) -> tuple[Dict[str, Any], GenerationResult]:
+        """Run a module generator and parse its JSON output.
+
+        With AI_STREAM_GENERATORS the response is streamed through
+        ``IncrementalJSONParser``: each entity is passed to ``on_entity`` as
+        soon as it closes, and a stream whose structure breaks is dropped
+        and started again (AI_STREAM_MALFORMED_RETRIES times) without
+        waiting for the rest of the body. Provider errors, and streams that
+        stay malformed, fall back to the buffered ``generate_with_retry``.
+        """
+        temperature = client.get_temperature()
+        # Tokens of dropped stream attempts, added to the result so the
+        # step log and cost totals include them.
+        aborted = GenerationResult(text="")
+        if settings.AI_STREAM_GENERATORS:
+            for attempt in range(settings.AI_STREAM_MALFORMED_RETRIES + 1):
+                parser = IncrementalJSONParser("entities")
+                final = None
+                stream = client.generate_stream(
+                    prompt, temperature=temperature, response_schema=ModuleGeneratorOutput,
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk.done:
+                            final = chunk
+                            continue
+                        for index, entity in parser.feed(chunk.text):
+                            if on_entity:
+                                on_entity(agent_name, index, entity)
+                except StreamJSONError as e:
+                    _record_json_parse(agent_name, "streams_aborted")
+                    self._count_aborted_stream(aborted, client, prompt, parser, final)
+                    print(
+                        f"[MultiAgentService] {agent_name} stream malformed ({e}) after "
+                        f"{len(parser.text)} chars, {len(parser.entities)} entities; restarting"
+                    )
+                    continue
+                except Exception as e:
+                    self._count_aborted_stream(aborted, client, prompt, parser, final)
+                    print(f"[MultiAgentService] {agent_name} stream failed ({e}); retrying without streaming")
+                    break
+                finally:
+                    await stream.aclose()
+                if final is None:
+                    self._count_aborted_stream(aborted, client, prompt, parser, final)
+                    print(f"[MultiAgentService] {agent_name} stream ended early; retrying without streaming")
+                    break
+                result = GenerationResult(
+                    text=parser.text,
+                    prompt_tokens=final.prompt_tokens,
+                    completion_tokens=final.completion_tokens,
+                    total_tokens=final.total_tokens,
+                    cached_tokens=final.cached_tokens,
+                    model=final.model,
+                    finish_reason=final.finish_reason,
+                )
+                data, result = await self._finish_streamed_json(client, prompt, agent_name, parser, result)
+                return data, _with_aborted_usage(result, aborted)
+
+        result = await client.generate_with_retry(
+            prompt, temperature=temperature, response_schema=ModuleGeneratorOutput,
+        )
+        result = _with_aborted_usage(result, aborted)
+        return await self._parse_json_with_repair(result.text, agent_name), result
+
+    @staticmethod
+    def _count_aborted_stream(
+        aborted: GenerationResult,
+        client: BaseAIClient,
+        prompt: str,
+        parser: IncrementalJSONParser,
+        final: Optional[Any],
+    ) -> None:
+        """Add a dropped stream attempt's tokens to ``aborted``.
+
+        Providers only report usage on the last chunk, so a stream cut off
+        before it is estimated from the prompt and the text received so far.
+        """
+        if final is not None:
+            prompt_tokens, completion_tokens = final.prompt_tokens, final.completion_tokens
+        else:
+            model = getattr(client, "model_name", "")
+            prompt_tokens = estimate_prompt_tokens(prompt, model)
+            completion_tokens = estimate_tokens(parser.text, model)
+        aborted.prompt_tokens += prompt_tokens
+        aborted.completion_tokens += completion_tokens
+        aborted.total_tokens += prompt_tokens + completion_tokens
+        aborted.stream_restarts += 1
+
+    async def _finish_streamed_json(
+        self,
+        client: BaseAIClient,
+        prompt: str,
+        agent_name: str,
+        parser: IncrementalJSONParser,
+        result: GenerationResult,
+    ) -> tuple[Dict[str, Any], GenerationResult]:
+        if parser.complete:
+            _record_json_parse(agent_name, "parsed")
+            return parser.document(), result
+        if result.finish_reason == "length":
+            result = await client._continue_if_truncated(prompt, result, client.get_temperature())
+        try:
+            return await self._parse_json_with_repair(result.text, agent_name), result
+        except (json.JSONDecodeError, ValueError):
+            if not parser.entities:
+                raise
+            # The entities that closed before the output broke are valid on
+            # their own; keep them so the merge still has something to work with.
+            print(f"[MultiAgentService] {agent_name} keeping {len(parser.entities)} streamed entities")
+            return {
+                "entities": parser.entities,
+                "warnings": [
+                    f"{agent_name} output was incomplete; kept the {len(parser.entities)} entities that were complete"
+                ],
+            }, result
+
     # ── JSON parsing ────────────────────────────────────────────
 
     async def _repair_json(self, malformed_json: str) -> GenerationResult:
@@ -785,15 +1651,20 @@ class MultiAgentService:
 
     async def _parse_json_with_repair(self, response: str, agent_name: str) -> Dict[str, Any]:
         try:
-            return self._parse_json(response)
+            data = self._parse_json(response)
         except (json.JSONDecodeError, ValueError) as e:
             print(f"[MultiAgentService] {agent_name} JSON malformed, attempting AI repair...")
             try:
                 repair_result = await self._repair_json(response)
-                return self._parse_json(repair_result.text)
+                data = self._parse_json(repair_result.text)
             except Exception as repair_error:
                 print(f"[MultiAgentService] AI repair also failed: {repair_error}")
+                _record_json_parse(agent_name, "failed")
                 raise e
+            _record_json_parse(agent_name, "repaired")
+            return data
+        _record_json_parse(agent_name, "parsed")
+        return data
 
     def _parse_json(self, response: str) -> Dict[str, Any]:
         start = response.find('{')
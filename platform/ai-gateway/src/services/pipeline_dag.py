@@ -0,0 +1,228 @@
+"""
+Declarative DAG scheduling for the multi-agent pipeline.
+
+Each ``Stage`` declares the values it reads (``inputs``) and writes
+(``outputs``); ``PipelineDAG.run`` starts every stage as soon as all of its
+inputs exist, so stages that don't depend on each other run concurrently.
+The order of the pipeline is therefore the data flow, not the code: making
+the distributor independent of the reviewer's output is what runs the two
+side by side.
+
+Per stage:
+
+- ``timeout`` bounds each attempt; ``retries`` re-runs the stage after a
+  failure or timeout (LLM stages usually keep 0: the clients retry already).
+- ``concurrency`` names a class whose limit (``PipelineDAG(limits=...)``)
+  caps how many of its stages run at once.
+- ``when`` skips the stage (its outputs become None) for this run.
+- ``halt`` inspects the values after the stage finishes; a returned reason
+  stops the run and cancels every stage still running.
+- ``error_output`` keeps a failure local: the exception is stored under that
+  name and the outputs become None, instead of aborting the run with
+  ``StageError``.
+
+Every run records a ``StageTiming`` per stage in ``DAGRun.trace``; an
+``on_event`` callback also hears ``("stage", ...)`` as each stage starts
+and finishes, for live progress.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+Values = Dict[str, Any]
+
+
+class StageError(Exception):
+    """A stage failed after its retries; the run was aborted."""
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[Values], Awaitable[Optional[Values]]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    retries: int = 0
+    retry_backoff: float = 0.0
+    concurrency: str = "default"
+    when: Optional[Callable[[Values], bool]] = None
+    halt: Optional[Callable[[Values], Optional[str]]] = None
+    error_output: Optional[str] = None
+
+
+@dataclass
+class StageTiming:
+    stage: str
+    status: str  # ok | skipped | failed | cancelled
+    started_at: float
+    ended_at: float
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> int:
+        return int((self.ended_at - self.started_at) * 1000)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "status": self.status,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "duration_ms": self.duration_ms,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+@dataclass
+class DAGRun:
+    values: Values
+    trace: List[StageTiming] = field(default_factory=list)
+    halted_by: Optional[str] = None
+    halt_reason: Optional[str] = None
+
+    def summary(self) -> str:
+        return ", ".join(f"{t.stage}={t.status}:{t.duration_ms}ms" for t in self.trace)
+
+
+class PipelineDAG:
+    """Runs a set of stages in dependency order, independent ones concurrently."""
+
+    def __init__(
+        self,
+        stages: Iterable[Stage],
+        limits: Optional[Dict[str, int]] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ):
+        self.stages = list(stages)
+        self.on_event = on_event
+        self._semaphores = {
+            name: asyncio.Semaphore(limit) for name, limit in (limits or {}).items() if limit and limit > 0
+        }
+        self._producers: Dict[str, str] = {}
+        names = set()
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage name '{stage.name}'")
+            names.add(stage.name)
+            produced = stage.outputs + ((stage.error_output,) if stage.error_output else ())
+            for key in produced:
+                if key in self._producers:
+                    raise ValueError(f"'{key}' is produced by both '{self._producers[key]}' and '{stage.name}'")
+                self._producers[key] = stage.name
+
+    def _validate(self, provided: Iterable[str]) -> None:
+        available = set(provided)
+        for stage in self.stages:
+            missing = [k for k in stage.inputs if k not in available and k not in self._producers]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' needs {missing}, which nothing produces")
+        # Kahn's algorithm over stage → stage edges; leftovers form a cycle.
+        remaining = {s.name: {self._producers[k] for k in s.inputs if k not in available} for s in self.stages}
+        while True:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                break
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        if remaining:
+            raise ValueError(f"Stage dependency cycle among {sorted(remaining)}")
+
+    async def run(self, initial: Optional[Values] = None) -> DAGRun:
+        values: Values = dict(initial or {})
+        self._validate(values)
+        result = DAGRun(values=values)
+        pending = {stage.name: stage for stage in self.stages}
+        running: Dict[asyncio.Task, Stage] = {}
+        started: Dict[str, float] = {}
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(key in values for key in stage.inputs):
+                        del pending[name]
+                        started[name] = time.time()
+                        inputs = {key: values[key] for key in stage.inputs}
+                        running[asyncio.ensure_future(self._run_stage(stage, inputs))] = stage
+                        self._emit({"stage": name, "status": "started", "started_at": started[name]})
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    outputs, timing = task.result()
+                    values.update(outputs)
+                    result.trace.append(timing)
+                    self._emit(timing.as_dict())
+                    reason = stage.halt(values) if stage.halt and timing.status == "ok" else None
+                    if reason:
+                        result.halted_by, result.halt_reason = stage.name, reason
+                        print(f"[PipelineDAG] '{stage.name}' halted the run: {reason}")
+                        return result
+        finally:
+            now = time.time()
+            for task, stage in running.items():
+                task.cancel()
+                result.trace.append(StageTiming(stage.name, "cancelled", started[stage.name], now))
+                self._emit(result.trace[-1].as_dict())
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return result
+
+    def _emit(self, data: Dict[str, Any]) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event("stage", data)
+        except Exception as e:
+            # Progress listeners must never break the run.
+            print(f"[PipelineDAG] on_event failed: {e}")
+
+    async def _run_stage(self, stage: Stage, inputs: Values) -> Tuple[Values, StageTiming]:
+        started_at = time.time()
+        empty = {key: None for key in stage.outputs}
+        if stage.error_output:
+            empty[stage.error_output] = None
+        if stage.when is not None and not stage.when(inputs):
+            return empty, StageTiming(stage.name, "skipped", started_at, time.time())
+
+        semaphore = self._semaphores.get(stage.concurrency)
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                if semaphore is not None:
+                    async with semaphore:
+                        outputs = await asyncio.wait_for(stage.run(inputs), stage.timeout)
+                else:
+                    outputs = await asyncio.wait_for(stage.run(inputs), stage.timeout)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = asyncio.TimeoutError(f"timed out after {stage.timeout}s")
+                if attempts <= stage.retries:
+                    print(f"[PipelineDAG] '{stage.name}' attempt {attempts} failed ({e}); retrying")
+                    if stage.retry_backoff:
+                        await asyncio.sleep(stage.retry_backoff * 2 ** (attempts - 1))
+                    continue
+                timing = StageTiming(stage.name, "failed", started_at, time.time(), attempts, str(e) or type(e).__name__)
+                if stage.error_output:
+                    empty[stage.error_output] = e
+                    return empty, timing
+                raise StageError(stage.name, e) from e
+
+        outputs = outputs or {}
+        unknown = set(outputs) - set(stage.outputs)
+        if unknown:
+            raise StageError(stage.name, ValueError(f"undeclared outputs {sorted(unknown)}"))
+        return {**empty, **outputs}, StageTiming(stage.name, "ok", started_at, time.time(), attempts)
@@ -25,9 +25,8 @@ from src.schemas.precheck import (
     SUPPORTED_CONFIDENCES,
     SUPPORTED_MODULES,
 )
-from src.services.azure_client import AzureOpenAIClient
 from src.services.base_client import BaseAIClient
-from src.services.gemini_client import GeminiClient
+from src.services.failover_client import create_agent_client
 from src.prompts.sdf_generation import get_module_precheck_prompt
 
 
@@ -72,15 +71,7 @@ class PrecheckService:
         # Reuse the distributor agent's client config — it is the lightest of
         # the multi-agent clients and runs on the same provider/model.
         config = settings.get_agent_config("distributor")
-        if config.provider == "azure_openai":
-            try:
-                return AzureOpenAIClient(agent_config=config)
-            except Exception as e:  # pragma: no cover (provider init failure)
-                print(f"[PrecheckService] Azure client init failed: {e}")
-                if settings.GOOGLE_AI_API_KEY:
-                    return GeminiClient(agent_config=config)
-                raise
-        return GeminiClient(agent_config=config)
+        return create_agent_client(config, log_prefix="PrecheckService")
 
     async def precheck_modules(self, request: PrecheckRequest) -> PrecheckResponse:
         prompt = get_module_precheck_prompt(
@@ -92,6 +83,7 @@ class PrecheckService:
             prompt,
             temperature=self.client.get_temperature(),
             json_mode=True,
+            response_schema=PrecheckResponse,
         )
         data = self._parse_json_safe(result.text)
         return self._normalize(data, request.selected_modules)
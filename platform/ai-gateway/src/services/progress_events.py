@@ -0,0 +1,145 @@
+"""
+Push-based generation progress for /ai/progress/{project_id}/stream.
+
+``ProgressBroker.publish`` is called from the pipeline's ``on_progress`` and
+``on_event`` callbacks; every subscriber of that project gets each event
+(progress transitions, stage start/finish, each module's partial SDF as it
+lands, then a terminal ``done`` or ``error``). Events carry a per-project
+sequence number, and the events of the current run are kept so a late or
+reconnecting subscriber (``Last-Event-ID``) is replayed what it missed.
+A run starts only with an explicit ``begin``. A finished run's events are
+kept until then: a subscriber whose ``after`` falls inside that run is
+replayed the rest of it, while one without ``after`` waits for the next run
+instead of being handed the old ``done``.
+
+A slow subscriber never blocks the pipeline: its queue is bounded and
+events that don't fit are dropped (counted in the snapshot).
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+# (seq, event, data); (None, None, None) is a keepalive tick.
+ProgressEvent = Tuple[Optional[int], Optional[str], Optional[Dict[str, Any]]]
+
+TERMINAL_EVENTS = ("done", "error")
+
+
+@dataclass
+class _Channel:
+    seq: int = 0
+    # Sequence number of the current run's first event, and whether it ended.
+    run_start: int = 1
+    finished: bool = False
+    history: Deque[ProgressEvent] = field(default_factory=deque)
+    subscribers: Set[asyncio.Queue] = field(default_factory=set)
+
+
+class ProgressBroker:
+    """Fans out per-project progress events to stream subscribers."""
+
+    def __init__(self, max_history: int = 500, max_queue: int = 1000, max_channels: int = 1000):
+        self.max_history = max_history
+        self.max_queue = max_queue
+        self.max_channels = max_channels
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self.published = 0
+        self.dropped = 0
+
+    def _channel(self, project_id: str) -> _Channel:
+        channel = self._channels.get(project_id)
+        if channel is None:
+            channel = _Channel(history=deque(maxlen=self.max_history))
+            self._channels[project_id] = channel
+            # Forget the least recently used idle projects.
+            for pid in list(self._channels):
+                if len(self._channels) <= self.max_channels:
+                    break
+                if not self._channels[pid].subscribers:
+                    del self._channels[pid]
+        else:
+            self._channels.move_to_end(project_id)
+        return channel
+
+    def begin(self, project_id: str) -> None:
+        """Start a new run: later subscribers are replayed only its events."""
+        channel = self._channel(project_id)
+        channel.history.clear()
+        channel.run_start = channel.seq + 1
+        channel.finished = False
+
+    def ensure_run(self, project_id: str) -> None:
+        """``begin`` unless a run is already in progress (e.g. begun at submit time)."""
+        if self._channel(project_id).finished:
+            self.begin(project_id)
+
+    def publish(self, project_id: str, event: str, data: Dict[str, Any]) -> None:
+        channel = self._channel(project_id)
+        channel.seq += 1
+        item = (channel.seq, event, data)
+        channel.history.append(item)
+        if event in TERMINAL_EVENTS:
+            channel.finished = True
+        self.published += 1
+        for queue in channel.subscribers:
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def subscribe(
+        self, project_id: str, after: Optional[int] = None, keepalive: float = 15.0,
+    ) -> AsyncIterator[ProgressEvent]:
+        """Yield the run's events so far (after ``after``), then live ones.
+
+        Ends after a terminal event; yields a keepalive tick every
+        ``keepalive`` seconds of silence.
+        """
+        channel = self._channel(project_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        # Snapshot and register without awaiting in between: nothing is missed twice or lost.
+        if channel.finished and (after is None or after < channel.run_start):
+            backlog = []  # that run is over; wait for the next one
+        else:
+            backlog = [item for item in channel.history if after is None or item[0] > after]
+        channel.subscribers.add(queue)
+        try:
+            for item in backlog:
+                yield item
+                if item[1] in TERMINAL_EVENTS:
+                    return
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield (None, None, None)
+                    continue
+                yield item
+                if item[1] in TERMINAL_EVENTS:
+                    return
+        finally:
+            channel.subscribers.discard(queue)
+
+    def snapshot(self) -> dict:
+        return {
+            "projects": len(self._channels),
+            "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+_broker: Optional[ProgressBroker] = None
+
+
+def get_progress_broker() -> ProgressBroker:
+    global _broker
+    if _broker is None:
+        _broker = ProgressBroker()
+    return _broker
+
+
+def progress_stream_snapshot() -> Optional[dict]:
+    return _broker.snapshot() if _broker is not None else None
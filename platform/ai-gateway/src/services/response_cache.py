@@ -0,0 +1,349 @@
+"""
+Content-addressed LLM response cache.
+
+Agents that opt in (``AI_AGENT_<NAME>_CACHE=true``, or ``AI_CACHE_ENABLED``
+for all) get their client wrapped in a ``CachingClient``. Each
+``generate_with_retry`` call is keyed by a hash of
+(provider, model/deployment, prompt, temperature, json_mode, response schema)
+and looked up in two tiers:
+
+- an in-process LRU (``AI_CACHE_MEMORY_ENTRIES``);
+- a size-bounded sqlite file (``AI_CACHE_DISK_MAX_MB``) that survives
+  restarts and evicts the least recently used rows first.
+
+Entries expire after ``AI_CACHE_TTL_SECONDS``. Every entry is stamped with a
+fingerprint of the prompt template files in ``src/prompts``; when any
+template changes, entries written under the old fingerprint are dropped.
+
+Only complete answers are stored: the call finished normally
+(``finish_reason`` "stop", or None for providers that don't report one)
+and, for JSON calls, the text parses. A truncated or malformed response
+would otherwise be replayed for the whole TTL.
+
+A hit comes back as a zero-token ``GenerationResult`` with ``cache_hit=True``
+and ``finish_reason="stop"``.
+"""
+
+import asyncio
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from src.config import settings
+from src.services.base_client import BaseAIClient, DelegatingClient, GenerationResult
+
+PROMPT_DIR = pathlib.Path(__file__).resolve().parent.parent / "prompts"
+
+
+def template_fingerprint(prompt_dir: pathlib.Path = PROMPT_DIR) -> str:
+    """Hash of the name, size and mtime of every prompt template file."""
+    digest = hashlib.sha256()
+    for path in sorted(prompt_dir.glob("*.txt")):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def make_cache_key(
+    provider: str,
+    model: str,
+    prompt: str,
+    temperature: float,
+    json_mode: bool,
+    response_schema: Optional[Type[BaseModel]] = None,
+) -> str:
+    schema = None
+    if response_schema is not None:
+        schema = json.dumps(response_schema.model_json_schema(), sort_keys=True)
+    payload = json.dumps(
+        [provider, model, prompt, round(float(temperature), 4), bool(json_mode), schema],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Memory LRU in front of a size-bounded sqlite store."""
+
+    def __init__(
+        self,
+        db_path: Optional[pathlib.Path],
+        memory_entries: int = 256,
+        disk_max_bytes: int = 50 * 1024 * 1024,
+        ttl_seconds: float = 86400.0,
+        prompt_dir: pathlib.Path = PROMPT_DIR,
+        fingerprint_check_seconds: float = 5.0,
+    ):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.prompt_dir = prompt_dir
+        self.fingerprint_check_seconds = fingerprint_check_seconds
+
+        # key -> (expires_at, text, model)
+        self._memory: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+        self._db_lock = threading.Lock()
+        self._fingerprint = template_fingerprint(prompt_dir)
+        self._fingerprint_checked = time.monotonic()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.invalidations = 0
+
+        if self.db_path is not None:
+            self._init_db()
+
+    # ── sqlite ────────────────────────────────────────────────────
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        with self._db_lock:
+            conn = sqlite3.connect(str(self.db_path), timeout=5)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def _init_db(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " fingerprint TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " text TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            # Templates may have changed while the process was down.
+            conn.execute("DELETE FROM responses WHERE fingerprint != ?", (self._fingerprint,))
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str, str]]:
+        now = time.time()
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT expires_at, text, model FROM responses WHERE key = ? AND fingerprint = ?",
+                (key, self._fingerprint),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row
+
+    def _disk_put(self, key: str, expires_at: float, text: str, model: str) -> None:
+        size = len(text.encode("utf-8"))
+        if size > self.disk_max_bytes:
+            return
+        now = time.time()
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, self._fingerprint, model, text, size, expires_at, now),
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.disk_max_bytes:
+                # Evict least recently used rows until back under the cap.
+                excess = total - self.disk_max_bytes
+                freed = 0
+                victims = []
+                for victim_key, victim_size in conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ):
+                    if freed >= excess:
+                        break
+                    victims.append((victim_key,))
+                    freed += victim_size
+                conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def _disk_clear_stale(self) -> None:
+        with self._db() as conn:
+            conn.execute("DELETE FROM responses WHERE fingerprint != ?", (self._fingerprint,))
+
+    def _disk_stats(self) -> Tuple[int, int]:
+        with self._db() as conn:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return count, size
+
+    # ── invalidation ──────────────────────────────────────────────
+
+    async def _check_templates(self) -> None:
+        now = time.monotonic()
+        if now - self._fingerprint_checked < self.fingerprint_check_seconds:
+            return
+        self._fingerprint_checked = now
+        fingerprint = template_fingerprint(self.prompt_dir)
+        if fingerprint == self._fingerprint:
+            return
+        print("[ResponseCache] Prompt templates changed — invalidating cached responses")
+        self._fingerprint = fingerprint
+        self._memory.clear()
+        self.invalidations += 1
+        if self.db_path is not None:
+            await asyncio.to_thread(self._disk_clear_stale)
+
+    # ── public API ────────────────────────────────────────────────
+
+    async def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Return (text, model) for a live entry, or None."""
+        await self._check_templates()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return entry[1], entry[2]
+            del self._memory[key]
+
+        if self.db_path is not None:
+            try:
+                row = await asyncio.to_thread(self._disk_get, key)
+            except sqlite3.Error as e:
+                print(f"[ResponseCache] Disk lookup failed: {e}")
+                row = None
+            if row is not None:
+                self._remember(key, row)
+                self.hits_disk += 1
+                return row[1], row[2]
+
+        self.misses += 1
+        return None
+
+    def _remember(self, key: str, entry: Tuple[float, str, str]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def put(self, key: str, text: str, model: str) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, (expires_at, text, model))
+        self.stores += 1
+        if self.db_path is not None:
+            try:
+                await asyncio.to_thread(self._disk_put, key, expires_at, text, model)
+            except sqlite3.Error as e:
+                print(f"[ResponseCache] Disk write failed: {e}")
+
+    def snapshot(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        disk_entries, disk_bytes = (0, 0)
+        if self.db_path is not None:
+            try:
+                disk_entries, disk_bytes = self._disk_stats()
+            except sqlite3.Error:
+                pass
+        return {
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "skipped_incomplete": self.skipped,
+            "invalidations": self.invalidations,
+            "template_fingerprint": self._fingerprint,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache, creating it from settings."""
+    global _cache
+    if _cache is None:
+        db_path = pathlib.Path(settings.AI_CACHE_DB_PATH) if settings.AI_CACHE_DISK_MAX_MB > 0 else None
+        _cache = ResponseCache(
+            db_path,
+            memory_entries=settings.AI_CACHE_MEMORY_ENTRIES,
+            disk_max_bytes=int(settings.AI_CACHE_DISK_MAX_MB * 1024 * 1024),
+            ttl_seconds=settings.AI_CACHE_TTL_SECONDS,
+        )
+    return _cache
+
+
+async def response_cache_snapshot() -> Optional[dict]:
+    # The disk stats are sqlite queries: keep them off the event loop.
+    return await asyncio.to_thread(_cache.snapshot) if _cache is not None else None
+
+
+def _is_complete(result: GenerationResult, json_mode: bool, response_schema: Optional[Type[BaseModel]]) -> bool:
+    """Whether ``result`` is a finished answer worth replaying."""
+    if not result.text or result.finish_reason not in ("stop", None):
+        return False
+    if not (json_mode or response_schema is not None):
+        return True
+    start = min((i for i in (result.text.find("{"), result.text.find("[")) if i != -1), default=-1)
+    end = max(result.text.rfind("}"), result.text.rfind("]"))
+    if start == -1 or end < start:
+        return False
+    try:
+        json.loads(result.text[start:end + 1])
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+class CachingClient(DelegatingClient):
+    """Serves repeated ``generate_with_retry`` calls from the response cache."""
+
+    def __init__(self, primary: BaseAIClient, cache: ResponseCache):
+        super().__init__(primary)
+        self.cache = cache
+        info = primary.get_model_info()
+        self._provider = str(info.get("provider", ""))
+        self._model = str(info.get("deployment") or info.get("model") or "")
+
+    async def generate_with_retry(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        json_mode: bool = False,
+        response_schema: Optional[Type[BaseModel]] = None,
+    ) -> GenerationResult:
+        key = make_cache_key(
+            self._provider, self._model, prompt,
+            self.get_temperature(temperature), json_mode, response_schema,
+        )
+        cached = await self.cache.get(key)
+        if cached is not None:
+            text, model = cached
+            agent_name = self.agent_config.name if self.agent_config else "default"
+            print(f"[ResponseCache:{agent_name}] Cache hit")
+            return GenerationResult(text=text, model=model, cache_hit=True, finish_reason="stop")
+
+        result = await self.primary.generate_with_retry(
+            prompt, temperature=temperature, json_mode=json_mode, response_schema=response_schema,
+        )
+        if _is_complete(result, json_mode, response_schema):
+            await self.cache.put(key, result.text, result.model)
+        else:
+            self.cache.skipped += 1
+        return result
+
+    def get_model_info(self) -> dict:
+        info = super().get_model_info()
+        info["response_cache"] = True
+        return info
@@ -0,0 +1,192 @@
+"""
+Shared retry policy for provider clients.
+
+Replaces the fixed ``2 ** (attempt + 1)`` sleep both clients used to share:
+
+- the provider's own hint wins: ``retry-after-ms`` / ``Retry-After`` /
+  ``x-ratelimit-reset-*`` headers (Azure OpenAI) or ``RetryInfo`` details
+  (Gemini); a small jitter is still added so callers that got the same hint
+  don't all come back in the same instant;
+- otherwise the delay uses decorrelated jitter
+  (``min(cap, uniform(base, previous * 3))``), which spreads concurrent
+  pipelines apart instead of retrying them in lockstep;
+- a process-wide retry budget caps retries at a fraction of first attempts
+  over a sliding window, so a provider outage can't multiply our load.
+"""
+
+import email.utils
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from src.config import settings
+
+
+class RetryBudget:
+    """Sliding-window cap on retries relative to first attempts."""
+
+    def __init__(self, ratio: float = 0.1, window_seconds: float = 60.0, min_retries: int = 3):
+        self.ratio = ratio
+        self.window_seconds = window_seconds
+        # Floor so a quiet process can still retry the odd transient error.
+        self.min_retries = min_retries
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._denied = 0
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def _allowance(self) -> int:
+        return max(self.min_retries, int(len(self._requests) * self.ratio))
+
+    def record_request(self) -> None:
+        """Count a first attempt."""
+        now = time.monotonic()
+        self._prune(now)
+        self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """Reserve one retry if the budget allows it."""
+        now = time.monotonic()
+        self._prune(now)
+        if len(self._retries) >= self._allowance():
+            self._denied += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def snapshot(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "window_seconds": self.window_seconds,
+            "ratio": self.ratio,
+            "requests": len(self._requests),
+            "retries": len(self._retries),
+            "allowance": self._allowance(),
+            "denied": self._denied,
+        }
+
+
+_budget: Optional[RetryBudget] = None
+
+
+def get_retry_budget() -> RetryBudget:
+    """Return the process-wide retry budget, creating it from settings."""
+    global _budget
+    if _budget is None:
+        _budget = RetryBudget(
+            ratio=settings.AI_RETRY_BUDGET_RATIO,
+            window_seconds=settings.AI_RETRY_BUDGET_WINDOW_SECONDS,
+            min_retries=settings.AI_RETRY_BUDGET_MIN_RETRIES,
+        )
+    return _budget
+
+
+def retry_budget_snapshot() -> dict:
+    return get_retry_budget().snapshot()
+
+
+# ── provider hints ───────────────────────────────────────────────
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse ``"20ms"``, ``"1.5s"``, ``"6m0s"`` or a bare number of seconds."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """``Retry-After`` is either delta-seconds or an HTTP date."""
+    seconds = _parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _hint_from_headers(headers) -> Optional[float]:
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        seconds = _parse_retry_after(retry_after)
+        if seconds is not None:
+            return seconds
+    # Only the exhausted dimension's reset matters; if the remaining
+    # headers are missing, assume both could be the culprit.
+    resets = []
+    for kind in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        reset = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}") or "")
+        if reset is not None and remaining in (None, "0"):
+            resets.append(reset)
+    return max(resets) if resets else None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Provider-supplied wait before retrying ``error``, if it carries one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        hint = _hint_from_headers(headers)
+        if hint is not None:
+            return hint
+    # google.api_core errors carry google.rpc.RetryInfo in ``details``.
+    for detail in getattr(error, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+    return None
+
+
+# ── backoff ──────────────────────────────────────────────────────
+
+def decorrelated_jitter(previous: float, base: float, cap: float) -> float:
+    """Next backoff given the previous one (0 on the first retry)."""
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+def next_retry_delay(error: BaseException, previous: float, log_prefix: str) -> Optional[float]:
+    """Delay before retrying ``error``, or None if the caller should give up.
+
+    Gives up when the process-wide retry budget is spent or the provider
+    asks us to wait longer than AI_RETRY_MAX_RETRY_AFTER_SECONDS (better to
+    fail over than to hold the request open).
+    """
+    hint = retry_after_seconds(error)
+    if hint is not None and hint > settings.AI_RETRY_MAX_RETRY_AFTER_SECONDS:
+        print(f"[{log_prefix}] Provider asked to retry after {hint:.1f}s — not retrying")
+        return None
+    if not get_retry_budget().try_acquire():
+        print(f"[{log_prefix}] Retry budget exhausted — not retrying")
+        return None
+    base = settings.AI_RETRY_BASE_SECONDS
+    if hint is not None:
+        return hint + random.uniform(0, base)
+    return decorrelated_jitter(previous, base, settings.AI_RETRY_MAX_BACKOFF_SECONDS)
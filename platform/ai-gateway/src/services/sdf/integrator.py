@@ -6,43 +6,98 @@ coherent SDF dict. All logic is mechanical: entity dedup by slug,
 field union, module config nesting, reference validation.
 """
 
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 from copy import deepcopy
 
 
 MODULE_ORDER = ["shared", "hr", "invoice", "inventory"]
 
 
+@dataclass
+class PreparedModule:
+    """One module's output after the per-module part of the merge."""
+    module: str
+    # Deep copies keyed by stripped slug; duplicates within the module merged.
+    entities_by_slug: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    module_config: Dict[str, Any] = field(default_factory=dict)
+    clarifications: List[Dict[str, Any]] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+
+
+def prepare_module_output(mod_name: str, output: Any) -> PreparedModule:
+    """
+    Do the merge work that only concerns one module, so it can run as soon
+    as that module's generator returns: drop unusable entities, copy and
+    de-duplicate the rest, and flatten clarifications and warnings.
+    """
+    prepared = PreparedModule(module=mod_name)
+
+    mod_entities = output.entities if hasattr(output, "entities") else output.get("entities", [])
+    for ent in mod_entities:
+        if not isinstance(ent, dict):
+            continue
+        slug = (ent.get("slug") or "").strip()
+        if not slug:
+            continue
+        if slug not in prepared.entities_by_slug:
+            prepared.entities_by_slug[slug] = deepcopy(ent)
+        else:
+            _merge_entity(prepared.entities_by_slug[slug], ent)
+
+    mod_config = output.module_config if hasattr(output, "module_config") else output.get("module_config", {})
+    if isinstance(mod_config, dict):
+        prepared.module_config = deepcopy(mod_config)
+
+    mod_clarifications = (
+        output.clarifications_needed
+        if hasattr(output, "clarifications_needed")
+        else output.get("clarifications_needed", [])
+    )
+    for q in mod_clarifications:
+        q_dict = q.model_dump(exclude_none=True) if hasattr(q, "model_dump") else (q if isinstance(q, dict) else {})
+        prepared.clarifications.append(q_dict)
+
+    mod_warnings = output.warnings if hasattr(output, "warnings") else output.get("warnings", [])
+    if isinstance(mod_warnings, list):
+        prepared.warnings = list(mod_warnings)
+    return prepared
+
+
 def merge_module_outputs(
     project_name: str,
     module_outputs: Dict[str, Any],
     shared_entity_hints: List[str],
     prefilled_sdf: Dict[str, Any],
+    prepared: Optional[Dict[str, PreparedModule]] = None,
 ) -> Dict[str, Any]:
     """
     Combine partial SDF outputs from module generators into one SDF dict.
 
+    ``prepared`` holds modules already run through ``prepare_module_output``
+    (the pipeline prepares each one as its generator finishes); the rest are
+    prepared here. Only the cross-module steps are left for this call.
+    Prepared modules are consumed: their entities become the result's.
+
     Returns a dict matching the IntegratorOutput / SystemDefinitionFile shape:
       { project_name, modules, entities, clarifications_needed, warnings }
     """
     warnings: List[str] = []
+    prepared_modules = {
+        mod_name: (prepared or {}).get(mod_name) or prepare_module_output(mod_name, output)
+        for mod_name, output in module_outputs.items()
+    }
 
     # ── 1. Collect all entities from all module outputs ──────────
     entities_by_slug: Dict[str, Dict[str, Any]] = {}
     slug_sources: Dict[str, set] = {}
     hint_set = set(s.lower().strip() for s in shared_entity_hints)
 
-    for mod_name, output in module_outputs.items():
-        mod_entities = output.entities if hasattr(output, "entities") else output.get("entities", [])
-        for ent in mod_entities:
-            if not isinstance(ent, dict):
-                continue
-            slug = (ent.get("slug") or "").strip()
-            if not slug:
-                continue
-
+    for mod_name, mod in prepared_modules.items():
+        for slug, ent in mod.entities_by_slug.items():
             if slug not in entities_by_slug:
-                entities_by_slug[slug] = deepcopy(ent)
+                # Already a private copy made by prepare_module_output.
+                entities_by_slug[slug] = ent
                 slug_sources[slug] = {mod_name}
             else:
                 slug_sources[slug].add(mod_name)
@@ -92,10 +147,9 @@ def merge_module_outputs(
         if key in prefilled_modules:
             modules[key] = deepcopy(prefilled_modules[key])
 
-    for mod_name, output in module_outputs.items():
-        mod_config = output.module_config if hasattr(output, "module_config") else output.get("module_config", {})
-        if isinstance(mod_config, dict) and mod_config:
-            modules[mod_name] = deepcopy(mod_config)
+    for mod_name, mod in prepared_modules.items():
+        if mod.module_config:
+            modules[mod_name] = mod.module_config
         elif mod_name in prefilled_modules:
             modules[mod_name] = deepcopy(prefilled_modules[mod_name])
         else:
@@ -121,24 +175,16 @@ def merge_module_outputs(
     # ── 6. Collect & deduplicate clarifications ─────────────────
     seen_q_ids: set = set()
     clarifications: List[Dict[str, Any]] = []
-    for output in module_outputs.values():
-        mod_clarifications = (
-            output.clarifications_needed
-            if hasattr(output, "clarifications_needed")
-            else output.get("clarifications_needed", [])
-        )
-        for q in mod_clarifications:
-            q_dict = q.model_dump(exclude_none=True) if hasattr(q, "model_dump") else (q if isinstance(q, dict) else {})
+    for mod in prepared_modules.values():
+        for q_dict in mod.clarifications:
             qid = q_dict.get("id", "")
             if qid and qid not in seen_q_ids:
                 seen_q_ids.add(qid)
                 clarifications.append(q_dict)
 
     # ── 7. Collect warnings from module outputs ─────────────────
-    for output in module_outputs.values():
-        mod_warnings = output.warnings if hasattr(output, "warnings") else output.get("warnings", [])
-        if isinstance(mod_warnings, list):
-            warnings.extend(mod_warnings)
+    for mod in prepared_modules.values():
+        warnings.extend(mod.warnings)
 
     return {
         "project_name": project_name,
@@ -92,6 +92,9 @@ class SDFService:
         selected_modules: Optional[List[str]] = None,
         business_answers: Optional[Dict[str, Dict[str, str]]] = None,
         acknowledged_unsupported_features: Optional[List[str]] = None,
+        project_id: Optional[str] = None,
+        reuse_checkpoints: bool = False,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
     ) -> tuple["SystemDefinitionFile", "PipelineResult"]:
         """
         Generates an SDF using the multi-agent pipeline.
@@ -104,6 +107,11 @@ class SDFService:
            never be removed by the AI -- only added to.
         2. AI-generated clarification questions that duplicate default wizard
            topics are filtered out programmatically.
+
+        With a project_id the pipeline checkpoints its stages;
+        reuse_checkpoints (clarify cycles) skips stages whose inputs are
+        unchanged since the project's last run. on_event hears stage
+        start/finish events and each module's output as it lands.
         """
         print("[SDFService] Generating SDF using multi-agent pipeline...")
 
@@ -128,6 +136,9 @@ class SDFService:
             selected_modules=normalized_selected,
             business_answers=business_answers,
             acknowledged_unsupported_features=acknowledged_unsupported_features,
+            project_id=project_id,
+            reuse_checkpoints=reuse_checkpoints,
+            on_event=on_event,
         )
 
         if not result.success:
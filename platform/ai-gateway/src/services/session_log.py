@@ -0,0 +1,197 @@
+"""
+Background writer for training-session records (training_data/sessions.jsonl).
+
+A full /ai/analyze record carries every prompt and raw response, so
+appending it (and indexing it) inside the endpoint blocks the event loop.
+``SessionLogWriter.write`` serializes the record, so later changes to the
+caller's dicts can't leak into the log, and only enqueues the line; one
+background task drains the queue and appends each batch from a thread with
+a single write. With a ``SessionStore`` attached, the same batch is also
+inserted into the indexed store behind /ai/training/*. A batch that fails
+is logged and counted; the writer keeps going.
+
+- The queue is bounded (``AI_TRAINING_LOG_QUEUE_SIZE``): when the disk
+  falls behind, new records are dropped and counted instead of growing
+  memory or slowing requests.
+- ``AI_TRAINING_LOG_FSYNC``: ``always`` syncs after every batch,
+  ``interval`` at most every ``AI_TRAINING_LOG_FSYNC_INTERVAL_SECONDS``,
+  ``never`` leaves it to the OS.
+- ``stop()`` writes everything still queued and syncs before returning.
+
+Called outside a running event loop (scripts), ``write`` appends inline.
+"""
+
+import asyncio
+import json
+import os
+import pathlib
+import time
+from typing import Any, Dict, List, Optional
+
+from src.config import settings
+from src.services.session_store import SessionStore, get_session_store
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+_STOP = object()
+
+
+class SessionLogWriter:
+    """Appends JSONL records from a bounded queue in batches."""
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        max_pending: int = 1000,
+        batch_size: int = 50,
+        fsync: str = "interval",
+        fsync_interval: float = 1.0,
+        store: Optional[SessionStore] = None,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            print(f"[SessionLog] Unknown fsync policy '{fsync}'; using interval")
+            fsync = "interval"
+        self.path = path
+        self.max_pending = max_pending
+        self.batch_size = max(1, batch_size)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.store = store
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_fsync = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.last_batch_ms = 0.0
+        self.max_batch_ms = 0.0
+
+    # ── public API ────────────────────────────────────────────────
+
+    def write(self, record: Dict[str, Any]) -> bool:
+        """Queue a record; returns False when it was dropped (queue full or unserializable)."""
+        try:
+            line = json.dumps(record, ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as e:
+            self.failed += 1
+            print(f"[SessionLog] Could not serialize session {record.get('session_id')}: {e}")
+            return False
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._append([line], sync=self.fsync != "never")
+            return True
+        if self._loop is not loop:
+            self._start(loop)
+        try:
+            self._queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                print(f"[SessionLog] Writer is behind; dropped {self.dropped} record(s) so far")
+            return False
+        return True
+
+    async def stop(self) -> None:
+        """Write every queued record, sync, and stop the writer task."""
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._queue, self._task, self._loop = None, None, None
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "fsync": self.fsync,
+            "last_batch_ms": round(self.last_batch_ms, 1),
+            "max_batch_ms": round(self.max_batch_ms, 1),
+        }
+
+    # ── writer ────────────────────────────────────────────────────
+
+    def _start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = loop.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[str] = []
+            item = await self._queue.get()
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+            # On stop, an interval-synced tail still needs its fsync.
+            if batch or (stopping and self.fsync == "interval"):
+                sync = self.fsync == "always" or (
+                    self.fsync == "interval"
+                    and (stopping or time.monotonic() - self._last_fsync >= self.fsync_interval)
+                )
+                try:
+                    await asyncio.to_thread(self._append, batch, sync)
+                except Exception as e:
+                    self.failed += len(batch)
+                    print(f"[SessionLog] Failed to write {len(batch)} training session(s): {e}")
+
+    def _append(self, lines: List[str], sync: bool) -> None:
+        started = time.monotonic()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if lines:
+                    f.write("".join(line + "\n" for line in lines))
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.fsyncs += 1
+                    self._last_fsync = time.monotonic()
+        except OSError as e:
+            self.failed += len(lines)
+            print(f"[SessionLog] Failed to write {len(lines)} training session(s): {e}")
+            return
+        if self.store is not None and lines:
+            try:
+                self.store.add_many((json.loads(line), line) for line in lines)
+            except Exception as e:
+                print(f"[SessionLog] Failed to index {len(lines)} training session(s): {e}")
+        self.written += len(lines)
+        self.batches += 1
+        self.last_batch_ms = (time.monotonic() - started) * 1000
+        self.max_batch_ms = max(self.max_batch_ms, self.last_batch_ms)
+
+
+_writer: Optional[SessionLogWriter] = None
+
+
+def get_session_log(path: pathlib.Path) -> SessionLogWriter:
+    """Return the process-wide session writer for ``path``, creating it from settings."""
+    global _writer
+    if _writer is None:
+        _writer = SessionLogWriter(
+            path,
+            max_pending=settings.AI_TRAINING_LOG_QUEUE_SIZE,
+            batch_size=settings.AI_TRAINING_LOG_BATCH_SIZE,
+            fsync=settings.AI_TRAINING_LOG_FSYNC,
+            fsync_interval=settings.AI_TRAINING_LOG_FSYNC_INTERVAL_SECONDS,
+            store=get_session_store(),
+        )
+    return _writer
+
+
+def session_log_snapshot() -> Optional[dict]:
+    return _writer.snapshot() if _writer is not None else None
@@ -0,0 +1,319 @@
+"""
+Indexed sqlite store behind the /ai/training/* endpoints.
+
+sessions.jsonl stays the append-only training log (the mock provider
+replays it), but reading it meant parsing the whole history on every
+request. Every record the session writer appends is also inserted here,
+with the list-view fields (endpoint, timestamp, agents, description
+snippet, token total) in indexed columns next to the full record.
+
+Listing is newest first by (timestamp, id). Pass the previous page's
+``next_cursor`` as ``cursor`` to fetch the next page with an index seek
+instead of an OFFSET scan. ``export`` walks the filtered records oldest
+first the same way, a page at a time. ``import_jsonl`` loads an existing
+sessions.jsonl once; re-running it skips records already stored.
+"""
+
+import asyncio
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.config import settings
+
+_IMPORT_BATCH = 500
+
+
+def _summary_fields(record: Dict[str, Any]) -> Tuple[str, str, str, List[str], int, int]:
+    inp = record.get("input") or {}
+    desc = inp.get("business_description", inp.get("message", "")) if isinstance(inp, dict) else ""
+    step_logs = record.get("step_logs") or []
+    agents = [s.get("agent", "") for s in step_logs if isinstance(s, dict)]
+    usage = (record.get("token_usage") or {}).get("total") or {}
+    total_tokens = usage.get("total", usage.get("prompt", 0) + usage.get("completion", 0)) if isinstance(usage, dict) else 0
+    return (
+        record.get("timestamp", "") or "",
+        record.get("endpoint", "") or "",
+        desc[:200] if isinstance(desc, str) else "",
+        agents,
+        len(step_logs),
+        int(total_tokens or 0),
+    )
+
+
+class SessionStore:
+    """Training sessions in sqlite, indexed for the list/detail/stats endpoints."""
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._imported: set = set()
+        self.inserted = 0
+        self.imported = 0
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        with self._db_lock:
+            conn = sqlite3.connect(str(self.db_path), timeout=5)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def _init_db(self) -> None:
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id INTEGER PRIMARY KEY,"
+                " session_id TEXT NOT NULL UNIQUE,"
+                " timestamp TEXT NOT NULL,"
+                " endpoint TEXT NOT NULL,"
+                " description_snippet TEXT NOT NULL,"
+                " agents TEXT NOT NULL,"
+                " step_count INTEGER NOT NULL,"
+                " token_usage TEXT NOT NULL,"
+                " total_tokens INTEGER NOT NULL,"
+                " record TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_agents ("
+                " agent TEXT NOT NULL,"
+                " session_row INTEGER NOT NULL,"
+                " PRIMARY KEY (agent, session_row))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_by_time ON sessions (timestamp, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_by_endpoint ON sessions (endpoint, timestamp, id)")
+
+    # ── writes ────────────────────────────────────────────────────
+
+    def _insert(self, conn: sqlite3.Connection, record: Dict[str, Any], line: str) -> bool:
+        session_id = record.get("session_id") or hashlib.sha256(line.encode()).hexdigest()
+        timestamp, endpoint, snippet, agents, step_count, total_tokens = _summary_fields(record)
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO sessions"
+            " (session_id, timestamp, endpoint, description_snippet, agents, step_count, token_usage, total_tokens, record)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                session_id, timestamp, endpoint, snippet, json.dumps(agents), step_count,
+                json.dumps(record.get("token_usage") or {}, default=str), total_tokens, line,
+            ),
+        )
+        if not cursor.rowcount:
+            return False
+        conn.executemany(
+            "INSERT OR IGNORE INTO session_agents VALUES (?, ?)",
+            [(agent, cursor.lastrowid) for agent in set(agents)],
+        )
+        return True
+
+    def add_many(self, entries: Iterable[Tuple[Dict[str, Any], str]]) -> int:
+        """Insert (record, serialized record) pairs; returns how many were new."""
+        with self._db() as conn:
+            added = sum(self._insert(conn, record, line) for record, line in entries)
+        self.inserted += added
+        return added
+
+    def _import(self, path: pathlib.Path) -> int:
+        key = f"imported:{path.resolve()}"
+        with self._db() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+        added = 0
+        if path.exists():
+            batch: List[Tuple[Dict[str, Any], str]] = []
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict):
+                        batch.append((record, line))
+                    if len(batch) >= _IMPORT_BATCH:
+                        added += self.add_many(batch)
+                        batch = []
+            added += self.add_many(batch)
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(added)))
+        return added
+
+    async def import_jsonl(self, path: pathlib.Path) -> int:
+        """Load an existing sessions.jsonl once; later calls are no-ops."""
+        if path in self._imported:
+            return 0
+        added = await asyncio.to_thread(self._import, path)
+        self._imported.add(path)
+        self.imported += added
+        if added:
+            print(f"[SessionStore] Imported {added} training session(s) from {path.name}")
+        return added
+
+    # ── reads ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def _where(
+        endpoint: Optional[str] = None,
+        agent: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        session_ids: Optional[List[str]] = None,
+    ) -> Tuple[List[str], List[Any]]:
+        where, params = [], []
+        if endpoint:
+            where.append("endpoint = ?")
+            params.append(endpoint)
+        if agent:
+            where.append("id IN (SELECT session_row FROM session_agents WHERE agent = ?)")
+            params.append(agent)
+        if since:
+            where.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("timestamp < ?")
+            params.append(until)
+        if session_ids is not None:
+            # One JSON parameter instead of one per id: no host-parameter limit.
+            where.append("session_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(session_ids))
+        return where, params
+
+    def _list(
+        self, limit: int, offset: int, endpoint: Optional[str], agent: Optional[str], cursor: Optional[int],
+    ) -> Tuple[int, List[Dict[str, Any]], Optional[int]]:
+        where, params = self._where(endpoint, agent)
+        filters = (" WHERE " + " AND ".join(where)) if where else ""
+        with self._db() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM sessions{filters}", params).fetchone()[0]
+            page_where, page_params = list(where), list(params)
+            if cursor is not None:
+                page_where.append("(timestamp, id) < (SELECT timestamp, id FROM sessions WHERE id = ?)")
+                page_params.append(cursor)
+                offset = 0
+            page_filters = (" WHERE " + " AND ".join(page_where)) if page_where else ""
+            rows = conn.execute(
+                "SELECT id, session_id, timestamp, endpoint, description_snippet, step_count, agents, token_usage"
+                f" FROM sessions{page_filters} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                (*page_params, max(0, limit), max(0, offset)),
+            ).fetchall()
+        summaries = [
+            {
+                "session_id": row[1],
+                "timestamp": row[2],
+                "endpoint": row[3],
+                "description_snippet": row[4],
+                "step_count": row[5],
+                "agents": json.loads(row[6]),
+                "token_usage": json.loads(row[7]),
+            }
+            for row in rows
+        ]
+        next_cursor = rows[-1][0] if rows and len(rows) == limit else None
+        return total, summaries, next_cursor
+
+    def _export_page(
+        self, where: List[str], params: List[Any], after: Optional[int], limit: int,
+    ) -> List[Tuple[int, str]]:
+        where, params = list(where), list(params)
+        if after is not None:
+            where.append("(timestamp, id) > (SELECT timestamp, id FROM sessions WHERE id = ?)")
+            params.append(after)
+        filters = (" WHERE " + " AND ".join(where)) if where else ""
+        with self._db() as conn:
+            return conn.execute(
+                f"SELECT id, record FROM sessions{filters} ORDER BY timestamp, id LIMIT ?", (*params, limit),
+            ).fetchall()
+
+    def _get(self, session_id: str) -> Optional[str]:
+        with self._db() as conn:
+            row = conn.execute("SELECT record FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def _stats(self) -> Dict[str, Any]:
+        with self._db() as conn:
+            total, total_tokens = conn.execute("SELECT COUNT(*), COALESCE(SUM(total_tokens), 0) FROM sessions").fetchone()
+            by_endpoint = dict(conn.execute(
+                "SELECT CASE WHEN endpoint = '' THEN 'unknown' ELSE endpoint END, COUNT(*) FROM sessions GROUP BY 1"
+            ).fetchall())
+            earliest, latest = conn.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM sessions WHERE timestamp != ''"
+            ).fetchone()
+        if not total:
+            return {"total_sessions": 0, "by_endpoint": {}, "date_range": None}
+        return {
+            "total_sessions": total,
+            "by_endpoint": by_endpoint,
+            "total_tokens": total_tokens,
+            "date_range": {"earliest": earliest, "latest": latest} if earliest else None,
+        }
+
+    async def list_sessions(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        endpoint: Optional[str] = None,
+        agent: Optional[str] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[int, List[Dict[str, Any]], Optional[int]]:
+        """(total matching, page of summaries, cursor for the next page or None)."""
+        return await asyncio.to_thread(self._list, limit, offset, endpoint, agent, cursor)
+
+    async def export(
+        self,
+        endpoint: Optional[str] = None,
+        agent: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        session_ids: Optional[List[str]] = None,
+        page_size: int = 200,
+    ) -> AsyncIterator[str]:
+        """Yield the serialized records matching the filters, oldest first.
+
+        Pages are read with a keyset seek, so memory stays at one page and
+        the database is not locked between pages.
+        """
+        where, params = self._where(endpoint, agent, since, until, session_ids)
+        after = None
+        while True:
+            rows = await asyncio.to_thread(self._export_page, where, params, after, page_size)
+            for _, record in rows:
+                yield record
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = await asyncio.to_thread(self._get, session_id)
+        return json.loads(raw) if raw is not None else None
+
+    async def stats(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._stats)
+
+    def snapshot(self) -> dict:
+        return {"inserted": self.inserted, "imported": self.imported}
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store at AI_TRAINING_DB_PATH."""
+    global _store
+    if _store is None:
+        _store = SessionStore(pathlib.Path(settings.AI_TRAINING_DB_PATH))
+    return _store
+
+
+def session_store_snapshot() -> Optional[dict]:
+    return _store.snapshot() if _store is not None else None
@@ -0,0 +1,83 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+The backend retries /ai/analyze and /ai/edit when they time out and users
+double-click "Generate", so the same payload for the same project often
+arrives while the first pipeline is still running. ``SingleFlight.run``
+keys each call by a canonical hash of the request body plus ``project_id``;
+a duplicate that arrives while a call with the same key is running awaits
+that call's task instead of starting its own pipeline, and gets the same
+result (or the same exception).
+
+The shared task is shielded: a caller that goes away does not cancel the
+work the other callers are waiting on.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(endpoint: str, body: Any, project_id: Optional[str] = None) -> str:
+    """Canonical hash of a request: key order and whitespace do not matter."""
+    payload = json.dumps(
+        [endpoint, project_id or "", body],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one task per key; concurrent callers share it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            print(f"[SingleFlight:{self.name}] Duplicate request joined in-flight call {key[:12]}")
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        self.started += 1
+
+        def _forget(done: asyncio.Task) -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            # Mark the exception retrieved even if every caller went away.
+            if not done.cancelled():
+                done.exception()
+
+        task.add_done_callback(_forget)
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+_flights: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    flight = _flights.get(name)
+    if flight is None:
+        flight = SingleFlight(name)
+        _flights[name] = flight
+    return flight
+
+
+def single_flight_snapshot() -> dict:
+    return {name: flight.snapshot() for name, flight in _flights.items()}
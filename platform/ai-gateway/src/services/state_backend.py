@@ -0,0 +1,312 @@
+"""
+Pluggable key/value state shared by the gateway's worker processes.
+
+Per-request state that another worker may be asked about (generation
+progress today) goes through a ``StateBackend`` instead of a module-level
+dict, so ``uvicorn --workers N`` behind one port answers consistently.
+Every entry can carry a TTL; expired entries read as missing.
+
+Backends (``AI_STATE_BACKEND``):
+
+- ``memory`` – a dict in this process (the default; single worker only).
+- ``sqlite`` – a WAL-mode sqlite file (``AI_STATE_DB_PATH``) shared by all
+  workers on one host.
+- ``redis`` – any Redis-compatible server at ``AI_STATE_REDIS_URL`` (needs
+  the optional ``redis`` package). Without a URL it runs against
+  ``LocalRedis``, an in-process stand-in with the same command subset.
+
+With ``AI_GATEWAY_WORKERS`` > 1, ``check_multi_worker`` refuses the
+process-local backends at startup. The push streams
+(/ai/progress/{id}/stream and its WebSocket) stay per process either way:
+they only see runs on the worker that serves them.
+
+Values must be JSON-serializable. ``StateWriter`` lets synchronous callers
+(the pipeline's ``on_progress`` callback) write without awaiting: writes
+per key are coalesced and applied in order by one background task.
+"""
+
+import asyncio
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.config import settings
+
+
+class StateBackend:
+    """Async get/set/delete of JSON values by (namespace, key), with optional TTL."""
+
+    name = "base"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemoryStateBackend(StateBackend):
+    name = "memory"
+
+    def __init__(self, sweep_every: int = 256):
+        self._data: Dict[Tuple[str, str], Tuple[Any, Optional[float]]] = {}
+        self._sweep_every = sweep_every
+        self._writes = 0
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._data.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[(namespace, key)]
+            return None
+        return value
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[(namespace, key)] = (value, time.time() + ttl if ttl is not None else None)
+        self._writes += 1
+        if self._writes % self._sweep_every == 0:
+            now = time.time()
+            for k in [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]:
+                del self._data[k]
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self._data.pop((namespace, key), None)
+
+    def snapshot(self) -> dict:
+        return {"backend": self.name, "entries": len(self._data)}
+
+
+class SqliteStateBackend(StateBackend):
+    name = "sqlite"
+
+    def __init__(self, db_path: pathlib.Path, sweep_every: int = 256):
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._sweep_every = sweep_every
+        self._writes = 0
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as conn:
+            # WAL lets readers in other workers proceed while one writes.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        with self._db_lock:
+            conn = sqlite3.connect(str(self.db_path), timeout=5)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    def _get(self, namespace: str, key: str) -> Optional[str]:
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, namespace: str, key: str, value: str, expires_at: Optional[float], sweep: bool) -> None:
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)", (namespace, key, value, expires_at))
+            if sweep:
+                conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def _delete(self, namespace: str, key: str) -> None:
+        with self._db() as conn:
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            raw = await asyncio.to_thread(self._get, namespace, key)
+        except sqlite3.Error as e:
+            print(f"[StateBackend] sqlite read failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._writes += 1
+        expires_at = time.time() + ttl if ttl is not None else None
+        try:
+            await asyncio.to_thread(
+                self._set, namespace, key, json.dumps(value, default=str), expires_at,
+                self._writes % self._sweep_every == 0,
+            )
+        except sqlite3.Error as e:
+            print(f"[StateBackend] sqlite write failed: {e}")
+
+    async def delete(self, namespace: str, key: str) -> None:
+        try:
+            await asyncio.to_thread(self._delete, namespace, key)
+        except sqlite3.Error as e:
+            print(f"[StateBackend] sqlite delete failed: {e}")
+
+
+class LocalRedis:
+    """In-process stand-in for the redis.asyncio commands RedisStateBackend uses."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    async def get(self, name: str) -> Optional[str]:
+        entry = self._data.get(name)
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            self._data.pop(name, None)
+            return None
+        return entry[0]
+
+    async def set(self, name: str, value: str, ex: Optional[float] = None, px: Optional[int] = None) -> bool:
+        ttl = px / 1000 if px is not None else ex
+        self._data[name] = (value, time.time() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class RedisStateBackend(StateBackend):
+    name = "redis"
+
+    def __init__(self, client: Any, prefix: str = "ai-gateway"):
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            raw = await self.client.get(self._key(namespace, key))
+        except Exception as e:
+            self.errors += 1
+            print(f"[StateBackend] redis read failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            await self.client.set(
+                self._key(namespace, key), json.dumps(value, default=str),
+                px=max(1, int(ttl * 1000)) if ttl is not None else None,
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"[StateBackend] redis write failed: {e}")
+
+    async def delete(self, namespace: str, key: str) -> None:
+        try:
+            await self.client.delete(self._key(namespace, key))
+        except Exception as e:
+            self.errors += 1
+            print(f"[StateBackend] redis delete failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {"backend": self.name, "client": type(self.client).__name__, "errors": self.errors}
+
+
+class StateWriter:
+    """Fire-and-forget writes from synchronous code, applied in order per key.
+
+    Only the latest pending value of a key is written: a burst of progress
+    updates costs one backend write per round trip, not one per update.
+    """
+
+    def __init__(self, backend: StateBackend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+        self._pending: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Schedule a write; a value of None deletes the key."""
+        self._pending[key] = (value, ttl)
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.ensure_future(self._flush(key))
+
+    async def _flush(self, key: str) -> None:
+        try:
+            while key in self._pending:
+                value, ttl = self._pending.pop(key)
+                if value is None:
+                    await self.backend.delete(self.namespace, key)
+                else:
+                    await self.backend.set(self.namespace, key, value, ttl)
+        finally:
+            del self._tasks[key]
+
+    async def drain(self) -> None:
+        """Wait until every pending write has been applied."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+
+_backend: Optional[StateBackend] = None
+
+
+def get_state_backend() -> StateBackend:
+    """Return the process-wide state backend selected by AI_STATE_BACKEND."""
+    global _backend
+    if _backend is None:
+        kind = settings.AI_STATE_BACKEND
+        if kind == "sqlite":
+            _backend = SqliteStateBackend(pathlib.Path(settings.AI_STATE_DB_PATH))
+        elif kind == "redis":
+            if settings.AI_STATE_REDIS_URL:
+                import redis.asyncio as redis_asyncio  # optional dependency, see requirements.txt
+
+                client = redis_asyncio.from_url(settings.AI_STATE_REDIS_URL, decode_responses=True)
+            else:
+                print("[StateBackend] AI_STATE_REDIS_URL is not set; using the in-process LocalRedis stand-in")
+                client = LocalRedis()
+            _backend = RedisStateBackend(client, prefix=settings.AI_STATE_REDIS_PREFIX)
+        else:
+            if kind != "memory":
+                print(f"[StateBackend] Unknown AI_STATE_BACKEND '{kind}'; using memory")
+            _backend = MemoryStateBackend()
+    return _backend
+
+
+def check_multi_worker(workers: int) -> None:
+    """Fail fast when several workers would each keep their own progress state."""
+    if workers <= 1:
+        return
+    kind = settings.AI_STATE_BACKEND
+    if kind == "memory" or (kind == "redis" and not settings.AI_STATE_REDIS_URL):
+        raise RuntimeError(
+            f"AI_GATEWAY_WORKERS={workers} needs shared state, but AI_STATE_BACKEND={kind}"
+            + (" without AI_STATE_REDIS_URL" if kind == "redis" else "")
+            + " is per process. Use AI_STATE_BACKEND=sqlite or a Redis URL."
+        )
+    print(
+        f"[StateBackend] {workers} workers: progress streams (SSE/WebSocket) only see runs on their own "
+        "worker; use sticky sessions for them or poll /ai/progress/{project_id}"
+    )
+
+
+def state_backend_snapshot() -> Optional[dict]:
+    return _backend.snapshot() if _backend is not None else None
@@ -0,0 +1,216 @@
+"""
+Incremental JSON parsing of streamed generator output.
+
+Module generators answer with one large object whose bulk is the
+``entities`` array. ``IncrementalJSONParser`` is fed ``generate_stream()``
+deltas as they arrive and:
+
+- hands back each ``entities[i]`` object as soon as its closing brace
+  arrives, so callers can report or keep entities before the body is done;
+- checks the structure as it goes (bracket nesting, ``,``/``:`` placement,
+  literal spelling) and raises ``StreamJSONError`` at the first character
+  that can't belong to a JSON document, so the caller can abandon the
+  stream and retry instead of waiting for the rest of an 8k-token body.
+
+Anything before the first ``{`` (a ```` ```json ```` fence, a sentence) and
+after the root object closes is ignored, and trailing commas are allowed,
+matching what ``MultiAgentService._parse_json`` already tolerates.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_LITERAL_CHAR = re.compile(r"[\w.+-]")
+_LITERAL = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Container states: what the next significant character may be.
+_KEY_OR_END = "key_or_end"      # just after "{"
+_KEY = "key"                    # after "," in an object
+_COLON = "colon"
+_VALUE = "value"                # after ":" or after "," in an array
+_VALUE_OR_END = "value_or_end"  # just after "["
+_COMMA_OR_END = "comma_or_end"
+
+
+class StreamJSONError(ValueError):
+    """The streamed text can no longer become a valid JSON document."""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+
+class _Frame:
+    __slots__ = ("kind", "state", "last_key", "collects")
+
+    def __init__(self, kind: str, state: str, collects: bool = False):
+        self.kind = kind
+        self.state = state
+        self.last_key: Optional[str] = None
+        # True for the root-level array whose elements are emitted.
+        self.collects = collects
+
+
+class IncrementalJSONParser:
+    """Validates a streamed JSON object and emits elements of one array."""
+
+    def __init__(self, array_key: str = "entities"):
+        self.array_key = array_key
+        self.entities: List[Dict[str, Any]] = []
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._root_start = -1
+        self._root_end = -1
+        self._in_string = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._literal_start = -1
+        self._element_start = -1
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def complete(self) -> bool:
+        """True once the root object has closed."""
+        return self._root_end != -1
+
+    def feed(self, chunk: str) -> List[Tuple[int, Dict[str, Any]]]:
+        """Consume a delta; return ``(index, element)`` for newly closed elements."""
+        self._text += chunk
+        emitted: List[Tuple[int, Dict[str, Any]]] = []
+        text = self._text
+        i = self._pos
+        n = len(text)
+        while i < n and not self.complete:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, i)
+                if match is None:
+                    i = n
+                    break
+                i = match.start()
+                if text[i] == "\\":
+                    if i + 1 >= n:
+                        break  # escape split across chunks; wait for more
+                    i += 2
+                    continue
+                self._in_string = False
+                self._end_string(text, i)
+                i += 1
+                continue
+
+            if self._literal_start != -1:
+                if _LITERAL_CHAR.match(text, i):
+                    i += 1
+                    continue
+                self._end_literal(text, i)
+
+            ch = text[i]
+            if not self._stack:
+                if ch == "{":
+                    self._root_start = i
+                    self._stack.append(_Frame("{", _KEY_OR_END))
+                i += 1
+                continue
+            if ch in " \t\r\n":
+                i += 1
+                continue
+
+            top = self._stack[-1]
+            if ch == '"':
+                self._string_is_key = top.kind == "{" and top.state in (_KEY_OR_END, _KEY)
+                if not self._string_is_key:
+                    self._expect_value(top, i)
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._expect_value(top, i)
+                collects = (
+                    ch == "[" and len(self._stack) == 1 and top.last_key == self.array_key
+                )
+                if ch == "{" and top.collects:
+                    self._element_start = i
+                self._stack.append(_Frame(ch, _KEY_OR_END if ch == "{" else _VALUE_OR_END, collects))
+            elif ch in "}]":
+                self._close(top, ch, i, emitted)
+            elif ch == ",":
+                if top.state != _COMMA_OR_END:
+                    raise StreamJSONError("unexpected ','", i)
+                top.state = _KEY if top.kind == "{" else _VALUE
+            elif ch == ":":
+                if top.kind != "{" or top.state != _COLON:
+                    raise StreamJSONError("unexpected ':'", i)
+                top.state = _VALUE
+            elif _LITERAL_CHAR.match(ch):
+                self._expect_value(top, i)
+                self._literal_start = i
+            else:
+                raise StreamJSONError(f"unexpected character {ch!r}", i)
+            i += 1
+        self._pos = i
+        return emitted
+
+    def document(self) -> Dict[str, Any]:
+        """The parsed root object; only valid once ``complete`` is True."""
+        if not self.complete:
+            raise StreamJSONError("document is incomplete", len(self._text))
+        return self._loads(self._text[self._root_start:self._root_end + 1], self._root_start)
+
+    # ── internals ────────────────────────────────────────────────
+
+    @staticmethod
+    def _expect_value(top: _Frame, i: int) -> None:
+        if top.kind == "{":
+            if top.state == _COLON:
+                raise StreamJSONError("expected ':'", i)
+            if top.state != _VALUE:
+                raise StreamJSONError("expected an object key", i)
+        elif top.state not in (_VALUE, _VALUE_OR_END):
+            raise StreamJSONError("expected ',' or ']'", i)
+        top.state = _COMMA_OR_END
+
+    def _end_string(self, text: str, i: int) -> None:
+        if self._string_is_key:
+            top = self._stack[-1]
+            top.last_key = text[self._string_start + 1:i]
+            top.state = _COLON
+
+    def _end_literal(self, text: str, i: int) -> None:
+        literal = text[self._literal_start:i]
+        if not _LITERAL.fullmatch(literal):
+            raise StreamJSONError(f"invalid literal {literal[:20]!r}", self._literal_start)
+        self._literal_start = -1
+
+    def _close(self, top: _Frame, ch: str, i: int, emitted: List[Tuple[int, Dict[str, Any]]]) -> None:
+        if ch == "}":
+            # A state of _KEY means a trailing comma, which is tolerated.
+            if top.kind != "{" or top.state not in (_KEY_OR_END, _KEY, _COMMA_OR_END):
+                raise StreamJSONError("unexpected '}'", i)
+        elif top.kind != "[" or top.state not in (_VALUE_OR_END, _VALUE, _COMMA_OR_END):
+            raise StreamJSONError("unexpected ']'", i)
+        self._stack.pop()
+        if not self._stack:
+            self._root_end = i
+            return
+        if ch == "}" and self._stack[-1].collects:
+            element = self._loads(self._text[self._element_start:i + 1], self._element_start)
+            emitted.append((len(self.entities), element))
+            self.entities.append(element)
+
+    @staticmethod
+    def _loads(fragment: str, position: int) -> Dict[str, Any]:
+        try:
+            return json.loads(fragment)
+        except json.JSONDecodeError:
+            pass
+        fixed = _CONTROL_CHARS.sub("", _TRAILING_COMMA.sub(r"\1", fragment))
+        try:
+            return json.loads(fixed)
+        except json.JSONDecodeError as e:
+            raise StreamJSONError(f"invalid JSON ({e.msg})", position + e.pos) from e
@@ -0,0 +1,146 @@
+"""
+Local token estimation and output-budget planning.
+
+Provider tokenizers are not shipped with the gateway (tiktoken needs a
+network download for its vocabularies, Gemini counts tokens with an API
+call), so prompts are measured with a small regex model of how BPE /
+SentencePiece vocabularies split text: ASCII words cost roughly one token
+per few letters, digit runs are chunked, non-ASCII text (Turkish, CJK) is
+close to a token per character, and punctuation runs pair up. The
+constants differ per model family and err on the high side.
+
+``plan_max_output_tokens`` turns an estimate into the ``max_tokens`` for a
+call: the agent's configured budget, clipped to the model's output limit and
+to whatever room the prompt leaves in the context window.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Tuple
+
+from src.config import settings
+
+
+@dataclass(frozen=True)
+class TokenizerProfile:
+    """Per-family constants for the regex estimator."""
+    name: str
+    # ASCII letters per token within one word.
+    letters_per_token: float
+    # Digits per token within one number.
+    digits_per_token: float
+    # Tokens per non-ASCII character.
+    non_ascii_per_char: float
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    family: str
+    context_window: int
+    max_output_tokens: int
+
+
+PROFILES = {
+    "o200k": TokenizerProfile("o200k", letters_per_token=7.0, digits_per_token=3.0, non_ascii_per_char=0.75),
+    "cl100k": TokenizerProfile("cl100k", letters_per_token=6.0, digits_per_token=3.0, non_ascii_per_char=1.0),
+    "gemini": TokenizerProfile("gemini", letters_per_token=7.0, digits_per_token=1.0, non_ascii_per_char=0.6),
+    "default": TokenizerProfile("default", letters_per_token=5.0, digits_per_token=2.0, non_ascii_per_char=1.0),
+}
+
+# Matched against the lowercased model or deployment name, first hit wins.
+# Azure deployment names are free-form, so these are substring patterns.
+_MODEL_SPECS: Tuple[Tuple[re.Pattern, ModelSpec], ...] = (
+    (re.compile(r"gpt-?4\.1"), ModelSpec("o200k", 1_047_576, 32_768)),
+    (re.compile(r"gpt-?4o"), ModelSpec("o200k", 128_000, 16_384)),
+    (re.compile(r"gpt-?5"), ModelSpec("o200k", 400_000, 128_000)),
+    (re.compile(r"(?:^|[-_])o[1-9](?:-|_|$)"), ModelSpec("o200k", 200_000, 100_000)),
+    # Legacy GPT-4 (4K output) only by its exact model names: a free-form
+    # deployment such as "gpt4-hr-specialist" must not be clipped to 4096.
+    (
+        re.compile(r"(?:^|[-_/])gpt-4-(?:turbo(?:-\d{4}-\d{2}-\d{2})?(?:-preview)?|\d{4}-preview|vision-preview)$"),
+        ModelSpec("cl100k", 128_000, 4_096),
+    ),
+    (re.compile(r"(?:^|[-_/])gpt-4-32k(?:-\d{4})?$"), ModelSpec("cl100k", 32_768, 4_096)),
+    (re.compile(r"(?:^|[-_/])gpt-4(?:-\d{4})?$"), ModelSpec("cl100k", 8_192, 4_096)),
+    (re.compile(r"gpt-?3\.?5"), ModelSpec("cl100k", 16_385, 4_096)),
+    (re.compile(r"gemini-?2\.5"), ModelSpec("gemini", 1_048_576, 65_536)),
+    (re.compile(r"gemini"), ModelSpec("gemini", 1_048_576, 8_192)),
+)
+_DEFAULT_SPEC = ModelSpec("default", 128_000, 8_192)
+
+_PIECE_RE = re.compile(
+    r"(?P<word>[A-Za-z]+)"
+    r"|(?P<digits>[0-9]+)"
+    r"|(?P<space>\s+)"
+    r"|(?P<punct>[!-/:-@\[-`{-~]+)"
+    r"|(?P<other>[^\x00-\x7f]+)"
+)
+
+
+class PromptTooLargeError(ValueError):
+    """The prompt leaves no room for a useful completion in the context window."""
+
+
+def model_spec(model: str) -> ModelSpec:
+    name = (model or "").lower()
+    for pattern, spec in _MODEL_SPECS:
+        if pattern.search(name):
+            return spec
+    return _DEFAULT_SPEC
+
+
+def model_family(model: str) -> str:
+    return model_spec(model).family
+
+
+def estimate_tokens(text: str, model: str = "") -> int:
+    """Estimated token count of ``text`` under ``model``'s tokenizer family."""
+    if not text:
+        return 0
+    profile = PROFILES[model_family(model)]
+    tokens = 0
+    for match in _PIECE_RE.finditer(text):
+        kind = match.lastgroup
+        size = match.end() - match.start()
+        if kind == "word":
+            tokens += math.ceil(size / profile.letters_per_token)
+        elif kind == "digits":
+            tokens += math.ceil(size / profile.digits_per_token)
+        elif kind == "space":
+            # A single space merges into the following word; newlines and
+            # indentation runs are tokens of their own.
+            if size > 1 or match.group() != " ":
+                tokens += 1
+        elif kind == "punct":
+            tokens += math.ceil(size / 2)
+        else:
+            tokens += math.ceil(size * profile.non_ascii_per_char)
+    return tokens
+
+
+def plan_max_output_tokens(prompt_tokens: int, model: str, budget: int) -> int:
+    """Output tokens to request for a prompt of ``prompt_tokens`` on ``model``.
+
+    Raises ``PromptTooLargeError`` when fewer than ``AI_MIN_OUTPUT_TOKENS``
+    would fit; sending such a call would only come back truncated.
+    """
+    spec = model_spec(model)
+    # Headroom for estimator error and chat-format framing tokens.
+    padded_prompt = int(prompt_tokens * 1.1) + 64
+    room = spec.context_window - padded_prompt
+    planned = min(budget, spec.max_output_tokens, room)
+
+    if padded_prompt > spec.context_window * settings.AI_CONTEXT_WARN_RATIO:
+        print(
+            f"[TokenEstimator] Prompt of ~{prompt_tokens} tokens uses "
+            f"{padded_prompt / spec.context_window:.0%} of {model or 'model'}'s "
+            f"{spec.context_window}-token context window"
+        )
+    if planned < settings.AI_MIN_OUTPUT_TOKENS:
+        raise PromptTooLargeError(
+            f"Prompt of ~{prompt_tokens} tokens leaves {max(room, 0)} output tokens "
+            f"in {model or 'model'}'s {spec.context_window}-token context window "
+            f"(minimum {settings.AI_MIN_OUTPUT_TOKENS})"
+        )
+    return planned
@@ -6,6 +6,8 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock
 
 from src.services.gemini_client import GeminiClient
+from src.services.mock_client import MockClient, MockResponseStore
+from src.config import AgentConfig
 
 @pytest.fixture
 def mock_gemini_client() -> MagicMock:
@@ -17,3 +19,18 @@ def mock_gemini_client() -> MagicMock:
     mock = MagicMock(spec=GeminiClient)
     mock.generate_with_retry = AsyncMock()
     return mock
+
+
+@pytest.fixture
+def mock_ai_client(monkeypatch) -> MockClient:
+    """An offline MockClient with an empty store and no simulated latency.
+
+    Add recordings with ``mock_ai_client.store.add(...)``; unmatched prompts
+    get the agent's canned response.
+    """
+    from src.services import mock_client
+
+    monkeypatch.setattr(mock_client.settings, "AI_MOCK_LATENCY_SCALE", 0.0)
+    monkeypatch.setattr(mock_client.settings, "AI_MOCK_RATE_LIMIT_RATE", 0.0)
+    monkeypatch.setattr(mock_client.settings, "AI_MOCK_TIMEOUT_RATE", 0.0)
+    return MockClient(AgentConfig(name="distributor", provider="mock"), store=MockResponseStore())
@@ -0,0 +1,100 @@
+"""Unit tests for the streaming chat path.
+
+Covered behaviors:
+- ``ReplyFieldExtractor`` decodes only the ``reply`` value out of a JSON
+  token stream, regardless of how the deltas are split (mid-key,
+  mid-escape, mid-surrogate-pair).
+- ``/ai/chat/stream`` emits ``delta`` frames with reply text followed by a
+  single ``final`` frame carrying the parsed ChatResponse + token usage.
+"""
+
+from __future__ import annotations
+
+import json
+
+from fastapi.testclient import TestClient
+
+from src import main as gateway_main
+from src.services.base_client import StreamChunk
+from src.services.chat_reply_stream import ReplyFieldExtractor
+
+
+CHAT_JSON = json.dumps(
+    {
+        "reply": "Hello \"there\"\nTry the HR module \U0001F600 — ok?",
+        "suggested_modules": ["hr"],
+        "discussion_points": [],
+        "confidence": "high",
+        "unsupported_features": [],
+    }
+)
+
+
+def _feed_in_pieces(text: str, size: int) -> str:
+    extractor = ReplyFieldExtractor()
+    out = []
+    for i in range(0, len(text), size):
+        out.append(extractor.feed(text[i:i + size]))
+    assert extractor.finished
+    return "".join(out)
+
+
+def test_extractor_decodes_reply_for_every_split_size():
+    expected = json.loads(CHAT_JSON)["reply"]
+    for size in range(1, 12):
+        assert _feed_in_pieces(CHAT_JSON, size) == expected, size
+
+
+def test_extractor_handles_ascii_escaped_surrogates():
+    raw = json.dumps({"reply": "smile \U0001F600 done"}, ensure_ascii=True)
+    for size in (1, 3, 7):
+        assert _feed_in_pieces(raw, size) == "smile \U0001F600 done"
+
+
+def test_extractor_ignores_text_before_reply_key():
+    extractor = ReplyFieldExtractor()
+    assert extractor.feed('{"confidence": "low", ') == ""
+    assert extractor.feed('"reply": "hi"}') == "hi"
+    assert extractor.feed(" trailing") == ""
+
+
+class _FakeStreamingClient:
+    def __init__(self, text: str, size: int = 5):
+        self._text = text
+        self._size = size
+
+    async def generate_stream(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        for i in range(0, len(self._text), self._size):
+            yield StreamChunk(text=self._text[i:i + self._size])
+        yield StreamChunk(done=True, prompt_tokens=11, completion_tokens=7, total_tokens=18, model="fake")
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = frame.split("\n")
+        event = lines[0][len("event: "):]
+        data = json.loads(lines[1][len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def test_chat_stream_endpoint_emits_deltas_then_final(monkeypatch):
+    monkeypatch.setattr(gateway_main, "get_chatbot_client", lambda: _FakeStreamingClient(CHAT_JSON))
+    monkeypatch.setattr(gateway_main, "_log_training_session", lambda *a, **kw: "session")
+
+    client = TestClient(gateway_main.app)
+    response = client.post("/ai/chat/stream", json={"message": "Which module do I need?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+
+    deltas = [data["text"] for name, data in events if name == "delta"]
+    assert "".join(deltas) == json.loads(CHAT_JSON)["reply"]
+
+    name, final = events[-1]
+    assert name == "final"
+    assert final["response"]["suggested_modules"] == ["hr"]
+    assert final["response"]["confidence"] == "high"
+    assert final["token_usage"] == {"total": {"prompt": 11, "completion": 7}}
@@ -0,0 +1,156 @@
+"""Unit tests for per-project stage checkpoints.
+
+Covered behaviors:
+- ``stage_key`` ignores key order; a checkpoint is only returned for the
+  same inputs, and hits/misses are counted per stage.
+- Checkpoints survive a new store on the same sqlite file and expire
+  after the TTL.
+- The in-process copy is capped: the least recently used stage is evicted
+  and, with a sqlite file, read back from disk.
+- A clarify cycle reuses the distributor and unchanged generators, re-runs
+  only the generator whose question was answered (with that answer in its
+  prompt inputs), and marks restored stages in the stage trace.
+- Without ``reuse_checkpoints`` (analyze) checkpoints are written only.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from src.schemas.multi_agent import DistributorOutput, ModuleContext, ModuleGeneratorOutput
+from src.services import checkpoint_store
+from src.services.base_client import GenerationResult
+from src.services.checkpoint_store import CheckpointStore, stage_key
+from src.services.multi_agent_service import MultiAgentService
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_key_and_lookup():
+    assert stage_key("merge", {"a": 1, "b": 2}) == stage_key("merge", {"b": 2, "a": 1})
+    assert stage_key("merge", {"a": 1}) != stage_key("distributor", {"a": 1})
+
+    store = CheckpointStore(None)
+    await store.put("p1", "distributor", "k1", {"output": {"project_name": "Shop"}})
+    assert await store.get("p1", "distributor", "k1") == {"output": {"project_name": "Shop"}}
+    assert await store.get("p1", "distributor", "k2") is None
+    assert await store.get("p2", "distributor", "k1") is None
+    snapshot = store.snapshot()
+    assert snapshot["hits"] == {"distributor": 1} and snapshot["misses"] == {"distributor": 2}
+    assert snapshot["stores"] == 1 and snapshot["projects"] == 1
+
+
+async def test_persists_and_expires(tmp_path):
+    path = tmp_path / "checkpoints.sqlite"
+    await CheckpointStore(path).put("p1", "merge", "k", {"final_sdf": {"entities": []}})
+    assert await CheckpointStore(path).get("p1", "merge", "k") == {"final_sdf": {"entities": []}}
+
+    expired = CheckpointStore(path, ttl_seconds=-1)
+    await expired.put("p1", "merge", "k", {"final_sdf": {}})
+    assert await expired.get("p1", "merge", "k") is None
+    assert await CheckpointStore(path).latest("p1", "merge") is None
+
+
+async def test_memory_is_bounded(tmp_path):
+    store = CheckpointStore(None, memory_entries=2)
+    for n in range(3):
+        await store.put(f"p{n}", "merge", "k", {"n": n})
+        if n == 1:
+            assert await store.get("p0", "merge", "k") == {"n": 0}
+    assert await store.latest("p1", "merge") is None
+    assert await store.get("p0", "merge", "k") == {"n": 0}
+    assert store.snapshot()["memory_entries"] == 2 and store.snapshot()["evicted"] == 1
+
+    on_disk = CheckpointStore(tmp_path / "checkpoints.sqlite", memory_entries=1)
+    await on_disk.put("p1", "merge", "k", {"n": 1})
+    await on_disk.put("p2", "merge", "k", {"n": 2})
+    assert await on_disk.get("p1", "merge", "k") == {"n": 1}
+    assert on_disk.snapshot()["memory_entries"] == 1
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+
+def _service(monkeypatch, calls):
+    service = MultiAgentService.__new__(MultiAgentService)
+    for name in ("distributor", "hr", "invoice", "inventory", "reviewer"):
+        setattr(service, f"{name}_client", _Client())
+
+    async def distributor(**kwargs):
+        calls.append(("distributor", kwargs["default_question_answers"]))
+        output = DistributorOutput(
+            project_name="Shop",
+            modules_needed=["hr", "inventory"],
+            hr_context=ModuleContext(enabled=True, description="Staff"),
+            inventory_context=ModuleContext(enabled=True, description="Stock"),
+        )
+        return output, GenerationResult(text="{}", total_tokens=10), "p"
+
+    def generator(module):
+        async def run(*args, clarification_answers=None, **kwargs):
+            calls.append((module, clarification_answers))
+            answered = bool(clarification_answers)
+            output = ModuleGeneratorOutput(
+                module=module,
+                entities=[{"slug": f"{module}_items", "module": module, "fields": [{"name": "name"}]}],
+                clarifications_needed=[] if answered or module != "hr" else [
+                    {"id": "overtime_policy", "question": "Do you pay overtime?", "type": "yes_no"},
+                ],
+                sdf_complete=module != "hr" or answered,
+            )
+            return output, GenerationResult(text="{}", total_tokens=100), "p"
+        return run
+
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    monkeypatch.setattr(service, "_run_hr_generator", generator("hr"))
+    monkeypatch.setattr(service, "_run_inventory_generator", generator("inventory"))
+    return service
+
+
+async def test_clarify_reruns_only_changed_stages(monkeypatch):
+    monkeypatch.setattr(checkpoint_store, "_store", CheckpointStore(None))
+    calls = []
+    service = _service(monkeypatch, calls)
+    answers = {"hr_work_days": "mon-fri"}
+
+    first = await service.generate_sdf("A shop", default_question_answers=answers, project_id="p1")
+    assert [c[0] for c in calls] == ["distributor", "hr", "inventory"]
+    assert [q.id for q in first.clarifications_needed] == ["overtime_policy"]
+    assert not any(t["restored"] for t in first.stage_trace)
+
+    calls.clear()
+    second = await service.generate_sdf(
+        "A shop",
+        default_question_answers={**answers, "overtime_policy": "yes"},
+        prefilled_sdf=first.sdf,
+        project_id="p1",
+        reuse_checkpoints=True,
+    )
+    assert calls == [("hr", {"overtime_policy": "yes"})]
+    assert second.sdf_complete and second.clarifications_needed == []
+    assert {e["slug"] for e in second.sdf["entities"]} == {"hr_items", "inventory_items"}
+    restored = {t["stage"] for t in second.stage_trace if t["restored"]}
+    assert restored == {"distributor", "inventory_generator"}
+    assert second.token_usage["total"]["total"] == 100
+    assert [log.agent for log in second.step_logs] == ["hr_generator", "integrator"]
+
+
+async def test_without_reuse_checkpoints_are_written_only(monkeypatch):
+    store = CheckpointStore(None)
+    monkeypatch.setattr(checkpoint_store, "_store", store)
+    calls = []
+    service = _service(monkeypatch, calls)
+
+    await service.generate_sdf("A shop", project_id="p1")
+    await service.generate_sdf("A shop", project_id="p1")
+    assert [c[0] for c in calls].count("distributor") == 2
+    assert store.snapshot()["hits"] == {} and store.stores == 8
+
+    calls.clear()
+    await service.generate_sdf("A shop", project_id="p1", reuse_checkpoints=True)
+    assert calls == []
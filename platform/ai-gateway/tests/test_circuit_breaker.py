@@ -0,0 +1,223 @@
+"""Unit tests for the circuit breaker and per-call provider failover.
+
+Covered behaviors:
+- The breaker trips on failure rate and on slow-call rate once the window
+  has enough calls, and not before.
+- Open -> half-open after the cool-down; a successful probe closes it, a
+  failed probe re-opens it; only one probe is admitted at a time.
+- ``FailoverClient`` fails a call over to the secondary on provider
+  failures, routes straight to the secondary while open, leaves bad
+  requests alone, and restores the primary after a good probe.
+- The step log of a failed-over call names the secondary's model.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.base_client import GenerationResult
+from src.services.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from src.services.failover_client import FailoverClient
+from src.services.multi_agent_service import MultiAgentService
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _breaker(**overrides) -> CircuitBreaker:
+    params = dict(
+        window_size=10,
+        min_calls=4,
+        failure_rate_threshold=0.5,
+        slow_call_seconds=5.0,
+        slow_call_rate_threshold=0.75,
+        open_seconds=30.0,
+    )
+    params.update(overrides)
+    return CircuitBreaker("test", **params)
+
+
+def _force_half_open(breaker: CircuitBreaker) -> None:
+    breaker._opened_at -= breaker.open_seconds + 1
+
+
+# ---------------------------------------------------------------------------
+# CircuitBreaker state machine
+# ---------------------------------------------------------------------------
+
+
+def test_breaker_needs_min_calls_before_tripping():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure(RuntimeError("boom"))
+    assert breaker.state == CLOSED
+    breaker.record_failure(RuntimeError("boom"))
+    assert breaker.state == OPEN
+    assert breaker.allow_request() is False
+
+
+def test_breaker_trips_on_slow_call_rate():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_success(10.0)
+    breaker.record_success(0.1)
+    assert breaker.state == OPEN
+
+
+def test_healthy_traffic_keeps_breaker_closed():
+    breaker = _breaker()
+    for _ in range(20):
+        breaker.record_success(0.5)
+    breaker.record_failure(RuntimeError("one-off"))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_admits_single_probe_and_closes_on_success():
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record_failure(RuntimeError("boom"))
+    _force_half_open(breaker)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record_failure(RuntimeError("boom"))
+    _force_half_open(breaker)
+    assert breaker.allow_request() is True
+    breaker.record_failure(RuntimeError("still down"))
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["times_opened"] == 2
+
+
+# ---------------------------------------------------------------------------
+# FailoverClient routing
+# ---------------------------------------------------------------------------
+
+
+class _ProviderDown(Exception):
+    pass
+
+
+class _FakeClient:
+    def __init__(self, name: str, fail_with: Exception | None = None):
+        self.name = name
+        self.fail_with = fail_with
+        self.calls = 0
+        self.agent_config = SimpleNamespace(name="distributor", temperature=0.1)
+        self.breaker_key = f"{name}-endpoint"
+        self.model_name = name
+
+    def is_provider_failure(self, error: BaseException) -> bool:
+        return isinstance(error, _ProviderDown)
+
+    async def generate_with_retry(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        self.calls += 1
+        if self.fail_with is not None:
+            raise self.fail_with
+        return GenerationResult(text=f"{self.name}:{prompt}", model=self.name)
+
+
+async def test_provider_failure_fails_over_for_that_call():
+    primary = _FakeClient("azure", fail_with=_ProviderDown("503"))
+    secondary = _FakeClient("gemini")
+    client = FailoverClient(primary, secondary, _breaker())
+
+    result = await client.generate_with_retry("hi")
+
+    assert result.text == "gemini:hi"
+    assert primary.calls == 1
+    assert client.breaker.snapshot()["window_failures"] == 1
+
+
+async def test_step_log_records_the_model_that_answered():
+    primary = _FakeClient("azure", fail_with=_ProviderDown("503"))
+    client = FailoverClient(primary, _FakeClient("gemini"), _breaker())
+    result = await client.generate_with_retry("hi")
+
+    service = MultiAgentService.__new__(MultiAgentService)
+    step = service._build_step_log("distributor", client, {}, {}, result, 10)
+    assert step.model == "gemini"
+
+
+async def test_open_breaker_skips_primary_entirely():
+    primary = _FakeClient("azure", fail_with=_ProviderDown("503"))
+    secondary = _FakeClient("gemini")
+    client = FailoverClient(primary, secondary, _breaker())
+
+    for _ in range(4):
+        await client.generate_with_retry("x")
+    assert client.breaker.state == OPEN
+    primary_calls = primary.calls
+
+    await client.generate_with_retry("y")
+    assert primary.calls == primary_calls
+    assert secondary.calls == 5
+
+
+async def test_bad_request_is_not_failed_over_or_counted():
+    primary = _FakeClient("azure", fail_with=ValueError("bad prompt"))
+    secondary = _FakeClient("gemini")
+    client = FailoverClient(primary, secondary, _breaker())
+
+    with pytest.raises(ValueError):
+        await client.generate_with_retry("x")
+    assert secondary.calls == 0
+    assert client.breaker.snapshot()["window_calls"] == 0
+
+
+async def test_successful_probe_restores_primary():
+    primary = _FakeClient("azure", fail_with=_ProviderDown("503"))
+    secondary = _FakeClient("gemini")
+    client = FailoverClient(primary, secondary, _breaker())
+    for _ in range(4):
+        await client.generate_with_retry("x")
+
+    primary.fail_with = None
+    _force_half_open(client.breaker)
+    result = await client.generate_with_retry("probe")
+    assert result.text == "azure:probe"
+    assert client.breaker.state == CLOSED
+
+
+async def test_open_breaker_without_secondary_raises():
+    primary = _FakeClient("azure", fail_with=_ProviderDown("503"))
+    client = FailoverClient(primary, None, _breaker())
+    for _ in range(4):
+        with pytest.raises(_ProviderDown):
+            await client.generate_with_retry("x")
+    with pytest.raises(CircuitOpenError):
+        await client.generate_with_retry("x")
+
+
+async def test_cancelled_probe_releases_slot():
+    class _Slow(_FakeClient):
+        async def generate_with_retry(self, prompt, **kwargs):
+            await asyncio.sleep(10)
+
+    primary = _Slow("azure")
+    client = FailoverClient(primary, _FakeClient("gemini"), _breaker())
+    for _ in range(4):
+        client.breaker.record_failure(RuntimeError("boom"))
+    _force_half_open(client.breaker)
+
+    task = asyncio.create_task(client.generate_with_retry("probe"))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert client.breaker.allow_request() is True
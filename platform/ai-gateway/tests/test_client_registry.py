@@ -0,0 +1,53 @@
+"""Unit tests for the shared provider connection-pool registry.
+
+Covered behaviors:
+- Agents with the same (provider, endpoint, api_key, api_version) get the
+  same pooled transport; any differing component yields a separate pool.
+- Endpoint normalization ignores case and trailing slashes.
+- The api_key never appears verbatim in a pool key.
+- ``aclose_all`` closes every pool and the next lookup builds a fresh one.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from src.services import client_registry
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def _clean_registry(monkeypatch):
+    monkeypatch.setattr(client_registry, "_pools", {})
+
+
+async def test_same_key_shares_one_pool():
+    a = client_registry.get_http_client("azure_openai", "https://x.openai.azure.com/", "k1", "2024-12-01-preview")
+    b = client_registry.get_http_client("azure_openai", "https://X.openai.azure.com", "k1", "2024-12-01-preview")
+    assert a is b
+    assert client_registry.pool_count() == 1
+
+
+async def test_distinct_credentials_or_versions_get_distinct_pools():
+    base = client_registry.get_http_client("azure_openai", "https://x.openai.azure.com", "k1", "v1")
+    other_key = client_registry.get_http_client("azure_openai", "https://x.openai.azure.com", "k2", "v1")
+    other_version = client_registry.get_http_client("azure_openai", "https://x.openai.azure.com", "k1", "v2")
+    assert base is not other_key
+    assert base is not other_version
+    assert client_registry.pool_count() == 3
+
+
+async def test_pool_key_does_not_contain_raw_api_key():
+    key = client_registry.make_pool_key("azure_openai", "https://x", "super-secret", "v1")
+    assert "super-secret" not in key
+
+
+async def test_aclose_all_closes_pools():
+    first = client_registry.get_http_client("azure_openai", "https://x", "k", "v")
+    await client_registry.aclose_all()
+    assert first.is_closed
+    assert client_registry.pool_count() == 0
+    second = client_registry.get_http_client("azure_openai", "https://x", "k", "v")
+    assert second is not first
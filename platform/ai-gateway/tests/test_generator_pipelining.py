@@ -0,0 +1,115 @@
+"""Unit tests for per-generator completion handling in the pipeline.
+
+Covered behaviors:
+- Each module output is prepared for the merge as soon as its generator
+  returns, while slower generators are still running.
+- Every generator's step log carries its own duration and start/end time
+  instead of one shared elapsed time.
+- The merged SDF does not depend on which generator finished first.
+- ``merge_module_outputs`` gives the same result with or without
+  pre-prepared modules.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from copy import deepcopy
+
+import pytest
+
+from src.schemas.multi_agent import DistributorOutput, ModuleContext, ModuleGeneratorOutput
+from src.services import multi_agent_service
+from src.services.base_client import GenerationResult
+from src.services.multi_agent_service import MultiAgentService
+from src.services.sdf.integrator import merge_module_outputs, prepare_module_output
+
+
+pytestmark = pytest.mark.asyncio
+
+ENTITIES = {
+    "hr": [{"slug": "employees", "fields": [{"name": "name"}]}, {"slug": "customers", "fields": [{"name": "email"}]}],
+    "inventory": [{"slug": "products", "fields": [{"name": "sku"}]}, {"slug": "customers", "fields": [{"name": "phone"}]}],
+}
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+
+def _service(monkeypatch, delays, events):
+    service = MultiAgentService.__new__(MultiAgentService)
+    for name in ("distributor", "hr", "invoice", "inventory", "reviewer"):
+        setattr(service, f"{name}_client", _Client())
+
+    async def distributor(**kwargs):
+        output = DistributorOutput(
+            project_name="Shop",
+            modules_needed=["hr", "inventory"],
+            hr_context=ModuleContext(enabled=True),
+            inventory_context=ModuleContext(enabled=True),
+        )
+        return output, GenerationResult(text="{}", total_tokens=10), "p"
+
+    def generator(module):
+        async def run(*args, **kwargs):
+            await asyncio.sleep(delays[module])
+            events.append(f"{module}_done")
+            output = ModuleGeneratorOutput(module=module, entities=deepcopy(ENTITIES[module]), sdf_complete=True)
+            return output, GenerationResult(text="{}", total_tokens=100), "p"
+        return run
+
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    monkeypatch.setattr(service, "_run_hr_generator", generator("hr"))
+    monkeypatch.setattr(service, "_run_inventory_generator", generator("inventory"))
+
+    real_prepare = prepare_module_output
+
+    def recording_prepare(module, output):
+        events.append(f"{module}_prepared")
+        return real_prepare(module, output)
+
+    monkeypatch.setattr(multi_agent_service, "prepare_module_output", recording_prepare)
+    return service
+
+
+async def test_modules_prepared_as_they_land(monkeypatch):
+    events = []
+    service = _service(monkeypatch, {"hr": 0.01, "inventory": 0.15}, events)
+    result = await service.generate_sdf("A shop with staff and stock")
+
+    assert result.success
+    assert events.index("hr_prepared") < events.index("inventory_done")
+
+
+async def test_each_generator_logs_its_own_timing(monkeypatch):
+    service = _service(monkeypatch, {"hr": 0.01, "inventory": 0.15}, [])
+    result = await service.generate_sdf("A shop with staff and stock")
+
+    logs = {log.agent: log for log in result.step_logs}
+    hr, inventory = logs["hr_generator"], logs["inventory_generator"]
+    assert hr.duration_ms < 100 <= inventory.duration_ms
+    assert hr.started_at and hr.ended_at and hr.ended_at <= inventory.ended_at
+    assert inventory.duration_ms == int((inventory.ended_at - inventory.started_at) * 1000)
+
+
+async def test_merge_independent_of_completion_order(monkeypatch):
+    fast_hr = await _service(monkeypatch, {"hr": 0.0, "inventory": 0.05}, []).generate_sdf("shop")
+    fast_inventory = await _service(monkeypatch, {"hr": 0.05, "inventory": 0.0}, []).generate_sdf("shop")
+
+    assert fast_hr.sdf == fast_inventory.sdf
+    customers = next(e for e in fast_hr.sdf["entities"] if e["slug"] == "customers")
+    assert customers["module"] == "shared"
+    assert [f["name"] for f in customers["fields"]] == ["email", "phone"]
+
+
+async def test_merge_same_with_prepared_modules():
+    outputs = {
+        module: ModuleGeneratorOutput(module=module, entities=deepcopy(entities), warnings=[f"{module} note"])
+        for module, entities in ENTITIES.items()
+    }
+    plain = merge_module_outputs("Shop", outputs, ["customers"], {})
+    prepared = {module: prepare_module_output(module, output) for module, output in outputs.items()}
+    assert merge_module_outputs("Shop", outputs, ["customers"], {}, prepared=prepared) == plain
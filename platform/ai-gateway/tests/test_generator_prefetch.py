@@ -0,0 +1,169 @@
+"""Unit tests for prefetching module generators while the distributor runs.
+
+Covered behaviors:
+- Selected modules with wizard answers start generating before the
+  distributor returns, with features predicted from the answers.
+- A prefetched module whose predicted context matches the distributor's is
+  kept and not generated again.
+- A module whose context diverges is re-run with the distributor's context;
+  only that module runs twice.
+- A prefetched module the distributor does not enable is cancelled and its
+  cost reported as ``speculative_waste``.
+- ``generator_prefetch_snapshot`` reports hits, misses, unused and the hit
+  rate; nothing is prefetched with the setting off or on change requests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from copy import deepcopy
+
+import pytest
+
+from src.schemas.multi_agent import AnswerReview, DistributorOutput, ModuleContext, ModuleGeneratorOutput
+from src.services import multi_agent_service
+from src.services.base_client import GenerationResult
+from src.services.multi_agent_service import MultiAgentService, _context_similarity
+
+
+pytestmark = pytest.mark.asyncio
+
+ANSWERS = {
+    "hr_enable_leave_engine": "yes",
+    "hr_enable_attendance_time": "no",
+    "inv_multi_location": "yes",
+    "inv_allow_negative_stock": "no",
+}
+PREFILLED = {"entities": [{"slug": "customers", "module": "shared"}, {"slug": "employees", "module": "hr"}]}
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+
+def _service(monkeypatch, contexts, calls, modules_needed=("hr", "inventory")):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_DISTRIBUTOR", False)
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_GENERATORS", True)
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_GENERATOR_MIN_SIMILARITY", 0.6)
+    monkeypatch.setattr(multi_agent_service, "_prefetch_stats", {
+        "started": 0, "hits": 0, "misses": 0, "unused": 0, "wasted_tokens": 0,
+    })
+    service = MultiAgentService.__new__(MultiAgentService)
+    for name in ("distributor", "hr", "invoice", "inventory", "reviewer"):
+        setattr(service, f"{name}_client", _Client())
+
+    async def reviewer(**kwargs):
+        return AnswerReview(is_clear_to_proceed=True), GenerationResult(text="{}", total_tokens=10), "p"
+
+    async def distributor(**kwargs):
+        calls.append("distributor_start")
+        await asyncio.sleep(0.05)
+        calls.append("distributor_end")
+        output = DistributorOutput(
+            project_name="Shop",
+            modules_needed=list(modules_needed),
+            shared_entities=["customers"],
+            **{f"{m}_context": contexts[m] for m in modules_needed},
+        )
+        return output, GenerationResult(text="{}", total_tokens=10), "p"
+
+    def generator(module):
+        async def run(business_description, context, shared_entities, *args, **kwargs):
+            calls.append((module, tuple(context.features)))
+            await asyncio.sleep(0.1)
+            entities = [{"slug": f"{module}_items", "fields": [{"name": "name"}]}]
+            output = ModuleGeneratorOutput(module=module, entities=deepcopy(entities), sdf_complete=True)
+            return output, GenerationResult(text="{}", total_tokens=100), "p"
+        return run
+
+    monkeypatch.setattr(service, "_run_answer_reviewer", reviewer)
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    for module in ("hr", "invoice", "inventory"):
+        monkeypatch.setattr(service, f"_run_{module}_generator", generator(module))
+    return service
+
+
+async def _run(service, **kwargs):
+    return await service.generate_sdf(
+        "A shop with staff and stock",
+        business_answers={"what_business": "shop"},
+        default_question_answers=ANSWERS,
+        prefilled_sdf=PREFILLED,
+        selected_modules=["hr", "inventory"],
+        **kwargs,
+    )
+
+
+async def test_matching_prefetch_is_kept(monkeypatch):
+    calls = []
+    contexts = {
+        "hr": ModuleContext(enabled=True, features=["Leave engine"]),
+        "inventory": ModuleContext(enabled=True, features=["multi location stock"]),
+    }
+    result = await _run(_service(monkeypatch, contexts, calls))
+
+    assert result.success
+    assert calls.index(("hr", ("leave engine",))) < calls.index("distributor_end")
+    assert [c for c in calls if isinstance(c, tuple)] == [("hr", ("leave engine",)), ("inventory", ("multi location",))]
+    snapshot = multi_agent_service.generator_prefetch_snapshot()
+    assert snapshot["hits"] == 2 and snapshot["hit_rate"] == 1.0
+    assert result.token_usage["speculative_waste"]["total"] == 0
+
+
+async def test_diverging_module_is_rerun_alone(monkeypatch):
+    calls = []
+    contexts = {
+        "hr": ModuleContext(enabled=True, features=["leave engine"]),
+        "inventory": ModuleContext(enabled=True, features=["barcode scanning", "purchase orders"]),
+    }
+    result = await _run(_service(monkeypatch, contexts, calls))
+
+    assert result.success
+    generated = [c for c in calls if isinstance(c, tuple)]
+    assert generated.count(("hr", ("leave engine",))) == 1
+    assert generated[-1] == ("inventory", ("barcode scanning", "purchase orders"))
+    snapshot = multi_agent_service.generator_prefetch_snapshot()
+    assert (snapshot["hits"], snapshot["misses"], snapshot["hit_rate"]) == (1, 1, 0.5)
+    assert result.token_usage["speculative_waste"]["prompt"] > 0
+
+
+async def test_unneeded_module_is_cancelled(monkeypatch):
+    calls = []
+    contexts = {"hr": ModuleContext(enabled=True, features=["leave engine"])}
+    result = await _run(_service(monkeypatch, contexts, calls, modules_needed=("hr",)))
+
+    assert result.success
+    assert {e["slug"] for e in result.sdf["entities"]} >= {"hr_items"}
+    assert "inventory_items" not in {e["slug"] for e in result.sdf["entities"]}
+    snapshot = multi_agent_service.generator_prefetch_snapshot()
+    assert (snapshot["started"], snapshot["hits"], snapshot["unused"]) == (2, 1, 1)
+    assert snapshot["wasted_tokens"] == result.token_usage["speculative_waste"]["total"] > 0
+
+
+async def test_no_prefetch_when_disabled_or_change_request(monkeypatch):
+    calls = []
+    contexts = {m: ModuleContext(enabled=True, features=["leave engine"]) for m in ("hr", "inventory")}
+    service = _service(monkeypatch, contexts, calls)
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_GENERATORS", False)
+    await _run(service)
+    assert calls.index("distributor_end") < calls.index(("hr", ("leave engine",)))
+
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_GENERATORS", True)
+    calls.clear()
+    await service.generate_sdf(
+        "A shop", default_question_answers=ANSWERS, prefilled_sdf=PREFILLED, selected_modules=["hr"],
+    )
+    assert calls.index("distributor_end") < calls.index(("hr", ("leave engine",)))
+    assert multi_agent_service.generator_prefetch_snapshot()["started"] == 0
+
+
+async def test_context_similarity():
+    predicted = ModuleContext(features=["leave engine", "attendance time"])
+    same = ModuleContext(features=["Leave engine", "attendance time tracking"])
+    assert _context_similarity(predicted, ["customers"], same, ["customers"]) > 0.8
+    assert _context_similarity(predicted, [], ModuleContext(features=["payroll"]), ["customers"]) == 0.0
+    changed = ModuleContext(features=predicted.features, change_instructions="Add a bonus field")
+    assert _context_similarity(predicted, [], changed, []) == 0.0
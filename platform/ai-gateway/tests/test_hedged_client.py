@@ -0,0 +1,157 @@
+"""Unit tests for request hedging.
+
+Covered behaviors:
+- No hedge is sent until the latency window has enough samples.
+- A fast first attempt returns without a hedge.
+- A slow first attempt triggers a hedge; the hedge wins, the original is
+  cancelled and its prompt is charged as extra tokens.
+- When the original still wins after the hedge went out, the hedge is
+  cancelled and ``hedge_won`` is False.
+- If one attempt fails, the other's answer is used; if both fail, the
+  error propagates.
+- The percentile helper and the diagnostics snapshot.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.services import hedged_client
+from src.services.base_client import GenerationResult, estimate_prompt_tokens
+from src.services.hedged_client import HedgingClient, LatencyTracker
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class _FakeClient:
+    def __init__(self, name: str, delays: list[float], fail: bool = False):
+        self.name = name
+        self.delays = list(delays)
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+        self.agent_config = SimpleNamespace(name="distributor", temperature=0.1)
+
+    async def generate_with_retry(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        self.calls += 1
+        delay = self.delays.pop(0) if self.delays else 0.0
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return GenerationResult(text=self.name, prompt_tokens=10, completion_tokens=5, total_tokens=15)
+
+
+def _warm_tracker(seconds: float = 0.02, samples: int = 5) -> LatencyTracker:
+    tracker = LatencyTracker("distributor", window_size=20, min_samples=samples)
+    for _ in range(samples):
+        tracker.record(seconds)
+    return tracker
+
+
+async def test_cold_tracker_never_hedges():
+    primary = _FakeClient("primary", [0.05])
+    hedge = _FakeClient("hedge", [0.0])
+    tracker = LatencyTracker("distributor", window_size=20, min_samples=5)
+    client = HedgingClient(primary, hedge, tracker, percentile=95)
+
+    result = await client.generate_with_retry("p")
+
+    assert result.text == "primary"
+    assert result.hedged is False
+    assert hedge.calls == 0
+    assert tracker.snapshot(95)["samples"] == 1
+
+
+async def test_fast_primary_is_not_hedged():
+    primary = _FakeClient("primary", [0.0])
+    hedge = _FakeClient("hedge", [0.0])
+    client = HedgingClient(primary, hedge, _warm_tracker(0.2), percentile=95)
+
+    result = await client.generate_with_retry("p")
+
+    assert result.hedged is False
+    assert hedge.calls == 0
+
+
+async def test_slow_primary_is_hedged_and_cancelled():
+    primary = _FakeClient("primary", [1.0])
+    hedge = _FakeClient("hedge", [0.0])
+    tracker = _warm_tracker(0.02)
+    client = HedgingClient(primary, hedge, tracker, percentile=95)
+
+    result = await client.generate_with_retry("x" * 400)
+
+    assert result.text == "hedge"
+    assert result.hedged is True
+    assert result.hedge_won is True
+    assert result.hedge_extra_tokens == estimate_prompt_tokens("x" * 400)
+    await asyncio.sleep(0)
+    assert primary.cancelled == 1
+    snap = tracker.snapshot(95)
+    assert snap["hedges_sent"] == 1
+    assert snap["hedge_wins"] == 1
+    assert snap["hedge_win_rate"] == 1.0
+
+
+async def test_primary_can_still_win_after_hedge_sent():
+    primary = _FakeClient("primary", [0.05])
+    hedge = _FakeClient("hedge", [1.0])
+    tracker = _warm_tracker(0.02)
+    client = HedgingClient(primary, hedge, tracker, percentile=95)
+
+    result = await client.generate_with_retry("p")
+
+    assert result.text == "primary"
+    assert result.hedged is True
+    assert result.hedge_won is False
+    await asyncio.sleep(0)
+    assert hedge.cancelled == 1
+    assert tracker.snapshot(95)["hedge_win_rate"] == 0.0
+
+
+async def test_failed_attempt_falls_back_to_the_other():
+    primary = _FakeClient("primary", [0.05], fail=True)
+    hedge = _FakeClient("hedge", [0.1])
+    client = HedgingClient(primary, hedge, _warm_tracker(0.02), percentile=95)
+
+    result = await client.generate_with_retry("p")
+
+    assert result.text == "hedge"
+    assert result.hedge_won is True
+
+
+async def test_both_attempts_failing_raises():
+    primary = _FakeClient("primary", [0.05], fail=True)
+    hedge = _FakeClient("hedge", [0.0], fail=True)
+    client = HedgingClient(primary, hedge, _warm_tracker(0.02), percentile=95)
+
+    with pytest.raises(RuntimeError):
+        await client.generate_with_retry("p")
+
+
+async def test_min_delay_floor_applies():
+    tracker = _warm_tracker(0.01)
+    client = HedgingClient(_FakeClient("p", []), None, tracker, percentile=95, min_delay_seconds=3.0)
+    assert client.hedge_delay() == 3.0
+    # No dedicated hedge target: the backup goes to the same client.
+    assert client.hedge is client.primary
+
+
+async def test_percentile_and_snapshot(monkeypatch):
+    monkeypatch.setattr(hedged_client, "_trackers", {})
+    tracker = hedged_client.get_latency_tracker("distributor")
+    tracker.min_samples = 1
+    for ms in range(1, 101):
+        tracker.record(ms / 1000)
+    assert tracker.percentile(50) == pytest.approx(0.05)
+    assert tracker.percentile(95) == pytest.approx(0.095)
+    assert hedged_client.get_latency_tracker("distributor") is tracker
+    assert "distributor" in hedged_client.hedging_snapshot()
@@ -0,0 +1,170 @@
+"""Unit tests for entity-level regeneration of change requests.
+
+Covered behaviors:
+- The scope comes from the distributor's ``affected_entities`` or, when it
+  names none, from slugs mentioned in ``change_instructions``.
+- No scope (whole-module regeneration) without change instructions, when
+  nothing known is named, or when every module entity is affected.
+- The scoped prompt carries only the affected entities and tells the
+  generator not to re-emit the others.
+- A scoped output is spliced back: unaffected entities carried forward in
+  place, affected ones replaced or removed, new ones appended.
+- Scope, prompt and splice agree on ownership: a shared entity is replaced
+  in place (never duplicated, never dropped) and an entity owned through
+  ``belongs_to`` is sent as prefilled and regenerated like any other.
+- A change request through ``generate_sdf`` passes the scope to the
+  generator and keeps the untouched entities in the final SDF.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from src.schemas.multi_agent import DistributorOutput, ModuleContext, ModuleGeneratorOutput
+from src.services import multi_agent_service
+from src.services.base_client import GenerationResult
+from src.services.multi_agent_service import MultiAgentService
+from src.services.sdf.integrator import merge_module_outputs
+
+
+pytestmark = pytest.mark.asyncio
+
+PREFILLED = {
+    "project_name": "Shop",
+    "modules": {"hr": {"enabled": True, "work_days": [1, 2, 3, 4, 5]}},
+    "entities": [
+        {"slug": "departments", "module": "hr", "fields": [{"name": "name"}]},
+        {"slug": "employees", "module": "hr", "fields": [{"name": "first_name"}]},
+        {"slug": "leave_requests", "module": "hr", "fields": [{"name": "approval_note"}]},
+        {"slug": "customers", "module": "shared", "fields": [{"name": "loyalty_tier"}]},
+    ],
+}
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+
+def _ctx(instructions: str, affected=()) -> ModuleContext:
+    return ModuleContext(enabled=True, changed=True, change_instructions=instructions, affected_entities=list(affected))
+
+
+async def test_scope_from_distributor_or_instructions():
+    scope = MultiAgentService._entity_scope
+    assert scope("hr", _ctx("Add a bonus field", ["Employees", "payroll"]), PREFILLED) == ["employees"]
+    assert scope("hr", _ctx("Add a 'bonus' field to the employees entity."), PREFILLED) == ["employees"]
+    assert scope("hr", _ctx("Add a reason to leave requests and customers"), PREFILLED) == ["leave_requests", "customers"]
+
+
+async def test_no_scope_cases():
+    scope = MultiAgentService._entity_scope
+    assert scope("hr", _ctx(""), PREFILLED) is None
+    assert scope("hr", _ctx("Enable the compensation ledger"), PREFILLED) is None
+    assert scope("hr", _ctx("Rename departments, employees and leave_requests"), PREFILLED) is None
+    assert scope("invoice", _ctx("Add notes to customers"), PREFILLED) is None
+    assert scope("hr", None, PREFILLED) is None
+
+
+async def test_scoped_prompt_sends_only_affected_entities():
+    service = MultiAgentService.__new__(MultiAgentService)
+    prompt = service._generator_prompt(
+        "hr", "A shop", _ctx("Add a bonus field to employees"), ["customers"], {}, PREFILLED, "en",
+        entity_scope=["employees"],
+    )
+    assert '"first_name"' in prompt
+    assert '"approval_note"' not in prompt and '"loyalty_tier"' not in prompt
+    assert "Output ONLY these existing entities" in prompt
+    assert "departments, leave_requests, customers" in prompt
+
+    full = service._generator_prompt("hr", "A shop", _ctx("Add a bonus field"), ["customers"], {}, PREFILLED, "en")
+    assert '"approval_note"' in full and "output every entity of this module" in full
+
+
+async def test_apply_scope_splices_output():
+    output = ModuleGeneratorOutput(
+        module="hr",
+        entities=[
+            {"slug": "employees", "fields": [{"name": "first_name"}, {"name": "bonus"}]},
+            {"slug": "bonuses", "fields": [{"name": "amount"}]},
+        ],
+        module_config={"enabled": True},
+    )
+    merged = MultiAgentService._apply_entity_scope("hr", output, ["employees", "leave_requests"], PREFILLED)
+
+    assert [e["slug"] for e in merged.entities] == ["departments", "employees", "bonuses"]
+    assert [f["name"] for f in merged.entities[1]["fields"]] == ["first_name", "bonus"]
+    assert merged.module_config == {"enabled": True, "work_days": [1, 2, 3, 4, 5]}
+
+
+async def test_shared_and_belongs_to_entities_regenerated():
+    prefilled = {
+        **PREFILLED,
+        "entities": PREFILLED["entities"] + [
+            {"slug": "shifts", "module": "scheduling", "belongs_to": ["hr"], "fields": [{"name": "starts_at"}]},
+        ],
+    }
+    scope = MultiAgentService._entity_scope("hr", _ctx("Add a bonus", ["customers", "shifts"]), prefilled)
+    assert scope == ["customers", "shifts"]
+    assert '"starts_at"' in MultiAgentService._extract_module_prefilled(prefilled, "hr")
+
+    output = ModuleGeneratorOutput(
+        module="hr",
+        entities=[
+            {"slug": "customers", "fields": [{"name": "loyalty_tier"}, {"name": "bonus"}]},
+            {"slug": "shifts", "fields": [{"name": "starts_at"}, {"name": "bonus"}]},
+        ],
+    )
+    merged = MultiAgentService._apply_entity_scope("hr", output, scope, prefilled)
+    assert [e["slug"] for e in merged.entities] == [
+        "departments", "employees", "leave_requests", "customers", "shifts",
+    ]
+    assert all("bonus" in [f["name"] for f in e["fields"]] for e in merged.entities[3:])
+
+    # Left out: the owned entity is removed, the shared one stays for the merge.
+    merged = MultiAgentService._apply_entity_scope("hr", output.model_copy(update={"entities": []}), scope, prefilled)
+    assert [e["slug"] for e in merged.entities] == ["departments", "employees", "leave_requests"]
+    sdf = merge_module_outputs("Shop", {"hr": merged}, [], prefilled)
+    assert "customers" in [e["slug"] for e in sdf["entities"]]
+
+
+async def test_change_request_regenerates_only_scope(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_INCREMENTAL_ENTITIES", True)
+    service = MultiAgentService.__new__(MultiAgentService)
+    for name in ("distributor", "hr", "invoice", "inventory", "reviewer"):
+        setattr(service, f"{name}_client", _Client())
+    seen = {}
+
+    async def distributor(**kwargs):
+        output = DistributorOutput(
+            project_name="Shop",
+            modules_needed=["hr"],
+            hr_context=_ctx("Add a 'bonus' field (number) to employees", ["employees"]),
+        )
+        return output, GenerationResult(text="{}", total_tokens=10), "p"
+
+    async def hr_generator(*args, entity_scope=None, **kwargs):
+        seen["scope"] = entity_scope
+        output = ModuleGeneratorOutput(
+            module="hr",
+            entities=[{"slug": "employees", "fields": [{"name": "first_name"}, {"name": "bonus"}]}],
+            sdf_complete=True,
+        )
+        return output, GenerationResult(text="{}", total_tokens=100), "p"
+
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    monkeypatch.setattr(service, "_run_hr_generator", hr_generator)
+    result = await service.generate_sdf("A shop\n--- CHANGE REQUEST ---\nAdd a bonus", prefilled_sdf=PREFILLED)
+
+    assert result.success
+    assert seen["scope"] == ["employees"]
+    slugs = [e["slug"] for e in result.sdf["entities"]]
+    assert {"departments", "employees", "leave_requests", "customers"} <= set(slugs)
+    employees = next(e for e in result.sdf["entities"] if e["slug"] == "employees")
+    assert "bonus" in [f["name"] for f in employees["fields"]]
+
+    monkeypatch.setattr(multi_agent_service.settings, "AI_INCREMENTAL_ENTITIES", False)
+    await service.generate_sdf("A shop\n--- CHANGE REQUEST ---\nAdd a bonus", prefilled_sdf=PREFILLED)
+    assert seen["scope"] is None
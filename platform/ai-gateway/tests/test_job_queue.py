@@ -0,0 +1,142 @@
+"""Unit tests for the persistent job queue and the /ai/jobs endpoints.
+
+Covered behaviors:
+- A submitted job runs on a worker; its status and result are read back
+  from the job table. ``run`` waits and re-raises the handler's error.
+- The worker pool bounds concurrency, and submissions beyond
+  ``max_pending`` waiting jobs raise ``JobQueueFull``.
+- After a restart, queued and interrupted jobs are re-queued; an
+  interrupted job without attempts left is marked failed.
+- ``POST /ai/jobs/analyze`` returns a job id at once and
+  ``GET /ai/jobs/{id}`` returns the SDF; ``/ai/analyze`` runs as a job
+  and answers 429 when the queue is full.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from src import main as gateway_main
+from src.schemas.multi_agent import PipelineResult
+from src.schemas.sdf import SystemDefinitionFile
+from src.services import job_queue
+from src.services.job_queue import JobQueue, JobQueueFull, job_handler
+
+
+pytestmark = pytest.mark.asyncio
+
+events: list = []
+
+
+@job_handler("test_echo")
+async def _echo(payload):
+    events.append(("start", payload["n"]))
+    await asyncio.sleep(payload.get("delay", 0))
+    events.append(("end", payload["n"]))
+    if payload.get("fail"):
+        raise ValueError("bad input")
+    return {"n": payload["n"]}
+
+
+async def _wait_for(queue: JobQueue, job_id: str, status: str) -> dict:
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}: {job}")
+
+
+@pytest.fixture(autouse=True)
+def _clear_events():
+    events.clear()
+
+
+async def test_submit_get_and_run(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    job_id = await queue.submit("test_echo", {"n": 1}, project_id="p1")
+    job = await _wait_for(queue, job_id, "succeeded")
+    assert job["result"] == {"n": 1} and job["project_id"] == "p1" and job["attempts"] == 1
+
+    assert await queue.run("test_echo", {"n": 2}) == {"n": 2}
+    with pytest.raises(ValueError, match="bad input"):
+        await queue.run("test_echo", {"n": 3, "fail": True})
+    assert queue.snapshot()["succeeded"] == 2 and queue.snapshot()["failed"] == 1
+    assert await queue.get("missing") is None
+    with pytest.raises(ValueError, match="Unknown job kind"):
+        await queue.submit("nope", {})
+    await queue.stop()
+
+
+async def test_pool_bounds_concurrency_and_pending(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", workers=1, max_pending=1)
+    first = await queue.submit("test_echo", {"n": 1, "delay": 0.05})
+    await asyncio.sleep(0)
+    second = await queue.submit("test_echo", {"n": 2})
+    with pytest.raises(JobQueueFull):
+        await queue.submit("test_echo", {"n": 3})
+    await _wait_for(queue, second, "succeeded")
+    assert events == [("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert (await queue.get(first))["status"] == "succeeded"
+    await queue.stop()
+
+
+async def test_restart_requeues_or_fails_interrupted_jobs(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    queue = JobQueue(path, workers=1)
+    interrupted = await queue.submit("test_echo", {"n": 1, "delay": 5})
+    waiting = await queue.submit("test_echo", {"n": 2})
+    await _wait_for(queue, interrupted, "running")
+    await queue.stop()
+    assert (await queue.get(waiting))["status"] == "queued"
+
+    restarted = JobQueue(path, workers=2, max_attempts=2)
+    await restarted.start()
+    assert restarted.snapshot()["resumed"] == 2
+    await _wait_for(restarted, waiting, "succeeded")
+    job = await _wait_for(restarted, interrupted, "running")
+    assert job["attempts"] == 2
+    await restarted.stop()
+
+    final = JobQueue(path, max_attempts=2)
+    await final.start()
+    job = await final.get(interrupted)
+    assert job["status"] == "failed" and "restart" in job["error"]
+    await final.stop()
+
+
+class _FakeSDFService:
+    async def generate_sdf_multi_agent(self, **kwargs):
+        sdf = SystemDefinitionFile(project_name="Shop", entities=[])
+        return sdf, PipelineResult(success=True)
+
+
+async def test_job_endpoints(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, "_job_queue", JobQueue(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(gateway_main, "get_sdf_service", lambda: _FakeSDFService())
+    monkeypatch.setattr(gateway_main, "_log_training_session", lambda *a, **kw: "session")
+    body = {"business_description": "A small shop that sells bicycles and repairs them for locals.", "project_id": "p1"}
+
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        response = await client.post("/ai/jobs/analyze", json=body)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        job = await _wait_for(job_queue._job_queue, job_id, "succeeded")
+        response = await client.get(f"/ai/jobs/{job_id}")
+        assert response.json()["result"]["project_name"] == "Shop"
+        assert (await client.get("/ai/jobs/unknown")).status_code == 404
+
+        response = await client.post("/ai/analyze", json=body)
+        assert response.status_code == 200 and response.json()["project_name"] == "Shop"
+    assert job_queue._job_queue.snapshot()["submitted"] == 2
+    await job_queue._job_queue.stop()
+
+    monkeypatch.setattr(job_queue, "_job_queue", JobQueue(tmp_path / "full.sqlite", max_pending=0))
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        response = await client.post("/ai/analyze", json=body)
+        assert response.status_code == 429
+    await job_queue._job_queue.stop()
@@ -0,0 +1,160 @@
+"""Unit tests for the offline mock provider.
+
+Covered behaviors:
+- Recorded step logs from sessions.jsonl replay by (agent, prompt hash),
+  including prompts truncated in the log, with their token counts.
+- Fixture files (.json / .jsonl) load with prompt or prompt_sha256 keys.
+- Unmatched prompts fall back to the agent's recordings round-robin, or
+  to a canned response; strict mode skips the round-robin fallback.
+- Simulated 429s carry Retry-After and are retried; timeouts raise.
+- Streaming yields the same text plus a final usage chunk.
+- ``AI_AGENT_<NAME>_PROVIDER=mock`` builds a MockClient via the factory.
+- The multi-agent pipeline runs end to end on canned responses.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+from src.config import AgentConfig
+from src.services import mock_client as mock_module
+from src.services.failover_client import create_agent_client
+from src.services.mock_client import MockClient, MockRateLimitError, MockResponseStore, prompt_hash
+from src.services.multi_agent_service import MultiAgentService
+from src.services.retry_policy import retry_after_seconds
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _session(agent: str, prompt: str, response: str, **extra) -> str:
+    step = {"agent": agent, "prompt_text": prompt, "raw_response": response, **extra}
+    return json.dumps({"session_id": "s1", "endpoint": "/ai/analyze", "step_logs": [step]})
+
+
+async def test_replays_recorded_step_by_agent_and_prompt(tmp_path, mock_ai_client):
+    long_prompt = "x" * 40000
+    sessions = tmp_path / "sessions.jsonl"
+    sessions.write_text("\n".join([
+        _session("distributor", "prompt-a", '{"a": 1}', tokens_in=321, tokens_out=45),
+        # Step logs truncate prompts at 30k characters.
+        _session("distributor", long_prompt[:30000], '{"long": true}'),
+        "not json",
+    ]) + "\n")
+    assert mock_ai_client.store.load_sessions(sessions) == 2
+
+    result = await mock_ai_client.generate_with_retry("prompt-a")
+    assert result.text == '{"a": 1}'
+    assert (result.prompt_tokens, result.completion_tokens, result.total_tokens) == (321, 45, 366)
+    assert result.model == "mock-distributor"
+
+    assert (await mock_ai_client.generate_with_retry(long_prompt)).text == '{"long": true}'
+
+
+async def test_fixture_files_load(tmp_path):
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    (fixtures / "a.json").write_text(json.dumps([
+        {"agent": "hr", "prompt": "p1", "response": {"entities": []}},
+    ]))
+    (fixtures / "b.jsonl").write_text(json.dumps(
+        {"agent": "chatbot", "prompt_sha256": prompt_hash("p2"), "response": "hi"}
+    ) + "\n")
+    store = MockResponseStore()
+    assert store.load_fixtures(fixtures) == 2
+    assert store.lookup("hr", "p1")["text"] == '{"entities": []}'
+    assert store.lookup("chatbot", "p2")["text"] == "hi"
+
+
+async def test_fallbacks_round_robin_then_canned(mock_ai_client, monkeypatch):
+    store = mock_ai_client.store
+    store.add("distributor", "one", prompt="p1")
+    store.add("distributor", "two", prompt="p2")
+
+    texts = [(await mock_ai_client.generate("unknown")).text for _ in range(3)]
+    assert texts == ["one", "two", "one"]
+
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_STRICT", True)
+    canned = json.loads((await mock_ai_client.generate("unknown")).text)
+    assert canned["project_name"] == "Mock Project"
+
+
+async def test_simulated_429_is_retried(mock_ai_client, monkeypatch):
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_RATE_LIMIT_RATE", 1.0)
+    with pytest.raises(MockRateLimitError) as exc:
+        await mock_ai_client.generate("p")
+    assert retry_after_seconds(exc.value) is not None
+
+    calls = {"n": 0}
+    real_faults = mock_ai_client._simulate_faults
+
+    async def first_call_429():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            await real_faults()
+
+    monkeypatch.setattr(mock_ai_client, "_simulate_faults", first_call_429)
+    result = await mock_ai_client.generate_with_retry("p")
+    assert calls["n"] == 2
+    assert result.text
+
+
+async def test_simulated_timeout(mock_ai_client, monkeypatch):
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_TIMEOUT_RATE", 1.0)
+    with pytest.raises(asyncio.TimeoutError):
+        await mock_ai_client.generate("p")
+    assert mock_ai_client.is_provider_failure(asyncio.TimeoutError())
+
+
+async def test_latency_distributions_are_seeded(monkeypatch):
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_LATENCY_SCALE", 1.0)
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_LATENCY_MS", 1000.0)
+    config = AgentConfig(name="hr", provider="mock")
+    a = MockClient(config, store=MockResponseStore(), seed=7)
+    b = MockClient(config, store=MockResponseStore(), seed=7)
+    assert [a._latency_seconds(0) for _ in range(5)] == [b._latency_seconds(0) for _ in range(5)]
+
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_LATENCY_DISTRIBUTION", "fixed")
+    assert a._latency_seconds(0) == 1.0
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_LATENCY_DISTRIBUTION", "recorded")
+    assert a._latency_seconds(250) == 0.25
+
+
+async def test_stream_reassembles_response(mock_ai_client):
+    mock_ai_client.store.add("distributor", '{"reply": "streamed text here"}', prompt="p")
+    chunks = [c async for c in mock_ai_client.generate_stream("p")]
+    assert "".join(c.text for c in chunks) == '{"reply": "streamed text here"}'
+    assert chunks[-1].done and chunks[-1].finish_reason == "stop"
+    assert chunks[-1].total_tokens > 0
+
+
+async def test_factory_builds_mock_without_failover():
+    client = create_agent_client(AgentConfig(name="hr", provider="mock"))
+    assert isinstance(client, MockClient)
+    assert client.get_model_info()["provider"] == "mock"
+
+
+async def test_pipeline_runs_on_canned_responses(monkeypatch):
+    monkeypatch.setattr(mock_module.settings, "AI_MOCK_LATENCY_SCALE", 0.0)
+    store = MockResponseStore()
+    clients = {
+        name: MockClient(AgentConfig(name=name, provider="mock"), store=store)
+        for name in ("distributor", "hr", "invoice", "inventory", "reviewer")
+    }
+    service = MultiAgentService(
+        distributor_client=clients["distributor"],
+        hr_client=clients["hr"],
+        invoice_client=clients["invoice"],
+        inventory_client=clients["inventory"],
+        reviewer_client=clients["reviewer"],
+    )
+    result = await service.generate_sdf(
+        "We run a hardware store and need to track products and stock levels.",
+        selected_modules=["inventory"],
+    )
+    assert result.success
+    assert [e["slug"] for e in result.sdf["entities"]] == ["products"]
+    assert result.token_usage["total"]["total"] > 0
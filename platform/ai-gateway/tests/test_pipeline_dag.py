@@ -0,0 +1,173 @@
+"""Unit tests for the pipeline stage scheduler and its use in generate_sdf.
+
+Covered behaviors:
+- Stages start once their inputs exist; independent stages run concurrently
+  and every stage gets a trace entry.
+- A halt condition stops the run and cancels stages still running.
+- Per-stage timeouts and retries; ``error_output`` keeps a failure local,
+  otherwise the run aborts with ``StageError``.
+- Concurrency classes cap how many stages of a class run at once.
+- ``when`` skips a stage; missing producers and cycles are rejected.
+- ``generate_sdf`` reports its stage trace and applies
+  ``AI_STAGE_<NAME>_TIMEOUT`` to a single generator.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from src.schemas.multi_agent import DistributorOutput, ModuleContext, ModuleGeneratorOutput
+from src.services.base_client import GenerationResult
+from src.services.multi_agent_service import MultiAgentService
+from src.services.pipeline_dag import PipelineDAG, Stage, StageError
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _sleeper(delay, outputs, events=None, name=""):
+    async def run(inputs):
+        if events is not None:
+            events.append(f"{name}_start")
+        await asyncio.sleep(delay)
+        if events is not None:
+            events.append(f"{name}_end")
+        return outputs(inputs) if callable(outputs) else outputs
+    return run
+
+
+async def test_independent_stages_run_concurrently():
+    events = []
+    dag = PipelineDAG([
+        Stage("a", _sleeper(0.1, {"x": 1}, events, "a"), outputs=("x",)),
+        Stage("b", _sleeper(0.1, {"y": 2}, events, "b"), outputs=("y",)),
+        Stage("sum", _sleeper(0, lambda v: {"z": v["x"] + v["y"]}, events, "sum"), inputs=("x", "y"), outputs=("z",)),
+    ])
+    started = time.monotonic()
+    run = await dag.run()
+
+    assert time.monotonic() - started < 0.18
+    assert run.values["z"] == 3
+    assert events.index("b_start") < events.index("a_end")
+    assert events.index("sum_start") > max(events.index("a_end"), events.index("b_end"))
+    assert [t.stage for t in run.trace][-1] == "sum" and all(t.status == "ok" for t in run.trace)
+
+
+async def test_halt_cancels_running_stages():
+    events = []
+    dag = PipelineDAG([
+        Stage("gate", _sleeper(0.01, {"ok": False}), outputs=("ok",), halt=lambda v: None if v["ok"] else "not ok"),
+        Stage("slow", _sleeper(5, {"y": 1}, events, "slow"), outputs=("y",)),
+        Stage("after", _sleeper(0, {"z": 1}, events, "after"), inputs=("ok",), outputs=("z",)),
+    ])
+    run = await dag.run()
+
+    assert (run.halted_by, run.halt_reason) == ("gate", "not ok")
+    assert "slow_end" not in events and "after_start" not in events
+    assert {t.stage: t.status for t in run.trace} == {"gate": "ok", "slow": "cancelled"}
+
+
+async def test_timeout_retry_and_error_output():
+    attempts = []
+
+    async def flaky(inputs):
+        attempts.append(1)
+        await asyncio.sleep(5 if len(attempts) == 1 else 0)
+        return {"x": "done"}
+
+    dag = PipelineDAG([Stage("flaky", flaky, outputs=("x",), timeout=0.05, retries=1)])
+    run = await dag.run()
+    assert run.values["x"] == "done" and run.trace[0].attempts == 2
+
+    async def broken(inputs):
+        raise RuntimeError("boom")
+
+    dag = PipelineDAG([
+        Stage("broken", broken, outputs=("x",), error_output="x_error"),
+        Stage("next", _sleeper(0, lambda v: {"y": str(v["x_error"])}), inputs=("x", "x_error"), outputs=("y",)),
+    ])
+    run = await dag.run()
+    assert run.values["x"] is None and run.values["y"] == "boom"
+    assert run.trace[0].status == "failed" and run.trace[0].error == "boom"
+
+    with pytest.raises(StageError) as info:
+        await PipelineDAG([Stage("broken", broken, outputs=("x",))]).run()
+    assert info.value.stage == "broken" and isinstance(info.value.error, RuntimeError)
+
+
+async def test_concurrency_class_limit():
+    active, peak = [0], [0]
+
+    async def llm_call(inputs):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.02)
+        active[0] -= 1
+        return {}
+
+    stages = [Stage(f"s{i}", llm_call, concurrency="llm") for i in range(4)]
+    await PipelineDAG(stages, limits={"llm": 2}).run()
+    assert peak[0] == 2
+
+
+async def test_skip_and_validation():
+    run = await PipelineDAG([
+        Stage("off", _sleeper(0, {"x": 1}), outputs=("x",), when=lambda v: False),
+    ]).run()
+    assert run.values["x"] is None and run.trace[0].status == "skipped"
+
+    with pytest.raises(ValueError, match="nothing produces"):
+        await PipelineDAG([Stage("a", _sleeper(0, {}), inputs=("missing",))]).run()
+    with pytest.raises(ValueError, match="cycle"):
+        await PipelineDAG([
+            Stage("a", _sleeper(0, {}), inputs=("y",), outputs=("x",)),
+            Stage("b", _sleeper(0, {}), inputs=("x",), outputs=("y",)),
+        ]).run()
+    with pytest.raises(ValueError, match="produced by both"):
+        PipelineDAG([Stage("a", _sleeper(0, {}), outputs=("x",)), Stage("b", _sleeper(0, {}), outputs=("x",))])
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+
+async def test_generate_sdf_stage_trace_and_stage_timeout(monkeypatch):
+    monkeypatch.setenv("AI_STAGE_INVENTORY_GENERATOR_TIMEOUT", "0.05")
+    service = MultiAgentService.__new__(MultiAgentService)
+    for name in ("distributor", "hr", "invoice", "inventory", "reviewer"):
+        setattr(service, f"{name}_client", _Client())
+
+    async def distributor(**kwargs):
+        output = DistributorOutput(
+            project_name="Shop",
+            modules_needed=["hr", "inventory"],
+            hr_context=ModuleContext(enabled=True),
+            inventory_context=ModuleContext(enabled=True),
+        )
+        return output, GenerationResult(text="{}", total_tokens=10), "p"
+
+    def generator(module, delay):
+        async def run(*args, **kwargs):
+            await asyncio.sleep(delay)
+            output = ModuleGeneratorOutput(module=module, entities=[{"slug": f"{module}_items"}], sdf_complete=True)
+            return output, GenerationResult(text="{}", total_tokens=100), "p"
+        return run
+
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    monkeypatch.setattr(service, "_run_hr_generator", generator("hr", 0))
+    monkeypatch.setattr(service, "_run_inventory_generator", generator("inventory", 5))
+    result = await service.generate_sdf("A shop")
+
+    assert result.success
+    assert [e["slug"] for e in result.sdf["entities"]] == ["hr_items"]
+    assert any("inventory" in error and "timed out" in error for error in result.errors)
+    statuses = {t["stage"]: t["status"] for t in result.stage_trace}
+    assert statuses["reviewer"] == "skipped" and statuses["invoice_generator"] == "skipped"
+    assert statuses["hr_generator"] == "ok" and statuses["inventory_generator"] == "failed"
+    assert statuses["finalize"] == "ok"
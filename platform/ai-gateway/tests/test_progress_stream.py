@@ -0,0 +1,212 @@
+"""Unit tests for push-based generation progress.
+
+Covered behaviors:
+- Subscribers get the current run's events replayed, then live ones, and
+  the stream ends after ``done``/``error``; ``after`` skips seen events and
+  ``begin`` starts a fresh history.
+- After a run ends, a new subscriber is not handed its old ``done``: it
+  waits for the next ``begin``; one resuming inside the finished run still
+  gets the rest of it.
+- Silence yields keepalive ticks; a full subscriber queue drops events
+  instead of blocking the publisher.
+- ``PipelineDAG`` reports stage start/finish and ``generate_sdf`` reports
+  each module's partial SDF as its generator lands.
+- ``/ai/progress/{project_id}/stream`` streams an /ai/analyze run as SSE
+  frames with ids, and ``Last-Event-ID`` resumes a finished run.
+- A submitted job's ``queued`` event stays in its run's history.
+- The WebSocket stream resumes after ``?after=`` like SSE's Last-Event-ID.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src import main as gateway_main
+from src.schemas.multi_agent import DistributorOutput, ModuleContext, ModuleGeneratorOutput, PipelineResult
+from src.schemas.sdf import SystemDefinitionFile
+from src.services import job_queue, progress_events
+from src.services.base_client import GenerationResult
+from src.services.job_queue import JobQueue
+from src.services.multi_agent_service import MultiAgentService
+from src.services.pipeline_dag import PipelineDAG, Stage
+from src.services.progress_events import ProgressBroker
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _collect(stream) -> list:
+    return [item async for item in stream]
+
+
+async def test_replay_live_and_terminal():
+    broker = ProgressBroker()
+    broker.publish("p1", "progress", {"step": "old"})
+    broker.begin("p1")
+    broker.publish("p1", "progress", {"step": "distributor"})
+
+    task = asyncio.ensure_future(_collect(broker.subscribe("p1")))
+    await asyncio.sleep(0)
+    broker.publish("p1", "module", {"module": "hr"})
+    broker.publish("p1", "done", {})
+    broker.publish("p1", "progress", {"step": "after"})
+    events = await task
+    assert [(seq, event) for seq, event, _ in events] == [(2, "progress"), (3, "module"), (4, "done")]
+
+    replay = await _collect(broker.subscribe("p1", after=3))
+    assert [event for _, event, _ in replay] == ["done"]
+    assert broker.snapshot()["subscribers"] == 0
+
+
+async def test_finished_run_is_not_replayed_to_new_subscribers():
+    broker = ProgressBroker()
+    broker.begin("p1")
+    broker.publish("p1", "progress", {"step": "old"})
+    broker.publish("p1", "done", {})
+
+    assert [seq for seq, _, _ in await _collect(broker.subscribe("p1", after=1))] == [2]
+
+    stream = broker.subscribe("p1", keepalive=0.01)
+    assert await stream.__anext__() == (None, None, None)
+    broker.begin("p1")
+    broker.publish("p1", "progress", {"step": "next"})
+    assert await stream.__anext__() == (3, "progress", {"step": "next"})
+    await stream.aclose()
+    # The new run's history holds only its own events.
+    broker.publish("p1", "done", {})
+    assert [seq for seq, _, _ in await _collect(broker.subscribe("p1", after=3))] == [4]
+
+
+async def test_keepalive_and_slow_subscriber():
+    broker = ProgressBroker(max_queue=1)
+    stream = broker.subscribe("p1", keepalive=0.01)
+    assert await stream.__anext__() == (None, None, None)
+    broker.publish("p1", "progress", {"pct": 1})
+    broker.publish("p1", "progress", {"pct": 2})
+    assert (await stream.__anext__())[2] == {"pct": 1}
+    assert broker.snapshot()["dropped"] == 1
+    await stream.aclose()
+
+
+async def test_dag_reports_stage_events():
+    seen = []
+
+    async def run(inputs):
+        return {"x": 1}
+
+    await PipelineDAG(
+        [Stage("a", run, outputs=("x",)), Stage("b", run, inputs=("x",), when=lambda v: False)],
+        on_event=lambda event, data: seen.append((event, data["stage"], data["status"])),
+    ).run()
+    assert seen == [
+        ("stage", "a", "started"), ("stage", "a", "ok"), ("stage", "b", "started"), ("stage", "b", "skipped"),
+    ]
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+
+async def test_generate_sdf_reports_module_outputs(monkeypatch):
+    service = MultiAgentService.__new__(MultiAgentService)
+    for name in ("distributor", "hr", "invoice", "inventory", "reviewer"):
+        setattr(service, f"{name}_client", _Client())
+
+    async def distributor(**kwargs):
+        output = DistributorOutput(project_name="Shop", modules_needed=["hr"], hr_context=ModuleContext(enabled=True))
+        return output, GenerationResult(text="{}", total_tokens=10), "p"
+
+    async def hr_generator(*args, **kwargs):
+        output = ModuleGeneratorOutput(module="hr", entities=[{"slug": "employees"}], sdf_complete=True)
+        return output, GenerationResult(text="{}", total_tokens=100), "p"
+
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    monkeypatch.setattr(service, "_run_hr_generator", hr_generator)
+    seen = []
+    await service.generate_sdf("A shop", on_event=lambda event, data: seen.append((event, data)))
+
+    modules = [data for event, data in seen if event == "module"]
+    assert modules == [{"module": "hr", "entities": [{"slug": "employees"}], "module_config": {}, "sdf_complete": True}]
+    finished = [data["stage"] for event, data in seen if event == "stage" and data["status"] == "ok"]
+    assert finished[0] == "distributor" and finished[-1] == "finalize"
+
+
+class _FakeSDFService:
+    async def generate_sdf_multi_agent(self, on_progress=None, on_event=None, **kwargs):
+        on_progress("distributor", 10, "Analyzing")
+        on_event("module", {"module": "hr", "entities": [{"slug": "employees"}]})
+        sdf = SystemDefinitionFile(project_name="Shop", entities=[], sdf_complete=True)
+        return sdf, PipelineResult(success=True)
+
+
+def _parse_sse(body: str) -> list:
+    frames = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.split("\n"))
+        frames.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return frames
+
+
+async def test_sse_stream_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, "_job_queue", JobQueue(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(progress_events, "_broker", ProgressBroker())
+    monkeypatch.setattr(gateway_main, "get_sdf_service", lambda: _FakeSDFService())
+    monkeypatch.setattr(gateway_main, "_log_training_session", lambda *a, **kw: "session")
+    body = {"business_description": "A small shop that sells bicycles and repairs them for locals.", "project_id": "p1"}
+
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        stream = asyncio.ensure_future(client.get("/ai/progress/p1/stream"))
+        await asyncio.sleep(0.05)
+        assert (await client.post("/ai/analyze", json=body)).status_code == 200
+        response = await stream
+        assert response.headers["content-type"].startswith("text/event-stream")
+        frames = _parse_sse(response.text)
+        assert [event for _, event, _ in frames] == ["progress", "progress", "module", "progress", "done"]
+        assert frames[2][2]["entities"] == [{"slug": "employees"}]
+        assert frames[-1][2] == {"sdf_complete": True, "halted_reason": None}
+
+        response = await client.get("/ai/progress/p1/stream", headers={"Last-Event-ID": str(frames[2][0])})
+        assert [event for _, event, _ in _parse_sse(response.text)] == ["progress", "done"]
+    await job_queue._job_queue.stop()
+
+
+async def test_submitted_job_keeps_queued_event(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, "_job_queue", JobQueue(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(progress_events, "_broker", ProgressBroker())
+    monkeypatch.setattr(gateway_main, "get_sdf_service", lambda: _FakeSDFService())
+    monkeypatch.setattr(gateway_main, "_log_training_session", lambda *a, **kw: "session")
+    body = {"business_description": "A small shop that sells bicycles and repairs them for locals.", "project_id": "p1"}
+
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        stream = asyncio.ensure_future(client.get("/ai/progress/p1/stream"))
+        await asyncio.sleep(0.05)
+        assert (await client.post("/ai/jobs/analyze", json=body)).status_code == 202
+        frames = _parse_sse((await stream).text)
+    assert frames[0][2]["step"] == "queued" and frames[-1][1] == "done"
+    assert [seq for seq, _, _ in frames] == list(range(1, len(frames) + 1))
+    await job_queue._job_queue.stop()
+
+
+async def test_websocket_resumes_after(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    broker = ProgressBroker()
+    monkeypatch.setattr(progress_events, "_broker", broker)
+    broker.begin("p1")
+    for step in ("distributor", "generators"):
+        broker.publish("p1", "progress", {"step": step})
+    broker.publish("p1", "done", {})
+
+    # Not used as a context manager: no startup/shutdown events.
+    with TestClient(gateway_main.app).websocket_connect("/ai/progress/p1/ws?after=1") as ws:
+        messages = [ws.receive_json(), ws.receive_json()]
+    assert [(m["id"], m["event"]) for m in messages] == [(2, "progress"), (3, "done")]
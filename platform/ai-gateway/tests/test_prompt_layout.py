@@ -0,0 +1,165 @@
+"""Unit tests for static-first prompt layout and provider prompt caching.
+
+Covered behaviors:
+- Every agent prompt puts request data after its static part, so two
+  requests share the whole static prefix (template, schema reference and
+  language directive), and the registry hands that prefix back.
+- English and Turkish prompts share everything before the directive.
+- A ``{language_directive}`` placeholder is always substituted, with an
+  empty string when there is no directive.
+- Azure's ``prompt_tokens_details.cached_tokens`` and Gemini's
+  ``cached_content_token_count`` surface as ``cached_tokens``.
+- The Gemini context cache creates one entry per prefix, reuses it, skips
+  small prefixes, and does not retry a failed prefix until its TTL is up.
+- With context caching on, the Gemini client sends only the suffix.
+- ``token_usage`` accumulates cached tokens per agent and in the total.
+"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.prompts import sdf_generation as prompts
+from src.services import gemini_client as gemini_module
+from src.services.azure_client import _cached_tokens
+from src.services.base_client import GenerationResult
+from src.services.gemini_context_cache import GeminiContextCache
+from src.services.multi_agent_service import MultiAgentService
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _generator_prompt(business: str, language: str = "en") -> str:
+    return prompts.get_hr_generator_prompt(
+        business_description=business,
+        hr_description=f"HR for {business}",
+        hr_features="[]",
+        shared_entities="[]",
+        prefilled_module_sdf='{"entities": []}',
+        language=language,
+    )
+
+
+PROMPT_BUILDERS = {
+    "analyze": lambda b: prompts.get_sdf_prompt(b),
+    "reviewer": lambda b: prompts.get_answer_reviewer_prompt(b, "{}", "{}", ["hr"], ["Payroll"]),
+    "change_reviewer": lambda b: prompts.get_change_request_reviewer_prompt(b, "summary", "add a field", ["x"]),
+    "distributor": lambda b: prompts.get_distributor_prompt(b, "{}", "", selected_modules=["hr"]),
+    "hr": _generator_prompt,
+    "integrator": lambda b: prompts.get_integrator_prompt("P", b, "[]", "{}", "null", "null", "{}", "{}"),
+    "edit": lambda b: prompts.get_edit_prompt(b, "{}", "rename"),
+    "chat": lambda b: prompts.get_chat_prompt(b, "hello"),
+    "precheck": lambda b: prompts.get_module_precheck_prompt(b, ["hr"]),
+}
+
+
+@pytest.mark.parametrize("name", sorted(PROMPT_BUILDERS))
+async def test_request_data_comes_after_static_prefix(name):
+    first = PROMPT_BUILDERS[name]("A bakery with 4 staff")
+    second = PROMPT_BUILDERS[name]("A car repair shop")
+
+    prefix = prompts.static_prefix(first)
+    assert prefix and prefix == prompts.static_prefix(second)
+    assert "A bakery" not in prefix
+    # Almost the whole prompt is static.
+    assert len(prefix) > 0.8 * len(first)
+    assert "{language_directive}" not in first and "{sdf_schema_reference}" not in first
+
+
+async def test_languages_share_template_and_schema_prefix():
+    en = prompts.static_prefix(_generator_prompt("shop", "en"))
+    tr = prompts.static_prefix(_generator_prompt("shop", "tr"))
+    assert en != tr
+    schema = prompts._get_sdf_schema_reference()
+    shared = en[: en.index(schema) + len(schema)]
+    assert tr.startswith(shared)
+
+
+async def test_language_placeholder_always_substituted(monkeypatch):
+    monkeypatch.setattr(prompts, "_LANGUAGE_DIRECTIVE_CACHE", {"en": "  "})
+    assert prompts._with_language_directive("A\n{language_directive}\nB", "en") == "A\n\nB"
+    assert prompts._with_language_directive("A", "en") == "A"
+    assert "{language_directive}" not in prompts._render("X {language_directive} {b}", {"b": "y"})
+
+
+async def test_cached_token_extraction():
+    usage = SimpleNamespace(prompt_tokens_details=SimpleNamespace(cached_tokens=1536))
+    assert _cached_tokens(usage) == 1536
+    assert _cached_tokens(SimpleNamespace(prompt_tokens_details=None)) == 0
+    assert _cached_tokens(None) == 0
+
+    meta = SimpleNamespace(prompt_token_count=9000, candidates_token_count=100,
+                           total_token_count=9100, cached_content_token_count=8000)
+    client = gemini_module.GeminiClient.__new__(gemini_module.GeminiClient)
+    assert client._extract_usage(SimpleNamespace(usage_metadata=meta))["cached"] == 8000
+
+
+async def test_context_cache_creates_once_and_reuses(monkeypatch):
+    cache = GeminiContextCache(ttl_seconds=3600, min_tokens=100)
+    created = []
+
+    def fake_create(model_name, prefix):
+        created.append(prefix)
+        return SimpleNamespace(name=f"cachedContents/{len(created)}", model=f"models/{model_name}")
+
+    monkeypatch.setattr(cache, "_create", fake_create)
+    prefix = "static instructions " * 200
+
+    first = await cache.get("gemini-2.5-flash", prefix)
+    second = await cache.get("gemini-2.5-flash", prefix)
+    assert first is second and len(created) == 1
+    assert await cache.get("gemini-2.5-flash", "tiny") is None
+    snap = cache.snapshot()
+    assert (snap["created"], snap["reused"], snap["too_small"]) == (1, 1, 1)
+
+
+async def test_context_cache_failure_is_not_retried_immediately(monkeypatch):
+    cache = GeminiContextCache(ttl_seconds=3600, min_tokens=1)
+    calls = {"n": 0}
+
+    def failing_create(model_name, prefix):
+        calls["n"] += 1
+        raise RuntimeError("model does not support caching")
+
+    monkeypatch.setattr(cache, "_create", failing_create)
+    assert await cache.get("gemini-2.0-flash", "prefix text") is None
+    assert await cache.get("gemini-2.0-flash", "prefix text") is None
+    assert calls["n"] == 1
+    assert cache.snapshot()["failures"] == 1
+
+
+async def test_gemini_sends_suffix_against_cached_prefix(monkeypatch):
+    prompt = _generator_prompt("A flower shop")
+    prefix = prompts.static_prefix(prompt)
+    cached = SimpleNamespace(name="cachedContents/abc", model="models/gemini-2.5-flash")
+
+    class _Cache:
+        async def get(self, model_name, static):
+            assert static == prefix
+            return cached
+
+    monkeypatch.setattr(gemini_module, "get_gemini_context_cache", lambda: _Cache())
+    client = gemini_module.GeminiClient.__new__(gemini_module.GeminiClient)
+    client.model = object()
+    client.model_name = "gemini-2.5-flash"
+
+    model, contents, used_prefix = await client._model_for(prompt)
+    assert used_prefix == prefix
+    assert contents == prompt[len(prefix):]
+    assert "A flower shop" in contents
+    assert model._cached_content == "cachedContents/abc"
+
+
+async def test_token_usage_tracks_cached_tokens():
+    usage = MultiAgentService._empty_token_usage()
+    MultiAgentService._add_tokens(usage, "hr", GenerationResult(
+        text="{}", prompt_tokens=10000, completion_tokens=500, total_tokens=10500, cached_tokens=9000,
+    ))
+    MultiAgentService._add_tokens(usage, "hr", GenerationResult(
+        text="{}", prompt_tokens=100, completion_tokens=5, total_tokens=105,
+    ))
+    assert usage["hr"]["cached"] == 9000
+    assert usage["total"]["cached"] == 9000
@@ -0,0 +1,104 @@
+"""Unit tests for the client-side RPM/TPM rate limiter.
+
+Covered behaviors:
+- Calls inside the budget pass straight through.
+- Exceeding RPM or TPM makes the next caller wait for refill instead of
+  failing.
+- Waiters are served in FIFO order.
+- A request larger than the whole TPM bucket still gets through.
+- Limiters are shared per deployment key and disabled when both limits are 0.
+- Agents configuring different limits for one deployment get the strictest
+  of them, whichever agent came first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from src.services import base_client
+from src.services.base_client import RateLimiter, get_rate_limiter
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_within_budget_does_not_wait():
+    limiter = RateLimiter("dep", rpm=60, tpm=100_000)
+    waited = await limiter.acquire(1_000)
+    assert waited < 0.05
+    snap = limiter.snapshot()
+    assert snap["acquired"] == 1
+    assert snap["delayed"] == 0
+    assert snap["queue_depth"] == 0
+
+
+async def test_rpm_exhaustion_queues_until_refill():
+    # 600 RPM -> one request every 0.1 s once the burst is spent.
+    limiter = RateLimiter("dep", rpm=600)
+    limiter._requests.tokens = 0.0
+    start = time.monotonic()
+    await limiter.acquire(1)
+    assert time.monotonic() - start >= 0.08
+    assert limiter.snapshot()["delayed"] == 1
+
+
+async def test_tpm_exhaustion_queues_until_refill():
+    # 60_000 TPM refills 1000 tokens per second.
+    limiter = RateLimiter("dep", tpm=60_000)
+    limiter._tokens.tokens = 0.0
+    start = time.monotonic()
+    await limiter.acquire(100)
+    assert time.monotonic() - start >= 0.08
+
+
+async def test_waiters_are_served_fifo():
+    limiter = RateLimiter("dep", rpm=1200)
+    limiter._requests.tokens = 0.0
+    order: list[int] = []
+
+    async def call(i: int):
+        await limiter.acquire(1)
+        order.append(i)
+
+    tasks = [asyncio.create_task(call(i)) for i in range(4)]
+    await asyncio.sleep(0)
+    assert limiter.snapshot()["queue_depth"] == 4
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2, 3]
+
+
+async def test_oversized_request_is_clamped_to_bucket():
+    limiter = RateLimiter("dep", tpm=1_000)
+    waited = await limiter.acquire(50_000)
+    assert waited < 0.05
+
+
+async def test_registry_shares_limiter_per_deployment(monkeypatch):
+    monkeypatch.setattr(base_client, "_rate_limiters", {})
+    a = get_rate_limiter("azure_openai:https://x:gpt-4o", 100, 0)
+    b = get_rate_limiter("azure_openai:https://x:gpt-4o", 100, 0)
+    c = get_rate_limiter("azure_openai:https://x:gpt-4o-mini", 100, 0)
+    assert a is b
+    assert a is not c
+    assert get_rate_limiter("disabled", 0, 0) is None
+    assert set(base_client.rate_limiter_snapshot()) == {
+        "azure_openai:https://x:gpt-4o",
+        "azure_openai:https://x:gpt-4o-mini",
+    }
+
+
+async def test_conflicting_limits_use_the_strictest(monkeypatch):
+    monkeypatch.setattr(base_client, "_rate_limiters", {})
+    assert get_rate_limiter("dep", 0, 0) is None
+    first = get_rate_limiter("dep", 600, 0)
+    first._requests.tokens = 100.0
+    assert get_rate_limiter("dep", 0, 0) is first
+    assert get_rate_limiter("dep", 60, 90_000) is first
+    assert (first.rpm, first.tpm) == (60, 90_000)
+    assert first._requests.tokens == 60.0
+    get_rate_limiter("dep", 300, 120_000)
+    assert base_client.rate_limiter_snapshot()["dep"]["rpm_limit"] == 60
+    assert base_client.rate_limiter_snapshot()["dep"]["tpm_limit"] == 90_000
@@ -0,0 +1,156 @@
+"""Unit tests for the content-addressed response cache.
+
+Covered behaviors:
+- The key changes with every component (provider, model, prompt,
+  temperature, json_mode, schema) and is stable otherwise.
+- ``CachingClient`` answers a repeated call from cache as a zero-token
+  ``GenerationResult`` with ``cache_hit=True``.
+- The memory tier is an LRU with TTL; the disk tier survives a new cache
+  instance and stays under its size cap.
+- Editing a prompt template file invalidates both tiers.
+- Truncated (``finish_reason == "length"``) and, for JSON calls,
+  unparseable responses are not cached; hits report ``finish_reason="stop"``.
+"""
+
+from __future__ import annotations
+
+import pathlib
+from types import SimpleNamespace
+
+import pytest
+
+from src.schemas.multi_agent import DistributorOutput
+from src.services.base_client import GenerationResult
+from src.services.response_cache import CachingClient, ResponseCache, make_cache_key
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def prompt_dir(tmp_path: pathlib.Path) -> pathlib.Path:
+    directory = tmp_path / "prompts"
+    directory.mkdir()
+    (directory / "reviewer_prompt.txt").write_text("Review {{answers}}")
+    return directory
+
+
+def _cache(prompt_dir, db_path=None, **kwargs) -> ResponseCache:
+    kwargs.setdefault("fingerprint_check_seconds", 0)
+    return ResponseCache(db_path, prompt_dir=prompt_dir, **kwargs)
+
+
+class _FakeClient:
+    def __init__(self, text=None, finish_reason=None):
+        self.calls = 0
+        self.text = text
+        self.finish_reason = finish_reason
+        self.agent_config = SimpleNamespace(name="reviewer", temperature=0.0)
+
+    def get_temperature(self, override=None):
+        return override if override is not None else self.agent_config.temperature
+
+    def get_model_info(self):
+        return {"provider": "azure_openai", "deployment": "gpt-4o"}
+
+    async def generate_with_retry(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        self.calls += 1
+        return GenerationResult(text=self.text or f"answer:{prompt}", prompt_tokens=100, completion_tokens=20,
+                                total_tokens=120, model="gpt-4o", finish_reason=self.finish_reason)
+
+
+async def test_cache_key_covers_every_component():
+    base = ("azure_openai", "gpt-4o", "prompt", 0.0, False, None)
+    key = make_cache_key(*base)
+    assert make_cache_key(*base) == key
+    variants = [
+        ("gemini", "gpt-4o", "prompt", 0.0, False, None),
+        ("azure_openai", "gpt-4o-mini", "prompt", 0.0, False, None),
+        ("azure_openai", "gpt-4o", "prompt!", 0.0, False, None),
+        ("azure_openai", "gpt-4o", "prompt", 0.2, False, None),
+        ("azure_openai", "gpt-4o", "prompt", 0.0, True, None),
+        ("azure_openai", "gpt-4o", "prompt", 0.0, False, DistributorOutput),
+    ]
+    assert len({make_cache_key(*v) for v in variants} | {key}) == len(variants) + 1
+
+
+async def test_repeated_call_is_a_zero_token_hit(prompt_dir):
+    primary = _FakeClient()
+    client = CachingClient(primary, _cache(prompt_dir))
+
+    first = await client.generate_with_retry("p", temperature=0.0)
+    second = await client.generate_with_retry("p", temperature=0.0)
+
+    assert primary.calls == 1
+    assert first.cache_hit is False and first.total_tokens == 120
+    assert second.cache_hit is True
+    assert second.text == first.text
+    assert (second.prompt_tokens, second.completion_tokens, second.total_tokens) == (0, 0, 0)
+    assert second.model == "gpt-4o"
+    assert second.finish_reason == "stop"
+
+
+@pytest.mark.parametrize("text, finish_reason, json_mode, cached", [
+    ('{"a": 1}', "stop", True, True),
+    ('```json\n{"a": 1}\n```', None, True, True),
+    ('{"a": 1, "b": [', "length", True, False),
+    ("partial answer", "length", False, False),
+    ('{"a": 1,, }', "stop", True, False),
+    ("plain text", "stop", True, False),
+])
+async def test_only_complete_responses_are_cached(prompt_dir, text, finish_reason, json_mode, cached):
+    primary = _FakeClient(text=text, finish_reason=finish_reason)
+    cache = _cache(prompt_dir)
+    client = CachingClient(primary, cache)
+    await client.generate_with_retry("p", temperature=0.0, json_mode=json_mode)
+    second = await client.generate_with_retry("p", temperature=0.0, json_mode=json_mode)
+    assert second.cache_hit is cached
+    assert primary.calls == (1 if cached else 2)
+    assert cache.snapshot()["skipped_incomplete"] == (0 if cached else 2)
+
+
+async def test_memory_lru_and_ttl(prompt_dir):
+    cache = _cache(prompt_dir, memory_entries=2)
+    await cache.put("a", "A", "m")
+    await cache.put("b", "B", "m")
+    await cache.get("a")  # a becomes most recent
+    await cache.put("c", "C", "m")
+    assert await cache.get("b") is None
+    assert await cache.get("a") == ("A", "m")
+
+    expiring = _cache(prompt_dir, ttl_seconds=-1)
+    await expiring.put("k", "v", "m")
+    assert await expiring.get("k") is None
+
+
+async def test_disk_tier_survives_restart(prompt_dir, tmp_path):
+    db = tmp_path / "cache.sqlite"
+    await _cache(prompt_dir, db).put("k", "persisted", "gpt-4o")
+
+    fresh = _cache(prompt_dir, db)
+    assert await fresh.get("k") == ("persisted", "gpt-4o")
+    snap = fresh.snapshot()
+    assert snap["hits_disk"] == 1
+    assert snap["disk_entries"] == 1
+
+
+async def test_disk_tier_respects_size_cap(prompt_dir, tmp_path):
+    cache = _cache(prompt_dir, tmp_path / "cache.sqlite", disk_max_bytes=250, memory_entries=1)
+    for i in range(5):
+        await cache.put(f"k{i}", "x" * 100, "m")
+    assert cache.snapshot()["disk_bytes"] <= 250
+    # The newest entry is kept; the oldest was evicted.
+    assert await cache.get("k4") is not None
+    assert await cache.get("k0") is None
+
+
+async def test_template_change_invalidates(prompt_dir, tmp_path):
+    db = tmp_path / "cache.sqlite"
+    cache = _cache(prompt_dir, db)
+    await cache.put("k", "v", "m")
+
+    (prompt_dir / "reviewer_prompt.txt").write_text("Review {{answers}} strictly")
+
+    assert await cache.get("k") is None
+    assert cache.snapshot()["invalidations"] == 1
+    assert cache.snapshot()["disk_entries"] == 0
@@ -0,0 +1,120 @@
+"""Unit tests for the shared retry policy.
+
+Covered behaviors:
+- ``Retry-After`` (seconds and HTTP date), ``retry-after-ms`` and the
+  exhausted ``x-ratelimit-reset-*`` header are honoured.
+- Gemini ``RetryInfo`` details are honoured.
+- Decorrelated jitter stays within [base, min(cap, 3 * previous)].
+- The retry budget denies retries beyond its ratio of first attempts, with
+  a floor for quiet periods, and forgets old traffic after the window.
+- ``next_retry_delay`` gives up on over-long hints and on an empty budget.
+"""
+
+from __future__ import annotations
+
+import email.utils
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from src.services import retry_policy
+from src.services.retry_policy import (
+    RetryBudget,
+    decorrelated_jitter,
+    next_retry_delay,
+    retry_after_seconds,
+)
+
+
+def _http_error(headers: dict) -> Exception:
+    error = Exception("429")
+    error.response = httpx.Response(429, headers=headers)
+    return error
+
+
+@pytest.fixture(autouse=True)
+def _fresh_budget(monkeypatch):
+    monkeypatch.setattr(retry_policy, "_budget", RetryBudget(ratio=0.1, window_seconds=60, min_retries=2))
+
+
+def test_retry_after_seconds_header():
+    assert retry_after_seconds(_http_error({"Retry-After": "7"})) == 7.0
+
+
+def test_retry_after_ms_takes_precedence():
+    error = _http_error({"retry-after-ms": "250", "Retry-After": "7"})
+    assert retry_after_seconds(error) == 0.25
+
+
+def test_retry_after_http_date():
+    when = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= retry_after_seconds(_http_error({"Retry-After": when})) <= 31
+
+
+def test_only_exhausted_ratelimit_reset_counts():
+    error = _http_error({
+        "x-ratelimit-remaining-requests": "12",
+        "x-ratelimit-reset-requests": "45s",
+        "x-ratelimit-remaining-tokens": "0",
+        "x-ratelimit-reset-tokens": "1m2.5s",
+    })
+    assert retry_after_seconds(error) == pytest.approx(62.5)
+
+
+def test_gemini_retry_info_detail():
+    error = Exception("quota")
+    error.details = [SimpleNamespace(retry_delay=SimpleNamespace(seconds=3, nanos=500_000_000))]
+    assert retry_after_seconds(error) == pytest.approx(3.5)
+
+
+def test_no_hint_returns_none():
+    assert retry_after_seconds(TimeoutError()) is None
+    assert retry_after_seconds(_http_error({})) is None
+
+
+def test_decorrelated_jitter_bounds():
+    for previous in (0.0, 1.0, 4.0, 50.0):
+        for _ in range(50):
+            delay = decorrelated_jitter(previous, base=1.0, cap=30.0)
+            assert 1.0 <= delay <= min(30.0, max(1.0, previous * 3))
+
+
+def test_budget_ratio_and_floor():
+    budget = RetryBudget(ratio=0.1, window_seconds=60, min_retries=2)
+    for _ in range(30):
+        budget.record_request()
+    # 10% of 30 = 3 retries.
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert budget.snapshot()["denied"] == 1
+
+    quiet = RetryBudget(ratio=0.1, window_seconds=60, min_retries=2)
+    quiet.record_request()
+    assert [quiet.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_budget_window_expires():
+    budget = RetryBudget(ratio=0.1, window_seconds=60, min_retries=1)
+    budget.record_request()
+    assert budget.try_acquire() is True
+    assert budget.try_acquire() is False
+    budget._retries[0] -= 120
+    assert budget.try_acquire() is True
+
+
+def test_next_retry_delay_uses_hint_plus_jitter(monkeypatch):
+    monkeypatch.setattr(retry_policy.settings, "AI_RETRY_BASE_SECONDS", 1.0)
+    delay = next_retry_delay(_http_error({"Retry-After": "5"}), 0.0, "Test")
+    assert 5.0 <= delay <= 6.0
+
+
+def test_next_retry_delay_gives_up_on_long_hint(monkeypatch):
+    monkeypatch.setattr(retry_policy.settings, "AI_RETRY_MAX_RETRY_AFTER_SECONDS", 60.0)
+    assert next_retry_delay(_http_error({"Retry-After": "600"}), 0.0, "Test") is None
+
+
+def test_next_retry_delay_gives_up_when_budget_spent():
+    assert next_retry_delay(TimeoutError(), 0.0, "Test") is not None
+    assert next_retry_delay(TimeoutError(), 1.0, "Test") is not None
+    assert next_retry_delay(TimeoutError(), 1.0, "Test") is None
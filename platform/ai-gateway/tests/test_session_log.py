@@ -0,0 +1,110 @@
+"""Unit tests for the background training-session writer.
+
+Covered behaviors:
+- Records queued while the writer is busy are appended in batches, in
+  order, and ``stop`` writes everything still queued.
+- A full queue drops new records and counts them instead of blocking.
+- The fsync policy decides when batches are synced.
+- Outside an event loop records are appended inline.
+- A record is captured when it is queued; later changes don't reach the
+  log, and a failing batch or store doesn't stop the writer.
+- ``_log_training_session`` only queues; the record lands in the file and
+  the indexed store after a flush.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+from src import main as gateway_main
+from src.services import session_log, session_store
+from src.services.session_log import SessionLogWriter
+from src.services.session_store import SessionStore
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _lines(path) -> list:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+async def test_batches_in_order_and_flushes_on_stop(tmp_path):
+    path = tmp_path / "sessions.jsonl"
+    writer = SessionLogWriter(path, batch_size=3, fsync="never")
+    for n in range(7):
+        assert writer.write({"session_id": str(n)})
+    assert not path.exists()
+
+    await writer.stop()
+    assert [r["session_id"] for r in _lines(path)] == [str(n) for n in range(7)]
+    assert writer.snapshot()["batches"] == 3 and writer.written == 7
+
+
+async def test_full_queue_drops(tmp_path):
+    writer = SessionLogWriter(tmp_path / "sessions.jsonl", max_pending=2, fsync="never")
+    results = [writer.write({"n": n}) for n in range(5)]
+    assert results == [True, True, False, False, False]
+    await writer.stop()
+    assert writer.snapshot()["dropped"] == 3 and writer.written == 2
+
+
+@pytest.mark.parametrize("policy, expected", [("always", 3), ("interval", 2), ("never", 0)])
+async def test_fsync_policy(tmp_path, policy, expected):
+    writer = SessionLogWriter(tmp_path / "sessions.jsonl", batch_size=1, fsync=policy, fsync_interval=60)
+    for n in range(2):
+        writer.write({"n": n})
+        await asyncio.sleep(0.05)
+    writer.write({"n": 2})
+    await writer.stop()
+    # interval: the first batch, then the final sync on stop.
+    assert writer.fsyncs == expected
+
+
+class _BrokenStore:
+    def add_many(self, entries):
+        raise RuntimeError("store is gone")
+
+
+async def test_record_captured_at_write_and_failures_survive(tmp_path, monkeypatch):
+    path = tmp_path / "sessions.jsonl"
+    writer = SessionLogWriter(path, batch_size=1, fsync="never", store=_BrokenStore())
+    record = {"session_id": "a", "steps": [1]}
+    writer.write(record)
+    record["steps"].append(2)
+    await asyncio.sleep(0.05)
+
+    def broken(batch, sync):
+        raise RuntimeError("disk")
+
+    appended = writer._append
+    monkeypatch.setattr(writer, "_append", broken)
+    writer.write({"session_id": "b"})
+    await asyncio.sleep(0.05)
+    monkeypatch.setattr(writer, "_append", appended)
+    writer.write({"session_id": "c"})
+    await writer.stop()
+
+    assert _lines(path) == [{"session_id": "a", "steps": [1]}, {"session_id": "c"}]
+    assert writer.written == 2 and writer.failed == 1
+
+
+def test_inline_without_event_loop(tmp_path):
+    path = tmp_path / "sessions.jsonl"
+    SessionLogWriter(path).write({"session_id": "s", "value": {1, 2}})
+    assert _lines(path)[0]["session_id"] == "s"
+
+
+async def test_log_training_session_queues(monkeypatch, tmp_path):
+    path = tmp_path / "sessions.jsonl"
+    monkeypatch.setattr(gateway_main, "_SESSIONS_FILE", path)
+    monkeypatch.setattr(session_log, "_writer", None)
+    monkeypatch.setattr(session_store, "_store", SessionStore(tmp_path / "sessions.sqlite"))
+    session_id = gateway_main._log_training_session("analyze", {"business_description": "x"}, {"ok": True})
+    await session_log.get_session_log(path).stop()
+    record = _lines(path)[0]
+    assert record["session_id"] == session_id and record["output"] == {"ok": True}
+    assert await session_store._store.get(session_id) == record
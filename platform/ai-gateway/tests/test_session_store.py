@@ -0,0 +1,169 @@
+"""Unit tests for the indexed training-session store.
+
+Covered behaviors:
+- An existing sessions.jsonl is imported once (bad lines skipped) and a
+  second import adds nothing.
+- Listing is newest first with the old summary shape; endpoint and agent
+  filters and ``total`` are applied in sqlite.
+- Cursor pages walk the whole filtered set without gaps or repeats, and
+  ``offset`` paging still works.
+- Stats match what the JSONL rescan reported.
+- The /ai/training/* endpoints answer from the store.
+- /ai/training/export streams filtered sessions oldest first, or one
+  prompt/completion row per LLM step, optionally gzip-encoded.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+
+import httpx
+import pytest
+
+from src import main as gateway_main
+from src.services import session_store
+from src.services.session_store import SessionStore
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _record(n: int, endpoint: str, agents: list) -> dict:
+    return {
+        "session_id": f"s{n}",
+        "timestamp": f"2026-01-01T00:00:{n:02d}Z",
+        "endpoint": endpoint,
+        "input": {"business_description": f"business {n}"},
+        "output": {"n": n},
+        "step_logs": [
+            {"agent": agent, "model": "gpt-4o", "prompt_text": f"{agent} prompt {n}", "output_parsed": {"n": n}}
+            for agent in agents
+        ] + ([{"agent": "finalize", "model": "deterministic", "prompt_text": "x"}] if endpoint == "analyze" else []),
+        "token_usage": {"total": {"prompt": 10, "completion": n}},
+    }
+
+
+@pytest.fixture
+def sessions_file(tmp_path):
+    path = tmp_path / "sessions.jsonl"
+    lines = []
+    for n in range(10):
+        endpoint = "analyze" if n % 2 == 0 else "chat"
+        agents = ["distributor", "hr_generator"] if endpoint == "analyze" else ["chat"]
+        lines.append(json.dumps(_record(n, endpoint, agents)))
+    lines.insert(3, "{not json")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+async def test_import_once_and_list(tmp_path, sessions_file):
+    store = SessionStore(tmp_path / "sessions.sqlite")
+    assert await store.import_jsonl(sessions_file) == 10
+    assert await SessionStore(tmp_path / "sessions.sqlite").import_jsonl(sessions_file) == 0
+
+    total, page, _ = await store.list_sessions(limit=2)
+    assert total == 10 and [s["session_id"] for s in page] == ["s9", "s8"]
+    assert page[1] == {
+        "session_id": "s8",
+        "timestamp": "2026-01-01T00:00:08Z",
+        "endpoint": "analyze",
+        "description_snippet": "business 8",
+        "step_count": 3,
+        "agents": ["distributor", "hr_generator", "finalize"],
+        "token_usage": {"total": {"prompt": 10, "completion": 8}},
+    }
+
+    total, page, _ = await store.list_sessions(endpoint="chat", limit=50)
+    assert total == 5 and {s["endpoint"] for s in page} == {"chat"}
+    total, page, _ = await store.list_sessions(agent="hr_generator", limit=50)
+    assert total == 5 and [s["session_id"] for s in page] == ["s8", "s6", "s4", "s2", "s0"]
+    assert (await store.get("s4"))["output"] == {"n": 4}
+    assert await store.get("missing") is None
+
+
+async def test_cursor_and_offset_paging(tmp_path, sessions_file):
+    store = SessionStore(tmp_path / "sessions.sqlite")
+    await store.import_jsonl(sessions_file)
+
+    seen, cursor = [], None
+    while True:
+        _, page, cursor = await store.list_sessions(limit=2, endpoint="analyze", cursor=cursor)
+        seen += [s["session_id"] for s in page]
+        if cursor is None:
+            break
+    assert seen == ["s8", "s6", "s4", "s2", "s0"]
+
+    _, page, _ = await store.list_sessions(limit=3, offset=3)
+    assert [s["session_id"] for s in page] == ["s6", "s5", "s4"]
+
+
+async def test_stats(tmp_path, sessions_file):
+    store = SessionStore(tmp_path / "sessions.sqlite")
+    assert await store.stats() == {"total_sessions": 0, "by_endpoint": {}, "date_range": None}
+    await store.import_jsonl(sessions_file)
+    assert await store.stats() == {
+        "total_sessions": 10,
+        "by_endpoint": {"analyze": 5, "chat": 5},
+        "total_tokens": 100 + sum(range(10)),
+        "date_range": {"earliest": "2026-01-01T00:00:00Z", "latest": "2026-01-01T00:00:09Z"},
+    }
+
+
+async def test_training_endpoints(monkeypatch, tmp_path, sessions_file):
+    monkeypatch.setattr(session_store, "_store", SessionStore(tmp_path / "sessions.sqlite"))
+    monkeypatch.setattr(gateway_main, "_SESSIONS_FILE", sessions_file)
+
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        body = (await client.get("/ai/training/sessions", params={"limit": 4, "agent": "chat"})).json()
+        assert body["total"] == 5 and [s["session_id"] for s in body["sessions"]] == ["s9", "s7", "s5", "s3"]
+        body = (await client.get(
+            "/ai/training/sessions", params={"limit": 4, "agent": "chat", "cursor": body["next_cursor"]},
+        )).json()
+        assert [s["session_id"] for s in body["sessions"]] == ["s1"] and body["next_cursor"] is None
+
+        assert (await client.get("/ai/training/sessions/s2")).json()["session_id"] == "s2"
+        assert (await client.get("/ai/training/sessions/nope")).status_code == 404
+        assert (await client.get("/ai/training/stats")).json()["total_sessions"] == 10
+
+
+async def test_export_endpoint(monkeypatch, tmp_path, sessions_file):
+    monkeypatch.setattr(session_store, "_store", SessionStore(tmp_path / "sessions.sqlite"))
+    monkeypatch.setattr(gateway_main, "_SESSIONS_FILE", sessions_file)
+    monkeypatch.setattr(session_store._store, "export", _small_pages(session_store._store.export))
+
+    def ids(text):
+        return [json.loads(line)["session_id"] for line in text.splitlines()]
+
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        response = await client.get("/ai/training/export")
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert ids(response.text) == [f"s{n}" for n in range(10)]
+
+        params = {"endpoint": "analyze", "since": "2026-01-01T00:00:02", "until": "2026-01-01T00:00:08"}
+        assert ids((await client.get("/ai/training/export", params=params)).text) == ["s2", "s4", "s6"]
+        params = [("session_id", "s7"), ("session_id", "s1,s3"), ("session_id", "missing")]
+        assert ids((await client.get("/ai/training/export", params=params)).text) == ["s1", "s3", "s7"]
+
+        response = await client.get("/ai/training/export", params={"rows": "steps", "agent": "hr_generator"})
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["session_id"] for row in rows] == ["s0", "s2", "s4", "s6", "s8"]
+        assert rows[0]["prompt"] == "hr_generator prompt 0" and rows[0]["completion"] == '{"n": 0}'
+
+        response = await client.get("/ai/training/export", params={"rows": "steps", "gzip": "true"})
+        assert response.headers["content-encoding"] == "gzip"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 15 and "finalize" not in {row["agent"] for row in rows}
+        async with client.stream("GET", "/ai/training/export", params={"gzip": "true"}) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        assert len(gzip.decompress(raw).splitlines()) == 10
+
+        assert (await client.get("/ai/training/export", params={"rows": "bad"})).status_code == 400
+
+
+def _small_pages(export):
+    def paged(*args, **kwargs):
+        return export(*args, page_size=3, **kwargs)
+    return paged
@@ -0,0 +1,115 @@
+"""Unit tests for single-flight coalescing of identical in-flight requests.
+
+Covered behaviors:
+- Concurrent calls with the same key share one factory call and result.
+- Different keys (body or project_id) run independently.
+- An exception reaches every caller that joined the call.
+- A key is released once its call finishes, so a later call runs again.
+- A caller that is cancelled does not cancel the shared call.
+- ``request_key`` ignores key order and separates endpoints/projects.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from src.services.single_flight import SingleFlight, request_key
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _counting_factory(calls: list, release: asyncio.Event, result="done"):
+    async def factory():
+        calls.append(1)
+        await release.wait()
+        return result
+    return factory
+
+
+async def test_concurrent_duplicates_share_one_call():
+    flight = SingleFlight("test")
+    calls: list = []
+    release = asyncio.Event()
+    factory = _counting_factory(calls, release)
+
+    waiters = [asyncio.ensure_future(flight.run("k", factory)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flight.snapshot()["in_flight"] == 1
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["done"] * 5
+    assert len(calls) == 1
+    assert flight.snapshot() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+async def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    calls: list = []
+    release = asyncio.Event()
+    release.set()
+    first = request_key("/ai/analyze", {"description": "x"}, "p1")
+    second = request_key("/ai/analyze", {"description": "x"}, "p2")
+
+    await asyncio.gather(
+        flight.run(first, _counting_factory(calls, release)),
+        flight.run(second, _counting_factory(calls, release)),
+    )
+    assert len(calls) == 2
+    assert flight.coalesced == 0
+
+
+async def test_exception_reaches_every_caller():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise ValueError("bad input")
+
+    waiters = [asyncio.ensure_future(flight.run("k", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.started == 1
+
+
+async def test_key_is_released_after_completion():
+    flight = SingleFlight("test")
+    calls: list = []
+    release = asyncio.Event()
+    release.set()
+
+    await flight.run("k", _counting_factory(calls, release))
+    await asyncio.sleep(0)
+    await flight.run("k", _counting_factory(calls, release))
+    assert len(calls) == 2
+    assert flight.snapshot()["in_flight"] == 0
+
+
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight("test")
+    calls: list = []
+    release = asyncio.Event()
+    factory = _counting_factory(calls, release)
+
+    leaver = asyncio.ensure_future(flight.run("k", factory))
+    stayer = asyncio.ensure_future(flight.run("k", factory))
+    await asyncio.sleep(0)
+    leaver.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await stayer == "done"
+    assert leaver.cancelled()
+
+
+async def test_request_key_is_canonical():
+    a = request_key("/ai/edit", {"instructions": "rename", "sdf": {"a": 1, "b": 2}}, "p")
+    b = request_key("/ai/edit", {"sdf": {"b": 2, "a": 1}, "instructions": "rename"}, "p")
+    assert a == b
+    assert a != request_key("/ai/analyze", {"instructions": "rename", "sdf": {"a": 1, "b": 2}}, "p")
+    assert a != request_key("/ai/edit", {"instructions": "rename", "sdf": {"a": 1, "b": 2}}, None)
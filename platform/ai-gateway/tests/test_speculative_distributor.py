@@ -0,0 +1,125 @@
+"""Unit tests for running the distributor speculatively next to the reviewer.
+
+Covered behaviors:
+- With speculation on, the distributor starts before the reviewer finishes
+  and its result is used once the reviewer clears.
+- A reviewer halt cancels a still-running distributor and reports its
+  (estimated) prompt tokens as ``speculative_waste`` with a waste rate.
+- A distributor that already finished before the halt is discarded with
+  its real token counts.
+- With speculation off the two steps run one after the other.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from src.schemas.multi_agent import AnswerIssue, AnswerReview, ClarificationQuestion, DistributorOutput
+from src.services import multi_agent_service
+from src.services.base_client import GenerationResult
+from src.services.multi_agent_service import MultiAgentService
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class _Client:
+    model_name = "gpt-4o"
+
+    def get_temperature(self, temperature=None):
+        return 0.1
+
+    def get_model_info(self):
+        return {"model": self.model_name, "provider": "mock"}
+
+
+def _service(monkeypatch, *, halt: bool, distributor_delay: float, reviewer_delay: float = 0.05):
+    monkeypatch.setattr(multi_agent_service, "_speculation_stats", {
+        "started": 0, "used": 0, "discarded": 0, "used_tokens": 0, "wasted_tokens": 0,
+    })
+    service = MultiAgentService.__new__(MultiAgentService)
+    service.distributor_client = _Client()
+    service.reviewer_client = _Client()
+    events = []
+
+    async def reviewer(**kwargs):
+        events.append("reviewer_start")
+        await asyncio.sleep(reviewer_delay)
+        events.append("reviewer_end")
+        issues = [AnswerIssue(kind="gibberish", severity="block", message="Please describe your business")] if halt else []
+        review = AnswerReview(is_clear_to_proceed=not halt, issues=issues)
+        return review, GenerationResult(text="{}", prompt_tokens=100, completion_tokens=20, total_tokens=120), "p"
+
+    async def distributor(**kwargs):
+        events.append("distributor_start")
+        try:
+            await asyncio.sleep(distributor_delay)
+        except asyncio.CancelledError:
+            events.append("distributor_cancelled")
+            raise
+        events.append("distributor_end")
+        output = DistributorOutput(
+            project_name="Shop",
+            clarifications_needed=[ClarificationQuestion(id="q1", question="How many stores?", type="text")],
+        )
+        return output, GenerationResult(text="{}", prompt_tokens=900, completion_tokens=100, total_tokens=1000), "p"
+
+    monkeypatch.setattr(service, "_run_answer_reviewer", reviewer)
+    monkeypatch.setattr(service, "_run_distributor", distributor)
+    return service, events
+
+
+async def _run(service):
+    return await service.generate_sdf("We sell flowers", business_answers={"what_business": "flowers"})
+
+
+async def test_speculative_distributor_used_when_reviewer_clears(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_DISTRIBUTOR", True)
+    service, events = _service(monkeypatch, halt=False, distributor_delay=0.05)
+    result = await _run(service)
+
+    assert result.halted_reason == "clarifications"
+    assert events.index("distributor_start") < events.index("reviewer_end")
+    assert result.token_usage["distributor"]["total"] == 1000
+    assert result.token_usage["speculative_waste"]["total"] == 0
+    assert multi_agent_service.speculation_snapshot()["used"] == 1
+
+
+async def test_halt_cancels_running_distributor(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_DISTRIBUTOR", True)
+    service, events = _service(monkeypatch, halt=True, distributor_delay=10)
+    result = await _run(service)
+
+    assert result.halted_reason == "answer_review"
+    assert "distributor_cancelled" in events
+    waste = result.token_usage["speculative_waste"]
+    assert waste["prompt"] > 0 and waste["completion"] == 0
+    assert 0 < waste["wasted_rate"] < 1
+    assert result.token_usage["total"]["total"] == 120 + waste["total"]
+    assert multi_agent_service.speculation_snapshot()["discarded"] == 1
+
+
+async def test_halt_discards_finished_distributor(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_DISTRIBUTOR", True)
+    service, events = _service(monkeypatch, halt=True, distributor_delay=0, reviewer_delay=0.05)
+    result = await _run(service)
+
+    waste = result.token_usage["speculative_waste"]
+    assert waste["total"] == 1000
+    assert waste["wasted_rate"] == pytest.approx(1000 / 1120, abs=1e-4)
+    assert "distributor_end" in events and result.distributor_output is None
+
+
+async def test_sequential_when_disabled(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_SPECULATIVE_DISTRIBUTOR", False)
+    service, events = _service(monkeypatch, halt=False, distributor_delay=0)
+    result = await _run(service)
+
+    assert events.index("reviewer_end") < events.index("distributor_start")
+    assert "speculative_waste" not in result.token_usage
+
+    service, events = _service(monkeypatch, halt=True, distributor_delay=0)
+    await _run(service)
+    assert "distributor_start" not in events
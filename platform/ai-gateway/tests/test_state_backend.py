@@ -0,0 +1,183 @@
+"""Unit tests for the shared state backends and multi-worker job ownership.
+
+Covered behaviors:
+- Every backend (memory, sqlite, redis via ``LocalRedis``) round-trips
+  JSON values per namespace, deletes, and expires entries after their TTL.
+- Two sqlite backends on one file (two workers) see each other's writes.
+- ``StateWriter`` applies the latest pending value per key, in order, and
+  ``None`` deletes.
+- /ai/progress answers from the backend, so a worker that did not run the
+  pipeline reports its progress.
+- Two job queues on one table never run the same job; a stopped queue's
+  unfinished jobs are taken over by the other.
+- The lease heartbeat keeps going while the event loop is blocked.
+- Several workers refuse to start on a per-process state backend.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src import main as gateway_main
+from src.services import state_backend
+from src.services.job_queue import JobQueue, job_handler
+from src.services.state_backend import (
+    LocalRedis,
+    MemoryStateBackend,
+    RedisStateBackend,
+    SqliteStateBackend,
+    StateWriter,
+    check_multi_worker,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    if request.param == "sqlite":
+        return SqliteStateBackend(tmp_path / "state.sqlite")
+    return RedisStateBackend(LocalRedis())
+
+
+async def test_round_trip_delete_and_ttl(backend):
+    await backend.set("progress", "p1", {"step": "distributor", "pct": 10})
+    await backend.set("other", "p1", [1, 2])
+    assert await backend.get("progress", "p1") == {"step": "distributor", "pct": 10}
+    assert await backend.get("other", "p1") == [1, 2]
+
+    await backend.delete("progress", "p1")
+    assert await backend.get("progress", "p1") is None
+
+    await backend.set("progress", "p2", {"step": "done"}, ttl=0.05)
+    assert await backend.get("progress", "p2") == {"step": "done"}
+    await asyncio.sleep(0.08)
+    assert await backend.get("progress", "p2") is None
+
+
+async def test_sqlite_is_shared_between_workers(tmp_path):
+    first = SqliteStateBackend(tmp_path / "state.sqlite")
+    second = SqliteStateBackend(tmp_path / "state.sqlite")
+    await first.set("progress", "p1", {"pct": 40})
+    assert await second.get("progress", "p1") == {"pct": 40}
+
+
+class _RecordingBackend(MemoryStateBackend):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    async def set(self, namespace, key, value, ttl=None):
+        self.writes.append(value)
+        await asyncio.sleep(0.01)
+        await super().set(namespace, key, value, ttl)
+
+
+async def test_state_writer_coalesces_in_order():
+    backend = _RecordingBackend()
+    writer = StateWriter(backend, "progress")
+    writer.put("p1", {"pct": 1})
+    await asyncio.sleep(0)
+    for pct in (2, 3, 4):
+        writer.put("p1", {"pct": pct})
+    await writer.drain()
+    assert backend.writes == [{"pct": 1}, {"pct": 4}]
+    assert await backend.get("progress", "p1") == {"pct": 4}
+
+    writer.put("p1", None)
+    await writer.drain()
+    assert await backend.get("progress", "p1") is None
+
+
+async def test_progress_endpoint_reads_backend(monkeypatch):
+    backend = MemoryStateBackend()
+    monkeypatch.setattr(state_backend, "_backend", backend)
+    await backend.set("progress", "p1", {"step": "generators", "pct": 25, "detail": "HR ready"})
+
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        assert (await client.get("/ai/progress/p1")).json()["step"] == "generators"
+        assert (await client.get("/ai/progress/p2")).json()["step"] == "idle"
+
+
+runs: list = []
+
+
+@job_handler("test_shared")
+async def _shared(payload):
+    runs.append(payload["n"])
+    await asyncio.sleep(payload.get("delay", 0))
+    return {"n": payload["n"]}
+
+
+async def _wait_for(queue: JobQueue, job_id: str, status: str) -> dict:
+    for _ in range(300):
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}: {job}")
+
+
+async def test_job_queues_share_a_table(tmp_path):
+    runs.clear()
+    path = tmp_path / "jobs.sqlite"
+    a = JobQueue(path, workers=1, lease_seconds=0.3)
+    b = JobQueue(path, workers=2, lease_seconds=0.3)
+    await a.start()
+    await b.start()
+
+    done = await a.submit("test_shared", {"n": 1})
+    await _wait_for(b, done, "succeeded")
+    # b's heartbeat scans never take over jobs of a live queue.
+    await asyncio.sleep(0.25)
+    assert runs == [1] and b.snapshot()["resumed"] == 0
+
+    slow = await a.submit("test_shared", {"n": 2, "delay": 5})
+    waiting = await a.submit("test_shared", {"n": 3})
+    await _wait_for(a, slow, "running")
+    await a.stop()
+
+    # b takes both over on its next heartbeat: one re-run, one resumed.
+    await _wait_for(b, waiting, "succeeded")
+    job = await _wait_for(b, slow, "running")
+    assert job["attempts"] == 2 and runs.count(3) == 1
+    await b.stop()
+
+
+async def test_heartbeat_survives_a_blocked_loop(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite", lease_seconds=0.3)
+    await queue.start()
+
+    def heartbeat_at():
+        return queue._execute("SELECT heartbeat_at FROM workers WHERE owner = ?", (queue.owner,))[0][0]
+
+    before = heartbeat_at()
+    time.sleep(0.35)  # a CPU-bound stage holding the event loop
+    assert heartbeat_at() > before
+    await queue.stop()
+    assert queue._execute("SELECT * FROM workers") == []
+
+
+@pytest.mark.parametrize("kind, url, ok", [
+    ("memory", "", False),
+    ("redis", "", False),
+    ("redis", "redis://cache:6379/0", True),
+    ("sqlite", "", True),
+])
+async def test_multi_worker_needs_shared_state(monkeypatch, kind, url, ok):
+    monkeypatch.setattr(state_backend.settings, "AI_STATE_BACKEND", kind)
+    monkeypatch.setattr(state_backend.settings, "AI_STATE_REDIS_URL", url)
+    check_multi_worker(1)
+    if ok:
+        check_multi_worker(4)
+    else:
+        with pytest.raises(RuntimeError, match="needs shared state"):
+            check_multi_worker(4)
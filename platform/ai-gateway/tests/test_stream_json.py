@@ -0,0 +1,162 @@
+"""Unit tests for incremental JSON parsing of streamed generator output.
+
+Covered behaviors:
+- Entities are emitted as soon as they close, whatever the chunk size,
+  and the finished document matches ``json.loads``.
+- Fences before and after the object, escaped quotes/braces in strings
+  and trailing commas are tolerated.
+- Structural errors raise ``StreamJSONError`` at the offending character,
+  before the rest of the body is fed.
+- The generator step streams, restarts a malformed stream, keeps the
+  complete entities when the output can't be salvaged, and falls back to
+  ``generate_with_retry`` when the stream itself fails.
+- Tokens of dropped stream attempts are added to the returned result.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import List
+
+import pytest
+
+from src.services import multi_agent_service
+from src.services.base_client import GenerationResult, StreamChunk, estimate_prompt_tokens
+from src.services.multi_agent_service import MultiAgentService
+from src.services.stream_json import IncrementalJSONParser, StreamJSONError
+
+
+pytestmark = pytest.mark.asyncio
+
+DOCUMENT = {
+    "module": "hr",
+    "entities": [
+        {"slug": "employees", "fields": [{"name": "salary", "min": -1.5e3, "required": True, "help": None}]},
+        {"slug": "notes", "display_name": "Say \"hi\" {to} [all] \\o/"},
+    ],
+    "module_config": {"enabled": True},
+    "sdf_complete": False,
+    "warnings": [],
+}
+
+
+def _chunks(text: str, size: int) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 5, 64, 100_000])
+async def test_entities_emitted_as_they_close(size):
+    text = "```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```"
+    parser = IncrementalJSONParser()
+    emitted = []
+    for chunk in _chunks(text, size):
+        emitted.extend(parser.feed(chunk))
+    assert [index for index, _ in emitted] == [0, 1]
+    assert [entity for _, entity in emitted] == DOCUMENT["entities"]
+    assert parser.complete and parser.document() == DOCUMENT
+
+
+async def test_first_entity_available_before_body_ends():
+    text = json.dumps(DOCUMENT)
+    cut = text.index('{"slug": "notes"')
+    parser = IncrementalJSONParser()
+    assert [e["slug"] for _, e in parser.feed(text[:cut])] == ["employees"]
+    assert not parser.complete
+
+
+async def test_trailing_commas_tolerated():
+    parser = IncrementalJSONParser()
+    emitted = parser.feed('{"entities": [{"slug": "a", "fields": [1, 2,],},], "warnings": [],}')
+    assert [e for _, e in emitted] == [{"slug": "a", "fields": [1, 2]}]
+    assert parser.document()["entities"] == [{"slug": "a", "fields": [1, 2]}]
+
+
+@pytest.mark.parametrize("text, position", [
+    ('{"entities": [{"slug" "a"}', 22),
+    ('{"entities": [{"slug": "a"} {"slug": "b"}', 28),
+    ('{"entities": [{"required": ture}', 27),
+    ('{"entities": [{"slug": "a"}}', 27),
+    ('{"module": "hr",, "entities": []', 16),
+])
+async def test_malformed_structure_detected_early(text, position):
+    parser = IncrementalJSONParser()
+    with pytest.raises(StreamJSONError) as excinfo:
+        parser.feed(text + ' ' * 5)
+    assert excinfo.value.position == position
+
+
+class _StreamingClient:
+    """Streams scripted bodies, one per ``generate_stream`` call."""
+
+    def __init__(self, bodies: List[object], fallback: str = ""):
+        self.bodies = list(bodies)
+        self.fallback = fallback
+        self.streams = 0
+        self.buffered = 0
+
+    def get_temperature(self, temperature=None):
+        return 0.2
+
+    async def generate_stream(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        self.streams += 1
+        body = self.bodies.pop(0)
+        if isinstance(body, Exception):
+            raise body
+        for chunk in _chunks(body, 16):
+            yield StreamChunk(text=chunk)
+        yield StreamChunk(done=True, prompt_tokens=100, completion_tokens=50, total_tokens=150,
+                          model="mock", finish_reason="stop")
+
+    async def generate_with_retry(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        self.buffered += 1
+        return GenerationResult(text=self.fallback, total_tokens=10)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_STREAM_GENERATORS", True)
+    monkeypatch.setattr(multi_agent_service.settings, "AI_STREAM_MALFORMED_RETRIES", 1)
+    monkeypatch.setattr(multi_agent_service, "_json_parse_stats", {})
+    return MultiAgentService.__new__(MultiAgentService)
+
+
+async def test_generator_streams_and_reports_entities(service):
+    client = _StreamingClient([json.dumps(DOCUMENT)])
+    seen = []
+    data, result = await service._generate_module_json(
+        client, "prompt", "hr", lambda agent, index, entity: seen.append((agent, index, entity["slug"])),
+    )
+    assert data == DOCUMENT
+    assert seen == [("hr", 0, "employees"), ("hr", 1, "notes")]
+    assert result.total_tokens == 150 and result.finish_reason == "stop"
+    assert (client.streams, client.buffered) == (1, 0)
+
+
+async def test_malformed_stream_is_restarted(service):
+    client = _StreamingClient(['{"entities": [{"slug": "a"} {"slug": "b"}' + "x" * 5000, json.dumps(DOCUMENT)])
+    data, result = await service._generate_module_json(client, "prompt", "hr")
+    assert data == DOCUMENT
+    assert client.streams == 2
+    # The dropped attempt's prompt and partial output are estimated and added.
+    assert result.stream_restarts == 1
+    assert result.prompt_tokens > 100 and result.completion_tokens > 50
+    assert result.total_tokens == result.prompt_tokens + result.completion_tokens
+    assert multi_agent_service.json_repair_snapshot()["agents"]["hr"]["streams_aborted"] == 1
+
+
+async def test_unsalvageable_output_keeps_complete_entities(service):
+    service.distributor_client = _StreamingClient([], fallback="still broken")
+    body = '{"entities": [{"slug": "a"}, {"slug": "b"}, {"slug": "c", "fields": ["'
+    client = _StreamingClient([body])
+    data, _ = await service._generate_module_json(client, "prompt", "invoice")
+    assert [e["slug"] for e in data["entities"]][:2] == ["a", "b"]
+
+
+async def test_stream_failure_falls_back_to_buffered_call(service):
+    service.distributor_client = _StreamingClient([])
+    client = _StreamingClient([RuntimeError("connection reset")], fallback=json.dumps(DOCUMENT))
+    data, result = await service._generate_module_json(client, "prompt", "inventory")
+    assert data == DOCUMENT
+    assert (client.streams, client.buffered) == (1, 1)
+    # The failed stream never reported usage; its prompt is estimated.
+    assert result.total_tokens == 10 + estimate_prompt_tokens("prompt") and result.stream_restarts == 1
@@ -0,0 +1,138 @@
+"""Unit tests for provider-native structured outputs.
+
+Covered behaviors:
+- Reviewer, distributor and precheck schemas are strict-mode compatible:
+  every object closes ``additionalProperties`` and requires all of its
+  properties, and no ``$ref``/``default`` keywords remain.
+- The generator schema (free-form entity rows) is sent non-strict to Azure
+  and not at all to Gemini.
+- Azure requests carry a ``json_schema`` response format when a schema is
+  given, and plain ``json_object`` when structured outputs are turned off.
+- Gemini schemas are accepted by ``protos.Schema`` and land in the
+  generation config.
+- The repair-call rate is tracked per agent.
+"""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+from google.generativeai.types import generation_types
+
+from src.config import AgentConfig
+from src.schemas.multi_agent import AnswerReview, DistributorOutput, ModuleGeneratorOutput
+from src.schemas.output_schemas import gemini_response_schema, is_strict, openai_response_format
+from src.schemas.precheck import PrecheckResponse
+from src.services import multi_agent_service
+from src.services.azure_client import AzureOpenAIClient
+from src.services.base_client import GenerationResult
+from src.services.gemini_client import GeminiClient
+from src.services.multi_agent_service import MultiAgentService, json_repair_snapshot
+
+
+pytestmark = pytest.mark.asyncio
+
+STRICT_MODELS = [AnswerReview, DistributorOutput, PrecheckResponse]
+
+
+def _objects(node):
+    if isinstance(node, dict):
+        if node.get("type") == "object":
+            yield node
+        for value in node.values():
+            yield from _objects(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _objects(item)
+
+
+@pytest.mark.parametrize("model", STRICT_MODELS, ids=lambda m: m.__name__)
+async def test_strict_schema_rules(model):
+    response_format = openai_response_format(model)
+    assert response_format["type"] == "json_schema"
+    spec = response_format["json_schema"]
+    assert spec["name"] == model.__name__ and spec["strict"] is True
+
+    objects = list(_objects(spec["schema"]))
+    assert objects
+    for obj in objects:
+        assert obj["additionalProperties"] is False
+        assert obj["required"] == list(obj["properties"])
+    text = json.dumps(spec["schema"])
+    assert "$ref" not in text and '"default"' not in text
+
+
+async def test_generator_schema_is_not_strict():
+    assert not is_strict(ModuleGeneratorOutput)
+    assert openai_response_format(ModuleGeneratorOutput)["json_schema"]["strict"] is False
+    assert gemini_response_schema(ModuleGeneratorOutput) is None
+
+
+def _azure_client() -> AzureOpenAIClient:
+    return AzureOpenAIClient(AgentConfig(
+        name="reviewer",
+        api_key="test-key",
+        azure_endpoint="https://example.openai.azure.com",
+        azure_deployment="gpt-4o",
+    ))
+
+
+async def test_azure_sends_json_schema(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_STRUCTURED_OUTPUTS", True)
+    client = _azure_client()
+    kwargs = client._build_request_kwargs("review", 0.0, False, AnswerReview)
+    assert kwargs["response_format"]["json_schema"]["name"] == "AnswerReview"
+    assert client._build_request_kwargs("chat", 0.0, True, None)["response_format"] == {"type": "json_object"}
+
+    monkeypatch.setattr(multi_agent_service.settings, "AI_STRUCTURED_OUTPUTS", False)
+    kwargs = client._build_request_kwargs("review", 0.0, False, AnswerReview)
+    assert kwargs["response_format"] == {"type": "json_object"}
+
+
+@pytest.mark.parametrize("model", STRICT_MODELS, ids=lambda m: m.__name__)
+async def test_gemini_schema_converts_to_proto(model):
+    schema = gemini_response_schema(model)
+    config = {"response_schema": schema}
+    generation_types._normalize_schema(config)
+    assert config["response_schema"].properties
+
+
+async def test_gemini_generation_config_carries_schema(monkeypatch):
+    monkeypatch.setattr(multi_agent_service.settings, "AI_STRUCTURED_OUTPUTS", True)
+    client = GeminiClient.__new__(GeminiClient)
+    client.agent_config = None
+
+    config = client._build_generation_config(0.1, False, DistributorOutput, 1024)
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema["properties"]["project_name"]["type"] == "string"
+
+    config = client._build_generation_config(0.1, False, ModuleGeneratorOutput, 1024)
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema is None
+
+
+class _RepairClient:
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    async def generate_with_retry(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        self.calls += 1
+        return GenerationResult(text=self.text)
+
+
+async def test_repair_rate_is_tracked(monkeypatch):
+    monkeypatch.setattr(multi_agent_service, "_json_parse_stats", {})
+    service = MultiAgentService.__new__(MultiAgentService)
+    service.distributor_client = _RepairClient('{"fixed": true}')
+
+    assert await service._parse_json_with_repair('{"ok": 1}', "reviewer") == {"ok": 1}
+    assert await service._parse_json_with_repair("not json at all", "reviewer") == {"fixed": True}
+    service.distributor_client = _RepairClient("still not json")
+    with pytest.raises(ValueError):
+        await service._parse_json_with_repair("nope", "reviewer")
+
+    stats = json_repair_snapshot()["agents"]["reviewer"]
+    assert (stats["parsed"], stats["repaired"], stats["failed"]) == (1, 1, 1)
+    assert stats["repair_rate"] == pytest.approx(2 / 3, abs=1e-3)
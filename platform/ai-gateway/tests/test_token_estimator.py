@@ -0,0 +1,202 @@
+"""Unit tests for local token estimation, output sizing and continuations.
+
+Covered behaviors:
+- Model and deployment names map to a tokenizer family and context limits.
+- Estimates grow with text, cost more for non-ASCII text, and are higher
+  for the older cl100k family than for o200k.
+- ``plan_max_output_tokens`` clips the budget to the model's output limit
+  and the remaining context, and refuses prompts that leave no room.
+- Azure requests use the agent's ``MAX_OUTPUT_TOKENS`` budget.
+- A ``finish_reason == "length"`` result is continued and stitched back
+  together (fences and repeated overlap removed, tokens summed); a failed
+  continuation returns the partial text.
+- Gemini's MAX_TOKENS finish reason maps to "length".
+"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+
+from src.config import AgentConfig
+from src.services import token_estimator
+from src.services.azure_client import AzureOpenAIClient
+from src.services.base_client import BaseAIClient, GenerationResult
+from src.services.gemini_client import _finish_reason
+from src.services.token_estimator import (
+    PromptTooLargeError,
+    estimate_tokens,
+    model_family,
+    model_spec,
+    plan_max_output_tokens,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+ENGLISH = (
+    "We run a small hardware store with two locations. We need to track products, "
+    "stock levels per warehouse, suppliers and purchase orders, and invoice customers."
+)
+TURKISH = (
+    "İki şubesi olan küçük bir hırdavat mağazası işletiyoruz. Ürünleri, depo bazında "
+    "stok seviyelerini, tedarikçileri ve satın alma siparişlerini takip etmemiz gerekiyor."
+)
+
+
+async def test_model_family_mapping():
+    assert model_family("gpt-4o") == "o200k"
+    assert model_family("prod-gpt-4o-mini") == "o200k"
+    assert model_family("gpt-4.1") == "o200k"
+    assert model_family("o3-mini") == "o200k"
+    assert model_family("gpt-4") == "cl100k"
+    assert model_family("prod-gpt-4-turbo-2024-04-09") == "cl100k"
+    assert model_family("gpt4-hr-specialist") == "default"
+    assert model_spec("gpt-4-hr-specialist").max_output_tokens > 4_096
+
+
+@pytest.mark.parametrize("model, context_window", [
+    ("gpt-4", 8_192),
+    ("gpt-4-0613", 8_192),
+    ("gpt-4-32k", 32_768),
+    ("gpt-4-32k-0613", 32_768),
+    ("gpt-4-turbo", 128_000),
+    ("gpt-4-turbo-2024-04-09", 128_000),
+    ("gpt-4-1106-preview", 128_000),
+    ("gpt-4-vision-preview", 128_000),
+])
+async def test_legacy_gpt4_windows(model, context_window):
+    spec = model_spec(model)
+    assert (spec.family, spec.context_window, spec.max_output_tokens) == ("cl100k", context_window, 4_096)
+
+
+async def test_legacy_gpt4_limits_apply():
+    assert plan_max_output_tokens(6_000, "gpt-4-0613", 4_096) < 4_096
+    with pytest.raises(PromptTooLargeError):
+        plan_max_output_tokens(8_000, "gpt-4", 4_096)
+    assert plan_max_output_tokens(8_000, "gpt-4-32k", 4_096) == 4_096
+    assert model_family("gpt-35-turbo") == "cl100k"
+    assert model_family("gemini-2.5-flash") == "gemini"
+    assert model_family("my-custom-deployment") == "default"
+    assert model_spec("gpt-4.1").context_window > model_spec("gpt-4o").context_window
+
+
+async def test_estimates_are_plausible():
+    assert estimate_tokens("") == 0
+    english = estimate_tokens(ENGLISH, "gpt-4o")
+    # ~25 words; real o200k count is 31.
+    assert 25 <= english <= 45
+    assert estimate_tokens(ENGLISH * 4, "gpt-4o") >= 4 * english - 4
+    # Non-ASCII text splits into more tokens per character.
+    turkish = estimate_tokens(TURKISH, "gpt-4o")
+    assert turkish / len(TURKISH) > english / len(ENGLISH)
+    assert estimate_tokens(TURKISH, "gpt-4") >= turkish
+    json_text = '{"entities": [{"slug": "products", "fields": [{"name": "sku", "type": "string"}]}]}'
+    assert 20 <= estimate_tokens(json_text, "gpt-4o") <= 45
+
+
+async def test_plan_clips_budget_to_model_and_context():
+    assert plan_max_output_tokens(1000, "gpt-4o", 8192) == 8192
+    assert plan_max_output_tokens(1000, "gpt-4o", 50_000) == 16_384
+    # Almost-full context: only the remainder is requested.
+    planned = plan_max_output_tokens(110_000, "gpt-4o", 16_384)
+    assert 1000 < planned < 7000
+    with pytest.raises(PromptTooLargeError):
+        plan_max_output_tokens(127_000, "gpt-4o", 8192)
+
+
+async def test_azure_request_uses_agent_budget(monkeypatch):
+    monkeypatch.setattr(token_estimator.settings, "AI_MAX_OUTPUT_TOKENS", 8192)
+    config = AgentConfig(
+        name="reviewer",
+        api_key="test-key",
+        azure_endpoint="https://example.openai.azure.com",
+        azure_deployment="gpt-4o",
+        max_output_tokens=2048,
+    )
+    client = AzureOpenAIClient(config)
+    assert client._build_request_kwargs("short", 0.0, True, None)["max_tokens"] == 2048
+
+    config.max_output_tokens = None
+    assert client._build_request_kwargs("short", 0.0, True, None)["max_tokens"] == 8192
+
+
+class _ScriptedClient(BaseAIClient):
+    """Returns the scripted results in order and records the prompts it saw."""
+
+    def __init__(self, results: List[Optional[GenerationResult]]):
+        self.results = results
+        self.prompts: List[str] = []
+        super().__init__(AgentConfig(name="hr", provider="mock"))
+
+    def _setup_client(self) -> None:
+        self.model_name = "gpt-4o"
+
+    async def generate(self, prompt, temperature=None, json_mode=False, response_schema=None,
+                       request_options=None) -> GenerationResult:
+        self.prompts.append(prompt)
+        result = self.results.pop(0)
+        if result is None:
+            raise RuntimeError("provider down")
+        return result
+
+    async def generate_with_retry(self, prompt, temperature=None, json_mode=False, response_schema=None):
+        result = await self.generate(prompt, temperature, json_mode, response_schema)
+        return await self._continue_if_truncated(prompt, result, temperature)
+
+    def generate_stream(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def test_connection(self) -> bool:
+        return True
+
+    def get_model_info(self) -> dict:
+        return {"provider": "test"}
+
+
+def _result(text: str, finish_reason: str, tokens: int = 10) -> GenerationResult:
+    return GenerationResult(text=text, prompt_tokens=tokens, completion_tokens=tokens,
+                            total_tokens=2 * tokens, finish_reason=finish_reason)
+
+
+async def test_truncated_output_is_continued():
+    client = _ScriptedClient([
+        _result('{"entities": [{"slug": "employees", "display_name": "Empl', "length"),
+        # The model re-opens a fence and repeats the tail it was shown.
+        _result('```json\n"display_name": "Employees"}]}\n```', "stop"),
+    ])
+
+    result = await client.generate_with_retry("generate hr", temperature=0.2)
+
+    assert result.text == '{"entities": [{"slug": "employees", "display_name": "Employees"}]}'
+    assert result.finish_reason == "stop"
+    assert result.continuations == 1
+    assert (result.prompt_tokens, result.completion_tokens, result.total_tokens) == (20, 20, 40)
+    assert "generate hr" in client.prompts[1]
+    assert '"display_name": "Empl' in client.prompts[1]
+
+
+async def test_continuations_are_capped_and_failures_keep_partial(monkeypatch):
+    monkeypatch.setattr(token_estimator.settings, "AI_MAX_CONTINUATIONS", 1)
+    client = _ScriptedClient([_result("part one ", "length"), _result("part two", "length")])
+    result = await client.generate_with_retry("p")
+    assert result.text == "part one part two"
+    assert result.continuations == 1
+    assert result.finish_reason == "length"
+
+    failing = _ScriptedClient([_result('{"a": [1, 2', "length"), None])
+    result = await failing.generate_with_retry("p")
+    assert result.text == '{"a": [1, 2'
+    assert result.continuations == 0
+
+
+async def test_gemini_finish_reason_mapping():
+    def response(name):
+        return SimpleNamespace(candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name=name))])
+
+    assert _finish_reason(response("MAX_TOKENS")) == "length"
+    assert _finish_reason(response("STOP")) == "stop"
+    assert _finish_reason(response("SAFETY")) == "safety"
+    assert _finish_reason(SimpleNamespace(candidates=[])) is None
@@ -19,6 +19,24 @@ async function gatewayGet(path) {
   return data;
 }
 
+// Fetch an NDJSON stream from the gateway and parse it into an array of objects.
+async function gatewayGetNdjson(path) {
+  const url = `${AI_GATEWAY_URL}${path.startsWith('/') ? '' : '/'}${path}`;
+  const res = await fetch(url);
+  const text = await res.text();
+  if (!res.ok) {
+    let detail = text;
+    try { detail = JSON.parse(text).detail || text; } catch { /* plain text */ }
+    const err = new Error(detail || `AI Gateway error (${res.status})`);
+    err.statusCode = res.status;
+    throw err;
+  }
+  return text.split('\n').filter(Boolean).map((line) => JSON.parse(line));
+}
+
+// Session ids per export request, to keep the query string short.
+const EXPORT_ID_CHUNK = 100;
+
 async function listSessions({ limit = 50, offset = 0, endpoint, quality, reviewed, agent } = {}) {
   let gwUrl = `/ai/training/sessions?limit=1000&offset=0`;
   if (endpoint) gwUrl += `&endpoint=${encodeURIComponent(endpoint)}`;
@@ -205,9 +223,6 @@ function buildChatUserContent(input) {
 }
 
 async function exportForAzure({ agentTypes, qualityFilter = 'good' }) {
-  const gwData = await gatewayGet('/ai/training/sessions?limit=10000&offset=0');
-  const allSessions = gwData.sessions || [];
-
   const qualityValues = qualityFilter === 'good' ? ['good'] : ['good', 'needs_edit'];
   const reviewResult = await query(
     'SELECT session_id, quality, edited_output FROM training_reviews WHERE quality = ANY($1)',
@@ -217,7 +232,6 @@ async function exportForAzure({ agentTypes, qualityFilter = 'good' }) {
   for (const row of reviewResult.rows) reviewMap[row.session_id] = row;
 
   const eligibleIds = new Set(Object.keys(reviewMap));
-  const eligibleSessions = allSessions.filter((s) => eligibleIds.has(s.session_id));
 
   const stepReviewResult = await query(
     'SELECT session_id, agent, quality, edited_output FROM training_step_reviews WHERE quality = ANY($1)',
@@ -229,18 +243,21 @@ async function exportForAzure({ agentTypes, qualityFilter = 'good' }) {
     stepReviewMap[row.session_id][row.agent] = row;
   }
 
-  const allEligibleIds = new Set([...eligibleIds, ...Object.keys(stepReviewMap)]);
-  const allEligibleSessions = allSessions.filter((s) => allEligibleIds.has(s.session_id));
+  const allEligibleIds = [...new Set([...eligibleIds, ...Object.keys(stepReviewMap)])];
 
+  // One streamed export request per chunk of ids instead of one request per session.
   const fullSessions = [];
-  for (const s of allEligibleSessions) {
+  for (let i = 0; i < allEligibleIds.length; i += EXPORT_ID_CHUNK) {
+    const ids = allEligibleIds.slice(i, i + EXPORT_ID_CHUNK);
+    const params = ids.map((id) => `session_id=${encodeURIComponent(id)}`).join('&');
     try {
-      const full = await gatewayGet(`/ai/training/sessions/${encodeURIComponent(s.session_id)}`);
-      full._review = reviewMap[s.session_id];
-      full._stepReviews = stepReviewMap[s.session_id] || {};
-      fullSessions.push(full);
+      for (const full of await gatewayGetNdjson(`/ai/training/export?${params}`)) {
+        full._review = reviewMap[full.session_id];
+        full._stepReviews = stepReviewMap[full.session_id] || {};
+        fullSessions.push(full);
+      }
     } catch (e) {
-      logger.warn(`Failed to fetch session ${s.session_id} for export: ${e.message}`);
+      logger.warn(`Failed to fetch ${ids.length} session(s) for export: ${e.message}`);
     }
   }
 